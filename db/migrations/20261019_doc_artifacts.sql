@@ -0,0 +1,35 @@
+-- Migration: Cache global de artefatos de documentos (content-addressed por SHA-256)
+-- Markdown convertido fica no storage (bucket govgo, ARTIFACTS/...); resumos por variante ficam na tabela.
+-- Idempotente (IF NOT EXISTS).
+
+-- 1) Artefato por conteúdo (SHA-256 dos bytes baixados)
+CREATE TABLE IF NOT EXISTS public.doc_artifact (
+  sha256 TEXT PRIMARY KEY,
+  filename TEXT,
+  size_bytes BIGINT,
+  markdown_key TEXT,
+  markdown_url TEXT,
+  markdown_chars INTEGER,
+  convert_tier TEXT,          -- camada da conversão: fast (pypdfium2) | docling
+  convert_ms INTEGER,
+  hits INTEGER NOT NULL DEFAULT 0,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  last_hit_at TIMESTAMPTZ
+);
+
+-- 2) Chave secundária: URL do documento → artefato (várias URLs podem apontar para o mesmo conteúdo)
+CREATE TABLE IF NOT EXISTS public.doc_artifact_url (
+  url TEXT PRIMARY KEY,
+  sha256 TEXT NOT NULL REFERENCES public.doc_artifact(sha256) ON DELETE CASCADE,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS doc_artifact_url_sha_idx ON public.doc_artifact_url(sha256);
+
+-- 3) Resumos por variante (modelo/assistant, versão do prompt, max_tokens, modo, hash do contexto PNCP)
+CREATE TABLE IF NOT EXISTS public.doc_artifact_summary (
+  sha256 TEXT NOT NULL REFERENCES public.doc_artifact(sha256) ON DELETE CASCADE,
+  variant TEXT NOT NULL,
+  summary_md TEXT NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (sha256, variant)
+);
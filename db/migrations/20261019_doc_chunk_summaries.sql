@@ -0,0 +1,11 @@
+-- Migration: Cache de resumos parciais (map) do resumo map-reduce de documentos longos
+-- Chave: SHA-256 do texto do trecho + variante (modelo, versão do prompt, max_tokens).
+-- Idempotente (IF NOT EXISTS).
+
+CREATE TABLE IF NOT EXISTS public.doc_chunk_summary (
+  chunk_sha TEXT NOT NULL,
+  variant TEXT NOT NULL,
+  summary_md TEXT NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (chunk_sha, variant)
+);
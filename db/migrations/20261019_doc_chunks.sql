@@ -0,0 +1,25 @@
+-- Migration: Índice de passagens do Markdown dos documentos (pgvector)
+-- Chave: SHA-256 do arquivo baixado (mesma chave de public.doc_artifact).
+-- Busca sempre filtrada por doc_sha (poucas centenas de passagens por documento): índice btree basta.
+-- Idempotente (IF NOT EXISTS).
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- 1) Passagens com embedding (halfvec(3072): text-embedding-3-large, como as demais tabelas *_emb)
+CREATE TABLE IF NOT EXISTS public.doc_chunk (
+  doc_sha TEXT NOT NULL,
+  chunk_no INTEGER NOT NULL,
+  title TEXT,
+  content TEXT NOT NULL,
+  embedding halfvec(3072) NOT NULL,
+  PRIMARY KEY (doc_sha, chunk_no)
+);
+
+-- 2) Documentos completamente indexados (e com qual modelo de embedding)
+CREATE TABLE IF NOT EXISTS public.doc_chunk_index (
+  doc_sha TEXT PRIMARY KEY,
+  model TEXT NOT NULL,
+  chunks INTEGER NOT NULL,
+  chars INTEGER,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
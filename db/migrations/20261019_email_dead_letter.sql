@@ -0,0 +1,22 @@
+-- Dead-letter de e-mails (gvg_mailer): mensagens que falharam após todas as tentativas.
+-- permanent = erro definitivo do servidor (5xx / destinatário recusado); senão esgotou as retentativas.
+-- body_html guardado para reenvio manual; resent_at marcado por quem reenviar.
+-- Seguro para executar múltiplas vezes (IF NOT EXISTS)
+
+CREATE TABLE IF NOT EXISTS public.email_dead_letter (
+  id          bigserial PRIMARY KEY,
+  kind        text NOT NULL,
+  ref_id      text NULL,
+  user_id     uuid NULL,
+  recipient   text NOT NULL,
+  subject     text NOT NULL,
+  body_html   text NULL,
+  error       text NULL,
+  attempts    integer NOT NULL DEFAULT 0,
+  permanent   boolean NOT NULL DEFAULT false,
+  meta        jsonb NOT NULL DEFAULT '{}'::jsonb,
+  created_at  timestamptz NOT NULL DEFAULT now(),
+  resent_at   timestamptz NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_email_dead_letter_pending ON public.email_dead_letter (created_at) WHERE resent_at IS NULL;
@@ -0,0 +1,11 @@
+-- Modo delta dos boletins: a busca considera só contratações embedadas após o last_run_at.
+-- delta_cutoff: menor similaridade do top-N da última execução completa (mantém a relevância do modo completo).
+-- last_full_run_at: quando a última execução completa (reconciliação) ocorreu.
+-- Seguro para executar múltiplas vezes (IF NOT EXISTS)
+
+ALTER TABLE IF EXISTS public.user_schedule
+    ADD COLUMN IF NOT EXISTS delta_cutoff REAL NULL,
+    ADD COLUMN IF NOT EXISTS last_full_run_at TIMESTAMPTZ NULL;
+
+-- Marca d'água de ingestão: contratacao_emb.created_at (contratação só é buscável após o embedding)
+CREATE INDEX IF NOT EXISTS idx_contratacao_emb_created_at ON public.contratacao_emb (created_at);
@@ -0,0 +1,21 @@
+-- Daemon de boletins (boletim_scheduler_daemon): recarga incremental por marca d'água em user_schedule.updated_at.
+-- Índice para "updated_at > marca" e trigger que mantém updated_at em qualquer UPDATE
+-- (inclusive edições fora do app), para que nenhuma alteração escape da recarga.
+-- Seguro para executar múltiplas vezes (IF NOT EXISTS / OR REPLACE)
+
+ALTER TABLE IF EXISTS public.user_schedule
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS idx_user_schedule_updated_at ON public.user_schedule (updated_at);
+
+CREATE OR REPLACE FUNCTION public.user_schedule_touch_updated_at() RETURNS trigger AS $$
+BEGIN
+  NEW.updated_at := now();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_user_schedule_updated_at ON public.user_schedule;
+CREATE TRIGGER trg_user_schedule_updated_at
+  BEFORE UPDATE ON public.user_schedule
+  FOR EACH ROW EXECUTE FUNCTION public.user_schedule_touch_updated_at();
@@ -0,0 +1,12 @@
+-- Percolação de boletins: vetor de consulta salvo por boletim (user_schedule).
+-- emb_key: hash de (modelo, peso de negação, texto de embedding); o vetor só é recalculado quando muda.
+-- Requer extensão pgvector. Seguro para executar múltiplas vezes (IF NOT EXISTS)
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+CREATE TABLE IF NOT EXISTS public.user_schedule_vec (
+  schedule_id   bigint PRIMARY KEY REFERENCES public.user_schedule(id) ON DELETE CASCADE,
+  emb_key       text NOT NULL,
+  embedding     halfvec(3072) NOT NULL,
+  updated_at    timestamptz NOT NULL DEFAULT now()
+);
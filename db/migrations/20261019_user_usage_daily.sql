@@ -0,0 +1,20 @@
+-- Migration: contadores diários de uso (por usuário, dia e métrica)
+-- Mantidos em lote pelo flusher de gvg_usage (write-behind), junto de user_usage_counters.
+-- usage_date = data UTC do evento (mesma base de created_at_date com o fuso padrão UTC do banco).
+-- Idempotente (IF NOT EXISTS / ON CONFLICT).
+
+CREATE TABLE IF NOT EXISTS public.user_usage_daily (
+  user_id UUID NOT NULL REFERENCES auth.users(id),
+  usage_date DATE NOT NULL,
+  metric_key TEXT NOT NULL,
+  metric_value BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ DEFAULT now(),
+  PRIMARY KEY (user_id, usage_date, metric_key)
+);
+
+-- Backfill a partir dos eventos já gravados
+INSERT INTO public.user_usage_daily (user_id, usage_date, metric_key, metric_value)
+SELECT user_id, COALESCE(created_at_date, created_at::date), event_type, COUNT(*)
+  FROM public.user_usage_events
+ GROUP BY 1, 2, 3
+ON CONFLICT (user_id, usage_date, metric_key) DO NOTHING;
@@ -5,6 +5,9 @@ Pipeline PNCP – Etapa 01: Download de contratações e itens (BDS1)
 - Simples, rápido e sem DEPARA externo (mapeamento inline)
 - Compatível com execução local e cron do Render
 - Dependências mínimas: requests, psycopg2-binary, python-dotenv
+- Páginas de contratações baixadas em paralelo (pncp_fetch: teto global adaptativo + fila para o banco)
+- Itens: cursor único de pendentes por data → GETs concorrentes (limite por host) → inserts em lotes grandes
+- --archive-dir: grava as respostas brutas (pncp_archive, zstd JSONL por data); com --replay reprocessa do disco
 """
 
 import os
@@ -15,14 +18,14 @@ import math
 import time
 import datetime as dt
 import argparse
-from typing import List, Dict, Any, Tuple
+import threading
+from typing import List, Dict, Any, Tuple, Iterable, Iterator
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import psycopg2
-from psycopg2.extras import execute_values
 from dotenv import load_dotenv
 
 # ---------------------------------------------------------------------
@@ -32,6 +35,15 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 V1_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))  # .../v1
 LOGS_DIR = os.path.join(SCRIPT_DIR, "logs")
 os.makedirs(LOGS_DIR, exist_ok=True)
+# Módulos compartilhados com scripts/pncp (pncp_bulk: COPY + merge em staging; pncp_archive: arquivo/replay)
+PNCP_SHARED_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "pncp")
+for _path in (PNCP_SHARED_DIR, SCRIPT_DIR):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from pncp_archive import ResponseArchive, add_archive_args, archive_from_args  # noqa: E402
+from pncp_bulk import merge_rows  # noqa: E402
+from pncp_fetch import PageFetchEngine, PageTask, FetchResult, HOST_RATES, PNCP_PAGE_CONCURRENCY, PNCP_HOST_RPS  # noqa: E402
 
 # Carrega apenas o .env de scripts/pncp/.env (sem fallbacks)
 PNCP_ENV = os.path.join(os.path.dirname(SCRIPT_DIR), "pncp", ".env")
@@ -46,6 +58,11 @@ DB_CONFIG = {
 }
 
 MAX_WORKERS_DEFAULT = int(os.getenv("PNCP_MAX_WORKERS", "20"))
+# Gravadores no banco consumindo a fila de páginas (fase 2)
+DB_WRITERS_DEFAULT = int(os.getenv("PNCP_DB_WRITERS", "2"))
+# Itens (fase 3): GETs simultâneos e tamanho do lote de inserção
+ITEM_CONCURRENCY_DEFAULT = int(os.getenv("PNCP_ITEM_CONCURRENCY", str(PNCP_PAGE_CONCURRENCY)))
+ITEM_BATCH_DEFAULT = int(os.getenv("PNCP_ITEM_BATCH", "5000"))
 
 # Log em arquivo simples (sem prefixos customizados)
 PIPELINE_TIMESTAMP = os.getenv("PIPELINE_TIMESTAMP") or dt.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -64,16 +81,19 @@ def log_line(msg: str) -> None:
 # HTTP client com retry/backoff simples
 # ---------------------------------------------------------------------
 
-def build_session() -> requests.Session:
+def build_session(status_retries: bool = True, pool_size: int = 32) -> requests.Session:
+    """status_retries=False: só reconecta em erro de conexão; 429/5xx voltam para o chamador
+    (o PageFetchEngine usa essas respostas para ajustar o teto de concorrência)."""
     sess = requests.Session()
     retry = Retry(
         total=5,
         backoff_factor=1.5,
-        status_forcelist=[408, 429, 500, 502, 503, 504],
+        status_forcelist=[408, 429, 500, 502, 503, 504] if status_retries else [],
         allowed_methods=["HEAD", "GET", "OPTIONS", "GET"],
         raise_on_status=False,
+        respect_retry_after_header=status_retries,
     )
-    adapter = HTTPAdapter(max_retries=retry, pool_connections=32, pool_maxsize=32)
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=32, pool_maxsize=max(32, pool_size))
     sess.mount("http://", adapter)
     sess.mount("https://", adapter)
     sess.headers.update({
@@ -85,6 +105,8 @@ def build_session() -> requests.Session:
     return sess
 
 SESSION = build_session()
+# Sessão do motor de páginas: sem retry de status no adapter, pool >= teto de concorrência
+PAGE_SESSION = build_session(status_retries=False, pool_size=PNCP_PAGE_CONCURRENCY)
 
 # ---------------------------------------------------------------------
 # Utilidades de transformação (inline, sem DEPARA)
@@ -244,6 +266,37 @@ def ensure_conn_open(conn):
         return get_conn()
 
 
+def iter_pending_item_numeros(conn, date_str: str, itersize: int = 2000, include_done: bool = False) -> Iterator[str]:
+    """Contratações da data ainda sem itens, via cursor no servidor.
+    O anti-join roda uma única vez (snapshot do início) e as linhas chegam em blocos de itersize,
+    sem refazer o NOT EXISTS a cada lote; itens gravados durante a leitura não alteram o resultado.
+    include_done: todas as contratações da data, com ou sem itens (replay regrava tudo).
+    """
+    pending_sql = """
+                   AND NOT EXISTS (
+                       SELECT 1 FROM item_contratacao i
+                        WHERE i.numero_controle_pncp = c.numero_controle_pncp
+                   )""" if not include_done else ""
+    try:
+        with conn.cursor(name=f"pendentes_itens_{date_str}") as cur:
+            cur.itersize = itersize
+            cur.execute(
+                f"""
+                SELECT c.numero_controle_pncp
+                  FROM contratacao c
+                 WHERE DATE(c.data_publicacao_pncp) = %s::date{pending_sql}
+                """,
+                (date_str,),
+            )
+            for (numero,) in cur:
+                yield numero
+    finally:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+
+
 def get_last_processed_date(conn) -> str | None:
     try:
         with conn.cursor() as cur:
@@ -299,8 +352,11 @@ def normalize_item(api_obj: Dict[str, Any], numero_controle_pncp: str) -> Dict[s
 # Busca API
 # ---------------------------------------------------------------------
 
-BASE_CONTRATACOES = "https://pncp.gov.br/api/consulta/v1/contratacoes/publicacao"
-BASE_ITENS = "https://pncp.gov.br/api/pncp/v1/orgaos/{cnpj}/compras/{ano}/{seq}/itens"
+# PNCP_API_BASE permite apontar para um servidor local (ex.: bench_pncp_download.py)
+PNCP_API_BASE = os.getenv("PNCP_API_BASE", "https://pncp.gov.br/api").rstrip("/")
+BASE_CONTRATACOES = f"{PNCP_API_BASE}/consulta/v1/contratacoes/publicacao"
+BASE_ITENS = PNCP_API_BASE + "/pncp/v1/orgaos/{cnpj}/compras/{ano}/{seq}/itens"
+PAGE_SIZE = 50
 
 
 def fetch_api_modalidade_totals(date_str: str, codigo: int) -> Tuple[int, int]:
@@ -383,6 +439,29 @@ def fetch_contratacoes_pages(date_str: str, codigo: int, tamanho_pagina: int = 5
         yield list(jd.get("data", []) or [])
 
 
+def build_contratacao_page_tasks(date_str: str, totals: Dict[int, int], tamanho_pagina: int = PAGE_SIZE) -> List[PageTask]:
+    """Uma tarefa por página de cada modalidade, a partir do totalRegistros já lido na contagem.
+    Intercala as modalidades (pág 1 de todas, pág 2 de todas, ...) para o progresso avançar junto.
+    """
+    pages_by_cod = {cod: math.ceil(total / tamanho_pagina) for cod, total in totals.items() if total > 0}
+    tasks: List[PageTask] = []
+    for page in range(1, max(pages_by_cod.values(), default=0) + 1):
+        for cod, n_pag in sorted(pages_by_cod.items()):
+            if page <= n_pag:
+                tasks.append(PageTask(
+                    key=(cod, page),
+                    url=BASE_CONTRATACOES,
+                    params={
+                        "dataInicial": date_str,
+                        "dataFinal": date_str,
+                        "codigoModalidadeContratacao": cod,
+                        "pagina": page,
+                        "tamanhoPagina": tamanho_pagina,
+                    },
+                ))
+    return tasks
+
+
 def partition_list(lst: List[Any], max_workers: int) -> List[List[Any]]:
     if not lst:
         return []
@@ -423,71 +502,148 @@ def fetch_itens_batch(numeros: List[str]) -> List[Dict[str, Any]]:
         # 404: sem itens; demais códigos: silenciar para seguir
     return itens
 
+
+def build_item_tasks(numeros: Iterable[str]) -> Iterator[PageTask]:
+    """Uma tarefa GET de itens por contratação (números de controle fora do padrão são ignorados)."""
+    for numero in numeros:
+        parsed = parse_numero_controle(numero)
+        if not parsed:
+            continue
+        cnpj, ano, seq = parsed
+        yield PageTask(key=numero, url=BASE_ITENS.format(cnpj=cnpj, ano=ano, seq=seq))
+
 # ---------------------------------------------------------------------
 # Inserções no banco
 # ---------------------------------------------------------------------
 
-def insert_contratacoes(conn, contratos: List[Dict[str, Any]]) -> int:
+def insert_contratacoes(conn, contratos: List[Dict[str, Any]], update: bool = False) -> int:
+    """COPY para staging + um INSERT ... ON CONFLICT DO NOTHING (pncp_bulk); retorna inseridas.
+    update=True (replay): ON CONFLICT DO UPDATE; retorna inseridas + atualizadas.
+    """
     if not contratos:
         return 0
     cols = [db for _, db, _ in CONTRATACAO_FIELDS]
-    values = []
-    for c in contratos:
-        row = []
-        for col in cols:
-            v = c.get(col)
-            if isinstance(v, (dict, list)):
-                v = json.dumps(v, ensure_ascii=False)
-            row.append(v)
-        values.append(tuple(row))
-    sql = f"""
-        INSERT INTO contratacao ({', '.join(cols)})
-        VALUES %s
-        ON CONFLICT (numero_controle_pncp) DO NOTHING
-        RETURNING 1
-    """
-    inserted = 0
     with conn.cursor() as cur:
-        execute_values(cur, sql, values, page_size=1000)
-        rows = cur.fetchall() or []
-        inserted += len(rows)
+        inserted, updated = merge_rows(cur, "contratacao", cols, contratos, ["numero_controle_pncp"],
+                                       update=update, keep="last" if update else "first")
     conn.commit()
-    return inserted
+    return inserted + updated
 
 
-def insert_itens(conn, itens_norm: List[Dict[str, Any]]) -> int:
+def insert_itens(conn, itens_norm: List[Dict[str, Any]], update: bool = False) -> int:
+    """COPY para staging + um INSERT ... ON CONFLICT DO NOTHING (pncp_bulk); retorna inseridos.
+    update=True (replay): ON CONFLICT DO UPDATE; retorna inseridos + atualizados.
+    """
     if not itens_norm:
         return 0
     cols = ["numero_controle_pncp"] + [db for _, db, _ in ITEM_FIELDS]
-    values = []
-    for it in itens_norm:
-        row = []
-        for col in cols:
-            v = it.get(col)
-            if isinstance(v, (dict, list)):
-                v = json.dumps(v, ensure_ascii=False)
-            row.append(v)
-        values.append(tuple(row))
-    sql = f"""
-        INSERT INTO item_contratacao ({', '.join(cols)})
-        VALUES %s
-        ON CONFLICT (numero_controle_pncp, numero_item) DO NOTHING
-        RETURNING 1
-    """
-    total_inserted = 0
-    batch = 3000
     with conn.cursor() as cur:
-        if len(values) > batch:
-            for i in range(0, len(values), batch):
-                execute_values(cur, sql, values[i:i+batch], page_size=1000)
-                rows = cur.fetchall() or []
-                total_inserted += len(rows)
-        else:
-            execute_values(cur, sql, values, page_size=1000)
-            rows = cur.fetchall() or []
-            total_inserted += len(rows)
+        inserted, updated = merge_rows(cur, "item_contratacao", cols, itens_norm, ["numero_controle_pncp", "numero_item"],
+                                       update=update, keep="last" if update else "first")
     conn.commit()
-    return total_inserted
+    return inserted + updated
+
+
+class ItemProgress:
+    """Contadores compartilhados pelos gravadores de itens; loga a cada `every_s` segundos."""
+
+    def __init__(self, every_s: float = 10.0):
+        self.lock = threading.Lock()
+        self.contracts = 0
+        self.items = 0
+        self.inserted = 0
+        self.t0 = time.perf_counter()
+        self.every_s = every_s
+        self._last_log = self.t0
+
+    def add(self, contracts: int = 0, items: int = 0, inserted: int = 0) -> None:
+        with self.lock:
+            self.contracts += contracts
+            self.items += items
+            self.inserted += inserted
+            now = time.perf_counter()
+            if now - self._last_log < self.every_s:
+                return
+            self._last_log = now
+            rate = self.items * 60.0 / max(1e-6, now - self.t0)
+            log_line(f"3) Download Itens: {self.contracts} contratações, {self.items} itens ({rate:.0f} itens/min)")
+
+
+class ItemWriter:
+    """Consumidor da fila de itens: normaliza e grava via insert_itens em lotes de batch_size.
+    Uma conexão por gravador; lote ordenado por (contratação, item) evita deadlock entre gravadores.
+    """
+
+    def __init__(self, batch_size: int = ITEM_BATCH_DEFAULT, progress: ItemProgress | None = None, update: bool = False):
+        self.batch_size = max(1, int(batch_size))
+        self.progress = progress or ItemProgress()
+        self.update = update
+        self.buffer: List[Dict[str, Any]] = []
+        self.conn = self._connect()
+
+    def _connect(self):
+        return get_conn()
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> int:
+        return insert_itens(self.conn, rows, update=self.update)
+
+    def __call__(self, result: FetchResult) -> None:
+        numero = result.task.key
+        seen: set[int] = set()
+        added = 0
+        for it in result.payload or []:
+            ni = to_int(it.get("numeroItem")) if isinstance(it, dict) else None
+            if ni is None or ni in seen:
+                continue
+            seen.add(ni)
+            self.buffer.append(normalize_item(it, numero))
+            added += 1
+        self.progress.add(contracts=1, items=added)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        rows = sorted(self.buffer, key=lambda r: (r["numero_controle_pncp"], r["numero_item"]))
+        self.buffer = []
+        try:
+            self.progress.add(inserted=self._insert(rows))
+        except Exception as e:
+            log_line(f"Erro ao inserir lote de {len(rows)} itens: {e}")
+            # tentar reconectar e seguir
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = self._connect()
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+
+
+def download_itens(numeros: Iterable[str], engine: PageFetchEngine, writers: int = DB_WRITERS_DEFAULT,
+                   batch_size: int = ITEM_BATCH_DEFAULT, writer_cls=ItemWriter, update: bool = False) -> Tuple[int, Dict[str, Any]]:
+    """Baixa os itens das contratações (GETs concorrentes no engine) e grava em lotes.
+    Retorna (itens inseridos, estatísticas do engine + contratações/itens/itens_por_min).
+    update=True (replay): regrava itens existentes (inseridos + atualizados).
+    """
+    progress = ItemProgress()
+    st = engine.stream(build_item_tasks(numeros), lambda: writer_cls(batch_size=batch_size, progress=progress, update=update),
+                       consumers=max(1, int(writers)))
+    st.update({
+        "contracts": progress.contracts,
+        "items": progress.items,
+        "inserted": progress.inserted,
+        "items_per_min": round(progress.items * 60.0 / st["elapsed_s"], 1) if st["elapsed_s"] > 0 else 0.0,
+    })
+    return progress.inserted, st
 
 
 def insert_pipeline_run_stats(conn, stage: str, date_ref: str, inserted_contr: int, inserted_itens: int) -> None:
@@ -516,8 +672,16 @@ def insert_pipeline_run_stats(conn, stage: str, date_ref: str, inserted_contr: i
 # Processamento por data
 # ---------------------------------------------------------------------
 
-def process_date(conn, date_str: str, max_workers: int, refresh_items: bool = False) -> Tuple[int, int]:
+def process_date(conn, date_str: str, max_workers: int, refresh_items: bool = False,
+                 engine: PageFetchEngine | None = None, db_writers: int | None = None,
+                 item_engine: PageFetchEngine | None = None, archive: ResponseArchive | None = None) -> Tuple[int, int]:
     log_line(f"Processando {date_str}...")
+    if archive is not None:
+        # respostas desta data vão para (ou vêm de) <archive-dir>/contratacao/AAAA/MM/<data>.jsonl.zst
+        archive.set_partition(date_str)
+    # Replay regrava a data inteira a partir do disco: ignora a contagem BD x API, faz upsert
+    # (ON CONFLICT DO UPDATE) e não registra pipeline_run_stats (não é uma execução de download)
+    replay = archive is not None and archive.replaying
 
     # 1) Contagem no BD por modalidade
     db_counts: Dict[int, int] = {}
@@ -566,156 +730,126 @@ def process_date(conn, date_str: str, max_workers: int, refresh_items: bool = Fa
         db_total = db_counts.get(cod, 0)
         total_missing += max(0, api_total - db_total)
 
-    if total_missing == 0 and not refresh_items:
+    if total_missing == 0 and not refresh_items and not replay:
         log_line("Sem faltantes; pulando processamento desta data.")
         insert_pipeline_run_stats(conn, stage="01", date_ref=date_str, inserted_contr=0, inserted_itens=0)
         return 0, 0
 
-    # 3) Processar cada modalidade em paralelo (14 workers fixos) – apenas CONTRATAÇÕES
-    def worker_modalidade(cod: int) -> Tuple[int, int]:
-        api_total, total_pag = mod_info.get(cod, (0, 0))
-        db_total = db_counts.get(cod, 0)
-        missing = max(0, api_total - db_total)
-        inserted_c = 0
-        local_conn = get_conn()
-        try:
-            numeros_baixados: List[str] = []
-            # Quando há faltantes, baixar página a página e inserir imediatamente
-            if missing > 0 and total_pag > 0:
-                page_idx = 0
-                last_pct = -1  # baseado em inserted_c/missing
-                for page_data in fetch_contratacoes_pages(date_str, cod, tamanho_pagina=50):
-                    page_idx += 1
-                    if not page_data:
-                        continue
-                    # Dedup da página
-                    uniq: Dict[str, Dict[str, Any]] = {}
-                    for c_raw in page_data:
-                        nc = c_raw.get("numeroControlePNCP")
-                        if nc and nc not in uniq:
-                            uniq[nc] = c_raw
-                    page_unique = list(uniq.values())
-                    numeros = [c.get("numeroControlePNCP") for c in page_unique if c.get("numeroControlePNCP")]
-                    numeros_baixados.extend(numeros)
-                    # Inserir contratações da página
-                    contratos_norm = [normalize_contratacao(c) for c in page_unique]
-                    try:
-                        inserted_c += insert_contratacoes(local_conn, contratos_norm)
-                    except Exception as e:
-                        log_line(f"Modalidade {cod} pág {page_idx}: erro ao inserir contratações: {e}")
-                        # tentar reconectar e seguir
-                        try:
-                            local_conn.close()
-                        except Exception:
-                            pass
-                        local_conn = get_conn()
-                    # Progresso por CONTRATOS faltantes (não por páginas)
-                    if missing > 0:
-                        pct = min(100, int((inserted_c * 100) / max(1, missing)))
-                        if pct == 100 or pct - last_pct >= 10:
-                            fill = int(round(pct * 20 / 100))
-                            bar = "█" * fill + "░" * (20 - fill)
-                            log_line(f"2) Download Contratações: {pct}% [{bar}] (mod {cod}: {inserted_c}/{missing})")
-                            last_pct = pct
-
-            # Fase 3 (itens) será executada depois para todas as modalidades
-        finally:
+    # 3) Fase 2 – CONTRATAÇÕES: todas as páginas das modalidades com faltantes em paralelo
+    #    (teto global adaptativo no PageFetchEngine) → fila limitada → gravadores no banco
+    missing_by_cod: Dict[int, int] = {}
+    totals_to_fetch: Dict[int, int] = {}
+    for cod in range(1, 15):
+        api_total, _ = mod_info.get(cod, (0, 0))
+        missing = api_total if replay else max(0, api_total - db_counts.get(cod, 0))
+        if missing > 0:
+            missing_by_cod[cod] = missing
+            totals_to_fetch[cod] = api_total
+    tasks = build_contratacao_page_tasks(date_str, totals_to_fetch)
+    engine = engine or PageFetchEngine(PAGE_SESSION, log=log_line)
+    progress_lock = threading.Lock()
+    inserted_by_cod: Dict[int, int] = {cod: 0 for cod in missing_by_cod}
+    last_pct_by_cod: Dict[int, int] = {cod: -1 for cod in missing_by_cod}
+
+    class PageWriter:
+        """Consumidor da fila: uma conexão por thread; insere a página e atualiza o progresso."""
+
+        def __init__(self):
+            self.conn = get_conn()
+
+        def __call__(self, result: FetchResult) -> None:
+            cod, page = result.task.key
+            page_data = list((result.payload or {}).get("data", []) or []) if isinstance(result.payload, dict) else []
+            if not page_data:
+                return
+            # Dedup da página; ordenação estável evita deadlock entre gravadores concorrentes
+            uniq: Dict[str, Dict[str, Any]] = {}
+            for c_raw in page_data:
+                nc = c_raw.get("numeroControlePNCP")
+                if nc and nc not in uniq:
+                    uniq[nc] = c_raw
+            contratos_norm = [normalize_contratacao(uniq[nc]) for nc in sorted(uniq)]
+            inserted = 0
             try:
-                local_conn.close()
+                inserted = insert_contratacoes(self.conn, contratos_norm, update=replay)
+            except Exception as e:
+                log_line(f"Modalidade {cod} pág {page}: erro ao inserir contratações: {e}")
+                # tentar reconectar e seguir
+                try:
+                    self.conn.close()
+                except Exception:
+                    pass
+                self.conn = get_conn()
+            # Progresso por CONTRATOS faltantes (não por páginas)
+            with progress_lock:
+                inserted_by_cod[cod] += inserted
+                inserted_c, missing = inserted_by_cod[cod], missing_by_cod[cod]
+                pct = min(100, int((inserted_c * 100) / max(1, missing)))
+                if pct == 100 and last_pct_by_cod[cod] == 100:
+                    return
+                if pct == 100 or pct - last_pct_by_cod[cod] >= 10:
+                    fill = int(round(pct * 20 / 100))
+                    bar = "█" * fill + "░" * (20 - fill)
+                    log_line(f"2) Download Contratações: {pct}% [{bar}] (mod {cod}: {inserted_c}/{missing})")
+                    last_pct_by_cod[cod] = pct
+
+        def close(self) -> None:
+            try:
+                self.conn.close()
             except Exception:
                 pass
-        return inserted_c, 0
 
     total_inserted_c = 0
     total_inserted_i = 0
-    with ThreadPoolExecutor(max_workers=14) as ex:
-        futures = {ex.submit(worker_modalidade, cod): cod for cod in range(1, 15)}
-        for fut in as_completed(futures):
-            cod = futures[fut]
-            try:
-                c_add, i_add = fut.result()
-                total_inserted_c += c_add
-            except Exception as e:
-                log_line(f"Erro na modalidade {cod}: {e}")
+    if tasks:
+        st = engine.stream(tasks, PageWriter, consumers=max(1, int(db_writers or DB_WRITERS_DEFAULT)))
+        total_inserted_c = sum(inserted_by_cod.values())
+        for r in st["failures"]:
+            cod, page = r.task.key
+            log_line(f"Modalidade {cod} pág {page}: falhou após {r.attempts} tentativas ({r.error})")
+        log_line(
+            f"2) Download Contratações: {st['pages']}/{len(tasks)} páginas em {st['elapsed_s']:.1f}s "
+            f"({st['pages_per_s']:.1f} pág/s, {st['records']} registros) | retentativas={st['retries']} "
+            f"429={st['throttled']} 5xx={st['server_errors']} rede={st['network_errors']} | "
+            f"concorrência mín={st['concurrency_lowest']} final={st['concurrency_final']}/{st['concurrency_max']}"
+        )
 
     # Espaço entre fase 2 (contratações) e fase 3 (itens)
     log_line("")
 
-    # 4) Fase 3 – ITENS pendentes por modalidade (ordem estrita após fase 2)
-    def worker_itens(cod: int) -> int:
-        inserted_i_local = 0
-        local_conn = get_conn()
+    # 4) Fase 3 – ITENS das contratações pendentes da data (ordem estrita após fase 2):
+    #    cursor único de pendentes → GETs concorrentes (teto + limite por host) → inserts em lotes grandes
+    if replay or refresh_items or total_inserted_c > 0:
+        item_engine = item_engine or PageFetchEngine(PAGE_SESSION, concurrency=ITEM_CONCURRENCY_DEFAULT,
+                                                     empty_status=(204, 404), log=log_line)
+        cursor_conn = get_conn()
         try:
-            with local_conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT c.numero_controle_pncp
-                      FROM contratacao c
-                     WHERE DATE(c.data_publicacao_pncp) = %s::date
-                       AND c.modalidade_id = %s
-                       AND NOT EXISTS (
-                           SELECT 1 FROM item_contratacao i
-                            WHERE i.numero_controle_pncp = c.numero_controle_pncp
-                       )
-                    """,
-                    (date_str, str(cod)),
-                )
-                pendentes = [r[0] for r in cur.fetchall()]
-            total_p = len(pendentes)
-            if total_p == 0:
-                return 0
-            processed = 0
-            last_pct_loc = -1
-            chunks = [pendentes[i:i+200] for i in range(0, total_p, 200)]
-            for ch in chunks:
-                try:
-                    itens_raw = fetch_itens_batch(ch)
-                    itens_norm: List[Dict[str, Any]] = []
-                    seen: set[Tuple[str, int]] = set()
-                    for it in itens_raw:
-                        nc = it.get("numero_controle_pncp")
-                        ni = to_int(it.get("numeroItem"))
-                        if not nc or ni is None:
-                            continue
-                        key = (nc, ni)
-                        if key in seen:
-                            continue
-                        seen.add(key)
-                        itens_norm.append(normalize_item(it, nc))
-                    inserted_i_local += insert_itens(local_conn, itens_norm)
-                except Exception as e:
-                    log_line(f"Modalidade {cod}: erro ao inserir itens (pendentes): {e}")
-                    try:
-                        local_conn.close()
-                    except Exception:
-                        pass
-                    local_conn = get_conn()
-                processed += len(ch)
-                # Progresso por CONTRATOS pendentes (não por páginas/chunks)
-                pct_loc = min(100, int((processed * 100) / max(1, total_p)))
-                if pct_loc == 100 or pct_loc - last_pct_loc >= 10:
-                    fill = int(round(pct_loc * 20 / 100))
-                    bar = "█" * fill + "░" * (20 - fill)
-                    log_line(f"3) Download Itens: {pct_loc}% [{bar}] (mod {cod}: {processed}/{total_p})")
-                    last_pct_loc = pct_loc
+            numeros = iter_pending_item_numeros(cursor_conn, date_str, include_done=replay)
+            if replay:
+                # só contratações com itens no arquivo (as demais dariam ArchiveMiss a cada tentativa)
+                numeros = (t.key for t in build_item_tasks(numeros) if archive.has(t.url))
+            total_inserted_i, st = download_itens(numeros, item_engine, writers=max(1, int(db_writers or DB_WRITERS_DEFAULT)),
+                                                  update=replay)
+            if st["failed"]:
+                sample = ", ".join(f"{r.task.key} ({r.error})" for r in st["failures"][:5])
+                log_line(f"3) Itens: {st['failed']} contratações falharam após as tentativas: {sample}")
+            log_line(
+                f"3) Download Itens: {st['contracts']} contratações, {st['items']} itens em {st['elapsed_s']:.1f}s "
+                f"({st['items_per_min']:.0f} itens/min) | retentativas={st['retries']} 429={st['throttled']} "
+                f"5xx={st['server_errors']} rede={st['network_errors']} espera_rate={st['rate_wait_s']}s | "
+                f"concorrência mín={st['concurrency_lowest']} final={st['concurrency_final']}/{st['concurrency_max']}"
+            )
+        except Exception as e:
+            log_line(f"Erro ao baixar itens de {date_str}: {e}")
         finally:
             try:
-                local_conn.close()
+                cursor_conn.close()
             except Exception:
                 pass
-        return inserted_i_local
-
-    if refresh_items or total_inserted_c > 0:
-        with ThreadPoolExecutor(max_workers=14) as ex:
-            futures = {ex.submit(worker_itens, cod): cod for cod in range(1, 15)}
-            for fut in as_completed(futures):
-                cod = futures[fut]
-                try:
-                    i_add = fut.result()
-                    total_inserted_i += i_add
-                except Exception as e:
-                    log_line(f"Erro na modalidade (itens) {cod}: {e}")
 
+    if replay:
+        log_line(f"Regravados (replay): {total_inserted_c} contratações, {total_inserted_i} itens")
+        return total_inserted_c, total_inserted_i
     log_line(f"Inseridos: {total_inserted_c} contratações, {total_inserted_i} itens")
 
     # 4) Registrar estatísticas da execução para a data/etapa 01
@@ -752,9 +886,29 @@ def main():
     parser.add_argument("--test", help="Rodar apenas uma data YYYYMMDD")
     parser.add_argument("--workers", type=int, default=MAX_WORKERS_DEFAULT, help="Máximo de workers")
     parser.add_argument("--refresh-items", action="store_true", help="Força verificação e (re)download de itens mesmo sem novos contratos")
+    parser.add_argument("--page-concurrency", type=int, default=PNCP_PAGE_CONCURRENCY, help="Teto global de páginas simultâneas (ajustado para baixo em 429/5xx)")
+    parser.add_argument("--db-writers", type=int, default=DB_WRITERS_DEFAULT, help="Conexões gravando as páginas baixadas")
+    parser.add_argument("--item-concurrency", type=int, default=ITEM_CONCURRENCY_DEFAULT, help="Teto de GETs de itens simultâneos")
+    parser.add_argument("--host-rps", type=float, default=PNCP_HOST_RPS, help="Máximo de requisições/s por host da API (0 = sem limite)")
+    add_archive_args(parser)
     args = parser.parse_args()
 
     log_line("[1/3] DOWNLOAD PNCP INICIADO (LPD)")
+    archive = archive_from_args(args, "contratacao", log=log_line)
+    if archive is not None and archive.replaying:
+        # replay: respostas vêm do disco, sem limite por host; LPD não é alterado
+        args.host_rps = 0
+        log_line(f"Replay do arquivo {args.archive_dir} (sem acesso à API)")
+
+    # Motores únicos para todas as datas: o teto aprendido (429/5xx) vale para a execução inteira;
+    # contratações e itens compartilham a sessão keep-alive e o limite por host
+    HOST_RATES.set_rate(args.host_rps)
+    session = build_session(status_retries=False, pool_size=max(args.page_concurrency, args.item_concurrency))
+    engine = PageFetchEngine(session, concurrency=max(1, args.page_concurrency), log=log_line)
+    item_engine = PageFetchEngine(session, concurrency=max(1, args.item_concurrency), empty_status=(204, 404), log=log_line)
+    if archive is not None:
+        archive.install(session)
+        archive.install(SESSION)  # totais por modalidade (fase 1)
 
     conn = get_conn()
     try:
@@ -794,10 +948,11 @@ def main():
         for d in dates:
             try:
                 conn = ensure_conn_open(conn)
-                c, i = process_date(conn, d, max_workers=max(1, args.workers), refresh_items=bool(args.refresh_items))
+                c, i = process_date(conn, d, max_workers=max(1, args.workers), refresh_items=bool(args.refresh_items),
+                                    engine=engine, db_writers=args.db_writers, item_engine=item_engine, archive=archive)
                 total_c += c
                 total_i += i
-                if not args.test:
+                if not args.test and not (archive is not None and archive.replaying):
                     conn = ensure_conn_open(conn)
                     save_last_processed_date(conn, d)
                     log_line(f"LPD atualizado: {d}")
@@ -813,9 +968,15 @@ def main():
         log_line(f"Datas: {len(dates)} | Contratações: {total_c} | Itens: {total_i}")
         if failed:
             log_line(f"Falhas em {len(failed)} datas: {', '.join(failed)}")
+        if archive is not None:
+            archive.close()
+            st = archive.stats
+            log_line(f"Arquivo {args.archive_dir}: gravadas={st['recorded']} replay={st['hits']} ausentes={st['misses']}")
         log_line(f"Log: {os.path.basename(LOG_FILE)}")
 
     finally:
+        if archive is not None:
+            archive.close()
         try:
             conn.close()
         except Exception:
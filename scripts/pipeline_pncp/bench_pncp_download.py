@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark do download de contratações e itens (etapa 01) contra um servidor PNCP local.
+
+O servidor (http.server, 127.0.0.1) reproduz fixtures JSON e simula:
+  --latency-ms    latência por requisição (± 30%);
+  --server-cap    requisições simultâneas acima das quais responde 429 + Retry-After (limite da API);
+  --error-rate    fração de respostas 503.
+Fixtures: --fixtures DIR ou sintéticas (--records, distribuídas entre as 14 modalidades com peso maior
+em dispensa/pregão, como no PNCP):
+  contratacoes_<modalidade>.json  {"data": [...]} — fatiado por pagina/tamanhoPagina (API de consulta);
+  itens.json                      {numeroControlePNCP: [itens]} — ausente → 404 (API pncp de itens).
+
+--stage contratacoes (custo simulado de gravação por página --insert-ms):
+  • sequencial: 14 threads, uma por modalidade, página a página (fetch_contratacoes_pages + inserção);
+  • motor concorrente: PageFetchEngine (teto global adaptativo) → fila limitada → --writers gravadores.
+--stage itens (--item-contracts contratações; gravação = --insert-ms por comando + --row-us por item):
+  • sequencial: 14 threads, uma por modalidade, lotes de 200 com fetch_itens_batch (um GET por vez);
+  • download_itens: GETs concorrentes (--item-concurrency, --host-rps) → ItemWriter em lotes de --item-batch
+    (o cursor de pendentes do banco é substituído pela lista de números).
+--stage arquivo (pncp_archive): baixa páginas + itens da data com --archive-dir gravando (zstd JSONL) e
+  depois reprocessa as mesmas tarefas em --replay (sem rede/limite por host); compara pág/s e tamanho em disco.
+Verifica que cada contratação/item chegou exatamente uma vez ao consumidor.
+--from-archive DIR: usa como fixtures uma partição gravada por --archive-dir (--date), em vez das sintéticas.
+
+Uso:
+  python scripts/pipeline_pncp/bench_pncp_download.py --records 20000 --concurrency 8,16,32
+  python scripts/pipeline_pncp/bench_pncp_download.py --stage itens --item-contracts 1500 --host-rps 0,60
+  python scripts/pipeline_pncp/bench_pncp_download.py --stage arquivo --records 20000
+  python scripts/pipeline_pncp/bench_pncp_download.py --from-archive /dados/pncp_archive --date 20250901
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATE = "20250901"
+# Peso aproximado de cada modalidade no volume diário (8 = dispensa, 6 = pregão eletrônico)
+MOD_WEIGHTS = {1: 1, 2: 1, 3: 2, 4: 3, 5: 2, 6: 30, 7: 2, 8: 45, 9: 8, 10: 1, 11: 1, 12: 3, 13: 1, 14: 1}
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def write_synthetic_fixtures(folder: str, records: int, seed: int = 7) -> None:
+    rng = random.Random(seed)
+    total_w = sum(MOD_WEIGHTS.values())
+    seq = 0
+    itens = {}
+    for mod, w in MOD_WEIGHTS.items():
+        n = max(1, int(records * w / total_w))
+        data = []
+        for _ in range(n):
+            seq += 1
+            cnpj = f"{rng.randint(10**13, 10**14 - 1)}"
+            data.append({
+                "numeroControlePNCP": f"{cnpj}-1-{seq:06d}/2025",
+                "modalidadeId": mod,
+                "modalidadeNome": f"Modalidade {mod}",
+                "anoCompra": 2025,
+                "sequencialCompra": seq,
+                "objetoCompra": "Aquisição de materiais " + " ".join(rng.choice(["de limpeza", "hospitalares", "de escritório", "elétricos"]) for _ in range(6)),
+                "valorTotalEstimado": round(rng.uniform(1e3, 1e6), 2),
+                "dataPublicacaoPncp": "2025-09-01T10:00:00",
+                "orgaoEntidade": {"cnpj": cnpj, "razaoSocial": "PREFEITURA MUNICIPAL", "poderId": "E", "esferaId": "M"},
+                "unidadeOrgao": {"ufSigla": rng.choice(["SP", "MG", "RJ", "BA"]), "municipioNome": "Cidade", "codigoIbge": "3550308"},
+                "informacaoComplementar": "x" * rng.randint(50, 800),
+            })
+            if rng.random() < 0.95:  # ~5% sem itens publicados (404)
+                numero = data[-1]["numeroControlePNCP"]
+                itens[numero] = [{
+                    "numeroItem": k,
+                    "descricao": f"Item {k} " + rng.choice(["papel A4", "luva nitrílica", "cabo flexível", "detergente"]),
+                    "materialOuServico": rng.choice(["M", "S"]),
+                    "valorUnitarioEstimado": round(rng.uniform(1, 500), 2),
+                    "valorTotal": round(rng.uniform(10, 50000), 2),
+                    "quantidade": rng.randint(1, 1000),
+                    "unidadeMedida": "UN",
+                    "criterioJulgamentoId": 1,
+                    "situacaoCompraItem": 1,
+                } for k in range(1, rng.choice([1, 2, 3, 5, 8, 12, 20, 40]) + 1)]
+        with open(os.path.join(folder, f"contratacoes_{mod}.json"), "w", encoding="utf-8") as f:
+            json.dump({"data": data}, f, ensure_ascii=False)
+    with open(os.path.join(folder, "itens.json"), "w", encoding="utf-8") as f:
+        json.dump(itens, f, ensure_ascii=False)
+
+
+def write_archive_fixtures(folder: str, archive_dir: str, date: str) -> None:
+    """Monta contratacoes_<modalidade>.json e itens.json a partir de uma partição do arquivo de respostas."""
+    from pncp_archive import iter_records  # disponível no sys.path após carregar a etapa 01
+    by_mod = {}
+    itens = {}
+    for rec in iter_records(archive_dir, "contratacao", date):
+        u = urlparse(rec.get("url", ""))
+        body = rec.get("body")
+        if rec.get("status") != 200:
+            continue
+        if u.path.endswith("/contratacoes/publicacao") and isinstance(body, dict):
+            cod = int(parse_qs(u.query).get("codigoModalidadeContratacao", ["0"])[0])
+            for c in body.get("data") or []:
+                by_mod.setdefault(cod, {})[c.get("numeroControlePNCP")] = c
+        elif u.path.endswith("/itens") and isinstance(body, list):
+            parts = u.path.strip("/").split("/")
+            cnpj, ano, seq = parts[-5], parts[-3], parts[-2]
+            itens[f"{cnpj}-1-{int(seq):06d}/{ano}"] = body
+    for cod, recs in by_mod.items():
+        with open(os.path.join(folder, f"contratacoes_{cod}.json"), "w", encoding="utf-8") as f:
+            json.dump({"data": list(recs.values())}, f, ensure_ascii=False)
+    with open(os.path.join(folder, "itens.json"), "w", encoding="utf-8") as f:
+        json.dump(itens, f, ensure_ascii=False)
+
+
+class MockPNCP:
+    """Servidor de consulta que fatia as fixtures por página e injeta latência, 429 e 503."""
+
+    def __init__(self, folder: str, args):
+        self.args = args
+        self.records = {}
+        for mod in range(1, 15):
+            path = os.path.join(folder, f"contratacoes_{mod}.json")
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    self.records[mod] = list((json.load(f) or {}).get("data", []) or [])
+        self.itens = {}
+        path = os.path.join(folder, "itens.json")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for numero, lst in (json.load(f) or {}).items():
+                    cnpj, _, right = numero.split("-")
+                    seq, ano = right.split("/")
+                    self.itens[(cnpj, ano, str(int(seq)))] = lst
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.rng = random.Random(11)
+        self.reset()
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *a):
+                pass
+
+            def _send(self, code: int, body: bytes = b"", headers=None):
+                self.send_response(code)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                code, body, headers = mock.handle(self.path)
+                self._send(code, body, headers)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", _free_port()), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def reset(self) -> None:
+        with self.lock:
+            self.requests = 0
+            self.status = Counter()
+            self.peak = 0
+
+    def handle(self, path: str):
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            over = self.args.server_cap > 0 and self.in_flight > self.args.server_cap
+            err = self.rng.random() < self.args.error_rate
+        try:
+            time.sleep(self.args.latency_ms / 1000.0 * random.uniform(0.7, 1.3))
+            if over:
+                return self._done(429, b"", {"Retry-After": "1"})
+            if err:
+                return self._done(503)
+            u = urlparse(path)
+            parts = u.path.strip("/").split("/")
+            if len(parts) >= 7 and parts[-1] == "itens" and parts[-4] == "compras":
+                lst = self.itens.get((parts[-5], parts[-3], parts[-2]))
+                if lst is None:
+                    return self._done(404)
+                return self._done(200, json.dumps(lst, ensure_ascii=False).encode("utf-8"), {"Content-Type": "application/json"})
+            if not u.path.endswith("/consulta/v1/contratacoes/publicacao"):
+                return self._done(404)
+            q = {k: v[0] for k, v in parse_qs(u.query).items()}
+            data = self.records.get(int(q.get("codigoModalidadeContratacao", 0)), [])
+            size = int(q.get("tamanhoPagina", 50))
+            page = int(q.get("pagina", 1))
+            chunk = data[(page - 1) * size: page * size]
+            if not chunk:
+                return self._done(204)
+            total_pag = (len(data) + size - 1) // size
+            body = json.dumps({"data": chunk, "totalRegistros": len(data), "totalPaginas": total_pag,
+                               "numeroPagina": page, "paginasRestantes": total_pag - page, "empty": False},
+                              ensure_ascii=False).encode("utf-8")
+            return self._done(200, body, {"Content-Type": "application/json"})
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def _done(self, code: int, body: bytes = b"", headers=None):
+        with self.lock:
+            self.status[code] += 1
+        return code, body, headers or {}
+
+
+def _load_download_module(base: str):
+    os.environ["PNCP_API_BASE"] = base + "/api"
+    spec = importlib.util.spec_from_file_location("pipeline_pncp_download", os.path.join(SCRIPT_DIR, "01_pipeline_pncp_download.py"))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)  # type: ignore[union-attr]
+    mod.LOG_FILE = os.devnull
+    return mod
+
+
+def _check(received: Counter, expected: set, label: str) -> str:
+    dup = sum(1 for n in received.values() if n > 1)
+    missing = len(expected - set(received))
+    assert dup == 0, f"{label}: {dup} contratações recebidas mais de uma vez"
+    assert missing == 0, f"{label}: {missing} contratações não recebidas"
+    return f"recebidas={sum(received.values())} (sem duplicatas/faltas)"
+
+
+def bench_contratacoes(mod, mock: MockPNCP, args) -> None:
+    expected = {r["numeroControlePNCP"] for recs in mock.records.values() for r in recs}
+    totals = {}
+    for cod in range(1, 15):
+        totals[cod], _ = mod.fetch_api_modalidade_totals(DATE, cod)
+    print(f"[contratações] registros={len(expected)} gravação={args.insert_ms}ms/pág")
+
+    if not args.skip_baseline:
+        mock.reset()
+        received: Counter = Counter()
+        lock = threading.Lock()
+        pages = [0]
+
+        def _seq(cod: int) -> None:
+            for page_data in mod.fetch_contratacoes_pages(DATE, cod, tamanho_pagina=mod.PAGE_SIZE):
+                time.sleep(args.insert_ms / 1000.0)
+                with lock:
+                    pages[0] += 1
+                    received.update(c["numeroControlePNCP"] for c in page_data)
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=_seq, args=(cod,)) for cod in range(1, 15)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        elapsed = time.perf_counter() - t0
+        print(f"sequencial (14 modalidades): {elapsed:7.1f}s  pág/s={pages[0] / elapsed:6.1f}  páginas={pages[0]} "
+              f"requisições={mock.requests} 429={mock.status[429]} 503={mock.status[503]} pico_servidor={mock.peak} "
+              f"| {_check(received, expected, 'sequencial')}")
+
+    tasks = mod.build_contratacao_page_tasks(DATE, totals)
+    for conc in [int(x) for x in args.concurrency.split(",") if x.strip()]:
+        mock.reset()
+        received = Counter()
+        lock = threading.Lock()
+
+        def _writer():
+            def _write(result):
+                time.sleep(args.insert_ms / 1000.0)
+                with lock:
+                    received.update(c["numeroControlePNCP"] for c in (result.payload or {}).get("data", []))
+            return _write
+
+        engine = mod.PageFetchEngine(mod.build_session(status_retries=False, pool_size=conc), concurrency=conc,
+                                     backoff_s=0.2, log=print)
+        st = engine.stream(tasks, _writer, consumers=args.writers)
+        print(f"motor teto={conc:<3} writers={args.writers}: {st['elapsed_s']:7.1f}s  pág/s={st['pages_per_s']:6.1f}  "
+              f"páginas={st['pages']}/{len(tasks)} falhas={st['failed']} retentativas={st['retries']} "
+              f"429={st['throttled']} 503={st['server_errors']} concorrência mín={st['concurrency_lowest']} "
+              f"final={st['concurrency_final']} pico_servidor={mock.peak} | {_check(received, expected, f'motor {conc}')}")
+
+
+def bench_itens(mod, mock: MockPNCP, args) -> None:
+    from pncp_fetch import HostRateLimiter  # disponível no sys.path após carregar a etapa 01
+    # Mesma proporção por modalidade das fixtures, limitada a --item-contracts contratações
+    by_mod = {m: [r["numeroControlePNCP"] for r in recs] for m, recs in mock.records.items()}
+    total = sum(len(v) for v in by_mod.values())
+    frac = min(1.0, args.item_contracts / max(1, total))
+    by_mod = {m: v[:max(1, int(len(v) * frac))] for m, v in by_mod.items()}
+    numeros = [n for v in by_mod.values() for n in v]
+    expected = set()
+    for n in numeros:
+        cnpj, ano, seq = mod.parse_numero_controle(n)
+        for it in mock.itens.get((cnpj, ano, seq), []):
+            expected.add((n, it["numeroItem"]))
+    print(f"[itens] contratações={len(numeros)} itens={len(expected)} gravação={args.insert_ms}ms/comando+{args.row_us}µs/item")
+
+    def _insert_cost(rows: int) -> None:
+        time.sleep(args.insert_ms / 1000.0 * max(1, -(-rows // 3000)) + rows * args.row_us / 1e6)
+
+    if not args.skip_baseline:
+        mock.reset()
+        received: Counter = Counter()
+        lock = threading.Lock()
+
+        def _seq(lst):
+            for i in range(0, len(lst), 200):
+                itens = mod.fetch_itens_batch(lst[i:i + 200])
+                _insert_cost(len(itens))
+                with lock:
+                    received.update((it["numero_controle_pncp"], it["numeroItem"]) for it in itens)
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=_seq, args=(lst,)) for lst in by_mod.values()]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        elapsed = time.perf_counter() - t0
+        n = sum(received.values())
+        print(f"sequencial (14 modalidades, lotes de 200): {elapsed:7.1f}s  itens/min={n * 60 / elapsed:9.0f}  "
+              f"contratações/s={len(numeros) / elapsed:6.1f} requisições={mock.requests} pico_servidor={mock.peak} "
+              f"| {_check(received, expected, 'sequencial')}")
+
+    for rps in [float(x) for x in args.host_rps.split(",") if x.strip()]:
+        mock.reset()
+        received = Counter()
+        lock = threading.Lock()
+
+        class SimWriter(mod.ItemWriter):
+            def _connect(self):
+                return None
+
+            def _insert(self, rows):
+                _insert_cost(len(rows))
+                with lock:
+                    received.update((r["numero_controle_pncp"], r["numero_item"]) for r in rows)
+                return len(rows)
+
+        engine = mod.PageFetchEngine(mod.build_session(status_retries=False, pool_size=args.item_concurrency),
+                                     concurrency=args.item_concurrency, empty_status=(204, 404), backoff_s=0.2,
+                                     host_rates=HostRateLimiter(rps), log=print)
+        inserted, st = mod.download_itens(iter(numeros), engine, writers=args.writers, batch_size=args.item_batch,
+                                          writer_cls=SimWriter)
+        print(f"download_itens teto={args.item_concurrency} host_rps={rps:g}: {st['elapsed_s']:7.1f}s  "
+              f"itens/min={st['items_per_min']:9.0f}  contratações/s={st['contracts'] / max(1e-6, st['elapsed_s']):6.1f} "
+              f"inseridos={inserted} falhas={st['failed']} retentativas={st['retries']} 429={st['throttled']} "
+              f"503={st['server_errors']} espera_rate={st['rate_wait_s']}s pico_servidor={mock.peak} "
+              f"| {_check(received, expected, f'download_itens {rps:g}')}")
+
+
+def bench_arquivo(mod, mock: MockPNCP, args) -> None:
+    from pncp_archive import ResponseArchive, iter_records
+    from pncp_fetch import HostRateLimiter
+    expected = {r["numeroControlePNCP"] for recs in mock.records.values() for r in recs}
+    totals = {cod: len(recs) for cod, recs in mock.records.items()}
+    page_tasks = mod.build_contratacao_page_tasks(DATE, totals)
+    item_tasks = list(mod.build_item_tasks(sorted(expected)))
+    conc = int(args.concurrency.split(",")[-1])
+    print(f"[arquivo] páginas={len(page_tasks)} contratações(itens)={len(item_tasks)} teto={conc} host_rps={args.archive_rps:g}")
+    archive_dir = tempfile.mkdtemp(prefix="pncp_archive_")
+    try:
+        results = {}
+        for mode in ("record", "replay"):
+            mock.reset()
+            archive = ResponseArchive(archive_dir, "contratacao", mode=mode)
+            session = archive.install(mod.build_session(status_retries=False, pool_size=conc))
+            t_load = time.perf_counter()
+            archive.set_partition(DATE)
+            t_load = time.perf_counter() - t_load
+            received: Counter = Counter()
+            items = [0]
+            lock = threading.Lock()
+
+            def _counter():
+                def _count(result):
+                    with lock:
+                        if isinstance(result.payload, dict):
+                            received.update(c["numeroControlePNCP"] for c in result.payload.get("data", []))
+                        elif isinstance(result.payload, list):
+                            items[0] += len(result.payload)
+                return _count
+
+            rps = args.archive_rps if mode == "record" else 0
+            engine = mod.PageFetchEngine(session, concurrency=conc, empty_status=(204, 404), backoff_s=0.2,
+                                         host_rates=HostRateLimiter(rps), log=print)
+            st = engine.stream(page_tasks + item_tasks, _counter, consumers=args.writers)
+            archive.close()
+            results[mode] = st["elapsed_s"]
+            extra = ""
+            if mode == "record":
+                path = archive.path_for(DATE)
+                raw = sum(len(json.dumps(r.get("body"), ensure_ascii=False).encode("utf-8"))
+                          for r in iter_records(archive_dir, "contratacao", DATE))
+                size = os.path.getsize(path)
+                extra = (f"gravadas={archive.stats['recorded']} arquivo={size / 1e6:.1f}MB "
+                         f"(JSON bruto {raw / 1e6:.1f}MB, {raw / max(1, size):.1f}x) {os.path.basename(path)}")
+            else:
+                extra = f"índice={t_load:.2f}s acertos={archive.stats['hits']} ausentes={archive.stats['misses']}"
+            print(f"{'ao vivo + gravação' if mode == 'record' else 'replay do disco':20s}: {st['elapsed_s']:7.2f}s  "
+                  f"req/s={st['pages'] / max(1e-6, st['elapsed_s']):8.0f}  itens={items[0]} requisições_servidor={mock.requests} "
+                  f"falhas={st['failed']} | {extra} | {_check(received, expected, mode)}")
+        print(f"replay {results['record'] / max(1e-6, results['replay']):.1f}x mais rápido que o download ao vivo")
+    finally:
+        shutil.rmtree(archive_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede o download de contratações (pág/s) e itens (itens/min) contra um PNCP local.")
+    parser.add_argument("--stage", choices=["contratacoes", "itens", "arquivo", "all"], default="all")
+    parser.add_argument("--records", type=int, default=20000, help="Contratações sintéticas na data")
+    parser.add_argument("--fixtures", help="Pasta com contratacoes_<modalidade>.json e itens.json (em vez das sintéticas)")
+    parser.add_argument("--concurrency", default="8,16,32", help="Tetos globais a medir no motor de páginas")
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--server-cap", type=int, default=24, help="Simultâneas acima disso → 429 (0 = sem limite)")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Fração de 503")
+    parser.add_argument("--insert-ms", type=float, default=25.0, help="Custo simulado por página/comando de inserção")
+    parser.add_argument("--row-us", type=float, default=60.0, help="Custo simulado por item inserido")
+    parser.add_argument("--item-contracts", type=int, default=1500, help="Contratações cujos itens são baixados")
+    parser.add_argument("--item-concurrency", type=int, default=16)
+    parser.add_argument("--item-batch", type=int, default=5000)
+    parser.add_argument("--host-rps", default="0,60", help="Limites por host a medir em download_itens (0 = sem limite)")
+    parser.add_argument("--archive-rps", type=float, default=60.0, help="Limite por host na gravação do --stage arquivo")
+    parser.add_argument("--from-archive", help="Pasta de --archive-dir usada como fixtures (partição --date)")
+    parser.add_argument("--date", default=DATE, help="Data da partição lida por --from-archive")
+    parser.add_argument("--skip-baseline", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = args.fixtures
+        if args.from_archive:
+            sys.path.insert(0, os.path.join(os.path.dirname(SCRIPT_DIR), "pncp"))
+            write_archive_fixtures(tmp, args.from_archive, args.date)
+            folder = tmp
+        elif not folder:
+            write_synthetic_fixtures(tmp, args.records)
+            folder = tmp
+        mock = MockPNCP(folder, args)
+        mock.thread.start()
+        try:
+            mod = _load_download_module(mock.base)
+            print(f"latência={args.latency_ms}ms teto_servidor={args.server_cap} 503={args.error_rate:.1%} servidor={mock.base}")
+            if args.stage in ("contratacoes", "all"):
+                bench_contratacoes(mod, mock, args)
+            if args.stage in ("itens", "all"):
+                bench_itens(mod, mock, args)
+            if args.stage in ("arquivo", "all"):
+                bench_arquivo(mod, mock, args)
+        finally:
+            mock.server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipeline PNCP – motor de download concorrente de páginas (usado pela etapa 01)
+
+Antes: cada modalidade percorria suas páginas em sequência (pág N+1 só depois de inserir a N),
+com o retry do urllib3 dormindo dentro da própria requisição em 429/5xx.
+Aqui:
+- AdaptiveLimiter: teto GLOBAL de requisições simultâneas (todas as modalidades/datas) com ajuste
+  AIMD — +1 a cada `limite` respostas OK, metade em 429/5xx/timeout (no máx. 1 corte por segundo),
+  e pausa global respeitando Retry-After;
+- PageFetchEngine.stream(): dispara todas as páginas de uma vez (limitadas pelo teto) e entrega as
+  respostas numa fila LIMITADA consumida por N gravadores no banco (backpressure: se o banco atrasar,
+  os downloads esperam em vez de acumular páginas em memória);
+- HostRateLimiter: balde de tokens POR HOST (requisições/s), compartilhado por todos os motores do
+  processo (contratações e itens batem no mesmo pncp.gov.br);
+- Tarefas podem vir de um gerador (ex.: cursor do banco): só ~4x o teto fica enfileirado por vez;
+- Estatísticas: páginas, registros, pág/s, retentativas, 429/5xx, concorrência mín./final.
+
+Ambiente:
+- PNCP_PAGE_CONCURRENCY (16), PNCP_HTTP_MAX_ATTEMPTS (6), PNCP_HTTP_BACKOFF_S (1.0),
+  PNCP_HTTP_MAX_BACKOFF_S (60), PNCP_PAGE_QUEUE (64), PNCP_HOST_RPS (60; 0 = sem limite)
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Collection, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+PNCP_PAGE_CONCURRENCY = max(1, _env_int("PNCP_PAGE_CONCURRENCY", 16))
+PNCP_HTTP_MAX_ATTEMPTS = max(1, _env_int("PNCP_HTTP_MAX_ATTEMPTS", 6))
+PNCP_HTTP_BACKOFF_S = max(0.0, _env_float("PNCP_HTTP_BACKOFF_S", 1.0))
+PNCP_HTTP_MAX_BACKOFF_S = max(0.0, _env_float("PNCP_HTTP_MAX_BACKOFF_S", 60.0))
+PNCP_PAGE_QUEUE = max(1, _env_int("PNCP_PAGE_QUEUE", 64))
+PNCP_HOST_RPS = max(0.0, _env_float("PNCP_HOST_RPS", 60.0))
+
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+# ---------------------------------------------------------------------
+# Teto global adaptativo (AIMD)
+# ---------------------------------------------------------------------
+
+class AdaptiveLimiter:
+    """Semáforo com limite variável: cresce +1 por janela de sucessos, cai à metade em sobrecarga."""
+
+    def __init__(self, max_concurrency: int, min_concurrency: int = 1, cut_interval_s: float = 1.0):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.min_concurrency = max(1, min(int(min_concurrency), self.max_concurrency))
+        self.limit = self.max_concurrency
+        self.lowest = self.limit
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.cuts = 0
+        self._cut_interval_s = cut_interval_s
+        self._last_cut = 0.0
+        self._ok_streak = 0
+        self._pause_until = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now < self._pause_until:
+                    self._cond.wait(self._pause_until - now)
+                    continue
+                if self.in_flight < self.limit:
+                    self.in_flight += 1
+                    self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                    return
+                self._cond.wait()
+
+    def release(self, ok: bool, pause_s: float = 0.0) -> None:
+        """Libera a vaga. ok=False sinaliza sobrecarga (429/5xx/timeout); pause_s pausa todos os envios."""
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            now = time.monotonic()
+            if ok:
+                self._ok_streak += 1
+                if self._ok_streak >= self.limit and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._ok_streak = 0
+            else:
+                self._ok_streak = 0
+                if now - self._last_cut >= self._cut_interval_s:
+                    self.limit = max(self.min_concurrency, self.limit // 2)
+                    self.lowest = min(self.lowest, self.limit)
+                    self._last_cut = now
+                    self.cuts += 1
+                if pause_s > 0:
+                    self._pause_until = max(self._pause_until, now + pause_s)
+            self._cond.notify_all()
+
+
+class HostRateLimiter:
+    """Balde de tokens por host (netloc): no máximo `rps` inícios de requisição por segundo, rajada de até `burst`."""
+
+    def __init__(self, rps: float = 0.0, burst: Optional[float] = None):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, List[float]] = {}  # host -> [tokens, último abastecimento]
+        self.set_rate(rps, burst)
+
+    def set_rate(self, rps: float, burst: Optional[float] = None) -> None:
+        with self._lock:
+            self.rps = max(0.0, float(rps or 0.0))
+            self.burst = max(1.0, float(burst if burst is not None else max(1.0, self.rps / 4)))
+            self._buckets.clear()
+
+    def acquire(self, url: str) -> float:
+        """Reserva um token do host da URL, dormindo o necessário; devolve o tempo esperado (s)."""
+        if self.rps <= 0:
+            return 0.0
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            b = self._buckets.setdefault(host, [self.burst, now])
+            b[0] = min(self.burst, b[0] + (now - b[1]) * self.rps)
+            b[1] = now
+            b[0] -= 1.0  # reserva já (pode ficar negativo: fila de espera justa entre threads)
+            wait = 0.0 if b[0] >= 0 else -b[0] / self.rps
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+# Compartilhado por todos os motores do processo
+HOST_RATES = HostRateLimiter(PNCP_HOST_RPS)
+
+
+def _retry_after_s(res: requests.Response) -> Optional[float]:
+    v = res.headers.get("Retry-After") if res is not None else None
+    if not v:
+        return None
+    try:
+        return max(0.0, float(v))
+    except Exception:
+        return None
+
+# ---------------------------------------------------------------------
+# Motor de páginas
+# ---------------------------------------------------------------------
+
+@dataclass
+class PageTask:
+    """Uma requisição GET: key identifica a página para o consumidor (ex.: (modalidade, página))."""
+    key: Any
+    url: str
+    params: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class FetchResult:
+    task: PageTask
+    status: Optional[int]
+    payload: Any = None
+    attempts: int = 0
+    error: Optional[str] = None
+    ok: bool = False
+
+
+@dataclass
+class _Counters:
+    pages: int = 0
+    records: int = 0
+    failed: int = 0
+    retries: int = 0
+    throttled: int = 0
+    server_errors: int = 0
+    network_errors: int = 0
+    rate_wait_s: float = 0.0
+    consumer_errors: int = 0
+    failures: List[FetchResult] = field(default_factory=list)
+
+
+class PageFetchEngine:
+    """GET concorrente com teto global adaptativo, retentativas com jitter e fila limitada para o banco.
+
+    A sessão deve ser criada SEM retry de status no adapter (429/5xx precisam chegar aqui para
+    ajustar o teto) e com pool_maxsize >= concurrency. empty_status: códigos que significam
+    "sem dados" (ok, payload None) — ex.: 404 na API de itens.
+    """
+
+    def __init__(self, session: requests.Session, concurrency: Optional[int] = None,
+                 max_attempts: Optional[int] = None, backoff_s: Optional[float] = None,
+                 max_backoff_s: Optional[float] = None, timeout: float = 60.0,
+                 queue_size: Optional[int] = None, log: Optional[Callable[[str], None]] = None,
+                 empty_status: Collection[int] = (204,), host_rates: Optional[HostRateLimiter] = None):
+        self.session = session
+        self.concurrency = max(1, int(concurrency or PNCP_PAGE_CONCURRENCY))
+        self.max_attempts = max(1, int(max_attempts or PNCP_HTTP_MAX_ATTEMPTS))
+        self.backoff_s = PNCP_HTTP_BACKOFF_S if backoff_s is None else max(0.0, float(backoff_s))
+        self.max_backoff_s = PNCP_HTTP_MAX_BACKOFF_S if max_backoff_s is None else max(0.0, float(max_backoff_s))
+        self.timeout = timeout
+        self.queue_size = max(1, int(queue_size or PNCP_PAGE_QUEUE))
+        self.limiter = AdaptiveLimiter(self.concurrency)
+        self.empty_status = set(empty_status)
+        self.host_rates = host_rates or HOST_RATES
+        self.log = log or (lambda msg: None)
+        self._lock = threading.Lock()
+        self._c = _Counters()
+
+    # ---- requisição única ----
+    def _backoff(self, attempt: int) -> float:
+        # full jitter: uniforme em [0, base * 2^(n-1)] limitado por max_backoff_s
+        return random.uniform(0, min(self.max_backoff_s, self.backoff_s * (2 ** (attempt - 1))))
+
+    def fetch(self, task: PageTask) -> FetchResult:
+        """Executa a requisição com retentativas; 200 → payload JSON, empty_status → payload None."""
+        status: Optional[int] = None
+        error: Optional[str] = None
+        attempt = 0
+        while attempt < self.max_attempts:
+            attempt += 1
+            waited = self.host_rates.acquire(task.url)
+            if waited:
+                with self._lock:
+                    self._c.rate_wait_s += waited
+            self.limiter.acquire()
+            res = None
+            try:
+                res = self.session.get(task.url, params=task.params, timeout=self.timeout)
+                status = res.status_code
+                if status == 200:
+                    payload = res.json()
+                    self.limiter.release(ok=True)
+                    return FetchResult(task, status, payload, attempt, ok=True)
+                if status in self.empty_status:
+                    self.limiter.release(ok=True)
+                    return FetchResult(task, status, None, attempt, ok=True)
+                error = f"HTTP {status}"
+                if status not in RETRY_STATUS:
+                    self.limiter.release(ok=True)
+                    break
+                delay = self._backoff(attempt)
+                retry_after = _retry_after_s(res)
+                with self._lock:
+                    if status == 429:
+                        self._c.throttled += 1
+                    else:
+                        self._c.server_errors += 1
+                self.limiter.release(ok=False, pause_s=retry_after if retry_after is not None else (delay if status == 429 else 0.0))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                status, error, delay = None, f"{type(e).__name__}: {e}", self._backoff(attempt)
+                with self._lock:
+                    self._c.network_errors += 1
+                self.limiter.release(ok=False)
+            except Exception as e:
+                # JSON inválido ou erro inesperado: não adianta insistir
+                error = f"{type(e).__name__}: {e}"
+                self.limiter.release(ok=True)
+                break
+            finally:
+                if res is not None:
+                    res.close()
+            if attempt < self.max_attempts:
+                with self._lock:
+                    self._c.retries += 1
+                time.sleep(delay)
+        return FetchResult(task, status, None, attempt, error)
+
+    # ---- fan-out + fila limitada ----
+    def stream(self, tasks: Iterable[PageTask], consumer_factory: Callable[[], Callable[[FetchResult], Any]],
+               consumers: int = 2) -> Dict[str, Any]:
+        """Baixa todas as tarefas em paralelo e entrega cada página OK a um consumidor.
+
+        tasks pode ser um gerador: é consumido aos poucos (no máx. 4x o teto aguardando execução).
+        consumer_factory() é chamado uma vez por thread consumidora (ex.: abre a conexão do banco);
+        o callable devolvido recebe cada FetchResult e, se tiver .close(), é fechado ao final.
+        Páginas que falharem após as retentativas não vão para o consumidor: ficam em stats['failures'].
+        """
+        self._c = _Counters()
+        out_q: "queue.Queue[Optional[FetchResult]]" = queue.Queue(maxsize=self.queue_size)
+        n_consumers = max(1, int(consumers))
+        t0 = time.perf_counter()
+
+        def _consume() -> None:
+            handler = None
+            try:
+                handler = consumer_factory()
+                while True:
+                    item = out_q.get()
+                    if item is None:
+                        return
+                    try:
+                        handler(item)
+                    except Exception as e:
+                        with self._lock:
+                            self._c.consumer_errors += 1
+                        self.log(f"Erro ao gravar página {item.task.key}: {e}")
+            except Exception as e:
+                self.log(f"Erro no consumidor de páginas: {e}")
+                # drena a fila para não travar os downloads
+                while out_q.get() is not None:
+                    with self._lock:
+                        self._c.consumer_errors += 1
+            finally:
+                close = getattr(handler, "close", None)
+                if callable(close):
+                    try:
+                        close()
+                    except Exception:
+                        pass
+
+        def _fetch(task: PageTask) -> None:
+            r = self.fetch(task)
+            with self._lock:
+                if r.ok:
+                    self._c.pages += 1
+                    data = r.payload.get("data") if isinstance(r.payload, dict) else r.payload
+                    self._c.records += len(data) if isinstance(data, list) else 0
+                else:
+                    self._c.failed += 1
+                    self._c.failures.append(r)
+            if r.ok:
+                out_q.put(r)  # bloqueia quando a fila está cheia (backpressure)
+
+        threads = [threading.Thread(target=_consume, name=f"pncp-writer-{i}", daemon=True) for i in range(n_consumers)]
+        for th in threads:
+            th.start()
+        pending = threading.BoundedSemaphore(self.concurrency * 4)
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="pncp-fetch") as ex:
+                futures = []
+                for t in tasks:
+                    pending.acquire()
+                    fut = ex.submit(_fetch, t)
+                    fut.add_done_callback(lambda _f: pending.release())
+                    futures.append(fut)
+                    if len(futures) >= 1024:  # gerador longo: descarta concluídas (propagando exceções)
+                        keep = []
+                        for f in futures:
+                            if f.done():
+                                f.result()
+                            else:
+                                keep.append(f)
+                        futures = keep
+                for fut in futures:
+                    fut.result()
+        finally:
+            for _ in threads:
+                out_q.put(None)
+            for th in threads:
+                th.join()
+        return self.stats(time.perf_counter() - t0)
+
+    def stats(self, elapsed_s: float) -> Dict[str, Any]:
+        c = self._c
+        return {
+            "pages": c.pages,
+            "records": c.records,
+            "failed": c.failed,
+            "retries": c.retries,
+            "throttled": c.throttled,
+            "server_errors": c.server_errors,
+            "network_errors": c.network_errors,
+            "rate_wait_s": round(c.rate_wait_s, 1),
+            "consumer_errors": c.consumer_errors,
+            "elapsed_s": round(elapsed_s, 3),
+            "pages_per_s": round(c.pages / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+            "concurrency_max": self.limiter.max_concurrency,
+            "concurrency_lowest": self.limiter.lowest,
+            "concurrency_final": self.limiter.limit,
+            "peak_in_flight": self.limiter.peak_in_flight,
+            "failures": list(c.failures),
+        }
+
+
+__all__ = [
+    "AdaptiveLimiter", "HostRateLimiter", "HOST_RATES", "PageTask", "FetchResult", "PageFetchEngine", "RETRY_STATUS",
+    "PNCP_PAGE_CONCURRENCY", "PNCP_HTTP_MAX_ATTEMPTS", "PNCP_HTTP_BACKOFF_S", "PNCP_HTTP_MAX_BACKOFF_S", "PNCP_PAGE_QUEUE",
+    "PNCP_HOST_RPS",
+]
@@ -29,10 +29,14 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import psycopg2
-import psycopg2.extras
 from dotenv import load_dotenv
 from rich.progress import Progress, BarColumn, TimeElapsedColumn, TimeRemainingColumn, SpinnerColumn, TextColumn
 
+# Módulos compartilhados de scripts/pncp (pncp_bulk: COPY + merge em staging; pncp_archive: arquivo/replay)
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+from pncp_archive import ResponseArchive, add_archive_args, archive_from_args  # noqa: E402
+from pncp_bulk import merge_rows  # noqa: E402
+
 STAGE_NAME = "ata.01"
 DEFAULT_PAGE_SIZE = 200
 BASE_URL = os.environ.get("PNCP_CONSULTA_BASE_URL", "https://pncp.gov.br/api/consulta")
@@ -124,92 +128,38 @@ def normalize_ata(api_obj: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+ATA_COLS = [
+    "numero_controle_ata_pncp",
+    "numero_controle_pncp_compra",
+    "numero_ata_registro_preco",
+    "ano_ata",
+    "data_assinatura",
+    "vigencia_inicio",
+    "vigencia_fim",
+    "data_cancelamento",
+    "cancelado",
+    "objeto_contratacao",
+    "cnpj_orgao",
+    "nome_orgao",
+    "codigo_unidade_orgao",
+    "nome_unidade_orgao",
+    "cnpj_orgao_subrogado",
+    "nome_orgao_subrogado",
+    "codigo_unidade_orgao_subrogado",
+    "nome_unidade_orgao_subrogado",
+    "usuario",
+    "data_publicacao_pncp",
+    "data_inclusao",
+    "data_atualizacao",
+    "data_atualizacao_global",
+]
+
+
 def upsert_atas(cur, atas: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """COPY para staging + INSERT ... ON CONFLICT DO UPDATE (pncp_bulk). Retorna (inserted, updated)."""
     if not atas:
         return 0, 0
-    psycopg2.extras.execute_values(
-        cur,
-        """
-        INSERT INTO public.ata (
-            numero_controle_ata_pncp,
-            numero_controle_pncp_compra,
-            numero_ata_registro_preco,
-            ano_ata,
-            data_assinatura,
-            vigencia_inicio,
-            vigencia_fim,
-            data_cancelamento,
-            cancelado,
-            objeto_contratacao,
-            cnpj_orgao,
-            nome_orgao,
-            codigo_unidade_orgao,
-            nome_unidade_orgao,
-            cnpj_orgao_subrogado,
-            nome_orgao_subrogado,
-            codigo_unidade_orgao_subrogado,
-            nome_unidade_orgao_subrogado,
-            usuario,
-            data_publicacao_pncp,
-            data_inclusao,
-            data_atualizacao,
-            data_atualizacao_global
-        ) VALUES %s
-        ON CONFLICT (numero_controle_ata_pncp) DO UPDATE SET
-            numero_controle_pncp_compra = EXCLUDED.numero_controle_pncp_compra,
-            numero_ata_registro_preco = EXCLUDED.numero_ata_registro_preco,
-            ano_ata = EXCLUDED.ano_ata,
-            data_assinatura = EXCLUDED.data_assinatura,
-            vigencia_inicio = EXCLUDED.vigencia_inicio,
-            vigencia_fim = EXCLUDED.vigencia_fim,
-            data_cancelamento = EXCLUDED.data_cancelamento,
-            cancelado = EXCLUDED.cancelado,
-            objeto_contratacao = EXCLUDED.objeto_contratacao,
-            cnpj_orgao = EXCLUDED.cnpj_orgao,
-            nome_orgao = EXCLUDED.nome_orgao,
-            codigo_unidade_orgao = EXCLUDED.codigo_unidade_orgao,
-            nome_unidade_orgao = EXCLUDED.nome_unidade_orgao,
-            cnpj_orgao_subrogado = EXCLUDED.cnpj_orgao_subrogado,
-            nome_orgao_subrogado = EXCLUDED.nome_orgao_subrogado,
-            codigo_unidade_orgao_subrogado = EXCLUDED.codigo_unidade_orgao_subrogado,
-            nome_unidade_orgao_subrogado = EXCLUDED.nome_unidade_orgao_subrogado,
-            usuario = EXCLUDED.usuario,
-            data_publicacao_pncp = EXCLUDED.data_publicacao_pncp,
-            data_inclusao = EXCLUDED.data_inclusao,
-            data_atualizacao = EXCLUDED.data_atualizacao,
-            data_atualizacao_global = EXCLUDED.data_atualizacao_global
-        """,
-        [
-            (
-                a.get("numero_controle_ata_pncp"),
-                a.get("numero_controle_pncp_compra"),
-                a.get("numero_ata_registro_preco"),
-                a.get("ano_ata"),
-                a.get("data_assinatura"),
-                a.get("vigencia_inicio"),
-                a.get("vigencia_fim"),
-                a.get("data_cancelamento"),
-                a.get("cancelado"),
-                a.get("objeto_contratacao"),
-                a.get("cnpj_orgao"),
-                a.get("nome_orgao"),
-                a.get("codigo_unidade_orgao"),
-                a.get("nome_unidade_orgao"),
-                a.get("cnpj_orgao_subrogado"),
-                a.get("nome_orgao_subrogado"),
-                a.get("codigo_unidade_orgao_subrogado"),
-                a.get("nome_unidade_orgao_subrogado"),
-                a.get("usuario"),
-                a.get("data_publicacao_pncp"),
-                a.get("data_inclusao"),
-                a.get("data_atualizacao"),
-                a.get("data_atualizacao_global"),
-            )
-            for a in atas
-        ],
-        page_size=1000,
-    )
-    return len(atas), 0
+    return merge_rows(cur, "public.ata", ATA_COLS, atas, ["numero_controle_ata_pncp"], update=True, keep="last")
 
 
 def fetch_atas_page(session: requests.Session, url: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -301,8 +251,10 @@ def fetch_atas_window(session: requests.Session, url: str, params: Dict[str, Any
     return data
 
 
-def process_window(date_from: str, date_to: str, mode: str = "vigencia") -> None:
-    """mode: "vigencia" usa /v1/atas; "atualizacao" usa /v1/atas/atualizacao"""
+def process_window(date_from: str, date_to: str, mode: str = "vigencia",
+                   archive: Optional[ResponseArchive] = None) -> None:
+    """mode: "vigencia" usa /v1/atas; "atualizacao" usa /v1/atas/atualizacao
+    archive: grava as respostas da API ou, em replay, as lê do disco (estado não é alterado no replay)"""
     # Carrega exclusivamente o .env de scripts/pncp/.env
     env_path = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", ".env"))
     load_dotenv(env_path)
@@ -328,6 +280,10 @@ def process_window(date_from: str, date_to: str, mode: str = "vigencia") -> None
     errors = 0
 
     session = build_session()
+    if archive is not None:
+        # respostas da janela vão para (ou vêm de) <archive-dir>/<fonte>/AAAA/MM/<janela>.jsonl.zst
+        archive.install(session)
+        archive.set_partition(date_from, date_to)
 
     with get_db_conn() as conn:
         conn.autocommit = False
@@ -353,8 +309,10 @@ def process_window(date_from: str, date_to: str, mode: str = "vigencia") -> None
                     inserted += ins
                     updated += upd
 
-                # Atualiza estado
-                if mode == "vigencia":
+                # Atualiza estado (replay reprocessa sem mover o estado)
+                if archive is not None and archive.replaying:
+                    pass
+                elif mode == "vigencia":
                     set_system_config(cur, CFG_VIG_FROM, date_from)
                     set_system_config(cur, CFG_VIG_TO, date_to)
                 else:
@@ -379,6 +337,7 @@ def main():
     parser.add_argument("--tipo", choices=["periodo", "diario"], default="periodo", help="Modo de execução: periodo (uma chamada) ou diario (dia-a-dia)")
     parser.add_argument("--from", dest="date_from", required=False, help="AAAAMMDD")
     parser.add_argument("--to", dest="date_to", required=False, help="AAAAMMDD")
+    add_archive_args(parser)
     args = parser.parse_args()
 
     # Defaults baseados em LED: sem --from usa last_processed_date_ata; sem --to usa hoje.
@@ -416,14 +375,19 @@ def main():
         logging.info("ATA: LED (%s) já está no dia atual (%s). Nada a fazer.", led, today)
         return
 
-    if args.tipo == "periodo":
-        process_window(date_from, date_to, mode=args.mode)
-    else:
-        cur_dt = dt_from
-        while cur_dt <= dt_to:
-            day_str = cur_dt.strftime("%Y%m%d")
-            process_window(day_str, day_str, mode=args.mode)
-            cur_dt += timedelta(days=1)
+    archive = archive_from_args(args, "ata", log=logging.info)
+    try:
+        if args.tipo == "periodo":
+            process_window(date_from, date_to, mode=args.mode, archive=archive)
+        else:
+            cur_dt = dt_from
+            while cur_dt <= dt_to:
+                day_str = cur_dt.strftime("%Y%m%d")
+                process_window(day_str, day_str, mode=args.mode, archive=archive)
+                cur_dt += timedelta(days=1)
+    finally:
+        if archive is not None:
+            archive.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark da carga no banco: execute_values + ON CONFLICT (loaders antigos) x COPY para staging
++ merge set-based (pncp_bulk.merge_rows).
+
+Cria um schema descartável (--schema, padrão bench_bulk) com tabelas no formato das tabelas PNCP
+(colunas text, mesma chave/índice único) e carrega lotes sintéticos em três formatos:
+  • contratacao      – chave única, INSERT ... ON CONFLICT DO NOTHING (pipeline_pncp/contratacao);
+  • item_contratacao – chave composta (pncp, item), DO NOTHING;
+  • contrato         – sem índice único confiável: UPDATE ... FROM + INSERT anti-join (contrato/item_pca).
+Cada caminho roda a carga inicial (tudo novo) e a recarga (metade nova, metade existente).
+O schema é removido ao final.
+
+Uso:
+  python scripts/pncp/bench_bulk_loader.py --rows 50000
+  python scripts/pncp/bench_bulk_loader.py --dsn postgresql://... --rows 20000 --batch 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import psycopg2
+import psycopg2.extras
+from dotenv import load_dotenv
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+from pncp_bulk import merge_rows  # noqa: E402
+
+# (tabela, nº de colunas de dados, chave, modo)
+TABLES = [
+    ("contratacao", 40, ["numero_controle_pncp"], "nothing"),
+    ("item_contratacao", 20, ["numero_controle_pncp", "numero_item"], "nothing"),
+    ("contrato", 36, ["numero_controle_pncp"], "match"),
+]
+
+
+def _dsn_from_env() -> str:
+    load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+    return (
+        f"host={os.getenv('SUPABASE_HOST')} port={os.getenv('SUPABASE_PORT', '6543')} "
+        f"dbname={os.getenv('SUPABASE_DBNAME', 'postgres')} user={os.getenv('SUPABASE_USER')} "
+        f"password={os.getenv('SUPABASE_PASSWORD')}"
+    )
+
+
+def _cols(keys, width):
+    return list(keys) + [f"c{i:02d}" for i in range(width - len(keys))]
+
+
+def _make_rows(keys, width, start, n, seed):
+    rnd = random.Random(seed)
+    cols = _cols(keys, width)
+    out = []
+    for i in range(start, start + n):
+        row = {}
+        for c in cols:
+            if c == "numero_controle_pncp":
+                row[c] = f"00000000000100-1-{i // 10 if len(keys) > 1 else i:06d}/2025"
+            elif c == "numero_item":
+                row[c] = str(i % 10 + 1)
+            else:
+                row[c] = f"{c}-{rnd.randint(0, 10**9)} lorem ipsum dolor sit amet"
+        out.append(row)
+    return out
+
+
+def _create(cur, schema, name, keys, width, mode):
+    cols = _cols(keys, width)
+    body = ", ".join(f"{c} text" for c in cols)
+    cur.execute(f"CREATE TABLE {schema}.{name} (id bigserial PRIMARY KEY, {body})")
+    if mode == "nothing":
+        cur.execute(f"CREATE UNIQUE INDEX ON {schema}.{name} ({', '.join(keys)})")
+    else:
+        cur.execute(f"CREATE INDEX ON {schema}.{name} ({', '.join(keys)})")
+
+
+def _legacy(cur, table, cols, keys, mode, rows):
+    """Mesmo SQL dos loaders antes do pncp_bulk (execute_values, page_size=1000)."""
+    values = [tuple(r.get(c) for c in cols) for r in rows]
+    if mode == "nothing":
+        psycopg2.extras.execute_values(
+            cur,
+            f"INSERT INTO {table} ({', '.join(cols)}) VALUES %s ON CONFLICT ({', '.join(keys)}) DO NOTHING",
+            values, page_size=1000,
+        )
+        return
+    set_clause = ", ".join(f"{c} = v.{c}" for c in cols if c not in keys)
+    match = " AND ".join(f"t.{k} = v.{k}" for k in keys)
+    psycopg2.extras.execute_values(
+        cur,
+        f"UPDATE {table} AS t SET {set_clause} FROM (VALUES %s) AS v ({', '.join(cols)}) WHERE {match}",
+        values, page_size=1000,
+    )
+    psycopg2.extras.execute_values(
+        cur,
+        f"INSERT INTO {table} ({', '.join(cols)}) SELECT {', '.join('v.' + c for c in cols)} "
+        f"FROM (VALUES %s) AS v ({', '.join(cols)}) LEFT JOIN {table} t ON {match} WHERE t.id IS NULL",
+        values, page_size=1000,
+    )
+
+
+def _bulk(cur, table, cols, keys, mode, rows):
+    if mode == "nothing":
+        merge_rows(cur, table, cols, rows, keys)
+    else:
+        match = " AND ".join(f"t.{k} = v.{k}" for k in keys)
+        merge_rows(cur, table, cols, rows, keys, update=True, match_sql=match, keep="last")
+
+
+def _run(conn, schema, path, batches):
+    """Carrega os lotes (um commit por lote, como os loaders) e devolve (linhas, segundos) por tabela."""
+    fn = _legacy if path == "legacy" else _bulk
+    out = {}
+    for name, width, keys, mode in TABLES:
+        table = f"{schema}.{name}_{path}"
+        cols = _cols(keys, width)
+        n = 0
+        t0 = time.perf_counter()
+        for rows in batches[name]:
+            with conn.cursor() as cur:
+                fn(cur, table, cols, keys, mode, rows)
+            conn.commit()
+            n += len(rows)
+        out[name] = (n, time.perf_counter() - t0)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="execute_values x COPY+merge (pncp_bulk) nas tabelas PNCP")
+    ap.add_argument("--dsn", default=None, help="DSN do PostgreSQL (padrão: SUPABASE_* de scripts/pncp/.env)")
+    ap.add_argument("--schema", default="bench_bulk")
+    ap.add_argument("--rows", type=int, default=50000, help="Linhas da carga inicial por tabela")
+    ap.add_argument("--batch", type=int, default=5000, help="Linhas por lote/commit")
+    args = ap.parse_args()
+
+    conn = psycopg2.connect(args.dsn or _dsn_from_env())
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+        cur.execute(f"CREATE SCHEMA {args.schema}")
+        for name, width, keys, mode in TABLES:
+            for path in ("legacy", "bulk"):
+                _create(cur, args.schema, f"{name}_{path}", keys, width, mode)
+    conn.commit()
+
+    def _split(rows):
+        return [rows[i:i + args.batch] for i in range(0, len(rows), args.batch)]
+
+    # carga inicial: tudo novo; recarga: metade já existente (atualização/conflito), metade nova
+    initial = {n: _split(_make_rows(k, w, 0, args.rows, 1)) for n, w, k, _ in TABLES}
+    reload_ = {n: _split(_make_rows(k, w, args.rows // 2, args.rows, 2)) for n, w, k, _ in TABLES}
+
+    try:
+        print(f"linhas={args.rows}/tabela lote={args.batch}")
+        for phase, batches in (("inicial", initial), ("recarga", reload_)):
+            res = {path: _run(conn, args.schema, path, batches) for path in ("legacy", "bulk")}
+            for name, _, _, mode in TABLES:
+                n, t_old = res["legacy"][name]
+                _, t_new = res["bulk"][name]
+                print(f"{phase:8s} {name:17s} ({mode:7s}) execute_values={n / t_old:9.0f} linhas/s  "
+                      f"COPY+merge={n / t_new:9.0f} linhas/s  ({t_old / t_new:.1f}x)")
+        with conn.cursor() as cur:
+            for name, _, _, _ in TABLES:
+                cur.execute(f"SELECT (SELECT count(*) FROM {args.schema}.{name}_legacy), "
+                            f"(SELECT count(*) FROM {args.schema}.{name}_bulk)")
+                a, b = cur.fetchone()
+                print(f"conferência {name}: legacy={a} bulk={b}")
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -22,7 +22,6 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import psycopg2
-from psycopg2.extras import execute_values
 from dotenv import load_dotenv
 
 # ---------------------------------------------------------------------
@@ -32,6 +31,12 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 V1_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))  # .../v1
 LOGS_DIR = os.path.join(SCRIPT_DIR, "logs")
 os.makedirs(LOGS_DIR, exist_ok=True)
+# Módulos compartilhados de scripts/pncp (pncp_bulk: COPY + merge em staging; pncp_archive: arquivo/replay)
+if os.path.dirname(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, os.path.dirname(SCRIPT_DIR))
+
+from pncp_archive import ResponseArchive, add_archive_args, archive_from_args  # noqa: E402
+from pncp_bulk import merge_rows  # noqa: E402
 
 # Carrega apenas o .env de scripts/pncp/.env (sem fallbacks)
 PNCP_ENV = os.path.join(os.path.dirname(SCRIPT_DIR), "pncp", ".env")
@@ -427,67 +432,32 @@ def fetch_itens_batch(numeros: List[str]) -> List[Dict[str, Any]]:
 # Inserções no banco
 # ---------------------------------------------------------------------
 
-def insert_contratacoes(conn, contratos: List[Dict[str, Any]]) -> int:
+def insert_contratacoes(conn, contratos: List[Dict[str, Any]], update: bool = False) -> int:
+    """COPY para staging + um INSERT ... ON CONFLICT DO NOTHING (pncp_bulk); retorna inseridas.
+    update=True (replay): ON CONFLICT DO UPDATE; retorna inseridas + atualizadas.
+    """
     if not contratos:
         return 0
     cols = [db for _, db, _ in CONTRATACAO_FIELDS]
-    values = []
-    for c in contratos:
-        row = []
-        for col in cols:
-            v = c.get(col)
-            if isinstance(v, (dict, list)):
-                v = json.dumps(v, ensure_ascii=False)
-            row.append(v)
-        values.append(tuple(row))
-    sql = f"""
-        INSERT INTO contratacao ({', '.join(cols)})
-        VALUES %s
-        ON CONFLICT (numero_controle_pncp) DO NOTHING
-        RETURNING 1
-    """
-    inserted = 0
     with conn.cursor() as cur:
-        execute_values(cur, sql, values, page_size=1000)
-        rows = cur.fetchall() or []
-        inserted += len(rows)
+        inserted, updated = merge_rows(cur, "contratacao", cols, contratos, ["numero_controle_pncp"],
+                                       update=update, keep="last" if update else "first")
     conn.commit()
-    return inserted
+    return inserted + updated
 
 
-def insert_itens(conn, itens_norm: List[Dict[str, Any]]) -> int:
+def insert_itens(conn, itens_norm: List[Dict[str, Any]], update: bool = False) -> int:
+    """COPY para staging + um INSERT ... ON CONFLICT DO NOTHING (pncp_bulk); retorna inseridos.
+    update=True (replay): ON CONFLICT DO UPDATE; retorna inseridos + atualizados.
+    """
     if not itens_norm:
         return 0
     cols = ["numero_controle_pncp"] + [db for _, db, _ in ITEM_FIELDS]
-    values = []
-    for it in itens_norm:
-        row = []
-        for col in cols:
-            v = it.get(col)
-            if isinstance(v, (dict, list)):
-                v = json.dumps(v, ensure_ascii=False)
-            row.append(v)
-        values.append(tuple(row))
-    sql = f"""
-        INSERT INTO item_contratacao ({', '.join(cols)})
-        VALUES %s
-        ON CONFLICT (numero_controle_pncp, numero_item) DO NOTHING
-        RETURNING 1
-    """
-    total_inserted = 0
-    batch = 3000
     with conn.cursor() as cur:
-        if len(values) > batch:
-            for i in range(0, len(values), batch):
-                execute_values(cur, sql, values[i:i+batch], page_size=1000)
-                rows = cur.fetchall() or []
-                total_inserted += len(rows)
-        else:
-            execute_values(cur, sql, values, page_size=1000)
-            rows = cur.fetchall() or []
-            total_inserted += len(rows)
+        inserted, updated = merge_rows(cur, "item_contratacao", cols, itens_norm, ["numero_controle_pncp", "numero_item"],
+                                       update=update, keep="last" if update else "first")
     conn.commit()
-    return total_inserted
+    return inserted + updated
 
 
 def insert_pipeline_run_stats(conn, stage: str, date_ref: str, inserted_contr: int, inserted_itens: int) -> None:
@@ -516,8 +486,15 @@ def insert_pipeline_run_stats(conn, stage: str, date_ref: str, inserted_contr: i
 # Processamento por data
 # ---------------------------------------------------------------------
 
-def process_date(conn, date_str: str, max_workers: int, refresh_items: bool = False) -> Tuple[int, int]:
+def process_date(conn, date_str: str, max_workers: int, refresh_items: bool = False,
+                 archive: ResponseArchive | None = None) -> Tuple[int, int]:
     log_line(f"Processando {date_str}...")
+    if archive is not None:
+        # respostas desta data vão para (ou vêm de) <archive-dir>/contratacao/AAAA/MM/<data>.jsonl.zst
+        archive.set_partition(date_str)
+    # Replay regrava a data inteira a partir do disco: ignora a contagem BD x API, faz upsert
+    # (ON CONFLICT DO UPDATE) e não registra pipeline_run_stats (não é uma execução de download)
+    replay = archive is not None and archive.replaying
 
     # 1) Contagem no BD por modalidade
     db_counts: Dict[int, int] = {}
@@ -566,7 +543,7 @@ def process_date(conn, date_str: str, max_workers: int, refresh_items: bool = Fa
         db_total = db_counts.get(cod, 0)
         total_missing += max(0, api_total - db_total)
 
-    if total_missing == 0 and not refresh_items:
+    if total_missing == 0 and not refresh_items and not replay:
         log_line("Sem faltantes; pulando processamento desta data.")
         insert_pipeline_run_stats(conn, stage="01", date_ref=date_str, inserted_contr=0, inserted_itens=0)
         return 0, 0
@@ -575,7 +552,7 @@ def process_date(conn, date_str: str, max_workers: int, refresh_items: bool = Fa
     def worker_modalidade(cod: int) -> Tuple[int, int]:
         api_total, total_pag = mod_info.get(cod, (0, 0))
         db_total = db_counts.get(cod, 0)
-        missing = max(0, api_total - db_total)
+        missing = api_total if replay else max(0, api_total - db_total)
         inserted_c = 0
         local_conn = get_conn()
         try:
@@ -600,7 +577,7 @@ def process_date(conn, date_str: str, max_workers: int, refresh_items: bool = Fa
                     # Inserir contratações da página
                     contratos_norm = [normalize_contratacao(c) for c in page_unique]
                     try:
-                        inserted_c += insert_contratacoes(local_conn, contratos_norm)
+                        inserted_c += insert_contratacoes(local_conn, contratos_norm, update=replay)
                     except Exception as e:
                         log_line(f"Modalidade {cod} pág {page_idx}: erro ao inserir contratações: {e}")
                         # tentar reconectar e seguir
@@ -642,25 +619,34 @@ def process_date(conn, date_str: str, max_workers: int, refresh_items: bool = Fa
     log_line("")
 
     # 4) Fase 3 – ITENS pendentes por modalidade (ordem estrita após fase 2)
+    #    Replay: todas as contratações da data com itens no arquivo (as demais dariam ArchiveMiss)
+    pending_sql = "" if replay else """
+                       AND NOT EXISTS (
+                           SELECT 1 FROM item_contratacao i
+                            WHERE i.numero_controle_pncp = c.numero_controle_pncp
+                       )"""
+
+    def _archived_itens(numero: str) -> bool:
+        parsed = parse_numero_controle(numero)
+        return bool(parsed) and archive.has(BASE_ITENS.format(cnpj=parsed[0], ano=parsed[1], seq=parsed[2]))
+
     def worker_itens(cod: int) -> int:
         inserted_i_local = 0
         local_conn = get_conn()
         try:
             with local_conn.cursor() as cur:
                 cur.execute(
-                    """
+                    f"""
                     SELECT c.numero_controle_pncp
                       FROM contratacao c
                      WHERE DATE(c.data_publicacao_pncp) = %s::date
-                       AND c.modalidade_id = %s
-                       AND NOT EXISTS (
-                           SELECT 1 FROM item_contratacao i
-                            WHERE i.numero_controle_pncp = c.numero_controle_pncp
-                       )
+                       AND c.modalidade_id = %s{pending_sql}
                     """,
                     (date_str, str(cod)),
                 )
                 pendentes = [r[0] for r in cur.fetchall()]
+            if replay:
+                pendentes = [n for n in pendentes if _archived_itens(n)]
             total_p = len(pendentes)
             if total_p == 0:
                 return 0
@@ -682,7 +668,7 @@ def process_date(conn, date_str: str, max_workers: int, refresh_items: bool = Fa
                             continue
                         seen.add(key)
                         itens_norm.append(normalize_item(it, nc))
-                    inserted_i_local += insert_itens(local_conn, itens_norm)
+                    inserted_i_local += insert_itens(local_conn, itens_norm, update=replay)
                 except Exception as e:
                     log_line(f"Modalidade {cod}: erro ao inserir itens (pendentes): {e}")
                     try:
@@ -705,7 +691,7 @@ def process_date(conn, date_str: str, max_workers: int, refresh_items: bool = Fa
                 pass
         return inserted_i_local
 
-    if refresh_items or total_inserted_c > 0:
+    if replay or refresh_items or total_inserted_c > 0:
         with ThreadPoolExecutor(max_workers=14) as ex:
             futures = {ex.submit(worker_itens, cod): cod for cod in range(1, 15)}
             for fut in as_completed(futures):
@@ -716,6 +702,9 @@ def process_date(conn, date_str: str, max_workers: int, refresh_items: bool = Fa
                 except Exception as e:
                     log_line(f"Erro na modalidade (itens) {cod}: {e}")
 
+    if replay:
+        log_line(f"Regravados (replay): {total_inserted_c} contratações, {total_inserted_i} itens")
+        return total_inserted_c, total_inserted_i
     log_line(f"Inseridos: {total_inserted_c} contratações, {total_inserted_i} itens")
 
     # 4) Registrar estatísticas da execução para a data/etapa 01
@@ -752,9 +741,15 @@ def main():
     parser.add_argument("--test", help="Rodar apenas uma data YYYYMMDD")
     parser.add_argument("--workers", type=int, default=MAX_WORKERS_DEFAULT, help="Máximo de workers")
     parser.add_argument("--refresh-items", action="store_true", help="Força verificação e (re)download de itens mesmo sem novos contratos")
+    add_archive_args(parser)
     args = parser.parse_args()
 
     log_line("[1/3] DOWNLOAD PNCP INICIADO (LPD)")
+    archive = archive_from_args(args, "contratacao", log=log_line)
+    if archive is not None:
+        archive.install(SESSION)
+        if archive.replaying:
+            log_line(f"Replay do arquivo {args.archive_dir} (sem acesso à API; LPD não é alterado)")
 
     conn = get_conn()
     try:
@@ -794,10 +789,11 @@ def main():
         for d in dates:
             try:
                 conn = ensure_conn_open(conn)
-                c, i = process_date(conn, d, max_workers=max(1, args.workers), refresh_items=bool(args.refresh_items))
+                c, i = process_date(conn, d, max_workers=max(1, args.workers), refresh_items=bool(args.refresh_items),
+                                    archive=archive)
                 total_c += c
                 total_i += i
-                if not args.test:
+                if not args.test and not (archive is not None and archive.replaying):
                     conn = ensure_conn_open(conn)
                     save_last_processed_date(conn, d)
                     log_line(f"LPD atualizado: {d}")
@@ -813,9 +809,15 @@ def main():
         log_line(f"Datas: {len(dates)} | Contratações: {total_c} | Itens: {total_i}")
         if failed:
             log_line(f"Falhas em {len(failed)} datas: {', '.join(failed)}")
+        if archive is not None:
+            archive.close()
+            st = archive.stats
+            log_line(f"Arquivo {args.archive_dir}: gravadas={st['recorded']} replay={st['hits']} ausentes={st['misses']}")
         log_line(f"Log: {os.path.basename(LOG_FILE)}")
 
     finally:
+        if archive is not None:
+            archive.close()
         try:
             conn.close()
         except Exception:
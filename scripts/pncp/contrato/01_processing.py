@@ -32,10 +32,14 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import psycopg2
-import psycopg2.extras
 from dotenv import load_dotenv
 from rich.progress import Progress, BarColumn, TimeElapsedColumn, TimeRemainingColumn, SpinnerColumn, TextColumn
 
+# Módulos compartilhados de scripts/pncp (pncp_bulk: COPY + merge em staging; pncp_archive: arquivo/replay)
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+from pncp_archive import ResponseArchive, add_archive_args, archive_from_args  # noqa: E402
+from pncp_bulk import merge_rows  # noqa: E402
+
 STAGE_NAME = "contrato.01"
 DEFAULT_PAGE_SIZE = 200  # aumentar para 200 conforme solicitado
 BASE_URL = os.environ.get("PNCP_CONSULTA_BASE_URL", "https://pncp.gov.br/api/consulta")
@@ -161,8 +165,8 @@ def normalize_contrato(api_obj: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def upsert_contratos(cur, contratos: List[Dict[str, Any]]) -> Tuple[int, int]:
-    """Upsert por numero_controle_pncp sem UNIQUE: faz UPDATE via VALUES + INSERT anti-join.
-    Retorna (inserted, updated).
+    """Upsert por numero_controle_pncp sem UNIQUE: COPY para staging + UPDATE ... FROM + INSERT anti-join
+    (pncp_bulk). Retorna (inserted, updated).
     """
     if not contratos:
         return 0, 0
@@ -204,14 +208,7 @@ def upsert_contratos(cur, contratos: List[Dict[str, Any]]) -> Tuple[int, int]:
         "vigencia_ano",
     ]
 
-    values = [
-        tuple(c.get(k) for k in cols)
-        for c in contratos
-    ]
-
-    # 1) UPDATE existentes (chave: numero_controle_pncp; fallback quando NULL: (compra+empenho+ano))
-    set_cols = [c for c in cols if c != "numero_controle_pncp"]
-    set_clause = ",\n            ".join([f"{c} = v.{c}" for c in set_cols])
+    # Chave: numero_controle_pncp; fallback quando NULL: (compra+empenho+ano)
     join_cond = (
         "(t.numero_controle_pncp = v.numero_controle_pncp) OR "
         "(t.numero_controle_pncp IS NULL AND v.numero_controle_pncp IS NULL "
@@ -219,34 +216,11 @@ def upsert_contratos(cur, contratos: List[Dict[str, Any]]) -> Tuple[int, int]:
         "AND COALESCE(t.numero_contrato_empenho::text,'') = COALESCE(v.numero_contrato_empenho::text,'') "
         "AND COALESCE(t.ano_contrato::text,'') = COALESCE(v.ano_contrato::text,''))"
     )
-    update_sql = f"""
-        UPDATE public.contrato AS t
-           SET {set_clause}
-          FROM (VALUES %s) AS v ({', '.join(cols)})
-         WHERE {join_cond}
-    """
-    psycopg2.extras.execute_values(cur, update_sql, values, page_size=1000)
-    updated = cur.rowcount or 0
-
-    # 2) INSERT dos que não existem
-    insert_sql = f"""
-        INSERT INTO public.contrato ({', '.join(cols)})
-        SELECT {', '.join(['v.' + c for c in cols])}
-          FROM (VALUES %s) AS v ({', '.join(cols)})
-          LEFT JOIN public.contrato t
-                 ON (t.numero_controle_pncp = v.numero_controle_pncp)
-                 OR (t.numero_controle_pncp IS NULL AND v.numero_controle_pncp IS NULL
-                     AND COALESCE(t.numero_controle_pncp_compra::text,'') = COALESCE(v.numero_controle_pncp_compra::text,'')
-                     AND COALESCE(t.numero_contrato_empenho::text,'') = COALESCE(v.numero_contrato_empenho::text,'')
-                     AND COALESCE(t.ano_contrato::text,'') = COALESCE(v.ano_contrato::text,''))
-         WHERE t.id_contrato IS NULL
-                 ON CONFLICT (numero_controle_pncp) DO NOTHING
-         RETURNING 1
-    """
-    psycopg2.extras.execute_values(cur, insert_sql, values, page_size=1000)
-    inserted = len(cur.fetchall() or [])
-
-    return inserted, updated
+    return merge_rows(
+        cur, "public.contrato", cols, contratos,
+        ["numero_controle_pncp", "numero_controle_pncp_compra", "numero_contrato_empenho", "ano_contrato"],
+        update=True, update_cols=[c for c in cols if c != "numero_controle_pncp"], match_sql=join_cond, keep="last",
+    )
 
 
 def fetch_contratos_window(session: requests.Session, url: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -319,9 +293,11 @@ def fetch_contratos_window(session: requests.Session, url: str, params: Dict[str
     return data
 
 
-def process_window(date_from: str, date_to: str, mode: str = "publicacao") -> None:
+def process_window(date_from: str, date_to: str, mode: str = "publicacao",
+                   archive: Optional[ResponseArchive] = None) -> None:
     """Processa janela de contratos.
     mode: "publicacao" usa /v1/contratos; "atualizacao" usa /v1/contratos/atualizacao
+    archive: grava as respostas da API ou, em replay, as lê do disco (LPD não é alterado no replay)
     """
     # Carrega exclusivamente o .env de scripts/pncp/.env
     env_path = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", ".env"))
@@ -351,6 +327,10 @@ def process_window(date_from: str, date_to: str, mode: str = "publicacao") -> No
     errors = 0
 
     session = build_session()
+    if archive is not None:
+        # respostas da janela vão para (ou vêm de) <archive-dir>/<fonte>/AAAA/MM/<janela>.jsonl.zst
+        archive.install(session)
+        archive.set_partition(date_from, date_to)
 
     with get_db_conn() as conn:
         conn.autocommit = False
@@ -388,8 +368,9 @@ def process_window(date_from: str, date_to: str, mode: str = "publicacao") -> No
                     updated += upd
                     # silêncio sobre upsert detalhado
 
-                # Atualiza LPD apenas quando terminar com sucesso
-                set_system_config(cur, CFG_LAST_PROCESSED, date_to)
+                # Atualiza LPD apenas quando terminar com sucesso (replay reprocessa sem mover o LPD)
+                if archive is None or not archive.replaying:
+                    set_system_config(cur, CFG_LAST_PROCESSED, date_to)
                 conn.commit()
             except Exception:
                 conn.rollback()
@@ -411,6 +392,7 @@ def main():
     parser.add_argument("--tipo", choices=["periodo", "diario"], default="diario", help="Modo de execução: periodo (uma chamada) ou diario (dia-a-dia)")
     parser.add_argument("--from", dest="date_from", required=False, help="AAAAMMDD")
     parser.add_argument("--to", dest="date_to", required=False, help="AAAAMMDD")
+    add_archive_args(parser)
     args = parser.parse_args()
 
     # Janela padrão seguindo LEDs (system_config):
@@ -447,15 +429,20 @@ def main():
 
     # Removido o guard de LED==hoje: sempre processar o dia atual quando chamado
 
-    if args.tipo == "periodo":
-        process_window(date_from, date_to, mode=args.mode)
-    else:
-        # modo diario: processa dia a dia e atualiza LED por dia (process_window já grava o LED quando tiver sucesso)
-        cur_dt = dt_from
-        while cur_dt <= dt_to:
-            day_str = cur_dt.strftime("%Y%m%d")
-            process_window(day_str, day_str, mode=args.mode)
-            cur_dt += timedelta(days=1)
+    archive = archive_from_args(args, "contrato", log=logging.info)
+    try:
+        if args.tipo == "periodo":
+            process_window(date_from, date_to, mode=args.mode, archive=archive)
+        else:
+            # modo diario: processa dia a dia e atualiza LED por dia (process_window já grava o LED quando tiver sucesso)
+            cur_dt = dt_from
+            while cur_dt <= dt_to:
+                day_str = cur_dt.strftime("%Y%m%d")
+                process_window(day_str, day_str, mode=args.mode, archive=archive)
+                cur_dt += timedelta(days=1)
+    finally:
+        if archive is not None:
+            archive.close()
 
 
 if __name__ == "__main__":
@@ -29,9 +29,13 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import psycopg2
-import psycopg2.extras
 from dotenv import load_dotenv
 from rich.progress import Progress, BarColumn, TimeElapsedColumn, TimeRemainingColumn, SpinnerColumn, TextColumn
+
+# Módulos compartilhados de scripts/pncp (pncp_bulk: COPY + merge em staging; pncp_archive: arquivo/replay)
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+from pncp_archive import ResponseArchive, add_archive_args, archive_from_args  # noqa: E402
+from pncp_bulk import merge_rows  # noqa: E402
 from pathlib import Path
 
 # Trace opcional de progresso (ativado por --trace)
@@ -177,181 +181,60 @@ def normalize_pca_item(numero_controle_pca_pncp: str, item: Dict[str, Any]) -> D
     }
 
 
+PCA_COLS = [
+    "numero_controle_pca_pncp",
+    "orgao_entidade_cnpj",
+    "orgao_entidade_razao_social",
+    "codigo_unidade",
+    "nome_unidade",
+    "ano_pca",
+    "id_usuario",
+    "data_publicacao_pncp",
+    "data_inclusao",
+    "data_atualizacao",
+]
+
+ITEM_PCA_COLS = [
+    "numero_controle_pca_pncp",
+    "numero_item",
+    "categoria_item_pca_nome",
+    "classificacao_catalogo_id",
+    "nome_classificacao_catalogo",
+    "classificacao_superior_codigo",
+    "classificacao_superior_nome",
+    "pdm_codigo",
+    "pdm_descricao",
+    "codigo_item",
+    "descricao_item",
+    "unidade_fornecimento",
+    "quantidade_estimada",
+    "valor_unitario",
+    "valor_total",
+    "valor_orcamento_exercicio",
+    "data_desejada",
+    "unidade_requisitante",
+    "grupo_contratacao_codigo",
+    "grupo_contratacao_nome",
+    "data_inclusao",
+    "data_atualizacao",
+]
+
+
 def upsert_pca(cur, rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """COPY para staging + INSERT ... ON CONFLICT DO UPDATE (pncp_bulk). Retorna (inserted, updated)."""
     if not rows:
         return 0, 0
-    psycopg2.extras.execute_values(
-        cur,
-        """
-        INSERT INTO public.pca (
-            numero_controle_pca_pncp,
-            orgao_entidade_cnpj,
-            orgao_entidade_razao_social,
-            codigo_unidade,
-            nome_unidade,
-            ano_pca,
-            id_usuario,
-            data_publicacao_pncp,
-            data_inclusao,
-            data_atualizacao
-        ) VALUES %s
-        ON CONFLICT (numero_controle_pca_pncp) DO UPDATE SET
-            orgao_entidade_cnpj = EXCLUDED.orgao_entidade_cnpj,
-            orgao_entidade_razao_social = EXCLUDED.orgao_entidade_razao_social,
-            codigo_unidade = EXCLUDED.codigo_unidade,
-            nome_unidade = EXCLUDED.nome_unidade,
-            ano_pca = EXCLUDED.ano_pca,
-            id_usuario = EXCLUDED.id_usuario,
-            data_publicacao_pncp = EXCLUDED.data_publicacao_pncp,
-            data_inclusao = EXCLUDED.data_inclusao,
-            data_atualizacao = EXCLUDED.data_atualizacao
-        """,
-        [
-            (
-                r.get("numero_controle_pca_pncp"),
-                r.get("orgao_entidade_cnpj"),
-                r.get("orgao_entidade_razao_social"),
-                r.get("codigo_unidade"),
-                r.get("nome_unidade"),
-                r.get("ano_pca"),
-                r.get("id_usuario"),
-                r.get("data_publicacao_pncp"),
-                r.get("data_inclusao"),
-                r.get("data_atualizacao"),
-            )
-            for r in rows
-        ],
-        page_size=1000,
-    )
-    return len(rows), 0
+    return merge_rows(cur, "public.pca", PCA_COLS, rows, ["numero_controle_pca_pncp"], update=True, keep="last")
 
 
 def upsert_item_pca(cur, rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """item_pca não tem índice único em (pca, item): UPDATE ... FROM + INSERT anti-join a partir do staging."""
     if not rows:
         return 0, 0
-    # Preparar valores na mesma ordem para UPDATE e INSERT
-    cols = [
-        "numero_controle_pca_pncp",
-        "numero_item",
-        "categoria_item_pca_nome",
-        "classificacao_catalogo_id",
-        "nome_classificacao_catalogo",
-        "classificacao_superior_codigo",
-        "classificacao_superior_nome",
-        "pdm_codigo",
-        "pdm_descricao",
-        "codigo_item",
-        "descricao_item",
-        "unidade_fornecimento",
-        "quantidade_estimada",
-        "valor_unitario",
-        "valor_total",
-        "valor_orcamento_exercicio",
-        "data_desejada",
-        "unidade_requisitante",
-        "grupo_contratacao_codigo",
-        "grupo_contratacao_nome",
-        "data_inclusao",
-        "data_atualizacao",
-    ]
-    values = [
-        tuple(r.get(c) for c in cols)
-        for r in rows
-    ]
-
-    # 1) UPDATE existente (match por numero_controle_pca_pncp, numero_item)
-    update_sql = f"""
-    WITH vals ({', '.join(cols)}) AS (VALUES %s)
-    UPDATE public.item_pca ip
-    SET
-        categoria_item_pca_nome = v.categoria_item_pca_nome,
-        classificacao_catalogo_id = v.classificacao_catalogo_id,
-        nome_classificacao_catalogo = v.nome_classificacao_catalogo,
-        classificacao_superior_codigo = v.classificacao_superior_codigo,
-        classificacao_superior_nome = v.classificacao_superior_nome,
-        pdm_codigo = v.pdm_codigo,
-        pdm_descricao = v.pdm_descricao,
-        codigo_item = v.codigo_item,
-        descricao_item = v.descricao_item,
-        unidade_fornecimento = v.unidade_fornecimento,
-        quantidade_estimada = v.quantidade_estimada,
-        valor_unitario = v.valor_unitario,
-        valor_total = v.valor_total,
-        valor_orcamento_exercicio = v.valor_orcamento_exercicio,
-        data_desejada = v.data_desejada,
-        unidade_requisitante = v.unidade_requisitante,
-        grupo_contratacao_codigo = v.grupo_contratacao_codigo,
-        grupo_contratacao_nome = v.grupo_contratacao_nome,
-        data_inclusao = v.data_inclusao,
-        data_atualizacao = v.data_atualizacao
-        FROM vals v
-        WHERE ip.numero_controle_pca_pncp = v.numero_controle_pca_pncp::text
-            AND ip.numero_item = v.numero_item::text
-    """
-    psycopg2.extras.execute_values(cur, update_sql, values, page_size=1000)
-    updated = cur.rowcount or 0
-
-    # 2) INSERT dos que não existem
-    insert_sql = f"""
-    WITH vals ({', '.join(cols)}) AS (VALUES %s)
-    INSERT INTO public.item_pca (
-        numero_controle_pca_pncp,
-        numero_item,
-        categoria_item_pca_nome,
-        classificacao_catalogo_id,
-        nome_classificacao_catalogo,
-        classificacao_superior_codigo,
-        classificacao_superior_nome,
-        pdm_codigo,
-        pdm_descricao,
-        codigo_item,
-        descricao_item,
-        unidade_fornecimento,
-        quantidade_estimada,
-        valor_unitario,
-        valor_total,
-        valor_orcamento_exercicio,
-        data_desejada,
-        unidade_requisitante,
-        grupo_contratacao_codigo,
-        grupo_contratacao_nome,
-        data_inclusao,
-        data_atualizacao
+    return merge_rows(
+        cur, "public.item_pca", ITEM_PCA_COLS, rows, ["numero_controle_pca_pncp", "numero_item"], update=True, keep="last",
+        match_sql="t.numero_controle_pca_pncp = v.numero_controle_pca_pncp AND t.numero_item = v.numero_item",
     )
-    SELECT
-        v.numero_controle_pca_pncp::text,
-        v.numero_item::text,
-        v.categoria_item_pca_nome,
-        v.classificacao_catalogo_id,
-        v.nome_classificacao_catalogo,
-        v.classificacao_superior_codigo,
-        v.classificacao_superior_nome,
-        v.pdm_codigo,
-        v.pdm_descricao,
-        v.codigo_item,
-        v.descricao_item,
-        v.unidade_fornecimento,
-        v.quantidade_estimada,
-        v.valor_unitario,
-        v.valor_total,
-        v.valor_orcamento_exercicio,
-        v.data_desejada,
-        v.unidade_requisitante,
-        v.grupo_contratacao_codigo,
-        v.grupo_contratacao_nome,
-        v.data_inclusao,
-        v.data_atualizacao
-    FROM vals v
-        WHERE NOT EXISTS (
-        SELECT 1
-        FROM public.item_pca ip
-                WHERE ip.numero_controle_pca_pncp = v.numero_controle_pca_pncp::text
-                    AND ip.numero_item = v.numero_item::text
-    )
-    """
-    psycopg2.extras.execute_values(cur, insert_sql, values, page_size=1000)
-    inserted = cur.rowcount or 0
-    return inserted, updated
 
 
 def fetch_pca_page(session: requests.Session, url: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -527,10 +410,12 @@ def fetch_pca_window(session: requests.Session, url: str, params: Dict[str, Any]
     return data
 
 
-def process_window(date_from: str, date_to: str, prefer_pca_endpoint: bool = True, ano_pca: Optional[int] = None, page_size: int = DEFAULT_PAGE_SIZE) -> bool:
+def process_window(date_from: str, date_to: str, prefer_pca_endpoint: bool = True, ano_pca: Optional[int] = None, page_size: int = DEFAULT_PAGE_SIZE,
+                   archive: Optional[ResponseArchive] = None) -> bool:
     """
     Diário: /v1/pca/atualizacao por dataAtualizacao
     Backfill 2025: preferir /v1/pca; se não retornar itens completos, fallback /v1/pca/usuario por (anoPca,idUsuario)
+    archive: grava as respostas da API ou, em replay, as lê do disco (LED não é alterado no replay)
     """
     # Carrega exclusivamente o .env de scripts/pncp/.env
     env_path = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", ".env"))
@@ -543,6 +428,10 @@ def process_window(date_from: str, date_to: str, prefer_pca_endpoint: bool = Tru
         logging.info("PCA TRACE: janela=%s→%s", date_from, date_to)
 
     session = build_session()
+    if archive is not None:
+        # respostas da janela vão para (ou vêm de) <archive-dir>/<fonte>/AAAA/MM/<janela>.jsonl.zst
+        archive.install(session)
+        archive.set_partition(date_from, date_to)
 
     url_upd = f"{BASE_URL}/v1/pca/atualizacao"
     # Importante: este endpoint aceita datas AAAAMMDD (sem hífen)
@@ -686,9 +575,11 @@ def process_window(date_from: str, date_to: str, prefer_pca_endpoint: bool = Tru
                             led_value = date_from
                 except Exception:
                     pass
-                set_system_config(cur, CFG_LAST_PROCESSED, led_value)
-                if TRACE:
-                    logging.info("PCA TRACE: LED gravado=%s", led_value)
+                replaying = archive is not None and archive.replaying
+                if not replaying:
+                    set_system_config(cur, CFG_LAST_PROCESSED, led_value)
+                    if TRACE:
+                        logging.info("PCA TRACE: LED gravado=%s", led_value)
                 conn.commit()
 
                 # Confirma LED gravado no BD e interrompe caso não confirme
@@ -698,7 +589,7 @@ def process_window(date_from: str, date_to: str, prefer_pca_endpoint: bool = Tru
                     db_led = row[0] if row else None
                 except Exception:
                     db_led = None
-                if db_led != led_value:
+                if not replaying and db_led != led_value:
                     logging.error("PCA: LED não confirmado no BD (esperado=%s, lido=%s)", led_value, db_led)
                     ok = False
                 else:
@@ -749,6 +640,7 @@ def main():
     parser.add_argument("--ano", dest="ano_pca", required=False, type=int, help="Ano PCA (fallback /pca/usuario)")
     parser.add_argument("--trace", action="store_true", help="Exibe logs detalhados (progresso por página, intervalo e LED)")
     parser.add_argument("--page", dest="page_size", required=False, type=int, default=DEFAULT_PAGE_SIZE, help="Tamanho de página para API (default 100)")
+    add_archive_args(parser)
     args = parser.parse_args()
 
     # Ativa TRACE global e configura logging cedo caso solicitado
@@ -845,26 +737,33 @@ def main():
     if TRACE:
         logging.info("PCA TRACE: page_size=%s", page_size)
 
-    if args.tipo == "periodo":
-        _ok = process_window(date_from, date_to, prefer_pca_endpoint=True, ano_pca=args.ano_pca, page_size=page_size)
-        if not _ok:
-            logging.error("PCA: término antecipado (LED não confirmado)")
-    else:
-        # Modo diário para PCA: a API /v1/pca/atualizacao retorna vazio quando dataInicio == dataFim.
-        # Portanto, processar por janelas [D, D+1].
-        cur_dt = dt_from
-        while cur_dt <= dt_to:
-            day_str = cur_dt.strftime("%Y%m%d")
-            next_day_str = (cur_dt + timedelta(days=1)).strftime("%Y%m%d")
-            if TRACE:
-                ds_h = f"{day_str[:4]}-{day_str[4:6]}-{day_str[6:]}"
-                nds_h = f"{next_day_str[:4]}-{next_day_str[4:6]}-{next_day_str[6:]}"
-                logging.info("PCA TRACE: diário %s → %s", ds_h, nds_h)
-            _ok = process_window(day_str, next_day_str, prefer_pca_endpoint=True, ano_pca=args.ano_pca, page_size=page_size)
+    archive = archive_from_args(args, "pca", log=logging.info)
+    try:
+        if args.tipo == "periodo":
+            _ok = process_window(date_from, date_to, prefer_pca_endpoint=True, ano_pca=args.ano_pca, page_size=page_size,
+                                 archive=archive)
             if not _ok:
-                logging.error("PCA: encerrando execução diária devido a falha ao confirmar LED (dia %s)", day_str)
-                break
-            cur_dt += timedelta(days=1)
+                logging.error("PCA: término antecipado (LED não confirmado)")
+        else:
+            # Modo diário para PCA: a API /v1/pca/atualizacao retorna vazio quando dataInicio == dataFim.
+            # Portanto, processar por janelas [D, D+1].
+            cur_dt = dt_from
+            while cur_dt <= dt_to:
+                day_str = cur_dt.strftime("%Y%m%d")
+                next_day_str = (cur_dt + timedelta(days=1)).strftime("%Y%m%d")
+                if TRACE:
+                    ds_h = f"{day_str[:4]}-{day_str[4:6]}-{day_str[6:]}"
+                    nds_h = f"{next_day_str[:4]}-{next_day_str[4:6]}-{next_day_str[6:]}"
+                    logging.info("PCA TRACE: diário %s → %s", ds_h, nds_h)
+                _ok = process_window(day_str, next_day_str, prefer_pca_endpoint=True, ano_pca=args.ano_pca, page_size=page_size,
+                                     archive=archive)
+                if not _ok:
+                    logging.error("PCA: encerrando execução diária devido a falha ao confirmar LED (dia %s)", day_str)
+                    break
+                cur_dt += timedelta(days=1)
+    finally:
+        if archive is not None:
+            archive.close()
 
 
 if __name__ == "__main__":
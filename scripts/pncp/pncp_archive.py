@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pncp_archive – arquivo das respostas brutas da API PNCP + replay offline
+
+Antes: toda execução das etapas 01 (pipeline_pncp e scripts/pncp/*) baixava tudo ao vivo; reprocessar
+uma data (bug de normalização, mudança de schema, queda no meio) significava baixar de novo, lento e
+sujeito ao limite da API.
+Aqui:
+- ResponseArchive.install(session): monta um adapter no requests.Session que, em modo "record", grava
+  cada resposta determinística (200/204/404) como uma linha JSON {ts, url, status, body} e, em modo
+  "replay", responde as mesmas URLs a partir do disco (sem rede; URL fora do arquivo → ArchiveMiss);
+- Partição por data/janela: <dir>/<fonte>/<AAAA>/<MM>/<AAAAMMDD>[_<AAAAMMDD>].jsonl.zst (zstd; sem o
+  pacote zstandard, cai para .jsonl.gz). Cada execução acrescenta um frame/membro novo: a última
+  resposta de uma URL prevalece no replay;
+- Manifesto <dir>/<fonte>/manifest.json: por partição, arquivo, respostas, bytes, códigos HTTP e datas.
+Como as respostas entram pela sessão, normalização e gravação no banco são exatamente as do modo ao
+vivo. iter_records() lê uma partição (ex.: para montar fixtures de benchmark).
+
+Ambiente:
+- PNCP_ARCHIVE_DIR (vazio = desligado), PNCP_ARCHIVE_MODE (record | replay; padrão record),
+  PNCP_ARCHIVE_LEVEL (nível zstd, padrão 3)
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+try:
+    import zstandard as zstd
+except ImportError:  # opcional: sem zstandard o arquivo usa gzip
+    zstd = None
+
+PNCP_ARCHIVE_DIR = os.getenv("PNCP_ARCHIVE_DIR", "")
+PNCP_ARCHIVE_MODE = os.getenv("PNCP_ARCHIVE_MODE", "record")
+try:
+    PNCP_ARCHIVE_LEVEL = int(os.getenv("PNCP_ARCHIVE_LEVEL", "3"))
+except Exception:
+    PNCP_ARCHIVE_LEVEL = 3
+
+ARCHIVE_MODES = ("record", "replay")
+# Só respostas determinísticas vão para o arquivo (429/5xx são transitórias)
+ARCHIVE_STATUS = (200, 204, 404)
+EXTENSIONS = (".jsonl.zst", ".jsonl.gz")
+
+
+class ArchiveMiss(requests.RequestException):
+    """URL pedida no replay que não está na partição atual do arquivo."""
+
+
+def canonical_url(url: str) -> str:
+    """URL com a query ordenada: a mesma página gera a mesma chave independente da ordem dos params."""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, query, ""))
+
+
+def partition_label(date_from: str, date_to: Optional[str] = None) -> str:
+    return date_from if not date_to or date_to == date_from else f"{date_from}_{date_to}"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+# ---------------------------------------------------------------------
+# Leitura/escrita das partições
+# ---------------------------------------------------------------------
+
+def _open_writer(path: str, level: int):
+    if path.endswith(".zst"):
+        return zstd.ZstdCompressor(level=level).stream_writer(open(path, "ab"), closefd=True)
+    return gzip.open(path, "ab", compresslevel=min(9, max(1, level)))
+
+
+def _open_reader(path: str):
+    if path.endswith(".zst"):
+        if zstd is None:
+            raise RuntimeError(f"{path}: instale o pacote zstandard para ler arquivos .zst")
+        return io.BufferedReader(zstd.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True))
+    return gzip.open(path, "rb")
+
+
+def _iter_lines(path: str) -> Iterator[bytes]:
+    """Linhas do arquivo; frame final truncado (execução interrompida) encerra a leitura."""
+    with _open_reader(path) as fh:
+        while True:
+            try:
+                line = fh.readline()
+            except (EOFError, OSError):
+                return
+            except Exception as e:
+                if zstd is not None and isinstance(e, zstd.ZstdError):
+                    return
+                raise
+            if not line:
+                return
+            yield line
+
+
+def _iter_file(path: str) -> Iterator[Dict[str, Any]]:
+    for line in _iter_lines(path):
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue  # linha inválida (corpo truncado)
+
+
+_BODY_SEP = b',"body":'
+
+
+def _split_line(line: bytes) -> Optional[Tuple[str, int, bytes]]:
+    """(url, status, corpo bruto) sem decodificar o corpo: a linha é gravada como {ts, url, status, body}."""
+    line = line.rstrip()
+    i = line.find(_BODY_SEP)
+    if i < 0 or not line.endswith(b"}"):
+        return None
+    try:
+        head = json.loads(line[:i] + b"}")
+        body = line[i + len(_BODY_SEP):-1]
+        if body[:1] not in (b"{", b"["):
+            body = (json.loads(body) or "").encode("utf-8")
+        return head.get("url", ""), int(head.get("status") or 0), body
+    except ValueError:
+        return None
+
+
+class ResponseArchive:
+    """Arquivo de respostas de uma fonte (ex.: "contratacao", "contrato", "ata", "pca")."""
+
+    def __init__(self, root: str, source: str, mode: str = "record", level: int = PNCP_ARCHIVE_LEVEL,
+                 log: Optional[Callable[[str], None]] = None):
+        if mode not in ARCHIVE_MODES:
+            raise ValueError(f"modo de arquivo inválido: {mode} (use {', '.join(ARCHIVE_MODES)})")
+        self.root = os.path.abspath(root)
+        self.source = source
+        self.mode = mode
+        self.level = level
+        self.log = log or (lambda msg: None)
+        self.dir = os.path.join(self.root, source)
+        self.manifest_path = os.path.join(self.dir, "manifest.json")
+        self.ext = EXTENSIONS[0] if zstd is not None else EXTENSIONS[1]
+        self._lock = threading.Lock()
+        self._label: Optional[str] = None
+        self._writer = None
+        self._part: Dict[str, Any] = {}
+        self._index: Dict[str, Tuple[int, bytes]] = {}
+        self.stats = {"recorded": 0, "hits": 0, "misses": 0}
+        if mode == "record":
+            os.makedirs(self.dir, exist_ok=True)
+            if zstd is None:
+                self.log("Arquivo PNCP: pacote zstandard ausente; gravando .jsonl.gz")
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def path_for(self, label: str, ext: Optional[str] = None) -> str:
+        return os.path.join(self.dir, label[0:4], label[4:6], label + (ext or self.ext))
+
+    # ---- partição ----
+    def set_partition(self, date_from: str, date_to: Optional[str] = None) -> None:
+        """Fecha a partição atual e passa a gravar/ler a da data (ou janela) informada."""
+        label = partition_label(date_from, date_to)
+        with self._lock:
+            if label == self._label:
+                return
+            self._close_partition()
+            self._label = label
+            if self.replaying:
+                self._index = self._load_index(label)
+                self.log(f"Arquivo PNCP: replay {self.source}/{label} ({len(self._index)} respostas)")
+
+    def _load_index(self, label: str) -> Dict[str, Tuple[int, bytes]]:
+        index: Dict[str, Tuple[int, bytes]] = {}
+        for ext in EXTENSIONS:
+            path = self.path_for(label, ext)
+            if os.path.exists(path):
+                for line in _iter_lines(path):
+                    rec = _split_line(line)
+                    if rec is not None:
+                        index[canonical_url(rec[0])] = (rec[1], rec[2])
+        return index
+
+    def _close_partition(self) -> None:
+        if self._writer is None:
+            return
+        try:
+            self._writer.close()
+        finally:
+            self._writer = None
+            self._update_manifest(self._label, self._part)
+            self._part = {}
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_partition()
+            self._label = None
+            self._index = {}
+
+    # ---- gravação ----
+    def record(self, url: str, status: int, content: bytes) -> None:
+        if self._label is None or status not in ARCHIVE_STATUS:
+            return
+        body = content.strip() if content else b""
+        if body[:1] not in (b"{", b"["):
+            body = json.dumps(body.decode("utf-8", "replace") or None).encode("utf-8")
+        # corpo JSON da API entra como está (sem decodificar/recodificar)
+        line = (b'{"ts":' + json.dumps(_now()).encode("utf-8") + b',"url":' + json.dumps(url).encode("utf-8")
+                + b',"status":' + str(status).encode("ascii") + b',"body":' + body + b"}\n")
+        with self._lock:
+            if self._label is None:
+                return
+            if self._writer is None:
+                path = self.path_for(self._label)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._writer = _open_writer(path, self.level)
+                self._part = {"path": os.path.relpath(path, self.dir), "records": 0, "status": {}, "started_at": _now()}
+            self._writer.write(line)
+            self._part["records"] += 1
+            self._part["status"][str(status)] = self._part["status"].get(str(status), 0) + 1
+            self.stats["recorded"] += 1
+
+    def _update_manifest(self, label: Optional[str], part: Dict[str, Any]) -> None:
+        if not label or not part:
+            return
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except Exception:
+            manifest = {"source": self.source, "partitions": {}}
+        manifest["format"] = "jsonl+" + ("zstd" if part["path"].endswith(".zst") else "gzip")
+        entry = manifest.setdefault("partitions", {}).setdefault(label, {"records": 0, "status": {}, "runs": 0})
+        entry["path"] = part["path"]
+        entry["records"] += part["records"]
+        for code, n in part["status"].items():
+            entry["status"][code] = entry["status"].get(code, 0) + n
+        entry["runs"] += 1
+        entry.setdefault("first_run_at", part["started_at"])
+        entry["last_run_at"] = _now()
+        try:
+            entry["bytes"] = os.path.getsize(os.path.join(self.dir, part["path"]))
+        except OSError:
+            pass
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    # ---- replay ----
+    def lookup(self, url: str) -> Optional[Tuple[int, bytes]]:
+        hit = self._index.get(canonical_url(url))
+        with self._lock:
+            self.stats["hits" if hit is not None else "misses"] += 1
+        return hit
+
+    def has(self, url: str) -> bool:
+        """A URL está na partição atual (sem contar em hits/misses)."""
+        return canonical_url(url) in self._index
+
+    def install(self, session: requests.Session) -> requests.Session:
+        """Envolve os adapters http/https da sessão (retry/pool continuam valendo na gravação)."""
+        for prefix in ("https://", "http://"):
+            session.mount(prefix, ArchiveAdapter(self, session.get_adapter(prefix)))
+        if self.replaying:
+            # sem rede: dispensa a varredura de proxies/.netrc no ambiente a cada requisição
+            session.trust_env = False
+        return session
+
+
+class ArchiveAdapter(BaseAdapter):
+    """Transporte do requests: grava (record) ou responde do arquivo (replay)."""
+
+    def __init__(self, archive: ResponseArchive, inner: BaseAdapter):
+        super().__init__()
+        self.archive = archive
+        self.inner = inner
+
+    def send(self, request, **kwargs):
+        if not self.archive.replaying:
+            resp = self.inner.send(request, **kwargs)
+            if resp.status_code in ARCHIVE_STATUS:
+                self.archive.record(request.url, resp.status_code, resp.content)
+            return resp
+        hit = self.archive.lookup(request.url)
+        if hit is None:
+            raise ArchiveMiss(f"não arquivado: {request.url}", request=request)
+        status, body = hit
+        resp = requests.Response()
+        resp.status_code = status
+        resp.reason = "OK" if status == 200 else ""
+        resp.url = request.url
+        resp.request = request
+        resp.encoding = "utf-8"
+        resp.headers["Content-Type"] = "application/json"
+        resp.headers["X-PNCP-Archive"] = "replay"
+        resp._content = body
+        return resp
+
+    def close(self):
+        self.inner.close()
+
+# ---------------------------------------------------------------------
+# CLI / utilidades
+# ---------------------------------------------------------------------
+
+def add_archive_args(parser) -> None:
+    parser.add_argument("--archive-dir", default=PNCP_ARCHIVE_DIR or None,
+                        help="Grava as respostas brutas da API (zstd JSONL por data) nesta pasta")
+    parser.add_argument("--replay", action="store_true", default=PNCP_ARCHIVE_MODE == "replay",
+                        help="Reprocessa a partir de --archive-dir, sem acessar a API")
+
+
+def archive_from_args(args, source: str, log: Optional[Callable[[str], None]] = None) -> Optional[ResponseArchive]:
+    if not getattr(args, "archive_dir", None):
+        if getattr(args, "replay", False):
+            raise SystemExit("--replay exige --archive-dir (ou PNCP_ARCHIVE_DIR)")
+        return None
+    return ResponseArchive(args.archive_dir, source, mode="replay" if args.replay else "record", log=log)
+
+
+def iter_records(root: str, source: str, date_from: str, date_to: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Registros {ts, url, status, body} de uma partição, na ordem em que foram gravados."""
+    archive = ResponseArchive(root, source, mode="replay")
+    label = partition_label(date_from, date_to)
+    for ext in EXTENSIONS:
+        path = archive.path_for(label, ext)
+        if os.path.exists(path):
+            yield from _iter_file(path)
+
+
+__all__ = [
+    "ResponseArchive", "ArchiveAdapter", "ArchiveMiss", "ARCHIVE_MODES", "ARCHIVE_STATUS",
+    "add_archive_args", "archive_from_args", "iter_records", "canonical_url", "partition_label",
+    "PNCP_ARCHIVE_DIR", "PNCP_ARCHIVE_MODE",
+]
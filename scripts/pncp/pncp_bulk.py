@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pncp_bulk – carga em massa compartilhada pelos loaders PNCP
+
+Antes: cada loader (insert_contratacoes/insert_itens do pipeline_pncp, upsert_contratos/upsert_atas/
+upsert_pca/upsert_item_pca em scripts/pncp/*/01_processing.py) mandava as linhas com execute_values
++ ON CONFLICT: um comando por 1000 linhas, com parse de VALUES e checagem de conflito linha a linha.
+Aqui:
+- copy_to_staging(): as linhas normalizadas vão por COPY ... FROM STDIN (CSV gerado sob demanda, sem
+  montar o lote inteiro em memória) para uma tabela de staging TEMPORÁRIA com os mesmos tipos do alvo.
+  Tabela temporária = sem WAL (como UNLOGGED) e privada da sessão: gravadores concorrentes não se
+  enxergam e o pgbouncer em modo transação não atrapalha (ON COMMIT DROP: criada e descartada dentro
+  da transação, nada sobra na sessão do servidor para o próximo cliente do pooler);
+- merge_rows(): um único comando set-based do staging para o alvo, com deduplicação no próprio lote
+  (DISTINCT ON chave, mantendo a primeira ou a última ocorrência):
+    • com índice único na chave: INSERT ... ON CONFLICT (chave) DO NOTHING | DO UPDATE;
+    • sem índice único confiável (match_sql): UPDATE ... FROM + INSERT ... WHERE NOT EXISTS.
+Retorna (inseridos, atualizados). Não faz commit: a transação é do chamador.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import re
+from decimal import Decimal
+from typing import Any, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+_NULL = "\\N"
+
+
+# ---------------------------------------------------------------------
+# CSV sob demanda para COPY
+# ---------------------------------------------------------------------
+
+def _csv_value(v: Any) -> str:
+    if v is None:
+        return _NULL
+    if isinstance(v, bool):
+        # mesmo texto que o psycopg2 envia (vale para colunas boolean e text)
+        return "true" if v else "false"
+    if isinstance(v, (int, Decimal)):
+        return str(v)
+    if isinstance(v, float):
+        return repr(v)
+    if isinstance(v, (dict, list)):
+        v = json.dumps(v, ensure_ascii=False)
+    s = str(v)
+    if "\x00" in s:
+        s = s.replace("\x00", "")  # PostgreSQL não aceita NUL em texto
+    # sempre entre aspas: "" é texto vazio e só o \N sem aspas vira NULL
+    return '"' + s.replace('"', '""') + '"'
+
+
+class _CsvRowStream(io.RawIOBase):
+    """Arquivo somente-leitura que gera o CSV do COPY por blocos de linhas (+ coluna _ord)."""
+
+    def __init__(self, rows: Iterable[Any], cols: Sequence[str], block_rows: int = 2000):
+        super().__init__()
+        self._it = iter(rows)
+        self._cols = list(cols)
+        self._block_rows = block_rows
+        self._buf = b""
+        self._pos = 0
+        self.rows = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def _fill(self) -> bool:
+        lines: List[str] = []
+        for row in self._it:
+            if isinstance(row, Mapping):
+                vals = [row.get(c) for c in self._cols]
+            else:
+                vals = list(row)
+            self.rows += 1
+            lines.append(",".join([_csv_value(v) for v in vals] + [str(self.rows)]) + "\n")
+            if len(lines) >= self._block_rows:
+                break
+        if not lines:
+            return False
+        self._buf = self._buf[self._pos:] + "".join(lines).encode("utf-8")
+        self._pos = 0
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buf) - self._pos < size:
+            if not self._fill():
+                break
+        end = len(self._buf) if size < 0 else self._pos + size
+        out = self._buf[self._pos:end]
+        self._pos += len(out)
+        return out
+
+
+# ---------------------------------------------------------------------
+# Staging + merge
+# ---------------------------------------------------------------------
+
+def _staging_name(table: str, cols: Sequence[str]) -> str:
+    base = re.sub(r"\W", "_", table.split(".")[-1])
+    digest = hashlib.md5((table + ":" + ",".join(cols)).encode("utf-8")).hexdigest()[:8]
+    return f"_stg_{base}_{digest}"
+
+
+def copy_to_staging(cur, table: str, cols: Sequence[str], rows: Iterable[Any]) -> Tuple[str, int]:
+    """Cria (se preciso) e limpa o staging temporário de `table` e carrega `rows` via COPY.
+    rows: tuplas na ordem de cols ou dicts. Retorna (nome do staging, linhas copiadas).
+    O staging é ON COMMIT DROP: exige transação aberta (autocommit desligado), como o merge que o segue.
+    """
+    cols = list(cols)
+    stg = _staging_name(table, cols)
+    cur.execute(
+        f"CREATE TEMP TABLE IF NOT EXISTS {stg} ON COMMIT DROP AS "
+        f"SELECT {', '.join(cols)}, 0::bigint AS _ord FROM {table} WITH NO DATA"
+    )
+    cur.execute(f"TRUNCATE {stg}")
+    stream = _CsvRowStream(rows, cols)
+    cur.copy_expert(
+        f"COPY {stg} ({', '.join(cols)}, _ord) FROM STDIN WITH (FORMAT csv, NULL '{_NULL}')",
+        stream,
+        size=1 << 20,
+    )
+    return stg, stream.rows
+
+
+def merge_rows(cur, table: str, cols: Sequence[str], rows: Iterable[Any], key_cols: Sequence[str],
+               update: bool = False, update_cols: Optional[Sequence[str]] = None,
+               match_sql: Optional[str] = None, keep: str = "first") -> Tuple[int, int]:
+    """COPY para o staging + merge set-based no alvo. Retorna (inseridos, atualizados).
+
+    key_cols: chave de deduplicação do lote e alvo do ON CONFLICT.
+    update: False → só insere novos (DO NOTHING); True → atualiza existentes (update_cols, padrão: cols - chave).
+    match_sql: condição entre t (alvo) e v (lote) para tabelas sem índice único na chave; usa
+      UPDATE ... FROM + INSERT ... WHERE NOT EXISTS (o INSERT ainda ignora conflitos de qualquer índice único).
+    keep: "first" | "last" — qual ocorrência de uma chave repetida no lote prevalece.
+    """
+    cols = list(cols)
+    stg, n = copy_to_staging(cur, table, cols, rows)
+    if n == 0:
+        return 0, 0
+    col_list = ", ".join(cols)
+    keys = ", ".join(key_cols)
+    order = "DESC" if keep == "last" else "ASC"
+    src = f"SELECT DISTINCT ON ({keys}) {col_list} FROM {stg} ORDER BY {keys}, _ord {order}"
+    set_cols = list(update_cols) if update_cols is not None else [c for c in cols if c not in key_cols]
+
+    if match_sql is None:
+        if not update or not set_cols:
+            cur.execute(f"INSERT INTO {table} ({col_list}) {src} ON CONFLICT ({keys}) DO NOTHING")
+            return cur.rowcount or 0, 0
+        set_clause = ", ".join(f"{c} = EXCLUDED.{c}" for c in set_cols)
+        cur.execute(
+            f"INSERT INTO {table} ({col_list}) {src} "
+            f"ON CONFLICT ({keys}) DO UPDATE SET {set_clause} RETURNING (xmax = 0)"
+        )
+        flags = [r[0] for r in (cur.fetchall() or [])]
+        inserted = sum(1 for f in flags if f)
+        return inserted, len(flags) - inserted
+
+    updated = 0
+    if update and set_cols:
+        set_clause = ", ".join(f"{c} = v.{c}" for c in set_cols)
+        cur.execute(f"UPDATE {table} AS t SET {set_clause} FROM ({src}) AS v WHERE {match_sql}")
+        updated = cur.rowcount or 0
+    cur.execute(
+        f"INSERT INTO {table} ({col_list}) "
+        f"SELECT {', '.join('v.' + c for c in cols)} FROM ({src}) AS v "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {table} AS t WHERE {match_sql}) "
+        f"ON CONFLICT DO NOTHING"
+    )
+    return cur.rowcount or 0, updated
+
+
+__all__ = ["copy_to_staging", "merge_rows"]
@@ -67,7 +67,7 @@ from gvg_user import (
     fetch_user_results_for_prompt_text,
     get_prompt_preproc_output,
 )
-from gvg_database import get_user_resumo, upsert_user_resumo, fetch_documentos, db_fetch_all, insert_user_message, get_artifacts_status
+from gvg_database import get_user_resumo, upsert_user_resumo, fetch_documentos, fetch_documentos_for_many, db_fetch_all, insert_user_message, get_artifacts_status
 
 from gvg_boletim import (
     create_user_boletim,
@@ -101,10 +101,15 @@ from gvg_schema import (
     project_result_for_output,
     PRIMARY_KEY,
 )
+from gvg_wire import encode_results, decode_results, first_result, measure_wire_bytes
+from gvg_session_store import store_put, store_get, store_delete, store_derive
+from gvg_jobs import submit_job, get_job, cancel_job, forget_job, job_progress, STATUS_DONE, STATUS_ERROR, STATUS_CANCELLED, FINAL_STATUSES
+from gvg_prefetch import PREFETCH_TOP_N, prefetch_for_results, get_prefetched_itens, get_prefetched_docs
 
 from gvg_ai_utils import generate_contratacao_label
-from gvg_email import send_html_email, render_boletim_email_html, render_favorito_email_html, render_history_email_html
-from gvg_search_core import fetch_itens_contratacao
+from gvg_email import render_boletim_email_html, render_favorito_email_html, render_history_email_html
+from gvg_mailer import EmailJob, get_mailer
+from gvg_search_core import fetch_itens_contratacao, fetch_itens_for_many
 from gvg_billing import (
     get_system_plans, 
     get_user_settings, 
@@ -349,6 +354,34 @@ try:
 except Exception:
     pass
 
+# Cookie de sessão do navegador: isola o escopo de jobs/prefetch entre sessões (inclusive anônimas)
+_SID_COOKIE = 'gvg_sid'
+
+
+@app.server.before_request
+def _ensure_session_cookie():
+    try:
+        from flask import g, request
+        sid = request.cookies.get(_SID_COOKIE) or ''
+        if not sid:
+            import secrets
+            sid = secrets.token_urlsafe(16)
+            g.gvg_sid_new = True
+        g.gvg_sid = sid
+    except Exception:
+        pass
+
+
+@app.server.after_request
+def _set_session_cookie(response):
+    try:
+        from flask import g, request
+        if getattr(g, 'gvg_sid_new', False):
+            response.set_cookie(_SID_COOKIE, g.gvg_sid, httponly=True, samesite='Lax', secure=request.is_secure)
+    except Exception:
+        pass
+    return response
+
 # =============================
 # API auxiliar: status rápido de plano (usado pós-pagamento)
 # =============================
@@ -550,22 +583,46 @@ except Exception:
     pass
 
 # ==========================
-# Progresso global (polled por Interval)
+# Progresso por job (gvg_jobs; polled por Interval)
 # ==========================
-PROGRESS = {"percent": 0, "label": ""}
-
 def progress_set(percent: int, label: str | None = None):
+    """Atualiza o progresso do job corrente (no-op fora de job; checa cancelamento)."""
+    job_progress(percent, label)
+
+
+def _current_uid() -> str:
+    """uid do usuário corrente ('' se anônimo). Só chamar no callback, nunca dentro de jobs."""
     try:
-        p = int(max(0, min(100, percent)))
+        return str((get_current_user() or {}).get('uid') or '')
     except Exception:
-        p = 0
-    PROGRESS["percent"] = p
-    if label is not None:
-        PROGRESS["label"] = str(label)
+        return ''
+
+
+def _session_id() -> str:
+    """Id da sessão do navegador (cookie gvg_sid emitido em _ensure_session_cookie)."""
+    try:
+        from flask import g, request
+        return str(getattr(g, 'gvg_sid', None) or request.cookies.get(_SID_COOKIE) or '')
+    except Exception:
+        return ''
+
+
+def _job_scope() -> str:
+    """Escopo dos jobs: usuário corrente + sessão do navegador.
+
+    Anônimos não compartilham escopo: cada sessão só enxerga/cancela os próprios jobs.
+    """
+    return f"{_current_uid() or 'anon'}|{_session_id() or 'nosession'}"
+
+
+def _prefetch_scope() -> str:
+    """Chave do orçamento de prefetch: uid ou, para anônimos, a sessão do navegador."""
+    uid = _current_uid()
+    if uid:
+        return uid
+    sid = _session_id()
+    return f"anon:{sid}" if sid else 'anon'
 
-def progress_reset():
-    PROGRESS["percent"] = 0
-    PROGRESS["label"] = ""
 
 def b64_image(image_path: str) -> str:
     try:
@@ -1130,6 +1187,10 @@ app.layout = html.Div([
     dcc.Store(id='store-notifications', data=[]),
     dcc.Interval(id='notifications-interval', interval=500, n_intervals=0, disabled=False),
     dcc.Interval(id='progress-interval', interval=400, n_intervals=0, disabled=True),
+    # Jobs em background (busca / resumos / exportações)
+    dcc.Store(id='store-search-job', data=None),
+    dcc.Store(id='store-export-job', data=None),
+    dcc.Interval(id='job-poll-interval', interval=1000, n_intervals=0, disabled=True),
     dcc.Download(id='download-out'),
     # Options dinâmicas de Modalidade
     dcc.Store(id='store-modalidade-options', data=[]),
@@ -4063,6 +4124,30 @@ def _format_money(value) -> str:
     return f"{f:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
 
 
+# =========================
+# Resultados server-side (browser guarda apenas handles)
+# =========================
+def _load_results(data, **kwargs) -> list:
+    """Resolve handle (ou payload inline legado) → list[dict] de resultados."""
+    return decode_results(store_get(data, []), **kwargs)
+
+
+def _prefetch_results(uid, results) -> None:
+    """Agenda prefetch (itens/documentos) dos primeiros PNCPs de um conjunto de resultados."""
+    try:
+        ids = []
+        for r in (results or [])[:PREFETCH_TOP_N]:
+            d = (r or {}).get('details') or {}
+            ids.append(d.get('numero_controle_pncp') or d.get('numerocontrolepncp') or r.get('id'))
+        prefetch_for_results(uid or 'anon', ids)
+    except Exception as e:
+        dbg('PRE', f"prefetch agendamento erro: {e}")
+
+def _save_results(results: list, handle: str | None = None):
+    """Codifica (gvg_wire) e grava no store de sessão; devolve o handle."""
+    return store_put(encode_results(results or []), handle=handle, ns='res')
+
+
 # =========================
 # Assinaturas de sessões (deduplicação)
 # =========================
@@ -4145,13 +4230,7 @@ def save_history(history: list, max_items: int = 50):
 # Callbacks: buscar → executar pipeline → renderizar
 # =====================================================================================
 @app.callback(
-    Output('store-results', 'data'),
-    Output('store-categories', 'data'),
-    Output('store-meta', 'data'),
-    Output('store-last-query', 'data'),
-    Output('store-session-event', 'data', allow_duplicate=True),
-    Output('processing-state', 'data', allow_duplicate=True),
-    Output('store-notifications', 'data', allow_duplicate=True),
+    Output('store-search-job', 'data'),
     Input('processing-state', 'data'),
     State('query-input', 'value'),
     State('search-type', 'value'),
@@ -4163,10 +4242,13 @@ def save_history(history: list, max_items: int = 50):
     State('toggles', 'value'),
     State('store-current-query-token', 'data'),
     State('store-search-filters', 'data'),
-    State('store-notifications', 'data'),
     prevent_initial_call=True,
 )
-def run_search(is_processing, query, s_type, approach, relevance, order, max_results, top_cat, toggles, current_token, ui_filters, notifications):
+def run_search(is_processing, query, s_type, approach, relevance, order, max_results, top_cat, toggles, current_token, ui_filters):
+    """Valida a consulta e submete a busca como job em background.
+
+    O resultado (evento de sessão + notificações) é aplicado por update_progress_store.
+    """
     if not is_processing:
         raise PreventUpdate
     # Permitir também buscas somente por filtros (quando V2 ativo)
@@ -4178,9 +4260,23 @@ def run_search(is_processing, query, s_type, approach, relevance, order, max_res
         pass
     if (not query or len((query or '').strip()) < 3) and not (ENABLE_SEARCH_V2 and _has_any_filter(ui_filters)):
         raise PreventUpdate
-    # Resetar e iniciar progresso
+    import time as _t
+    job_id = submit_job(
+        _job_scope(), 'search', _run_search_job,
+        query, s_type, approach, relevance, order, max_results, top_cat, toggles, current_token, ui_filters,
+        uid=_current_uid(), prefetch_scope=_prefetch_scope(),
+    )
+    return {'id': job_id, 'token': current_token, 'ts': _t.time()}
+
+
+def _run_search_job(query, s_type, approach, relevance, order, max_results, top_cat, toggles, current_token, ui_filters, uid='', prefetch_scope=None):
+    """Pipeline completo da busca (executa dentro de um job).
+
+    Retorna {'session_event': dict|None, 'notifications': [novas notificações]}.
+    """
+    notifications = []
+    # Iniciar progresso do job
     try:
-        progress_reset()
         progress_set(10, 'Iniciando')
     except Exception:
         pass
@@ -4251,8 +4347,8 @@ def run_search(is_processing, query, s_type, approach, relevance, order, max_res
     # Início do evento de uso (query). Ref será ajustado após persistir prompt.
     from gvg_usage import usage_event_start  # type: ignore
     from gvg_limits import ensure_capacity, LimitExceeded  # type: ignore
-    user = get_current_user() if 'get_current_user' in globals() else {'uid': ''}
-    uid = (user or {}).get('uid') or ''
+    # uid capturado no submit: o usuário corrente é global ao processo e não vale dentro do job
+    uid = uid or ''
     usage_started = False
     if uid:
         # Checar limites separadamente para capturar erros
@@ -4267,14 +4363,8 @@ def run_search(is_processing, query, s_type, approach, relevance, order, max_res
                 updated_notifs.append(notif)
             except Exception:
                 pass
-            # Reset do progresso para fechar spinner
-            try:
-                progress_reset()
-            except Exception:
-                pass
-            # Retorna: results=no_update, categories=no_update, meta=no_update, query=no_update, 
-            # session_event=no_update, processing=FALSE (para fechar spinner), notifications=updated
-            return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, False, updated_notifs
+            # Sem evento de sessão; o poller encerra o processamento (fecha spinner)
+            return {'session_event': None, 'notifications': updated_notifs}
         except Exception as e:
             # Não aborta a busca; continua e ainda registra evento
             dbg('LIMIT', f"erro ensure_capacity: {e}")
@@ -4418,11 +4508,7 @@ def run_search(is_processing, query, s_type, approach, relevance, order, max_res
         except Exception:
             pass
         # Retornar imediatamente com erro
-        try:
-            progress_reset()
-        except Exception:
-            pass
-        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, False, updated_notifs
+        return {'session_event': None, 'notifications': updated_notifs}
 
     try:
         progress_set(78, 'Ordenando resultados')
@@ -4474,6 +4560,7 @@ def run_search(is_processing, query, s_type, approach, relevance, order, max_res
                 embedding=prompt_emb,
                 filters=(ui_filters or {}) if ENABLE_SEARCH_V2 else None,
                 preproc_output=(info if (ENABLE_SEARCH_V2 and isinstance(info, dict)) else None),
+                uid=uid or None,
             )
             try:
                 if ENABLE_SEARCH_V2 and isinstance(info, dict):
@@ -4482,7 +4569,7 @@ def run_search(is_processing, query, s_type, approach, relevance, order, max_res
                 pass
             if prompt_id:
                 try:
-                    save_user_results(prompt_id, results or [])
+                    save_user_results(prompt_id, results or [], uid=uid or None)
                 except Exception:
                     pass
                 # Atualiza ref do evento agora que temos prompt_id
@@ -4509,12 +4596,19 @@ def run_search(is_processing, query, s_type, approach, relevance, order, max_res
     }
     try:
         progress_set(100, 'Concluído')
-        progress_reset()
     except Exception:
         pass
+    # Prefetch (background) de itens/documentos dos primeiros resultados
+    _prefetch_results(prefetch_scope or uid, results)
     # Evento de sessão (gatilho único para criar/ativar aba)
     try:
         sign = _make_query_signature(query, meta, results)
+        try:
+            if SQL_DEBUG and results:
+                m = measure_wire_bytes(results)
+                dbg('UI', f"wire bytes/result legado={m['legacy_per_result']} compacto={m['wire_per_result']} ratio={m['ratio']} n={m['n']}")
+        except Exception:
+            pass
         session_event = {
             'token': current_token or int(time.time()*1000),
             'type': 'query',
@@ -4522,7 +4616,7 @@ def run_search(is_processing, query, s_type, approach, relevance, order, max_res
             'title': (query or '').strip(),
             'signature': sign,
             'payload': {
-                'results': results or [],
+                'results': _save_results(results or []),
                 'categories': categories or [],
                 'meta': meta or {},
             }
@@ -4566,7 +4660,7 @@ def run_search(is_processing, query, s_type, approach, relevance, order, max_res
     except Exception:
         pass
     
-    return dash.no_update, dash.no_update, dash.no_update, dash.no_update, session_event, False, updated_notifs
+    return {'session_event': session_event, 'notifications': updated_notifs}
 
 
 # ========================= Abas de resultados (sessões) =========================
@@ -4686,7 +4780,7 @@ def render_tabs_bar(sessions, active):
             # Cor dinâmica com base na data de encerramento
             status_color = None
             try:
-                first = (sess.get('results') or [None])[0] or {}
+                first = first_result(store_get(sess.get('results')))
                 details = (first.get('details') or {}) if isinstance(first, dict) else {}
                 end_date = (
                     details.get('dataencerramentoproposta')
@@ -4741,7 +4835,7 @@ def render_tabs_bar(sessions, active):
             uf = ''
             rotulo = ''
             try:
-                first = (sess.get('results') or [None])[0] or {}
+                first = first_result(store_get(sess.get('results')))
                 details = (first.get('details') or {}) if isinstance(first, dict) else {}
                 municipio = details.get('unidade_orgao_municipio_nome') or ''
                 uf = details.get('unidade_orgao_uf_sigla') or ''
@@ -4827,9 +4921,10 @@ def toggle_tabs_bar_style(sessions):
     Input({'type': 'tab-close', 'sid': ALL}, 'n_clicks'),
     State('store-active-session', 'data'),
     State('store-result-sessions', 'data'),
+    State('store-search-job', 'data'),
     prevent_initial_call=True,
 )
-def on_tab_click(_activates, _closes, active, sessions):
+def on_tab_click(_activates, _closes, active, sessions, search_job):
     sessions = sessions or {}
     ctx = callback_context
     if not ctx.triggered:
@@ -4852,7 +4947,20 @@ def on_tab_click(_activates, _closes, active, sessions):
             sid = None
         if not sid:
             raise PreventUpdate
-        sessions.pop(sid, None)
+        closed = sessions.pop(sid, None)
+        # Fechar aba pendente cancela o job de busca correspondente
+        try:
+            if (closed or {}).get('pending_token') is not None and isinstance(search_job, dict) \
+                    and search_job.get('token') == closed.get('pending_token'):
+                cancel_job(search_job.get('id'), _job_scope())
+        except Exception:
+            pass
+        try:
+            h = (closed or {}).get('results')
+            store_delete(store_derive(h, 'sorted'))
+            store_delete(h)
+        except Exception:
+            pass
         # Se fechou ativo, escolher outro (último da lista) ou None
         if active == sid:
             active = next(iter(sessions.keys()), None)
@@ -4976,7 +5084,7 @@ def open_pncp_tab_from_favorite(n_clicks_list, favs, sessions, active):
     sessions[sid] = {
         'type': 'pncp',
         'title': (title or f"PNCP {pid}"),
-        'results': [mock_result],
+        'results': [],
         'categories': [],
     'meta': {'order': 1, 'count': 1},
     'sort': None,
@@ -4994,6 +5102,7 @@ def open_pncp_tab_from_favorite(n_clicks_list, favs, sessions, active):
             details['unidade_orgao_uf_sigla'] = item.get('unidade_orgao_uf_sigla')
     except Exception:
         pass
+    sessions[sid]['results'] = _save_results([mock_result])
     return sessions, sid
 
 
@@ -5041,22 +5150,58 @@ def toggle_progress_interval(is_processing):
     return not bool(is_processing)
 
 
-# Atualiza a Store de progresso periodicamente a partir do estado global
+# Acompanha o job de busca: progresso por job e, ao concluir, aplica o resultado
 @app.callback(
     Output('progress-store', 'data'),
+    Output('store-session-event', 'data', allow_duplicate=True),
+    Output('processing-state', 'data', allow_duplicate=True),
+    Output('store-notifications', 'data', allow_duplicate=True),
+    Output('store-search-job', 'data', allow_duplicate=True),
     Input('progress-interval', 'n_intervals'),
     State('processing-state', 'data'),
-    prevent_initial_call=False,
+    State('store-search-job', 'data'),
+    State('store-notifications', 'data'),
+    prevent_initial_call=True,
 )
-def update_progress_store(_n, is_processing):
+def update_progress_store(_n, is_processing, job_ref, notifications):
+    idle = {'percent': 0, 'label': ''}
     if not is_processing:
-        return {'percent': 0, 'label': ''}
-    try:
-        p = int(PROGRESS.get('percent', 0))
-        lbl = PROGRESS.get('label', '')
-    except Exception:
-        p, lbl = 0, ''
-    return {'percent': p, 'label': lbl}
+        return idle, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    job_id = (job_ref or {}).get('id') if isinstance(job_ref, dict) else None
+    if not job_id:
+        return idle, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    snap = get_job(job_id, _job_scope())
+    if not snap:
+        # Job desconhecido (ex.: worker reiniciado): desiste após 10 min
+        try:
+            import time as _t
+            if _t.time() - float((job_ref or {}).get('ts') or 0) > 600:
+                notif = add_note(NOTIF_ERROR, "Busca interrompida. Tente novamente.")
+                return idle, dash.no_update, False, list(notifications or []) + [notif], None
+        except Exception:
+            pass
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    status = snap.get('status')
+    if status not in FINAL_STATUSES:
+        try:
+            p = int(snap.get('percent') or 0)
+        except Exception:
+            p = 0
+        return {'percent': p, 'label': snap.get('label') or ''}, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    forget_job(job_id)
+    updated_notifs = list(notifications or [])
+    session_event = dash.no_update
+    if status == STATUS_DONE:
+        result = snap.get('result') or {}
+        updated_notifs.extend(result.get('notifications') or [])
+        if result.get('session_event'):
+            session_event = result['session_event']
+    elif status != STATUS_CANCELLED:
+        try:
+            updated_notifs.append(add_note(NOTIF_ERROR, "Erro ao executar busca. Tente novamente."))
+        except Exception:
+            pass
+    return idle, session_event, False, updated_notifs, None
 
 
 # Reflete a barra de progresso na UI (comportamento global)
@@ -5809,6 +5954,7 @@ def render_status_and_categories(meta, categories, last_query, filters):
     prevent_initial_call=True,
 )
 def render_results_table(results, sort_state):
+    results = _load_results(results)
     if not results:
         return html.Div("Nenhum resultado encontrado", style={'color': '#555'})
     data = []
@@ -5892,6 +6038,8 @@ def render_results_table(results, sort_state):
     prevent_initial_call=True,
 )
 def compute_artifacts_status(results, favs, auth, cache_resumo):
+    results = _load_results(results)
+    cache_resumo = store_get(cache_resumo, {})
     # Coletar lista de PNCPs visíveis (resultados + favoritos)
     pncp_set = set()
     try:
@@ -5963,6 +6111,7 @@ def compute_artifacts_status(results, favs, auth, cache_resumo):
     prevent_initial_call=True,
 )
 def render_details(results, last_query, artifacts_status):
+    results = _load_results(results, full_text=True)
     if not results:
         # Debug: sem resultados
         if SQL_DEBUG:
@@ -6137,7 +6286,9 @@ def render_details(results, last_query, artifacts_status):
 )
 def compute_sorted_results(results, sort_state):
     try:
-        return _sorted_for_ui(results or [], sort_state or {'field': 'similaridade', 'direction': 'desc'})
+        rows = _load_results(results)
+        ordered = _sorted_for_ui(rows, sort_state or {'field': 'similaridade', 'direction': 'desc'})
+        return _save_results(ordered, handle=store_derive(results, 'sorted'))
     except Exception:
         return results or []
 
@@ -6205,11 +6356,14 @@ def on_header_sort(sort_by, curr):
     prevent_initial_call=True,
 )
 def load_itens_for_cards(n_clicks_list, active_map, results, cache_itens):
+    results = _load_results(results)
+    cache_handle = cache_itens
+    cache_itens = store_get(cache_itens, {})
     from gvg_search_core import fetch_itens_contratacao
     children_out, style_out, btn_styles = [], [], []
     updated_cache = dict(cache_itens or {})
     if not results:
-        return children_out, style_out, btn_styles, updated_cache
+        return children_out, style_out, btn_styles, store_put(updated_cache, handle=cache_handle, ns='itens')
     # Build pncp id list aligned with components order
     pncp_ids = []
     for r in results:
@@ -6224,6 +6378,16 @@ def load_itens_for_cards(n_clicks_list, active_map, results, cache_itens):
     elif len(n_clicks_list) > len(pncp_ids):
         n_clicks_list = list(n_clicks_list[:len(pncp_ids)])
 
+    # Painéis abertos sem cache: uma única consulta em lote
+    batch_itens = {}
+    try:
+        need = [p for p in pncp_ids if p != 'N/A' and (active_map or {}).get(p) == 'itens'
+                and p not in updated_cache and get_prefetched_itens(p) is None]
+        if need:
+            batch_itens = fetch_itens_for_many(need, limit_per_id=500)
+    except Exception:
+        batch_itens = {}
+
     for i in range(len(pncp_ids)):
         pid = pncp_ids[i]
         clicks = n_clicks_list[i] or 0
@@ -6250,6 +6414,10 @@ def load_itens_for_cards(n_clicks_list, active_map, results, cache_itens):
                     itens = cache_itens.get(str(pid)) or []
             except Exception:
                 itens = None
+            if itens is None:
+                itens = get_prefetched_itens(pid)
+            if itens is None:
+                itens = batch_itens.get(str(pid))
             if itens is None:
                 try:
                     itens = fetch_itens_contratacao(pid, limit=500) or []
@@ -6298,7 +6466,7 @@ def load_itens_for_cards(n_clicks_list, active_map, results, cache_itens):
             children_out.append([html.Div([table, summary], style=styles['details_content_inner'])])
         else:
             children_out.append([])
-    return children_out, style_out, btn_styles, updated_cache
+    return children_out, style_out, btn_styles, store_put(updated_cache, handle=cache_handle, ns='itens')
 
 @app.callback(
     Output({'type': 'docs-card', 'pncp': ALL}, 'children'),
@@ -6312,10 +6480,13 @@ def load_itens_for_cards(n_clicks_list, active_map, results, cache_itens):
     prevent_initial_call=True,
 )
 def load_docs_for_cards(n_clicks_list, active_map, results, cache_docs):
+    results = _load_results(results)
+    cache_handle = cache_docs
+    cache_docs = store_get(cache_docs, {})
     children_out, style_out, btn_styles = [], [], []
     updated_cache = dict(cache_docs or {})
     if not results:
-        return children_out, style_out, btn_styles, updated_cache
+        return children_out, style_out, btn_styles, store_put(updated_cache, handle=cache_handle, ns='docs')
     pncp_ids = []
     for r in results:
         d = (r or {}).get('details', {}) or {}
@@ -6329,6 +6500,16 @@ def load_docs_for_cards(n_clicks_list, active_map, results, cache_docs):
     elif len(n_clicks_list) > len(pncp_ids):
         n_clicks_list = list(n_clicks_list[:len(pncp_ids)])
 
+    # Painéis abertos sem cache: uma única consulta em lote (+ API concorrente p/ ausentes)
+    batch_docs = {}
+    try:
+        need = [p for p in pncp_ids if p != 'N/A' and (active_map or {}).get(p) == 'docs'
+                and p not in updated_cache and get_prefetched_docs(p) is None]
+        if need:
+            batch_docs = fetch_documentos_for_many(need)
+    except Exception:
+        batch_docs = {}
+
     for i in range(len(pncp_ids)):
         pid = pncp_ids[i]
         clicks = n_clicks_list[i] or 0
@@ -6353,6 +6534,10 @@ def load_docs_for_cards(n_clicks_list, active_map, results, cache_docs):
                     docs = cache_docs.get(str(pid)) or []
             except Exception:
                 docs = None
+            if docs is None:
+                docs = get_prefetched_docs(pid)
+            if docs is None:
+                docs = batch_docs.get(str(pid))
             if docs is None:
                 try:
                     docs = fetch_documentos(pid) or []
@@ -6391,7 +6576,93 @@ def load_docs_for_cards(n_clicks_list, active_map, results, cache_docs):
             children_out.append([html.Div([table], style=styles['details_content_inner'])])
         else:
             children_out.append([])
-    return children_out, style_out, btn_styles, updated_cache
+    return children_out, style_out, btn_styles, store_put(updated_cache, handle=cache_handle, ns='docs')
+
+def _generate_summary_job(uid: str, pid: str, docs: list, pncp_data: dict) -> dict:
+    """Gera o resumo de todos os documentos de um PNCP (executa dentro de um job).
+
+    Persiste em user_resumos quando bom e fecha/descarta o evento de uso.
+    Retorna {'summary': str|None, 'is_good': bool}.
+    """
+    summary_text = None
+    # Iniciar tracking somente para geração real (sem cache) e só gravar se sucesso
+    summary_event_started = False
+    try:
+        if uid and pid:
+            from gvg_usage import usage_event_start  # type: ignore
+            usage_event_start(uid, 'summary_success', ref_type='sumário', ref_id=str(pid))
+            summary_event_started = True
+    except Exception:
+        summary_event_started = False
+
+    if DOCUMENTS_AVAILABLE:
+        combined = []
+        try:
+            for idx_doc, doc in enumerate(docs or []):
+                nome = str(doc.get('nome') or doc.get('titulo') or f'Documento {idx_doc+1}')
+                url = str(doc.get('url') or doc.get('uri') or '')
+                if not url:
+                    continue
+                progress_set(int(100 * idx_doc / max(1, len(docs))), f"Documento {idx_doc+1}/{len(docs)}")
+                # Numerador do documento no lote
+                try:
+                    if isinstance(pncp_data, dict):
+                        pncp_data['doc_seq'] = idx_doc + 1
+                except Exception:
+                    pass
+                if summarize_document:
+                    if SQL_DEBUG:
+                        short = (url[:80] + '...') if len(url) > 80 else url
+                        dbg('RESUMO', f"Gerando resumo do doc {idx_doc+1}/{len(docs)}: '{nome}' url='{short}'")
+                    piece = summarize_document(url, max_tokens=500, document_name=nome, pncp_data=pncp_data)
+                elif process_pncp_document:
+                    if SQL_DEBUG:
+                        short = (url[:80] + '...') if len(url) > 80 else url
+                        dbg('RESUMO', f"Gerando resumo (fallback) do doc {idx_doc+1}/{len(docs)}: '{nome}' url='{short}'")
+                    piece = process_pncp_document(url, max_tokens=500, document_name=nome, pncp_data=pncp_data)
+                else:
+                    piece = 'Pipeline de documentos não está disponível neste ambiente.'
+                if isinstance(piece, str) and piece.strip():
+                    combined.append(f"## {nome}\n\n{piece}\n")
+            summary_text = "\n\n---\n\n".join(combined) if combined else None
+        except Exception as e:
+            summary_text = f"Erro ao gerar resumo: {e}"
+    else:
+        summary_text = 'Pipeline de documentos não está disponível neste ambiente.'
+
+    if SQL_DEBUG and summary_text is not None:
+        sz = len(summary_text) if isinstance(summary_text, str) else 'N/A'
+        dbg('RESUMO', f"Resumo GERADO (chars={sz})")
+
+    is_good = bool(
+        isinstance(summary_text, str) and summary_text.strip()
+        and not summary_text.startswith('Erro')
+        and summary_text != 'Pipeline de documentos não está disponível neste ambiente.'
+    )
+    # Persistir no BD por usuário (best-effort)
+    if uid and is_good:
+        try:
+            upsert_user_resumo(uid, pid, summary_text)
+        except Exception:
+            pass
+    # Finalizar ou descartar evento summary_success conforme resultado
+    try:
+        if summary_event_started and uid and pid:
+            extra = {}
+            ok = bool(isinstance(summary_text, str) and summary_text.strip())
+            if ok:
+                extra['chars'] = len(summary_text)
+                extra['status'] = 'success'
+                from gvg_usage import usage_event_finish  # type: ignore
+                usage_event_finish(extra)
+            else:
+                extra['status'] = 'empty'
+                from gvg_usage import usage_event_discard  # type: ignore
+                usage_event_discard()
+    except Exception:
+        pass
+    return {'summary': summary_text, 'is_good': is_good}
+
 
 @app.callback(
     Output({'type': 'resumo-card', 'pncp': ALL}, 'children', allow_duplicate=True),
@@ -6399,6 +6670,7 @@ def load_docs_for_cards(n_clicks_list, active_map, results, cache_docs):
     Output({'type': 'resumo-btn', 'pncp': ALL}, 'style', allow_duplicate=True),
     Output('store-cache-resumo', 'data', allow_duplicate=True),
     Output('store-notifications', 'data', allow_duplicate=True),
+    Output('job-poll-interval', 'disabled', allow_duplicate=True),
     Input({'type': 'resumo-btn', 'pncp': ALL}, 'n_clicks'),
     Input('store-panel-active', 'data'),
     State('store-results-sorted', 'data'),
@@ -6412,6 +6684,9 @@ def load_resumo_for_cards(n_clicks_list, active_map, results, cache_resumo, noti
     Heuristic: prefer PDFs matching common names (edital, termo de referencia/TR, projeto basico,
     anexo i, pregão/pe/concorrência/dispensa); else first PDF; else first document.
     """
+    results = _load_results(results)
+    cache_handle = cache_resumo
+    cache_resumo = store_get(cache_resumo, {})
     # Usar funções do pipeline de documentos do módulo gvg_documents (já importadas no topo)
     # DOCUMENTS_AVAILABLE é definido no início deste arquivo, com base nas imports de summarize_document/process_pncp_document
     children_out, style_out, btn_styles = [], [], []
@@ -6420,10 +6695,11 @@ def load_resumo_for_cards(n_clicks_list, active_map, results, cache_resumo, noti
     # Debug início do callback
 
     updated_cache = dict(cache_resumo or {})
+    jobs_pending = False
     # Quando não há resultados, não há componentes correspondentes; retornar listas vazias é seguro
     if not results:
-        # Retorno deve respeitar 5 outputs
-        return children_out, style_out, btn_styles, updated_cache, updated_notifs
+        # Retorno deve respeitar 6 outputs
+        return children_out, style_out, btn_styles, store_put(updated_cache, handle=cache_handle, ns='resumo'), updated_notifs, dash.no_update
 
     # Helper to pick main doc
     def pick_main_doc(docs: list) -> dict | None:
@@ -6497,6 +6773,8 @@ def load_resumo_for_cards(n_clicks_list, active_map, results, cache_resumo, noti
                 docs = None
                 if isinstance(cache_resumo, dict) and str(pid) in cache_resumo and isinstance(cache_resumo[str(pid)], dict) and 'docs' in cache_resumo[str(pid)]:
                     docs = cache_resumo[str(pid)]['docs'] or []
+                if docs is None:
+                    docs = get_prefetched_docs(pid)
                 if docs is None:
                     docs = fetch_documentos(pid) or []
             except Exception:
@@ -6550,6 +6828,34 @@ def load_resumo_for_cards(n_clicks_list, active_map, results, cache_resumo, noti
             except Exception:
                 pass
 
+            # 3) Job de resumo já submetido: aguardar (spinner) ou exibir falha uma única vez
+            try:
+                entry = cache_resumo.get(str(pid)) if isinstance(cache_resumo, dict) else None
+                if isinstance(entry, dict) and entry.get('error'):
+                    children_out.append([html.Div(dcc.Markdown(children=entry['error'], className='markdown-summary'), style=styles['details_content_inner'])])
+                    style_out[-1] = {**style_out[-1], 'display': 'block'}
+                    btn_styles[-1] = inverted_btn_style
+                    updated_cache[str(pid)] = {'docs': entry.get('docs') or []}
+                    continue
+                if isinstance(entry, dict) and entry.get('job'):
+                    snap = get_job(entry.get('job'), _job_scope())
+                    if snap is not None:
+                        children_out.append([
+                            html.Div(
+                                html.Div(
+                                    html.I(className="fas fa-spinner fa-spin", style={'color': _COLOR_PRIMARY, 'fontSize': '24px'}),
+                                    style=styles['details_spinner_center']
+                                ),
+                                style={**styles['details_content_inner'], 'height': '100%'}
+                            )
+                        ])
+                        style_out[-1] = {**style_out[-1], 'display': 'block'}
+                        btn_styles[-1] = inverted_btn_style
+                        jobs_pending = True
+                        continue
+            except Exception:
+                pass
+
             # Antes de gerar, tentar carregar do BD por usuário
             try:
                 user = get_current_user() if 'get_current_user' in globals() else {'uid': ''}
@@ -6655,108 +6961,17 @@ def load_resumo_for_cards(n_clicks_list, active_map, results, cache_resumo, noti
                 except Exception as e:
                     dbg('LIMIT', f"erro ao verificar limite de resumos: {e}")
 
-            # Iniciar tracking somente para geração real (sem cache) e só gravar se sucesso
-            summary_event_started = False
+            # Geração em background (um job por PNCP); o poller aplica o resultado
             try:
-                if uid and pid and not (isinstance(cache_resumo, dict) and str(pid) in cache_resumo and isinstance(cache_resumo[str(pid)], dict) and 'summary' in cache_resumo[str(pid)]):
-                    from gvg_usage import usage_event_start  # type: ignore
-                    usage_event_start(uid, 'summary_success', ref_type='sumário', ref_id=str(pid))
-                    summary_event_started = True
-            except Exception:
-                summary_event_started = False
-
-            if DOCUMENTS_AVAILABLE:
-                combined = []
-                try:
-                    for idx_doc, doc in enumerate(docs or []):
-                        nome = str(doc.get('nome') or doc.get('titulo') or f'Documento {idx_doc+1}')
-                        url = str(doc.get('url') or doc.get('uri') or '')
-                        if not url:
-                            continue
-                        # Numerador do documento no lote
-                        try:
-                            if isinstance(pncp_data, dict):
-                                pncp_data['doc_seq'] = idx_doc + 1
-                        except Exception:
-                            pass
-                        if summarize_document:
-                            if SQL_DEBUG:
-                                short = (url[:80] + '...') if len(url) > 80 else url
-                                dbg('RESUMO', f"Gerando resumo do doc {idx_doc+1}/{len(docs)}: '{nome}' url='{short}'")
-                            piece = summarize_document(url, max_tokens=500, document_name=nome, pncp_data=pncp_data)
-                        elif process_pncp_document:
-                            if SQL_DEBUG:
-                                short = (url[:80] + '...') if len(url) > 80 else url
-                                dbg('RESUMO', f"Gerando resumo (fallback) do doc {idx_doc+1}/{len(docs)}: '{nome}' url='{short}'")
-                            piece = process_pncp_document(url, max_tokens=500, document_name=nome, pncp_data=pncp_data)
-                        else:
-                            piece = 'Pipeline de documentos não está disponível neste ambiente.'
-                        if isinstance(piece, str) and piece.strip():
-                            combined.append(f"## {nome}\n\n{piece}\n")
-                    summary_text = "\n\n---\n\n".join(combined) if combined else None
-                except Exception as e:
-                    summary_text = f"Erro ao gerar resumo: {e}"
-            else:
-                summary_text = 'Pipeline de documentos não está disponível neste ambiente.'
-
-            if SQL_DEBUG and summary_text is not None:
-                sz = len(summary_text) if isinstance(summary_text, str) else 'N/A'
-                dbg('RESUMO', f"Resumo GERADO (chars={sz})")
-
-            # Guardar fallback só para exibição (não cachear/persistir)
-            is_good = False
-            if isinstance(summary_text, str) and summary_text.strip() and not summary_text.startswith('Erro') and summary_text != 'Pipeline de documentos não está disponível neste ambiente.':
-                is_good = True
-            display_text = summary_text if is_good else 'Não foi possível gerar o resumo.'
-
-            try:
-                if is_good:
-                    updated_cache[str(pid)] = {'docs': docs, 'summary': summary_text}
-            except Exception:
-                pass
-
-            # Persistir no BD por usuário (best-effort)
-            if uid and is_good:
-                try:
-                    upsert_user_resumo(uid, pid, summary_text)
-                except Exception:
-                    pass
-            # Finalizar ou descartar evento summary_success conforme resultado
-            try:
-                if summary_event_started and uid and pid:
-                    extra = {}
-                    ok = bool(isinstance(summary_text, str) and summary_text.strip())
-                    if ok:
-                        extra['chars'] = len(summary_text)
-                        extra['status'] = 'success'
-                        from gvg_usage import usage_event_finish  # type: ignore
-                        usage_event_finish(extra)
-                    else:
-                        extra['status'] = 'empty'
-                        from gvg_usage import usage_event_discard  # type: ignore
-                        usage_event_discard()
-            except Exception:
-                pass
-            
-            # Notificações de resultado do resumo
-            updated_notifs = list(notifications or [])
-            try:
-                if is_good:
-                    # Sucesso
-                    notif = add_note(NOTIF_SUCCESS, "Resumo gerado com sucesso!")
-                    updated_notifs.append(notif)
-                elif isinstance(summary_text, str) and summary_text.startswith('Erro'):
-                    # Erro ao gerar
-                    notif = add_note(NOTIF_ERROR, "Erro ao gerar resumo. Tente novamente.")
-                    updated_notifs.append(notif)
-            except Exception:
-                pass
-            
-            # Substitui o spinner pelo conteúdo final (resumo)
-            children_out[-1] = [html.Div(dcc.Markdown(children=display_text, className='markdown-summary'), style=styles['details_content_inner'])]
+                job_id = submit_job(_job_scope(), 'resumo', _generate_summary_job, uid, str(pid), docs, pncp_data, key=str(pid))
+                updated_cache[str(pid)] = {'docs': docs, 'job': job_id}
+                jobs_pending = True
+            except Exception as e:
+                dbg('RESUMO', f"erro ao submeter job de resumo: {e}")
+                children_out[-1] = [html.Div(dcc.Markdown(children='Não foi possível gerar o resumo.', className='markdown-summary'), style=styles['details_content_inner'])]
         else:
             children_out.append([])
-    return children_out, style_out, btn_styles, updated_cache, updated_notifs
+    return children_out, style_out, btn_styles, store_put(updated_cache, handle=cache_handle, ns='resumo'), updated_notifs, (False if jobs_pending else dash.no_update)
 
 # Callback rápido para exibir spinner imediatamente ao ativar o painel de Resumo
 @app.callback(
@@ -6769,6 +6984,8 @@ def load_resumo_for_cards(n_clicks_list, active_map, results, cache_resumo, noti
     prevent_initial_call=True,
 )
 def show_resumo_spinner_when_active(active_map, results, cache_resumo):
+    results = _load_results(results)
+    cache_resumo = store_get(cache_resumo, {})
     children_out, style_out, btn_styles = [], [], []
     if not results:
         return children_out, style_out, btn_styles
@@ -6834,6 +7051,7 @@ def show_resumo_spinner_when_active(active_map, results, cache_resumo):
     prevent_initial_call=True,
 )
 def set_active_panel(it_clicks, dc_clicks, rs_clicks, results, active_map):
+    results = _load_results(results)
     active_map = dict(active_map or {})
     if not results:
         raise PreventUpdate
@@ -6881,6 +7099,7 @@ def set_active_panel(it_clicks, dc_clicks, rs_clicks, results, active_map):
     prevent_initial_call=True,
 )
 def update_button_icons(active_map, results):
+    results = _load_results(results)
     itens_children, docs_children, resumo_children = [], [], []
     pncp_ids = []
     for r in (results or []):
@@ -6905,6 +7124,7 @@ def update_button_icons(active_map, results):
     prevent_initial_call=True,
 )
 def toggle_panel_wrapper(active_map, results):
+    results = _load_results(results)
     styles_out = []
     pncp_ids = []
     for r in (results or []):
@@ -7107,6 +7327,7 @@ def replay_from_history(n_clicks_list, history, notifications):
         notif = add_note(NOTIF_WARNING, "Nenhum resultado encontrado para esta consulta.")
         updated_notifs.append(notif)
     
+    _prefetch_results(_prefetch_scope(), rows)
     # Meta mínima para cards
     meta = {'order': 1, 'count': len(rows), 'source': 'history'}
     session_event = {
@@ -7115,7 +7336,7 @@ def replay_from_history(n_clicks_list, history, notifications):
         'title': prompt_text,
         'signature': f"history:{prompt_text[:100]}",
         'payload': {
-            'results': rows,
+            'results': _save_results(rows),
             'categories': [],
             'meta': meta
         }
@@ -7311,6 +7532,7 @@ def replay_from_boletim(n_clicks_list, boletins, notifications):
             pass
         raise PreventUpdate
 
+    _prefetch_results(_prefetch_scope(), results)
     # Meta enriquecida a partir do config_snapshot para unificar com card de busca
     meta = {
         'order': (cfg.get('sort_mode') if isinstance(cfg, dict) else 1) or 1,
@@ -7330,7 +7552,7 @@ def replay_from_boletim(n_clicks_list, boletins, notifications):
         'title': title or 'Boletim',
         'signature': f"boletim:{boletim_id}:{str(run_token)[:32]}",
         'payload': {
-            'results': results,
+            'results': _save_results(results),
             'categories': [],
             'meta': meta,
         }
@@ -7859,6 +8081,23 @@ def queue_email_send(n, n_submit, ctx_data, raw_recipients, self_opts, auth_stat
     return req, None, '', {'display': 'none'}
 
 
+def _fetch_email_maps(pncp_ids, label: str):
+    """Itens e documentos de vários PNCPs em lote (evita N+1 no envio de e-mail)."""
+    try:
+        items_map = fetch_itens_for_many(pncp_ids, limit_per_id=200)  # limite de segurança
+    except Exception:
+        items_map = {}
+    try:
+        docs_map = fetch_documentos_for_many(pncp_ids)
+    except Exception:
+        docs_map = {}
+    try:
+        dbg('EMAIL', f"{label} pncps={len(pncp_ids)} itens={sum(len(v) for v in items_map.values())} docs={sum(len(v) for v in docs_map.values())}")
+    except Exception:
+        pass
+    return items_map, docs_map
+
+
 # Processamento em segundo plano: quando há um pedido na Store, envia e limpa
 @app.callback(
     Output('store-email-send-request', 'data', allow_duplicate=True),
@@ -7904,23 +8143,7 @@ def process_email_send(req, notifications):
             ) or []
             # Montar mapas de itens e documentos
             pncp_ids = [str(r.get('numero_controle_pncp') or '') for r in rows if r.get('numero_controle_pncp')]
-            items_map = {}
-            docs_map = {}
-            for pid in pncp_ids:
-                try:
-                    itens = fetch_itens_contratacao(pid, limit=200) or []  # limite de segurança
-                except Exception:
-                    itens = []
-                try:
-                    docs = fetch_documentos(pid) or []
-                except Exception:
-                    docs = []
-                items_map[pid] = itens
-                docs_map[pid] = docs
-                try:
-                    dbg('EMAIL', f"boletim pncp={pid} itens={len(itens)} docs={len(docs)}")
-                except Exception:
-                    pass
+            items_map, docs_map = _fetch_email_maps(pncp_ids, 'boletim')
             try:
                 html = render_boletim_email_html(qtxt, rows, cfg, stype, sdetail, items_map=items_map, docs_map=docs_map)
             except Exception:
@@ -7976,23 +8199,7 @@ def process_email_send(req, notifications):
                         pncp_ids.append(str(pid))
                 except Exception:
                     pass
-            items_map = {}
-            docs_map = {}
-            for pid in pncp_ids:
-                try:
-                    itens = fetch_itens_contratacao(pid, limit=200) or []
-                except Exception:
-                    itens = []
-                try:
-                    docs = fetch_documentos(pid) or []
-                except Exception:
-                    docs = []
-                items_map[pid] = itens
-                docs_map[pid] = docs
-                try:
-                    dbg('EMAIL', f"history pncp={pid} itens={len(itens)} docs={len(docs)}")
-                except Exception:
-                    pass
+            items_map, docs_map = _fetch_email_maps(pncp_ids, 'history')
             try:
                 from gvg_email import render_history_email_html
                 html = render_history_email_html(prompt_text, rows, items_map=items_map, docs_map=docs_map)
@@ -8014,14 +8221,17 @@ def process_email_send(req, notifications):
         else:
             return None
 
-        email_sent_count = 0
-        email_failed_count = 0
-        for to in recips:
-            try:
-                send_html_email(to, subject, html)
-                email_sent_count += 1
-            except Exception:
-                email_failed_count += 1
+        # Todos os destinatários pelo pool SMTP do processo (sessão reutilizada, retentativas, dead-letter)
+        report = get_mailer().deliver([
+            EmailJob(to=to, subject=subject, html=html, kind=kind, ref_id=str(ctxd.get('id') or ctxd.get('pncp') or '')[:200] or None)
+            for to in recips
+        ])
+        email_sent_count = len(report.sent)
+        email_failed_count = len(report.failed)
+        try:
+            dbg('EMAIL', f"envio kind={kind} {report.stats}")
+        except Exception:
+            pass
         
         # Notificações de resultado
         if email_sent_count > 0:
@@ -8050,6 +8260,7 @@ def process_email_send(req, notifications):
     prevent_initial_call=True,
 )
 def toggle_bookmark(n_clicks_list, results, favs, notifications):
+    results = _load_results(results)
     # Conjunto de favoritos atual
     fav_set = {str(x.get('numero_controle_pncp')) for x in (favs or [])}
 
@@ -8224,6 +8435,7 @@ def toggle_bookmark(n_clicks_list, results, favs, notifications):
     prevent_initial_call=True,
 )
 def sync_bookmark_icons(favs, results, current_n_clicks):
+    results = _load_results(results)
     # Conjunto de favoritos atualizado
     fav_set = {str(x.get('numero_controle_pncp')) for x in (favs or [])}
 
@@ -8346,9 +8558,51 @@ from types import SimpleNamespace
 OUTPUT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'Resultados_Busca'))
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+_EXPORT_TYPES = {
+    'export-json': ('json', 'JSON'),
+    'export-xlsx': ('xlsx', 'Excel'),
+    'export-csv': ('csv', 'CSV'),
+    'export-pdf': ('pdf', 'PDF'),
+    'export-html': ('html', 'HTML'),
+}
+
+
+def _export_job(results_handle, query: str, meta: dict, fmt: str) -> dict:
+    """Gera o arquivo de exportação (executa dentro de um job).
+
+    Retorna {'path': str|None, 'error': None|'missing_lib'|'failed'}.
+    """
+    results = _load_results(results_handle, full_text=True)
+    meta = meta or {}
+    params = SimpleNamespace(
+        search=meta.get('search', 1),
+        approach=meta.get('approach', 3),
+        relevance=meta.get('relevance', 2),
+        order=meta.get('order', 1),
+    )
+    progress_set(20, 'Gerando arquivo')
+    path = None
+    if fmt == 'json':
+        path = export_results_json(results, query or '', params, OUTPUT_DIR)
+    elif fmt == 'xlsx':
+        path = export_results_excel(results, query or '', params, OUTPUT_DIR)
+    elif fmt == 'csv':
+        path = export_results_csv(results, query or '', params, OUTPUT_DIR)
+    elif fmt == 'pdf':
+        path = export_results_pdf(results, query or '', params, OUTPUT_DIR)
+        if not path:
+            # ReportLab ausente
+            return {'path': None, 'error': 'missing_lib'}
+    elif fmt == 'html':
+        path = export_results_html(results, query or '', params, OUTPUT_DIR)
+    if path and os.path.exists(path):
+        return {'path': path, 'error': None}
+    return {'path': None, 'error': 'failed'}
+
+
 @app.callback(
-    Output('download-out', 'data'),
-    Output('store-notifications', 'data', allow_duplicate=True),
+    Output('store-export-job', 'data'),
+    Output('job-poll-interval', 'disabled', allow_duplicate=True),
     Input('export-json', 'n_clicks'),
     Input('export-xlsx', 'n_clicks'),
     Input('export-csv', 'n_clicks'),
@@ -8357,68 +8611,100 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
     State('store-results', 'data'),
     State('store-last-query', 'data'),
     State('store-meta', 'data'),
-    State('store-notifications', 'data'),
     prevent_initial_call=True,
 )
-def export_files(n_json, n_xlsx, n_csv, n_pdf, n_html, results, query, meta, notifications):
+def export_files(n_json, n_xlsx, n_csv, n_pdf, n_html, results, query, meta):
+    """Submete a exportação como job; poll_background_jobs entrega o arquivo."""
     if not results:
         raise PreventUpdate
     # Qual botão foi clicado
     if not callback_context.triggered:
         raise PreventUpdate
     btn_id = callback_context.triggered[0]['prop_id'].split('.')[0]
-    params = SimpleNamespace(
-        search=meta.get('search', 1),
-        approach=meta.get('approach', 3),
-        relevance=meta.get('relevance', 2),
-        order=meta.get('order', 1),
-    )
-    
-    updated_notifs = list(notifications or [])
-    export_type = {
-        'export-json': 'JSON',
-        'export-xlsx': 'Excel',
-        'export-csv': 'CSV',
-        'export-pdf': 'PDF',
-        'export-html': 'HTML'
-    }.get(btn_id, 'arquivo')
-    
-    try:
-        path = None
-        if btn_id == 'export-json':
-            path = export_results_json(results, query or '', params, OUTPUT_DIR)
-        elif btn_id == 'export-xlsx':
-            path = export_results_excel(results, query or '', params, OUTPUT_DIR)
-        elif btn_id == 'export-csv':
-            path = export_results_csv(results, query or '', params, OUTPUT_DIR)
-        elif btn_id == 'export-pdf':
-            path = export_results_pdf(results, query or '', params, OUTPUT_DIR)
-            if not path:
-                # ReportLab ausente
-                notif = add_note(NOTIF_ERROR, "Erro ao exportar PDF. Biblioteca ausente.")
-                updated_notifs.append(notif)
-                return dash.no_update, updated_notifs
-        elif btn_id == 'export-html':
-            path = export_results_html(results, query or '', params, OUTPUT_DIR)
+    fmt, export_type = _EXPORT_TYPES.get(btn_id, (None, 'arquivo'))
+    if not fmt:
+        raise PreventUpdate
+    job_id = submit_job(_job_scope(), 'export', _export_job, results, query or '', meta or {}, fmt)
+    return {'id': job_id, 'type': export_type}, False
+
+
+# Acompanha jobs de resumo e exportação; aplica resultados e desliga o Interval quando ocioso
+@app.callback(
+    Output('store-cache-resumo', 'data', allow_duplicate=True),
+    Output('store-panel-active', 'data', allow_duplicate=True),
+    Output('download-out', 'data'),
+    Output('store-export-job', 'data', allow_duplicate=True),
+    Output('store-notifications', 'data', allow_duplicate=True),
+    Output('job-poll-interval', 'disabled', allow_duplicate=True),
+    Input('job-poll-interval', 'n_intervals'),
+    State('store-cache-resumo', 'data'),
+    State('store-panel-active', 'data'),
+    State('store-export-job', 'data'),
+    State('store-notifications', 'data'),
+    prevent_initial_call=True,
+)
+def poll_background_jobs(_n, cache_resumo, active_map, export_job, notifications):
+    scope = _job_scope()
+    pending = False
+    new_notes = []
+    # Resumos
+    cache = store_get(cache_resumo, {}) or {}
+    cache_changed = False
+    for pid, entry in list(cache.items()):
+        if not isinstance(entry, dict) or not entry.get('job') or 'summary' in entry:
+            continue
+        snap = get_job(entry.get('job'), scope)
+        if snap is None:
+            cache[pid] = {'docs': entry.get('docs') or []}
+            cache_changed = True
+            continue
+        status = snap.get('status')
+        if status not in FINAL_STATUSES:
+            pending = True
+            continue
+        forget_job(entry.get('job'))
+        result = snap.get('result') or {}
+        summary_text = result.get('summary')
+        if status == STATUS_DONE and result.get('is_good'):
+            cache[pid] = {'docs': entry.get('docs') or [], 'summary': summary_text}
+            new_notes.append(add_note(NOTIF_SUCCESS, "Resumo gerado com sucesso!"))
         else:
-            raise PreventUpdate
-        
-        if path and os.path.exists(path):
-            # Sucesso na exportação
-            notif = add_note(NOTIF_SUCCESS, f"Arquivo {export_type} exportado com sucesso!")
-            updated_notifs.append(notif)
-            return dcc.send_file(path), updated_notifs
+            cache[pid] = {'docs': entry.get('docs') or [], 'error': 'Não foi possível gerar o resumo.'}
+            if status == STATUS_ERROR or (isinstance(summary_text, str) and summary_text.startswith('Erro')):
+                new_notes.append(add_note(NOTIF_ERROR, "Erro ao gerar resumo. Tente novamente."))
+        cache_changed = True
+    # Exportação
+    download = dash.no_update
+    export_out = dash.no_update
+    if isinstance(export_job, dict) and export_job.get('id'):
+        export_type = export_job.get('type') or 'arquivo'
+        snap = get_job(export_job.get('id'), scope)
+        if snap is not None and snap.get('status') not in FINAL_STATUSES:
+            pending = True
         else:
-            # Arquivo não foi criado
-            notif = add_note(NOTIF_ERROR, f"Erro ao exportar {export_type}. Tente novamente.")
-            updated_notifs.append(notif)
-            return dash.no_update, updated_notifs
-            
-    except Exception as e:
-        # Erro genérico na exportação
-        notif = add_note(NOTIF_ERROR, f"Erro ao exportar {export_type}. Verifique os dados.")
-        updated_notifs.append(notif)
-        return dash.no_update, updated_notifs
+            export_out = None
+            forget_job(export_job.get('id'))
+            result = (snap or {}).get('result') or {}
+            path = result.get('path')
+            if snap and snap.get('status') == STATUS_DONE and path and os.path.exists(path):
+                download = dcc.send_file(path)
+                new_notes.append(add_note(NOTIF_SUCCESS, f"Arquivo {export_type} exportado com sucesso!"))
+            elif result.get('error') == 'missing_lib':
+                new_notes.append(add_note(NOTIF_ERROR, "Erro ao exportar PDF. Biblioteca ausente."))
+            else:
+                new_notes.append(add_note(NOTIF_ERROR, f"Erro ao exportar {export_type}. Tente novamente."))
+    if not cache_changed and not new_notes and download is dash.no_update and export_out is dash.no_update:
+        if pending:
+            raise PreventUpdate
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, True
+    return (
+        store_put(cache, handle=cache_resumo, ns='resumo') if cache_changed else dash.no_update,
+        dict(active_map or {}) if cache_changed else dash.no_update,
+        download,
+        export_out,
+        (list(notifications or []) + new_notes) if new_notes else dash.no_update,
+        not pending,
+    )
 
 
 # =====================================================================================
@@ -14,11 +14,13 @@ import os
 import re
 import json
 import time
+import threading
 from typing import Dict, Any, List, Optional
 
 import numpy as np
 from dotenv import load_dotenv
 from gvg_debug import debug_log as dbg
+from gvg_budget import limit as budget_limit
 try:
 	from gvg_usage import _get_current_aggregator
 except Exception:  # fallback se circular
@@ -38,7 +40,10 @@ NEGATION_EMB_WEIGHT = float(os.getenv('NEGATION_EMB_WEIGHT', 1.0))
 # ======================================================
 
 _OPENAI_CLIENT = None
-_THREADS: Dict[str, Any] = {}
+# Threads OpenAI livres por contexto (reutilizadas entre threads do processo; limitadas)
+_THREADS: Dict[str, List[Any]] = {}
+_THREADS_LOCK = threading.Lock()
+_THREADS_IDLE_MAX = 8
 
 def ai_get_client():
 	"""Retorna singleton do cliente OpenAI (ou None se indisponível)."""
@@ -56,23 +61,39 @@ def ai_get_client():
 	return _OPENAI_CLIENT
 
 def ai_get_thread(context_key: str = "default"):
-	"""Retorna (ou cria) uma thread de Assistant por contexto lógico."""
+	"""Retira uma thread de Assistant livre do contexto lógico (ou cria uma).
+
+	Runs simultâneos na mesma thread OpenAI são rejeitados, então cada run usa uma
+	thread exclusiva e a devolve com ai_release_thread ao terminar. O total criado
+	acompanha a concorrência máxima (não o nº de threads que já passaram pelo pool).
+	"""
 	client = ai_get_client()
 	if client is None:
 		return None
-	thread = _THREADS.get(context_key)
+	with _THREADS_LOCK:
+		idle = _THREADS.get(context_key)
+		if idle:
+			return idle.pop()
+	try:
+		with budget_limit('openai'):
+			return client.beta.threads.create()
+	except Exception as e:
+		dbg('ASSISTANT', f"Create thread failed [{context_key}]: {e}")
+		return None
+
+def ai_release_thread(context_key: str, thread) -> None:
+	"""Devolve a thread ao contexto (só após run terminal; excedente é descartado)."""
 	if thread is None:
-		try:
-			thread = client.beta.threads.create()
-			_THREADS[context_key] = thread
-		except Exception as e:
-			dbg('ASSISTANT', f"Create thread failed [{context_key}]: {e}")
-			return None
-	return thread
+		return
+	with _THREADS_LOCK:
+		idle = _THREADS.setdefault(context_key, [])
+		if len(idle) < _THREADS_IDLE_MAX:
+			idle.append(thread)
 
 def _extract_assistant_text_from_messages(client, thread_id: str, limit: int = 10) -> str:
 	try:
-		msgs = client.beta.threads.messages.list(thread_id=thread_id, order='desc', limit=limit)
+		with budget_limit('openai'):
+			msgs = client.beta.threads.messages.list(thread_id=thread_id, order='desc', limit=limit)
 		for m in getattr(msgs, 'data', []):
 			if getattr(m, 'role', '') == 'assistant':
 				for p in getattr(m, 'content', []) or []:
@@ -99,10 +120,13 @@ def ai_assistant_run_text(assistant_id: str, content: str, context_key: str = 'd
 	t0 = time.time()
 	tokens_in = tokens_out = total_tokens = None
 	try:
-		client.beta.threads.messages.create(thread_id=thread.id, role='user', content=content)
-		run = client.beta.threads.runs.create(thread_id=thread.id, assistant_id=assistant_id)
+		with budget_limit('openai'):
+			client.beta.threads.messages.create(thread_id=thread.id, role='user', content=content)
+		with budget_limit('openai'):
+			run = client.beta.threads.runs.create(thread_id=thread.id, assistant_id=assistant_id)
 		while True:
-			cur = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
+			with budget_limit('openai'):
+				cur = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
 			status = getattr(cur, 'status', '')
 			if status in ('completed', 'failed', 'cancelled', 'expired', 'requires_action'):
 				run = cur
@@ -130,6 +154,9 @@ def ai_assistant_run_text(assistant_id: str, content: str, context_key: str = 'd
 		except Exception:
 			pass
 		dbg('IA', f"assistant.run func=ai_assistant_run_text feat={feature or ''} context={context_key} tokens_in={tokens_in} tokens_out={tokens_out} total={total_tokens} time_ms={elapsed_ms} in_len={len(content) if isinstance(content,str) else 'N/A'} out_len={len(out) if isinstance(out,str) else 'N/A'}")
+		# Timeout/erro/requires_action: a thread pode ter run ativo → não volta ao pool
+		if status != 'requires_action':
+			ai_release_thread(context_key, thread)
 		return out
 	except Exception as e:
 		elapsed_ms = int((time.time() - t0) * 1000)
@@ -155,7 +182,8 @@ def ai_assistant_run_with_files(assistant_id: str, file_paths: List[str], user_m
 		for p in file_paths or []:
 			try:
 				with open(p, 'rb') as f:
-					up = client.files.create(purpose='assistants', file=f)
+					with budget_limit('openai'):
+						up = client.files.create(purpose='assistants', file=f)
 					attachments.append({'file_id': up.id, 'tools': [{'type': 'file_search'}]})
 					try:
 						aggr = _get_current_aggregator()
@@ -168,11 +196,15 @@ def ai_assistant_run_with_files(assistant_id: str, file_paths: List[str], user_m
 			except Exception as e:
 				dbg('ASSISTANT', f"file.upload.error path={os.path.basename(p)} err={e}")
 		if not attachments:
+			ai_release_thread('documents', thread)
 			return ""
-		client.beta.threads.messages.create(thread_id=thread.id, role='user', content=[{"type": "text", "text": user_message}], attachments=attachments)  # type: ignore
-		run = client.beta.threads.runs.create(thread_id=thread.id, assistant_id=assistant_id)
+		with budget_limit('openai'):
+			client.beta.threads.messages.create(thread_id=thread.id, role='user', content=[{"type": "text", "text": user_message}], attachments=attachments)  # type: ignore
+		with budget_limit('openai'):
+			run = client.beta.threads.runs.create(thread_id=thread.id, assistant_id=assistant_id)
 		while True:
-			cur = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
+			with budget_limit('openai'):
+				cur = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
 			status = getattr(cur, 'status', '')
 			if status in ('completed', 'failed', 'cancelled', 'expired', 'requires_action'):
 				run = cur
@@ -198,6 +230,8 @@ def ai_assistant_run_with_files(assistant_id: str, file_paths: List[str], user_m
 		except Exception:
 			pass
 		dbg('IA', f"assistant.files func=ai_assistant_run_with_files feat={feature or ''} tokens_in={tokens_in} tokens_out={tokens_out} total={total_tokens} time_ms={elapsed_ms} files={len(file_paths or [])} msg_len={len(user_message) if isinstance(user_message,str) else 'N/A'} out_len={len(out) if isinstance(out,str) else 'N/A'}")
+		if status != 'requires_action':
+			ai_release_thread('documents', thread)
 		return out
 	except Exception as e:
 		elapsed_ms = int((time.time() - t0) * 1000)
@@ -211,7 +245,8 @@ def ai_chat_complete(model: str, messages: List[Dict[str, Any]], max_tokens: Opt
 		return ""
 	t0 = time.time()
 	try:
-		resp = client.chat.completions.create(model=model, messages=messages, max_tokens=max_tokens, temperature=temperature)
+		with budget_limit('openai'):
+			resp = client.chat.completions.create(model=model, messages=messages, max_tokens=max_tokens, temperature=temperature)
 		elapsed_ms = int((time.time() - t0) * 1000)
 		try:
 			usage = getattr(resp, 'usage', None)
@@ -244,7 +279,8 @@ def get_embedding(text, model=EMBEDDING_MODEL, feature: Optional[str] = None):
 		return None
 	t0 = time.time()
 	try:
-		response = client.embeddings.create(input=text, model=model)
+		with budget_limit('openai'):
+			response = client.embeddings.create(input=text, model=model)
 		elapsed_ms = int((time.time() - t0) * 1000)
 		# Nem todos os SDKs/planos retornam usage no embeddings
 		try:
@@ -265,6 +301,42 @@ def get_embedding(text, model=EMBEDDING_MODEL, feature: Optional[str] = None):
 		dbg('ASSISTANT', f"embedding.error func=get_embedding feat={feature or ''} model={model} err={e} time_ms={elapsed_ms}")
 		return None
 
+def get_embeddings_batch(texts: List[str], model=EMBEDDING_MODEL, batch_size: int = 64, feature: Optional[str] = None) -> List[Optional[List[float]]]:
+	"""Embeddings de vários textos em lotes (uma chamada por lote); None nas posições com erro."""
+	items = list(texts or [])
+	out: List[Optional[List[float]]] = [None] * len(items)
+	client = ai_get_client()
+	if client is None or not items:
+		return out
+	size = max(1, int(batch_size or 64))
+	for start in range(0, len(items), size):
+		batch = [(t or ' ') for t in items[start:start + size]]
+		t0 = time.time()
+		try:
+			with budget_limit('openai'):
+				response = client.embeddings.create(input=batch, model=model)
+			elapsed_ms = int((time.time() - t0) * 1000)
+			for pos, item in enumerate(getattr(response, 'data', None) or []):
+				idx = getattr(item, 'index', pos)
+				if 0 <= idx < len(batch):
+					out[start + idx] = item.embedding
+			try:
+				usage = getattr(response, 'usage', None)
+				tt = getattr(usage, 'total_tokens', None) if usage else None
+			except Exception:
+				tt = None
+			try:
+				aggr = _get_current_aggregator()
+				if aggr and tt:
+					aggr.add_tokens(tt, 0, tt)
+			except Exception:
+				pass
+			dbg('IA', f"embeddings func=get_embeddings_batch feat={feature or ''} model={model} batch={len(batch)} total_tokens={tt} time_ms={elapsed_ms}")
+		except Exception as e:
+			elapsed_ms = int((time.time() - t0) * 1000)
+			dbg('ASSISTANT', f"embedding.error func=get_embeddings_batch feat={feature or ''} model={model} batch={len(batch)} err={e} time_ms={elapsed_ms}")
+	return out
+
 def _normalize(vec: np.ndarray):
 	norm = np.linalg.norm(vec)
 	if norm == 0:
@@ -459,4 +531,4 @@ def generate_contratacao_label(descricao: str, timeout: float = 6.0, feature: Op
 		label = 'Indefinido'
 	return label
 
-__all__ = ['get_embedding','get_negation_embedding','generate_keywords','calculate_confidence','generate_contratacao_label']
+__all__ = ['get_embedding','get_embeddings_batch','get_negation_embedding','generate_keywords','calculate_confidence','generate_contratacao_label']
@@ -0,0 +1,373 @@
+"""
+gvg_archive.py
+Processamento de pacotes ZIP/RAR de editais: extração por entrada, conversão
+concorrente (limitada) para Markdown e upload concorrente.
+
+Objetivo:
+  Editais costumam vir em ZIPs com uma dúzia de anexos; converter e enviar um a
+  um deixava o resumo em minutos. Aqui:
+  • Entradas são priorizadas (provável documento principal primeiro: nome
+    "edital", "termo de referência", ...; depois PDF e tamanho).
+  • Cada entrada é extraída sob demanda (streaming) e convertida em paralelo
+    com no máximo GVG_ARCHIVE_WORKERS conversões simultâneas.
+  • Orçamentos totais de tempo (GVG_ARCHIVE_TIME_BUDGET, s) e de tamanho
+    descompactado (GVG_ARCHIVE_MAX_MB); o que estourar é pulado e reportado.
+  • Uploads dos Markdown por arquivo em paralelo.
+  • Latência por pacote (extração/conversão/upload) no log DOCS.
+
+Observações:
+  • A conversão usa gvg_documents.convert_document_to_markdown (pool Docling);
+    o paralelismo aqui só preenche os workers do pool. Cada conversão recebe o
+    tempo restante do orçamento como timeout do pool (worker estourado é reciclado).
+  • A pasta de extração só é removida depois que as conversões em andamento terminam.
+  • RAR: rarfile quando disponível; senão 7-Zip extrai tudo de uma vez.
+"""
+from __future__ import annotations
+
+import os
+import re
+import time
+import shutil
+import zipfile
+import tempfile
+import subprocess
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from gvg_debug import debug_log as dbg  # type: ignore
+except Exception:  # pragma: no cover
+    def dbg(*_a, **_k):
+        pass
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.doc', '.pptx', '.xlsx', '.xls', '.csv', '.txt', '.md')
+ARCHIVE_WORKERS = max(1, _env_int('GVG_ARCHIVE_WORKERS', _env_int('GVG_DOCLING_WORKERS', 2)))
+ARCHIVE_TIME_BUDGET = max(10, _env_int('GVG_ARCHIVE_TIME_BUDGET', 300))
+ARCHIVE_MAX_BYTES = max(1, _env_int('GVG_ARCHIVE_MAX_MB', 200)) * 1024 * 1024
+ARCHIVE_UPLOAD_WORKERS = 4
+
+# Nomes típicos do documento principal (comparação sem acento, minúsculas)
+_MAIN_DOC_PATTERNS = (
+    (r'edital', 50),
+    (r'termo[\s_-]*de[\s_-]*referencia|(^|[^a-z])tr([^a-z]|$)', 40),
+    (r'projeto[\s_-]*basico', 35),
+    (r'aviso', 20),
+    (r'minuta', 10),
+)
+_LOW_PRIORITY_PATTERNS = (r'planilha', r'modelo', r'declarac', r'anexo[\s_-]*[ivx\d]+')
+
+
+# =====================
+# Priorização
+# =====================
+def _fold(text: str) -> str:
+    t = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in t if not unicodedata.combining(c)).lower()
+
+
+def entry_priority(name: str, size: int) -> float:
+    """Pontuação do provável documento principal (maior = processar antes)."""
+    base = _fold(os.path.basename(name))
+    score = 0.0
+    for pat, pts in _MAIN_DOC_PATTERNS:
+        if re.search(pat, base):
+            score = max(score, float(pts))
+    for pat in _LOW_PRIORITY_PATTERNS:
+        if re.search(pat, base):
+            score -= 15.0
+    if base.endswith('.pdf'):
+        score += 10.0
+    elif base.endswith(('.docx', '.doc')):
+        score += 5.0
+    # Desempate por tamanho (1 ponto por MB, até 10)
+    score += min(10.0, (size or 0) / (1024 * 1024))
+    return score
+
+
+def _is_supported(name: str) -> bool:
+    if not name or name.endswith('/') or name.startswith('__MACOSX/'):
+        return False
+    return os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS
+
+
+# =====================
+# Extração em streaming
+# =====================
+def _new_extract_dir(kind: str) -> str:
+    return tempfile.mkdtemp(prefix=f"{kind}_extract_{datetime.now().strftime('%Y%m%d_%H%M%S')}_")
+
+
+def _budgeted(items, max_bytes: int, skipped: List[Dict[str, Any]]) -> Iterator[Tuple[str, int, float, Callable[[], str]]]:
+    """Ordena (nome, tamanho, extrair) por prioridade e aplica o orçamento de bytes."""
+    used = 0
+    for name, size, extract in sorted(items, key=lambda t: entry_priority(t[0], t[1]), reverse=True):
+        if used + size > max_bytes:
+            skipped.append({'name': os.path.basename(name), 'size': size, 'reason': 'orçamento de tamanho'})
+            continue
+        used += size
+        yield os.path.basename(name), size, entry_priority(name, size), extract
+
+
+def iter_archive_entries(archive_path: str, kind: str, extract_dir: str,
+                         max_bytes: int = ARCHIVE_MAX_BYTES,
+                         skipped: Optional[List[Dict[str, Any]]] = None) -> Iterator[Tuple[str, int, float, Callable[[], str]]]:
+    """Gera (nome, tamanho, prioridade, extrair) em ordem de prioridade.
+
+    `extrair()` descompacta só aquela entrada e devolve o caminho (streaming).
+    Entradas além do orçamento de bytes vão para `skipped`.
+    """
+    skipped = skipped if skipped is not None else []
+
+    if kind == 'zip':
+        with zipfile.ZipFile(archive_path, 'r') as zf:
+            infos = [i for i in zf.infolist() if not i.is_dir() and _is_supported(i.filename)]
+            yield from _budgeted([(i.filename, i.file_size, (lambda i=i: zf.extract(i, extract_dir))) for i in infos], max_bytes, skipped)
+        return
+    if kind == 'rar':
+        rf = None
+        try:
+            import rarfile  # type: ignore
+            rf = rarfile.RarFile(archive_path)
+        except Exception as e:
+            dbg('DOCS', f"[RAR] rarfile indisponível/erro: {e}")
+        if rf is not None:
+            def _rar_extract(info) -> str:
+                rf.extract(info, extract_dir)
+                return os.path.join(extract_dir, info.filename)
+            infos = [i for i in rf.infolist() if not i.isdir() and _is_supported(i.filename)]
+            yield from _budgeted([(i.filename, i.file_size, (lambda i=i: _rar_extract(i))) for i in infos], max_bytes, skipped)
+            return
+        # Fallback 7-Zip: extrai tudo de uma vez e segue a mesma ordenação
+        from gvg_documents import _discover_7z_exe  # type: ignore
+        seven = _discover_7z_exe()
+        if not seven:
+            raise RuntimeError("RAR: 'rarfile' indisponível e 7-Zip não encontrado.")
+        proc = subprocess.run([seven, 'x', '-y', f"-o{extract_dir}", archive_path], capture_output=True, text=True, timeout=120)
+        if proc.returncode != 0:
+            err = proc.stderr.strip() or proc.stdout.strip()
+            raise RuntimeError(f"Erro 7-Zip ao extrair RAR: {err[:200]}")
+        found = []
+        for root, _, fnames in os.walk(extract_dir):
+            for fn in fnames:
+                if _is_supported(fn):
+                    p = os.path.join(root, fn)
+                    found.append((fn, os.path.getsize(p), (lambda p=p: p)))
+        yield from _budgeted(found, max_bytes, skipped)
+        return
+    raise ValueError(f"tipo de pacote não suportado: {kind}")
+
+
+# =====================
+# Conversão concorrente
+# =====================
+def convert_archive(archive_path: str, kind: str,
+                    convert_fn: Optional[Callable[..., Tuple[bool, Optional[str], Optional[str]]]] = None,
+                    workers: int = ARCHIVE_WORKERS, time_budget: int = ARCHIVE_TIME_BUDGET,
+                    max_bytes: int = ARCHIVE_MAX_BYTES) -> Dict[str, Any]:
+    """Extrai e converte as entradas do pacote com paralelismo limitado.
+
+    Retorna {'files': [...em ordem de prioridade...], 'skipped': [...], 'stats': {...}}.
+    Cada arquivo: name, size, priority, ok, markdown, error, ms, tier
+    (camada da conversão quando usa o conversor padrão; None caso contrário).
+    """
+    extract_dir = _new_extract_dir(kind)
+    skipped: List[Dict[str, Any]] = []
+    try:
+        entries = iter_archive_entries(archive_path, kind, extract_dir, max_bytes=max_bytes, skipped=skipped)
+        return _convert_entries(entries, skipped, kind, convert_fn, workers, time_budget)
+    finally:
+        # _convert_entries só retorna quando nenhuma conversão lê mais os arquivos extraídos
+        shutil.rmtree(extract_dir, ignore_errors=True)
+
+
+def convert_extracted_files(paths: List[Tuple[str, str]], kind: str,
+                            convert_fn: Optional[Callable[..., Tuple[bool, Optional[str], Optional[str]]]] = None,
+                            workers: int = ARCHIVE_WORKERS, time_budget: int = ARCHIVE_TIME_BUDGET,
+                            max_bytes: int = ARCHIVE_MAX_BYTES) -> Dict[str, Any]:
+    """Como convert_archive, para arquivos já extraídos [(caminho, nome)] (sem nova extração).
+
+    Os arquivos continuam do chamador (não são removidos aqui).
+    """
+    skipped: List[Dict[str, Any]] = []
+    items = []
+    for path, name in paths or []:
+        try:
+            items.append((name, os.path.getsize(path), (lambda p=path: p)))
+        except OSError as e:
+            skipped.append({'name': os.path.basename(name), 'size': 0, 'reason': f'arquivo: {e}'})
+    return _convert_entries(_budgeted(items, max_bytes, skipped), skipped, kind, convert_fn, workers, time_budget)
+
+
+def _convert_entries(entries: Iterator[Tuple[str, int, float, Callable[[], str]]], skipped: List[Dict[str, Any]],
+                     kind: str, convert_fn, workers: int, time_budget: int) -> Dict[str, Any]:
+    """Converte as entradas (já priorizadas) com no máximo `workers` conversões em voo.
+
+    Com o conversor padrão, cada conversão recebe o tempo restante do orçamento como
+    timeout do pool Docling (o worker estourado é reciclado e liberado). Só retorna
+    depois que todas as conversões iniciadas terminaram: quem chama pode remover os arquivos.
+    """
+    with_tier = convert_fn is None
+    if convert_fn is None:
+        from gvg_documents import convert_document_to_markdown as convert_fn  # type: ignore
+    t0 = time.time()
+    deadline = t0 + max(1, int(time_budget))
+    files: List[Dict[str, Any]] = []
+    extract_ms = 0
+
+    def _run(path: str, name: str) -> Dict[str, Any]:
+        t1 = time.time()
+        info: Dict[str, Any] = {}
+        try:
+            if with_tier:
+                remaining = max(1, int(deadline - time.time()))
+                ok, md, err = convert_fn(path, name, conv_info=info, timeout=remaining)
+            else:
+                ok, md, err = convert_fn(path, name)
+        except Exception as e:
+            ok, md, err = False, None, str(e)
+        return {'ok': bool(ok and isinstance(md, str)), 'markdown': md if ok else None, 'error': None if ok else err,
+                'ms': int((time.time() - t1) * 1000), 'tier': info.get('tier')}
+
+    pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix='gvg-archive')
+    futures: Dict[Any, Dict[str, Any]] = {}
+    try:
+        inflight = set()
+        while True:
+            if time.time() >= deadline:
+                for name, size, _prio, _extract in entries:
+                    skipped.append({'name': name, 'size': size, 'reason': 'orçamento de tempo'})
+                break
+            # Mantém no máximo `workers` conversões em voo; só extrai a próxima quando há vaga
+            if len(inflight) >= max(1, int(workers)):
+                _done, inflight = wait(inflight, timeout=max(0.1, deadline - time.time()), return_when=FIRST_COMPLETED)
+                continue
+            try:
+                name, size, prio, extract = next(entries)
+            except StopIteration:
+                break
+            te = time.time()
+            try:
+                path = extract()
+            except Exception as e:
+                skipped.append({'name': name, 'size': size, 'reason': f'extração: {e}'})
+                continue
+            finally:
+                extract_ms += int((time.time() - te) * 1000)
+            rec = {'path': path, 'name': name, 'size': size, 'priority': prio, 'ok': False, 'markdown': None, 'error': None, 'ms': 0, 'tier': None}
+            files.append(rec)
+            fut = pool.submit(_run, path, name)
+            futures[fut] = rec
+            inflight.add(fut)
+        wait(inflight, timeout=max(0.0, deadline - time.time()))
+        # Congela o resultado no prazo: só entra o que terminou; conclusões tardias são ignoradas
+        for fut, rec in futures.items():
+            if fut.done() and not fut.cancelled():
+                rec.update(fut.result())
+            else:
+                rec['error'] = 'orçamento de tempo esgotado'
+    finally:
+        # Descarta as pendentes e espera as em andamento (limitadas pelo timeout do pool)
+        # antes de devolver: os arquivos só podem ser removidos quando ninguém mais os lê
+        pool.shutdown(wait=True, cancel_futures=True)
+    total_ms = int((time.time() - t0) * 1000)
+    ok_n = sum(1 for r in files if r['ok'])
+    stats = {
+        'kind': kind, 'files': len(files), 'ok': ok_n, 'skipped': len(skipped),
+        'extract_ms': extract_ms, 'convert_ms_sum': sum(r['ms'] for r in files), 'total_ms': total_ms,
+        'workers': int(workers),
+    }
+    dbg('DOCS', f"archive {kind} files={len(files)} ok={ok_n} skipped={len(skipped)} extract_ms={extract_ms} "
+                f"convert_ms_sum={stats['convert_ms_sum']} total_ms={total_ms}")
+    return {'files': files, 'skipped': skipped, 'stats': stats}
+
+
+# =====================
+# Upload concorrente
+# =====================
+def upload_archive_markdowns(files: List[Dict[str, Any]], pncp_raw: Optional[str], uid: Optional[str],
+                             doc_url: Optional[str] = None) -> Dict[str, Any]:
+    """Envia o Markdown de cada arquivo convertido (DOCUMENTS/PNCP_<id>_DOC<n>.md) em paralelo."""
+    from gvg_database import storage_put_text, upsert_user_document  # type: ignore
+    from gvg_documents import _sanitize_pncp_id, _infer_doc_type  # type: ignore
+    t0 = time.time()
+    pncp_key = _sanitize_pncp_id(str(pncp_raw)) if pncp_raw else None
+    if not pncp_key:
+        return {'uploaded': 0, 'ms': 0}
+    jobs = []
+    n = 0
+    for rec in files:
+        if rec.get('ok') and isinstance(rec.get('markdown'), str) and rec['markdown'].strip():
+            n += 1
+            jobs.append((n, rec))
+
+    def _up(item) -> bool:
+        seq, rec = item
+        key = f"DOCUMENTS/PNCP_{pncp_key}_DOC{seq}.md"
+        try:
+            ok, public_url, size_bytes = storage_put_text('govgo', key, rec['markdown'])
+            dbg('DOCS', f"upload file ok={ok} key='{key}' size={size_bytes} url='{public_url}' pncp_raw='{pncp_raw}' pncp_key='{pncp_key}'")
+            if ok and public_url and uid and pncp_raw:
+                doc_type = _infer_doc_type(rec['name'], doc_url, default=None)
+                ok_db = upsert_user_document(str(uid), str(pncp_raw), rec['name'], doc_type, public_url, size_bytes)
+                dbg('DOCS', f"db insert user_documents ok={ok_db} uid={uid} pncp_raw='{pncp_raw}' name='{rec['name']}'")
+            return bool(ok)
+        except Exception as e:
+            dbg('DOCS', f"upload/db erro arquivo='{rec.get('name')}' err={e}")
+            return False
+
+    uploaded = 0
+    if jobs:
+        with ThreadPoolExecutor(max_workers=min(ARCHIVE_UPLOAD_WORKERS, len(jobs)), thread_name_prefix='gvg-upload') as pool:
+            uploaded = sum(1 for ok in pool.map(_up, jobs) if ok)
+    ms = int((time.time() - t0) * 1000)
+    dbg('DOCS', f"archive upload files={len(jobs)} ok={uploaded} ms={ms}")
+    return {'uploaded': uploaded, 'ms': ms}
+
+
+def build_archive_markdown(final_filename: str, kind_label: str, result: Dict[str, Any]) -> str:
+    """Markdown consolidado (documento principal primeiro) no formato já usado pelo resumo."""
+    files = result.get('files') or []
+    out = f"# Documento PNCP: {final_filename} ({kind_label} com múltiplos arquivos)\n\n"
+    out += f"**Arquivo original:** `{final_filename}`  \n"
+    out += f"**Processado em:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}  \n"
+    out += "**Ferramenta:** Docling SUPER OTIMIZADO (PyPdfium + TableFormer FAST) + OpenAI GPT-4o  \n"
+    out += f"**Arquivos extraídos:** {len(files)}  \n\n"
+    out += "---\n\n"
+    for rec in files:
+        size_mb = (rec.get('size') or 0) / (1024 * 1024)
+        if rec.get('ok'):
+            out += f"## 📄 Arquivo: {rec['name']}\n\n"
+            out += f"**Tamanho:** {size_mb:.2f} MB  \n"
+            out += "**Status:** ✅ Processado com sucesso  \n\n"
+            out += "### Conteúdo:\n\n"
+            out += rec['markdown']
+            out += "\n\n---\n\n"
+        else:
+            out += f"## ❌ Arquivo: {rec['name']}\n\n"
+            out += f"**Tamanho:** {size_mb:.2f} MB  \n"
+            out += "**Status:** ❌ Erro no processamento  \n"
+            out += f"**Erro:** {rec.get('error')}  \n\n"
+            out += "---\n\n"
+    skipped = result.get('skipped') or []
+    if skipped:
+        out += "## ⏭️ Arquivos não processados\n\n"
+        for sk in skipped:
+            out += f"- {sk.get('name')} ({(sk.get('size') or 0) / (1024 * 1024):.2f} MB): {sk.get('reason')}\n"
+        out += "\n---\n\n"
+    return out
+
+
+__all__ = [
+    'SUPPORTED_EXTENSIONS', 'entry_priority', 'iter_archive_entries',
+    'convert_archive', 'convert_extracted_files', 'upload_archive_markdowns', 'build_archive_markdown',
+]
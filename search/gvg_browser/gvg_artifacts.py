@@ -0,0 +1,287 @@
+"""
+gvg_artifacts.py
+Cache global (entre usuários) de artefatos de documentos: Markdown convertido e resumos.
+
+Objetivo:
+  Quando dois usuários resumem o mesmo edital, reaproveitar download, conversão
+  Docling e chamada ao Assistant. Os registros por usuário (user_documents /
+  user_resumos) apenas referenciam o artefato compartilhado.
+
+Chaves:
+  • Primária: SHA-256 dos bytes baixados (public.doc_artifact).
+  • Secundária: URL do documento → SHA (public.doc_artifact_url); permite pular
+    inclusive o download.
+  • Resumo: (sha256, variante) em public.doc_artifact_summary; a variante combina
+    assistant/modelo, versão do prompt, max_tokens, modo (md|files) e o hash do
+    contexto PNCP do prompt. O Markdown é compartilhado entre contratações; o
+    resumo só é reaproveitado para o mesmo contexto (mesma contratação).
+
+Armazenamento do Markdown:
+  GVG_ARTIFACT_STORE=supabase (padrão) → bucket govgo, prefixo ARTIFACTS/
+  GVG_ARTIFACT_STORE=local             → diretório GVG_ARTIFACT_PATH
+  GVG_ARTIFACT_CACHE=false desliga o cache.
+
+Observações:
+  • Tabelas em db/migrations/20261019_doc_artifacts.sql. Sem as tabelas, todas as
+    funções devolvem None/False e o fluxo segue sem cache.
+"""
+from __future__ import annotations
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from gvg_database import (
+    db_fetch_one,
+    db_execute,
+    storage_put_text,
+    storage_download,
+)
+
+try:
+    from gvg_debug import debug_log as dbg  # type: ignore
+except Exception:  # pragma: no cover
+    def dbg(*_a, **_k):
+        pass
+
+
+ARTIFACT_CACHE_ENABLED = (os.getenv('GVG_ARTIFACT_CACHE', 'true') or '').strip().lower() in ('1', 'true', 'yes', 'on')
+ARTIFACT_STORE = (os.getenv('GVG_ARTIFACT_STORE', 'supabase') or 'supabase').strip().lower()
+ARTIFACT_BUCKET = 'govgo'
+ARTIFACT_PREFIX = 'ARTIFACTS'
+ARTIFACT_PATH = os.getenv('GVG_ARTIFACT_PATH') or str(Path(os.getenv('BASE_PATH') or (Path(__file__).resolve().parents[2] / 'data')) / 'artifacts')
+# Incrementar quando o prompt/contexto do resumo mudar (invalida resumos antigos)
+SUMMARY_PROMPT_VERSION = 'v1'
+
+_MEMO_MAX = 2048
+_URL_MEMO: "OrderedDict[str, str]" = OrderedDict()
+_MEMO_LOCK = threading.Lock()
+
+
+# =====================
+# Chaves
+# =====================
+def sha256_file(path: str) -> Optional[str]:
+    try:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        return h.hexdigest()
+    except Exception:
+        return None
+
+
+def summary_variant(max_tokens: Any, mode: str = 'md', context: str = '') -> str:
+    """Identificador da variante de resumo (assistant, versão do prompt, max_tokens, modo, contexto).
+
+    `context` é o bloco de contexto PNCP enviado no prompt; entra como hash para que o
+    mesmo arquivo anexado a outra contratação não receba o resumo da primeira.
+    """
+    assistant = os.getenv('GVG_SUMMARY_DOCUMENT_v1') or 'na'
+    ctx = hashlib.sha256((context or '').encode('utf-8')).hexdigest()[:16]
+    return f"{assistant}|{SUMMARY_PROMPT_VERSION}|{max_tokens or 0}|{mode}|{ctx}"
+
+
+def _markdown_key(sha: str) -> str:
+    return f"{ARTIFACT_PREFIX}/{sha[:2]}/{sha}.md"
+
+
+def _memo_url(url: str, sha: Optional[str] = None) -> Optional[str]:
+    with _MEMO_LOCK:
+        if sha is None:
+            val = _URL_MEMO.get(url)
+            if val is not None:
+                _URL_MEMO.move_to_end(url)
+            return val
+        _URL_MEMO[url] = sha
+        _URL_MEMO.move_to_end(url)
+        while len(_URL_MEMO) > _MEMO_MAX:
+            _URL_MEMO.popitem(last=False)
+        return sha
+
+
+# =====================
+# Consulta
+# =====================
+_ARTIFACT_COLS = "sha256, filename, size_bytes, markdown_key, markdown_url, markdown_chars"
+
+
+def artifact_lookup(sha: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not ARTIFACT_CACHE_ENABLED or not sha:
+        return None
+    try:
+        row = db_fetch_one(
+            f"SELECT {_ARTIFACT_COLS} FROM public.doc_artifact WHERE sha256 = %s",
+            (sha,), as_dict=True, ctx="ART.lookup",
+        )
+        return dict(row) if row else None
+    except Exception as e:
+        dbg('DOCS', f"artifact lookup erro: {e}")
+        return None
+
+
+def artifact_lookup_by_url(url: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not ARTIFACT_CACHE_ENABLED or not url:
+        return None
+    sha = _memo_url(url)
+    if sha:
+        return artifact_lookup(sha)
+    try:
+        row = db_fetch_one(
+            "SELECT a.sha256, a.filename, a.size_bytes, a.markdown_key, a.markdown_url, a.markdown_chars "
+            "FROM public.doc_artifact_url u JOIN public.doc_artifact a ON a.sha256 = u.sha256 WHERE u.url = %s",
+            (url,), as_dict=True, ctx="ART.lookup_url",
+        )
+    except Exception as e:
+        dbg('DOCS', f"artifact lookup_url erro: {e}")
+        return None
+    if not row:
+        return None
+    _memo_url(url, row['sha256'])
+    return dict(row)
+
+
+def artifact_get_markdown(art: Optional[Dict[str, Any]]) -> Optional[str]:
+    key = (art or {}).get('markdown_key')
+    if not key:
+        return None
+    try:
+        if ARTIFACT_STORE == 'local':
+            p = Path(ARTIFACT_PATH) / key
+            return p.read_text(encoding='utf-8') if p.exists() else None
+        ok, data, _err = storage_download(ARTIFACT_BUCKET, key)
+        if ok and data:
+            return data.decode('utf-8-sig', errors='replace')
+    except Exception as e:
+        dbg('DOCS', f"artifact markdown leitura erro: {e}")
+    return None
+
+
+def artifact_get_summary(sha: Optional[str], variant: str) -> Optional[str]:
+    if not ARTIFACT_CACHE_ENABLED or not sha:
+        return None
+    try:
+        row = db_fetch_one(
+            "SELECT summary_md FROM public.doc_artifact_summary WHERE sha256 = %s AND variant = %s",
+            (sha, variant), as_dict=False, ctx="ART.get_summary",
+        )
+        return row[0] if row and row[0] else None
+    except Exception as e:
+        dbg('DOCS', f"artifact resumo leitura erro: {e}")
+        return None
+
+
+def artifact_touch(sha: Optional[str]) -> None:
+    if not ARTIFACT_CACHE_ENABLED or not sha:
+        return
+    try:
+        db_execute(
+            "UPDATE public.doc_artifact SET hits = hits + 1, last_hit_at = now() WHERE sha256 = %s",
+            (sha,), ctx="ART.touch",
+        )
+    except Exception:
+        pass
+
+
+# =====================
+# Gravação
+# =====================
+def artifact_register(sha: Optional[str], url: Optional[str], filename: Optional[str], size_bytes: Optional[int]) -> bool:
+    """Garante o registro do artefato e o vínculo URL → SHA."""
+    if not ARTIFACT_CACHE_ENABLED or not sha:
+        return False
+    try:
+        db_execute(
+            """
+            INSERT INTO public.doc_artifact (sha256, filename, size_bytes)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (sha256) DO NOTHING
+            """,
+            (sha, filename, int(size_bytes or 0)), ctx="ART.register",
+        )
+        if url:
+            db_execute(
+                """
+                INSERT INTO public.doc_artifact_url (url, sha256) VALUES (%s, %s)
+                ON CONFLICT (url) DO UPDATE SET sha256 = EXCLUDED.sha256
+                """,
+                (url, sha), ctx="ART.register_url",
+            )
+            _memo_url(url, sha)
+        return True
+    except Exception as e:
+        dbg('DOCS', f"artifact register erro: {e}")
+        return False
+
+
+def artifact_put_markdown(sha: Optional[str], markdown: Optional[str],
+                          conversion: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """Grava o Markdown compartilhado e devolve sua URL (ou caminho local).
+
+    `conversion` (conv_info de convert_document_to_markdown) registra camada e tempo no artefato.
+    """
+    if not ARTIFACT_CACHE_ENABLED or not sha or not isinstance(markdown, str) or not markdown.strip():
+        return None
+    key = _markdown_key(sha)
+    url: Optional[str] = None
+    try:
+        if ARTIFACT_STORE == 'local':
+            p = Path(ARTIFACT_PATH) / key
+            p.parent.mkdir(parents=True, exist_ok=True)
+            p.write_text(markdown, encoding='utf-8')
+            url = str(p)
+        else:
+            ok, url, _size = storage_put_text(ARTIFACT_BUCKET, key, markdown, upsert=True)
+            if not ok:
+                return None
+        db_execute(
+            """
+            UPDATE public.doc_artifact
+               SET markdown_key = %s, markdown_url = %s, markdown_chars = %s,
+                   convert_tier = COALESCE(%s, convert_tier), convert_ms = COALESCE(%s, convert_ms)
+             WHERE sha256 = %s
+            """,
+            (key, url, len(markdown), (conversion or {}).get('tier'), (conversion or {}).get('ms'), sha),
+            ctx="ART.put_markdown",
+        )
+        return url
+    except Exception as e:
+        dbg('DOCS', f"artifact markdown gravação erro: {e}")
+        return None
+
+
+def artifact_put_summary(sha: Optional[str], variant: str, summary: Optional[str]) -> bool:
+    if not ARTIFACT_CACHE_ENABLED or not sha or not is_cacheable_summary(summary):
+        return False
+    try:
+        db_execute(
+            """
+            INSERT INTO public.doc_artifact_summary (sha256, variant, summary_md)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (sha256, variant) DO UPDATE SET summary_md = EXCLUDED.summary_md, created_at = now()
+            """,
+            (sha, variant, summary), ctx="ART.put_summary",
+        )
+        return True
+    except Exception as e:
+        dbg('DOCS', f"artifact resumo gravação erro: {e}")
+        return False
+
+
+def is_cacheable_summary(text: Optional[str]) -> bool:
+    """Não compartilhar mensagens de erro/fallback como se fossem resumos."""
+    if not isinstance(text, str) or not text.strip():
+        return False
+    t = text.strip().lower()
+    return not (t.startswith('erro') or t.startswith('openai/assistant não configurado'))
+
+
+__all__ = [
+    'ARTIFACT_CACHE_ENABLED', 'sha256_file', 'summary_variant', 'is_cacheable_summary',
+    'artifact_lookup', 'artifact_lookup_by_url', 'artifact_get_markdown', 'artifact_get_summary', 'artifact_touch',
+    'artifact_register', 'artifact_put_markdown', 'artifact_put_summary',
+]
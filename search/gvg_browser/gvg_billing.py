@@ -58,6 +58,7 @@ if STRIPE_AVAILABLE:
 
 from gvg_database import db_fetch_all, db_fetch_one, db_execute  # type: ignore
 from gvg_debug import debug_log as dbg  # type: ignore
+from gvg_limits import invalidate_user_plan, get_usage_status  # type: ignore
 
 # Cache de planos do CSV (carregado uma vez)
 _PLANS_FALLBACK_CACHE = None
@@ -268,6 +269,7 @@ def finalize_upgrade_mock(user_id: str, plan_code: str) -> Dict[str, Any]:
 	if affected == 0:
 		# tentativa de insert se não existir
 		db_execute("INSERT INTO public.user_settings (user_id, plan_id) VALUES (%s, %s) ON CONFLICT (user_id) DO UPDATE SET plan_id = EXCLUDED.plan_id", (user_id, plan_id), ctx="BILLING.ins_plan")
+	invalidate_user_plan(user_id)
 	dbg('BILL', f"upgrade_mock uid={user_id} plan={plan_code}")
 	return get_user_settings(user_id)
 
@@ -275,37 +277,10 @@ def finalize_upgrade_mock(user_id: str, plan_code: str) -> Dict[str, Any]:
 # =============================
 # Snapshot de Uso
 # =============================
-def _count_event_today(user_id: str, event_type: str) -> int:
-	sql = """
-	SELECT COUNT(*) FROM public.user_usage_events
-	 WHERE user_id = %s AND event_type = %s AND created_at_date = current_date
-	"""
-	row = db_fetch_one(sql, (user_id, event_type), ctx="BILLING.count_event")
-	if not row:
-		return 0
-	if isinstance(row, dict):
-		return int(list(row.values())[0])
-	return int(row[0])
-
-
-def _count_favoritos(user_id: str) -> int:
-	sql = "SELECT COUNT(*) FROM public.user_bookmarks WHERE user_id = %s AND active = true"
-	row = db_fetch_one(sql, (user_id,), ctx="BILLING.count_fav")
-	if not row:
-		return 0
-	if isinstance(row, dict):
-		return int(list(row.values())[0])
-	return int(row[0])
-
-
 def get_usage_snapshot(user_id: str) -> Dict[str, Any]:
 	settings = get_user_settings(user_id)
-	usage = {
-		'consultas': _count_event_today(user_id, 'query'),
-		'resumos': _count_event_today(user_id, 'summary_success'),
-		'boletim_run': _count_event_today(user_id, 'boletim_run'),
-		'favoritos': _count_favoritos(user_id),
-	}
+	# Uso do dia em uma consulta (contadores diários + favoritos) via motor de cotas
+	usage = {tipo: st.get('used', 0) for tipo, st in get_usage_status(user_id).items()}
 	return {
 		'user_id': user_id,
 		'plan_code': settings['plan_code'],
@@ -353,6 +328,8 @@ def ensure_user_settings(user_id: str) -> bool:
 	affected = 0
 	try:
 		affected = db_execute(sql, (user_id, free_id), ctx="BILLING.ensure_user_settings")
+		if affected:
+			invalidate_user_plan(user_id)
 		try:
 			dbg('BILL', f"ensure_user_settings uid={user_id} affected={affected}")
 		except Exception:
@@ -391,6 +368,7 @@ def upgrade_plan(user_id: str, target_plan_code: str, gateway_customer_id: Optio
 			"gateway_subscription_id = COALESCE(EXCLUDED.gateway_subscription_id, user_settings.gateway_subscription_id)"
 		)
 		db_execute(sql_ins, (user_id, pid, gateway_customer_id, gateway_subscription_id), ctx="BILLING.upgrade_plan.ins")
+	invalidate_user_plan(user_id)
 	return get_user_settings(user_id)
 
 def schedule_downgrade(user_id: str, target_plan_code: str) -> Dict[str, Any]:
@@ -415,6 +393,7 @@ def apply_scheduled_plan_changes(user_id: str) -> Dict[str, Any]:
 	if not next_pid:
 		return {'status': 'nothing_to_apply'}
 	db_execute("UPDATE public.user_settings SET plan_id = next_plan_id, next_plan_id = NULL WHERE user_id = %s", (user_id,), ctx="BILLING.apply_sched_upd")
+	invalidate_user_plan(user_id)
 	return get_user_settings(user_id)
 
 def get_plan_map() -> Dict[str, int]:
@@ -659,6 +638,8 @@ def handle_webhook_event(event: Dict[str, Any]) -> Dict[str, Any]:
 				"gateway_subscription_id = NULL WHERE gateway_subscription_id = %s"
 			)
 			db_execute(sql, (subscription_id,), ctx="BILLING.cancel_subscription")
+			# Usuário identificado só pela assinatura: descartar todas as visões de cota
+			invalidate_user_plan(None)
 			try:
 				dbg('BILL', f"[webhook.canceled] assinatura cancelada sub={subscription_id}")
 			except Exception:
@@ -8,10 +8,9 @@ Observações:
 """
 from __future__ import annotations
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import json
 from datetime import datetime, timezone
-import time
 
 try:
     from search.gvg_browser.gvg_user import get_current_user  # type: ignore
@@ -29,27 +28,26 @@ except Exception:
         from gvg_database import db_fetch_all, db_fetch_one, db_execute, db_execute_many, db_execute_returning_one  # type: ignore
         from gvg_debug import debug_log as dbg  # type: ignore
 
+try:
+    from search.gvg_browser.gvg_cache import cache_get, cache_set, cache_invalidate  # type: ignore
+except Exception:
+    try:
+        from .gvg_cache import cache_get, cache_set, cache_invalidate  # type: ignore
+    except Exception:
+        from gvg_cache import cache_get, cache_set, cache_invalidate  # type: ignore
+
 
-# Cache leve em memória para listas de boletins por usuário
-_BOLETIM_CACHE: Dict[str, Dict[str, Any]] = {}
+# Cache leve para listas de boletins por usuário (gvg_cache, namespace 'boletim')
 _TTL_BOLETIM_SECONDS = 300  # 5 minutos
 
 def _cache_get(key: str):
-    ent = _BOLETIM_CACHE.get(key)
-    if not ent:
-        return None
-    if ent.get('expires', 0) > time.time():
-        return ent.get('value')
-    _BOLETIM_CACHE.pop(key, None)
-    return None
+    return cache_get('boletim', key)
 
 def _cache_set(key: str, value: Any, ttl: int = _TTL_BOLETIM_SECONDS):
-    _BOLETIM_CACHE[key] = {'value': value, 'expires': time.time() + ttl}
+    cache_set('boletim', key, value, ttl)
 
 def _cache_invalidate_prefix(prefix: str):
-    for k in list(_BOLETIM_CACHE.keys()):
-        if str(k).startswith(prefix):
-            _BOLETIM_CACHE.pop(k, None)
+    cache_invalidate('boletim', prefix)
 
 def fetch_user_boletins() -> List[Dict[str, Any]]:
     """Retorna boletins ATIVOS do usuário atual com campos para UI (inclui filters quando existir)."""
@@ -304,7 +302,6 @@ def list_active_schedules_all(now_dt: datetime) -> List[Dict[str, Any]]:
             ctx="BOLETIM.list_active_schedules_all:legacy",
         )
         have_filters = False
-    import json as _json
     dow_map = {0: 'seg', 1: 'ter', 2: 'qua', 3: 'qui', 4: 'sex', 5: 'sab', 6: 'dom'}
     dow = dow_map[now_dt.weekday()]
     for r in (rows or []):
@@ -313,73 +310,198 @@ def list_active_schedules_all(now_dt: datetime) -> List[Dict[str, Any]]:
         else:
             (sid, uid, q, stype, sdetail, channels, snapshot, preproc_output, last_run_at) = r
             filters = None
-        stype = (stype or '').upper()
-        try:
-            detail = sdetail if isinstance(sdetail, dict) else _json.loads(sdetail or '{}')
-        except Exception:
-            detail = {}
-        try:
-            if filters and isinstance(filters, str):
-                filters = _json.loads(filters)
-        except Exception:
-            filters = filters if isinstance(filters, dict) else {}
-        try:
-            if preproc_output and isinstance(preproc_output, str):
-                preproc_output = _json.loads(preproc_output)
-        except Exception:
-            preproc_output = preproc_output if isinstance(preproc_output, dict) else None
-        cfg_days = detail.get('days') if isinstance(detail, dict) else None
-        due = False
-        if stype in ('DIARIO', 'MULTIDIARIO'):
-            days = list(cfg_days) if cfg_days else ['seg', 'ter', 'qua', 'qui', 'sex']
-            due = dow in days
-        elif stype == 'SEMANAL':
-            days = list(cfg_days) if cfg_days else []
-            due = (dow in days)
-        if not due:
+        item = _schedule_item(sid, uid, q, stype, sdetail, channels, snapshot, filters, preproc_output, last_run_at)
+        if dow in schedule_days(item['schedule_type'], item['_detail']):
+            item.pop('_detail', None)
+            items.append(item)
+    return items
+
+
+def schedule_days(schedule_type: str, detail: Optional[Dict[str, Any]]) -> List[str]:
+    """Dias da semana ('seg'..'dom') em que o boletim roda (DIARIO/MULTIDIARIO: seg-sex por padrão)."""
+    stype = (schedule_type or '').upper()
+    cfg_days = detail.get('days') if isinstance(detail, dict) else None
+    if stype in ('DIARIO', 'MULTIDIARIO'):
+        return list(cfg_days) if cfg_days else ['seg', 'ter', 'qua', 'qui', 'sex']
+    if stype == 'SEMANAL':
+        return list(cfg_days) if cfg_days else []
+    return []
+
+
+def _schedule_item(sid, uid, q, stype, sdetail, channels, snapshot, filters, preproc_output, last_run_at) -> Dict[str, Any]:
+    """Linha de user_schedule → dict usado pelo executor (JSONs decodificados; '_detail' = schedule_detail como dict)."""
+    stype = (stype or '').upper()
+    try:
+        detail = sdetail if isinstance(sdetail, dict) else json.loads(sdetail or '{}')
+    except Exception:
+        detail = {}
+    try:
+        if filters and isinstance(filters, str):
+            filters = json.loads(filters)
+    except Exception:
+        filters = filters if isinstance(filters, dict) else {}
+    try:
+        if preproc_output and isinstance(preproc_output, str):
+            preproc_output = json.loads(preproc_output)
+    except Exception:
+        preproc_output = preproc_output if isinstance(preproc_output, dict) else None
+    return {
+        'id': sid,
+        'user_id': uid,
+        'query_text': q,
+        'schedule_type': stype,
+        'schedule_detail': sdetail or {},
+        'channels': channels or [],
+        'config_snapshot': snapshot or {},
+        'filters': filters or {},
+        'preproc_output': preproc_output or None,
+        'last_run_at': last_run_at,
+        '_detail': detail,
+    }
+
+
+def fetch_schedules_changed_since(since: Optional[datetime]) -> Tuple[List[Dict[str, Any]], Optional[datetime]]:
+    """Boletins (user_schedule) com updated_at > since — inclusive inativos, para remoção — e a nova marca d'água.
+
+    since=None carrega todos. Cada item traz 'active' e 'updated_at' além dos campos do executor.
+    Marca d'água = maior updated_at visto (relógio do DB); sem linhas, mantém since.
+    """
+    rows = db_fetch_all(
+        """
+        SELECT id, user_id, query_text, schedule_type, schedule_detail, channels, config_snapshot, filters,
+               preproc_output, last_run_at, active, updated_at
+          FROM public.user_schedule
+         WHERE (%s::timestamptz IS NULL OR updated_at > %s::timestamptz)
+         ORDER BY updated_at
+        """,
+        (since, since), ctx="BOLETIM.fetch_schedules_changed_since",
+    ) or []
+    items: List[Dict[str, Any]] = []
+    watermark = since
+    for r in rows:
+        item = _schedule_item(*r[:10])
+        item['active'] = bool(r[10])
+        item['updated_at'] = r[11]
+        items.append(item)
+        if r[11] is not None and (watermark is None or r[11] > watermark):
+            watermark = r[11]
+    return items, watermark
+
+
+def build_boletim_rows(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Resultados de busca (id/similarity/details) → linhas de user_boletim com payload compacto."""
+    rows: List[Dict[str, Any]] = []
+    def _first(det: Dict[str, Any], keys: List[str]) -> Any:
+        for k in keys:
+            if k in det and det.get(k) not in (None, ""):
+                return det.get(k)
+        return None
+    def _compact_payload(det: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            # identificação básica
+            'objeto': _first(det, ['objeto_compra', 'objetoCompra', 'objeto_contrato', 'objetoContrato']),
+            # órgão/unidade/localização
+            'orgao': _first(det, ['orgao_entidade_razao_social', 'orgaoEntidadeRazaoSocial', 'orgao_entidade_razaosocial']),
+            'unidade': _first(det, ['unidade_orgao_nome_unidade', 'unidadeorgao_nomeunidade']),
+            'municipio': _first(det, ['unidade_orgao_municipio_nome', 'unidadeorgao_municipionome']),
+            'uf': _first(det, ['unidade_orgao_uf_sigla', 'unidadeorgao_ufsigla']),
+            # valores/modalidade
+            'valor': _first(det, ['valor_total_estimado', 'valorTotalEstimado', 'valor_total_homologado', 'valorGlobal', 'valor_final', 'valorFinal']),
+            'modalidade': _first(det, ['modalidade_nome', 'modalidadeNome']),
+            'modo_disputa': _first(det, ['modo_disputa_nome', 'modoDisputaNome']),
+            # datas principais
+            'data_publicacao_pncp': _first(det, ['dataPublicacao', 'data_publicacao_pncp']),
+            'data_encerramento_proposta': _first(det, ['dataEncerramentoProposta', 'data_encerramento_proposta']),
+            # links úteis
+            'links': {
+                'origem': _first(det, ['link_sistema_origem', 'linkSistemaOrigem']),
+                'processo': _first(det, ['link_processo_eletronico', 'linkProcessoEletronico'])
+            }
+        }
+    for r in results or []:
+        det = r.get('details') or {}
+        pid = (
+            det.get('numerocontrolepncp')
+            or det.get('numeroControlePNCP')
+            or det.get('numero_controle_pncp')
+            or r.get('id')
+            or r.get('numero_controle')
+        )
+        if not pid:
             continue
-        items.append({
-            'id': sid,
-            'user_id': uid,
-            'query_text': q,
-            'schedule_type': stype,
-            'schedule_detail': sdetail or {},
-            'channels': channels or [],
-            'config_snapshot': snapshot or {},
-            'filters': filters or {},
-            'preproc_output': preproc_output or None,
-            'last_run_at': last_run_at,
+        compact = _compact_payload(det)
+        rows.append({
+            'numero_controle_pncp': str(pid),
+            'similarity': r.get('similarity'),
+            'data_publicacao_pncp': compact.get('data_publicacao_pncp'),
+            'data_encerramento_proposta': compact.get('data_encerramento_proposta'),
+            'payload': compact,
         })
-    return items
+    return rows
+
+
+_INSERT_BOLETIM_SQL = (
+    "INSERT INTO public.user_boletim (boletim_id, user_id, run_token, run_at, numero_controle_pncp, similarity, data_publicacao_pncp, data_encerramento_proposta, payload)\n"
+    "VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)"
+)
+
+
+def _boletim_row_params(boletim_id: int, user_id: str, run_token: str, run_at: datetime, r: Dict[str, Any]) -> tuple:
+    return (
+        boletim_id,
+        user_id,
+        run_token,
+        run_at,
+        r.get('numero_controle_pncp'),
+        r.get('similarity'),
+        r.get('data_publicacao_pncp'),
+        r.get('data_encerramento_proposta'),
+        json.dumps(r.get('payload') or {}),
+    )
 
 
 def record_boletim_results(boletim_id: int, user_id: str, run_token: str, run_at: datetime, rows: List[Dict[str, Any]]) -> int:
     """Insere resultados em public.user_boletim via executemany; retorna total inserido."""
     if not rows:
         return 0
-    import json as _json
-    sql = (
-        "INSERT INTO public.user_boletim (boletim_id, user_id, run_token, run_at, numero_controle_pncp, similarity, data_publicacao_pncp, data_encerramento_proposta, payload)\n"
-        "VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)"
-    )
-    data = [
-        (
-            boletim_id,
-            user_id,
-            run_token,
-            run_at,
-            r.get('numero_controle_pncp'),
-            r.get('similarity'),
-            r.get('data_publicacao_pncp'),
-            r.get('data_encerramento_proposta'),
-            _json.dumps(r.get('payload') or {}),
-        )
-        for r in rows
-    ]
-    aff = db_execute_many(sql, data, ctx="BOLETIM.record_boletim_results")
+    data = [_boletim_row_params(boletim_id, user_id, run_token, run_at, r) for r in rows]
+    aff = db_execute_many(_INSERT_BOLETIM_SQL, data, ctx="BOLETIM.record_boletim_results")
     return int(aff or 0)
 
 
+def record_boletim_hits(items: List[tuple], chunk_size: int = 5000) -> Tuple[int, set]:
+    """Insere resultados de vários boletins de uma vez: items = [(boletim_id, user_id, run_token, run_at, row)].
+
+    Usado pela percolação (milhares de boletins por execução): uma transação por bloco
+    em vez de uma por boletim. Os blocos nunca dividem um boletim (items agrupados por
+    boletim_id, como a percolação gera), então um bloco que falha não deixa gravação parcial.
+    Retorna (linhas gravadas, {boletim_id dos blocos que falharam}).
+    """
+    total = 0
+    failed: set = set()
+    chunk: List[tuple] = []
+
+    def _flush() -> None:
+        nonlocal total
+        if not chunk:
+            return
+        data = [_boletim_row_params(*it) for it in chunk]
+        n = int(db_execute_many(_INSERT_BOLETIM_SQL, data, ctx="BOLETIM.record_boletim_hits") or 0)
+        if n:
+            total += n
+        else:
+            failed.update(it[0] for it in chunk)
+        chunk.clear()
+
+    for it in items or []:
+        # Fecha o bloco só na troca de boletim
+        if len(chunk) >= max(1, int(chunk_size)) and it[0] != chunk[-1][0]:
+            _flush()
+        chunk.append(it)
+    _flush()
+    return total, failed
+
+
 def fetch_unsent_results_for_boletim(boletim_id: int, baseline_iso: Optional[str]) -> List[Dict[str, Any]]:
     """Retorna resultados não enviados (sent=false) aplicando baseline de publicação quando possível."""
     base = [
@@ -406,18 +528,62 @@ def mark_results_sent(result_ids: List[int], sent_at: Optional[datetime] = None)
 
 
 def touch_last_run(boletim_id: int, dt: datetime) -> bool:
-    # Atualiza em user_schedule; se não afetar, tenta tabela legada
-    aff = db_execute("UPDATE public.user_schedule SET last_run_at = %s, updated_at = now() WHERE id = %s", (dt, boletim_id), ctx="BOLETIM.touch_last_run:user_schedule")
-    if aff and aff > 0:
+    # Atualiza em user_schedule; se não afetar, tenta tabela legada.
+    # last_run_at aparece na lista da UI: invalida o cache do dono (RETURNING user_id).
+    row = db_execute_returning_one(
+        "UPDATE public.user_schedule SET last_run_at = %s, updated_at = now() WHERE id = %s RETURNING user_id",
+        (dt, boletim_id), ctx="BOLETIM.touch_last_run:user_schedule",
+    )
+    if row:
+        _cache_invalidate_prefix(f"BOLETIM.fetch_user_boletins:{row[0]}")
         return True
     aff2 = db_execute("UPDATE public.user_boletins SET last_run_at = %s, updated_at = now() WHERE id = %s", (dt, boletim_id), ctx="BOLETIM.touch_last_run:legacy")
     return bool(aff2 and aff2 > 0)
 
 
+def touch_last_run_many(owners: Dict[int, str], dt: datetime) -> int:
+    """Marca last_run_at de vários boletins (owners = {boletim_id: user_id}) e invalida o cache dos donos."""
+    if not owners:
+        return 0
+    aff = db_execute(
+        "UPDATE public.user_schedule SET last_run_at = %s, updated_at = now() WHERE id = ANY(%s)",
+        (dt, list(owners.keys())), ctx="BOLETIM.touch_last_run_many",
+    )
+    for uid in set(owners.values()):
+        _cache_invalidate_prefix(f"BOLETIM.fetch_user_boletins:{uid}")
+    return int(aff or 0)
+
+
+def fetch_delta_state(boletim_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Estado do modo delta por boletim: {id: {'delta_cutoff', 'last_full_run_at'}} ({} se colunas ausentes)."""
+    if not boletim_ids:
+        return {}
+    rows = db_fetch_all(
+        "SELECT id, delta_cutoff, last_full_run_at FROM public.user_schedule WHERE id = ANY(%s)",
+        (list(boletim_ids),),
+        ctx="BOLETIM.fetch_delta_state",
+    ) or []
+    return {r[0]: {'delta_cutoff': r[1], 'last_full_run_at': r[2]} for r in rows}
+
+
+def set_delta_state(boletim_ids: List[int], cutoff: Optional[float], full_run_at: datetime) -> int:
+    """Registra a execução completa (reconciliação) e o corte de similaridade para os próximos deltas."""
+    if not boletim_ids:
+        return 0
+    aff = db_execute(
+        "UPDATE public.user_schedule SET delta_cutoff = %s, last_full_run_at = %s WHERE id = ANY(%s)",
+        (cutoff, full_run_at, list(boletim_ids)),
+        ctx="BOLETIM.set_delta_state",
+    )
+    return int(aff or 0)
+
+
 __all__ = [
     'fetch_user_boletins', 'create_user_boletim', 'deactivate_user_boletim',
-    'list_active_schedules_all', 'record_boletim_results', 'fetch_unsent_results_for_boletim', 'mark_results_sent', 'touch_last_run',
-    'update_schedule_preproc_output'
+    'list_active_schedules_all', 'build_boletim_rows', 'record_boletim_results', 'record_boletim_hits',
+    'fetch_unsent_results_for_boletim', 'mark_results_sent', 'touch_last_run', 'touch_last_run_many',
+    'update_schedule_preproc_output', 'fetch_delta_state', 'set_delta_state',
+    'schedule_days', 'fetch_schedules_changed_since'
 ]
 
 # --- Helpers adicionais para envio ---
@@ -444,6 +610,29 @@ def set_last_sent(boletim_id: int, dt: datetime) -> bool:
         return True
 
 
+def get_user_emails(user_ids: List[str]) -> Dict[str, str]:
+    """E-mails de vários usuários em uma consulta: {user_id: email} (ausentes omitidos)."""
+    ids = sorted({str(u) for u in (user_ids or []) if u})
+    if not ids:
+        return {}
+    rows = db_fetch_all(
+        "SELECT id::text, email FROM auth.users WHERE id = ANY(%s::uuid[])",
+        (ids,), ctx="BOLETIM.get_user_emails",
+    ) or []
+    return {r[0]: r[1] for r in rows if r and r[1]}
+
+
+def set_last_sent_many(boletim_ids: List[int], dt: datetime) -> int:
+    """last_sent_at de vários boletins em um único UPDATE."""
+    if not boletim_ids:
+        return 0
+    aff = db_execute(
+        "UPDATE public.user_schedule SET last_sent_at = %s, updated_at = now() WHERE id = ANY(%s)",
+        (dt, list(boletim_ids)), ctx="BOLETIM.set_last_sent_many",
+    )
+    return int(aff or 0)
+
+
 def update_schedule_preproc_output(boletim_id: int, preproc_output: Dict[str, Any]) -> bool:
     """Atualiza o campo JSONB preproc_output do user_schedule com EXACT o assistant.output."""
     try:
@@ -0,0 +1,155 @@
+"""
+gvg_budget.py
+Orçamentos globais de concorrência e taxa por recurso externo (OpenAI, DB).
+
+Objetivo:
+  Execuções concorrentes (ex.: boletins agendados em pool de threads) não podem
+  estourar o rate limit da OpenAI nem abrir conexões demais no Postgres/pooler.
+  Os wrappers centrais (gvg_ai_utils, gvg_database) passam por `limit(nome)`;
+  cada chamada ocupa uma vaga de concorrência e consome um token de taxa.
+
+Configuração (por processo):
+  GVG_BUDGET_OPENAI_CONCURRENCY / GVG_BUDGET_OPENAI_RPS
+  GVG_BUDGET_DB_CONCURRENCY     / GVG_BUDGET_DB_QPS
+  GVG_BUDGET_SMTP_CONCURRENCY   / GVG_BUDGET_SMTP_RPS   (envio de e-mails, gvg_mailer)
+  0 (padrão) = ilimitado → caminho rápido sem locks além da contagem.
+  configure_budget(nome, concurrency=, rate=) ajusta em tempo de execução.
+
+Taxa: token bucket (rajada = 1 s de taxa); espera reservada fora do lock.
+"""
+from __future__ import annotations
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+def _env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+# Nome do recurso → variáveis de ambiente (concorrência, taxa/s)
+_ENV = {
+    'openai': ('GVG_BUDGET_OPENAI_CONCURRENCY', 'GVG_BUDGET_OPENAI_RPS'),
+    'db': ('GVG_BUDGET_DB_CONCURRENCY', 'GVG_BUDGET_DB_QPS'),
+    'smtp': ('GVG_BUDGET_SMTP_CONCURRENCY', 'GVG_BUDGET_SMTP_RPS'),
+}
+
+
+class Budget:
+    def __init__(self, name: str, concurrency: int = 0, rate: float = 0.0):
+        self.name = name
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.waited_s = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.configure(concurrency, rate)
+
+    def configure(self, concurrency: Optional[int] = None, rate: Optional[float] = None) -> None:
+        with self._lock:
+            if concurrency is not None:
+                self.concurrency = max(0, int(concurrency))
+                self._sem = threading.BoundedSemaphore(self.concurrency) if self.concurrency else None
+            if rate is not None:
+                self.rate = max(0.0, float(rate))
+                self._burst = max(1.0, self.rate)
+                self._tokens = self._burst
+                self._last = time.monotonic()
+
+    def _take_token(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1.0
+            return 0.0 if self._tokens >= 0 else (-self._tokens) / self.rate
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        sem = self._sem
+        if sem is None and not self.rate:
+            self.calls += 1
+            yield
+            return
+        t0 = time.monotonic()
+        if sem is not None:
+            sem.acquire()
+        try:
+            if self.rate:
+                wait = self._take_token()
+                if wait > 0:
+                    time.sleep(wait)
+            with self._lock:
+                self.calls += 1
+                self.waited_s += time.monotonic() - t0
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+        finally:
+            if sem is not None:
+                sem.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'concurrency': self.concurrency, 'rate': self.rate, 'calls': self.calls,
+                'waited_s': round(self.waited_s, 3), 'max_in_flight': self.max_in_flight,
+            }
+
+
+_BUDGETS: Dict[str, Budget] = {}
+_BUDGETS_LOCK = threading.Lock()
+
+
+def get_budget(name: str) -> Budget:
+    b = _BUDGETS.get(name)
+    if b is None:
+        with _BUDGETS_LOCK:
+            b = _BUDGETS.get(name)
+            if b is None:
+                env_c, env_r = _ENV.get(name, ('', ''))
+                b = Budget(name, int(_env_num(env_c, 0)) if env_c else 0, _env_num(env_r, 0.0) if env_r else 0.0)
+                _BUDGETS[name] = b
+    return b
+
+
+def configure_budget(name: str, concurrency: Optional[int] = None, rate: Optional[float] = None) -> Budget:
+    b = get_budget(name)
+    b.configure(concurrency, rate)
+    return b
+
+
+def limit(name: str):
+    """Context manager: `with limit('openai'): client.embeddings.create(...)`."""
+    return get_budget(name).slot()
+
+
+def limited(name: str) -> Callable:
+    """Decorator equivalente a envolver a função inteira em limit(name)."""
+    def deco(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with get_budget(name).slot():
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def budget_stats() -> Dict[str, Dict[str, Any]]:
+    with _BUDGETS_LOCK:
+        items = list(_BUDGETS.items())
+    return {name: b.stats() for name, b in items}
+
+
+__all__ = ['Budget', 'get_budget', 'configure_budget', 'limit', 'limited', 'budget_stats']
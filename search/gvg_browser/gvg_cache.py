@@ -0,0 +1,321 @@
+"""
+gvg_cache.py
+Cache de dados com namespaces, backend plugável e métricas de acerto.
+
+Objetivo:
+  Substituir os dicts por processo de gvg_user/gvg_boletim (sem limite de tamanho,
+  frios em cada worker gunicorn e potencialmente obsoletos após escrita em outro
+  worker) por um cache único com invalidação explícita nas escritas.
+
+Backends (GVG_CACHE_BACKEND; vazio → segue GVG_SESSION_STORE; padrão memory):
+  memory → LRU em processo (GVG_CACHE_MAX_ITEMS, padrão 5000 entradas)
+  sqlite → arquivo sqlite local compartilhado pelos workers do host
+           (GVG_CACHE_PATH; orçamento GVG_CACHE_MAX_MB, padrão 64)
+  redis  → Redis (REDIS_URL; orçamento delegado ao maxmemory do servidor)
+
+Chaves:
+  '<namespace>:<chave>'. cache_invalidate(ns, prefixo) remove todas as chaves do
+  namespace que começam com o prefixo (em todos os workers nos backends compartilhados).
+
+Observações:
+  • TTL fixo (não deslizante): o TTL é o limite de obsolescência quando uma escrita
+    não passa por estes módulos.
+  • memory guarda o próprio objeto (como os dicts anteriores); sqlite/redis usam pickle.
+  • Falha do backend conta como miss (o chamador consulta o banco normalmente).
+"""
+from __future__ import annotations
+
+import os
+import time
+import pickle
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from gvg_debug import debug_log as dbg  # type: ignore
+except Exception:  # pragma: no cover
+    def dbg(*_a, **_k):
+        pass
+
+try:  # Redis opcional
+    import redis  # type: ignore
+except Exception:  # pragma: no cover
+    redis = None  # type: ignore
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+CACHE_BACKEND = (os.getenv('GVG_CACHE_BACKEND') or os.getenv('GVG_SESSION_STORE') or 'memory').strip().lower()
+CACHE_MAX_ITEMS = max(100, _env_int('GVG_CACHE_MAX_ITEMS', 5000))
+try:
+    CACHE_MAX_BYTES = int(float(os.getenv('GVG_CACHE_MAX_MB', '64')) * 1024 * 1024)
+except Exception:
+    CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+# =====================
+# Backends
+# =====================
+class _MemoryBackend:
+    """LRU em processo com TTL fixo e limite de entradas."""
+
+    name = 'memory'
+
+    def __init__(self, max_items: int):
+        self.max_items = int(max_items)
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False, None
+            if item[0] < time.time():
+                self._data.pop(key, None)
+                return False, None
+            self._data.move_to_end(key)
+            return True, item[1]
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (time.time() + ttl, value)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self._lock:
+            keys = [k for k in self._data if k.startswith(prefix)]
+            for k in keys:
+                self._data.pop(k, None)
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'items': len(self._data), 'max_items': self.max_items, 'evictions': self.evictions}
+
+
+class _SqliteBackend:
+    """Arquivo sqlite compartilhado entre workers do mesmo host (pickle + orçamento em bytes)."""
+
+    name = 'sqlite'
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self._local = threading.local()
+        self._writes = 0
+        self.evictions = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (k TEXT PRIMARY KEY, expires REAL NOT NULL, size INTEGER NOT NULL, v BLOB NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache(expires)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            except Exception:
+                pass
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        row = self._conn().execute("SELECT expires, v FROM cache WHERE k=?", (key,)).fetchone()
+        if not row or row[0] < time.time():
+            return False, None
+        return True, pickle.loads(row[1])
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (k, expires, size, v) VALUES (?,?,?,?)",
+            (key, now + ttl, len(blob), sqlite3.Binary(blob)),
+        )
+        conn.commit()
+        self._writes += 1
+        if self._writes % 50 == 0:
+            self._prune(conn, now)
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        try:
+            conn.execute("DELETE FROM cache WHERE expires < ?", (now,))
+            total = conn.execute("SELECT COALESCE(SUM(size),0) FROM cache").fetchone()[0] or 0
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                drop = []
+                for k, size in conn.execute("SELECT k, size FROM cache ORDER BY expires ASC"):
+                    if excess <= 0:
+                        break
+                    drop.append((k,))
+                    excess -= size
+                conn.executemany("DELETE FROM cache WHERE k=?", drop)
+                self.evictions += len(drop)
+            conn.commit()
+        except Exception as e:
+            dbg('BROWSER', f"cache sqlite prune erro: {e}")
+
+    def delete_prefix(self, prefix: str) -> int:
+        conn = self._conn()
+        # Faixa [prefixo, prefixo + U+FFFF) usa o índice da PK (LIKE exigiria escape)
+        cur = conn.execute("DELETE FROM cache WHERE k >= ? AND k < ?", (prefix, prefix + '￿'))
+        conn.commit()
+        return int(cur.rowcount or 0)
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            row = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size),0) FROM cache").fetchone()
+            return {'items': int(row[0]), 'bytes': int(row[1]), 'max_bytes': self.max_bytes, 'evictions': self.evictions}
+        except Exception:
+            return {}
+
+
+class _RedisBackend:
+    """Redis compartilhado (pickle; limite de memória pelo maxmemory do servidor)."""
+
+    name = 'redis'
+
+    def __init__(self, url: str):
+        self._r = redis.Redis.from_url(url)  # type: ignore[union-attr]
+        self._ns = 'gvg:cache:'
+        self._r.ping()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        blob = self._r.get(self._ns + key)
+        if blob is None:
+            return False, None
+        return True, pickle.loads(blob)
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        self._r.setex(self._ns + key, int(ttl), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def delete_prefix(self, prefix: str) -> int:
+        pattern = self._ns + ''.join('\\' + c if c in '*?[]\\' else c for c in prefix) + '*'
+        keys = list(self._r.scan_iter(match=pattern, count=500))
+        if keys:
+            self._r.delete(*keys)
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+# =====================
+# Cache
+# =====================
+class Cache:
+    def __init__(self, kind: Optional[str] = None):
+        kind = (kind if kind is not None else CACHE_BACKEND).strip().lower()
+        self.backend: Any = None
+        try:
+            if kind == 'sqlite':
+                path = os.getenv('GVG_CACHE_PATH') or os.path.join(tempfile.gettempdir(), 'gvg_cache.sqlite')
+                self.backend = _SqliteBackend(path, CACHE_MAX_BYTES)
+            elif kind == 'redis':
+                if redis is None:
+                    raise RuntimeError('pacote redis não instalado')
+                self.backend = _RedisBackend(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+        except Exception as e:
+            dbg('BROWSER', f"cache backend '{kind}' indisponível ({e}); usando memória")
+            self.backend = None
+        if self.backend is None:
+            self.backend = _MemoryBackend(CACHE_MAX_ITEMS)
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, ns: str, field: str, n: int = 1) -> None:
+        with self._lock:
+            m = self._metrics.setdefault(ns, {'hits': 0, 'misses': 0, 'sets': 0, 'invalidated': 0, 'errors': 0})
+            m[field] += n
+
+    def get(self, ns: str, key: str) -> Any:
+        try:
+            found, value = self.backend.get(f"{ns}:{key}")
+        except Exception as e:
+            dbg('BROWSER', f"cache get erro ns={ns}: {e}")
+            self._count(ns, 'errors')
+            found, value = False, None
+        self._count(ns, 'hits' if found else 'misses')
+        return value if found else None
+
+    def set(self, ns: str, key: str, value: Any, ttl: int) -> None:
+        try:
+            self.backend.set(f"{ns}:{key}", value, ttl)
+            self._count(ns, 'sets')
+        except Exception as e:
+            dbg('BROWSER', f"cache set erro ns={ns}: {e}")
+            self._count(ns, 'errors')
+
+    def invalidate(self, ns: str, prefix: str = '') -> int:
+        try:
+            n = self.backend.delete_prefix(f"{ns}:{prefix}")
+        except Exception as e:
+            dbg('BROWSER', f"cache invalidate erro ns={ns}: {e}")
+            self._count(ns, 'errors')
+            return 0
+        self._count(ns, 'invalidated', n)
+        return n
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            per_ns = {}
+            for ns, m in self._metrics.items():
+                total = m['hits'] + m['misses']
+                per_ns[ns] = dict(m, hit_rate=round(m['hits'] / total, 3) if total else 0.0)
+        try:
+            backend_stats = self.backend.stats()
+        except Exception:
+            backend_stats = {}
+        return {'backend': self.backend.name, 'namespaces': per_ns, **backend_stats}
+
+
+_CACHE: Optional[Cache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_cache() -> Cache:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = Cache()
+    return _CACHE
+
+
+def cache_get(ns: str, key: str) -> Any:
+    """Valor em cache ou None (ausente/expirado)."""
+    return get_cache().get(ns, key)
+
+
+def cache_set(ns: str, key: str, value: Any, ttl: int) -> None:
+    get_cache().set(ns, key, value, ttl)
+
+
+def cache_invalidate(ns: str, prefix: str = '') -> int:
+    """Remove as chaves do namespace que começam com `prefix` (vazio → namespace inteiro)."""
+    return get_cache().invalidate(ns, prefix)
+
+
+def cache_stats() -> Dict[str, Any]:
+    return get_cache().stats()
+
+
+__all__ = ['Cache', 'get_cache', 'cache_get', 'cache_set', 'cache_invalidate', 'cache_stats']
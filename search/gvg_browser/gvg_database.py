@@ -5,7 +5,7 @@ Objetivos:
 - Centralizar conexões (psycopg2) e engine (SQLAlchemy) com carregamento de env.
 - Expor wrappers com métricas de desempenho via categoria de debug "DB":
   - db_fetch_all, db_fetch_one, db_execute, db_execute_many, db_read_df
-- Manter utilidades já existentes (fetch_documentos, get_user_resumo, upsert_user_resumo).
+- Manter utilidades já existentes (fetch_documentos[_for_many], get_user_resumo, upsert_user_resumo).
 
 Observações:
 - Não altera schema; apenas organiza e padroniza I/O de DB.
@@ -16,10 +16,11 @@ from __future__ import annotations
 import os
 import re
 import time
+import queue
+import threading
 from typing import Any, Iterable, List, Optional, Sequence
 
 import psycopg2
-import requests
 from sqlalchemy import create_engine
 from dotenv import load_dotenv
 
@@ -32,6 +33,13 @@ except Exception:  # pragma: no cover - fallback em runtime
     except Exception:
         from gvg_debug import debug_log as dbg  # type: ignore
 
+try:
+    # Orçamento global de concorrência/taxa do DB (no-op se não configurado)
+    from gvg_budget import limited  # type: ignore
+except Exception:  # pragma: no cover
+    def limited(_name):
+        return lambda fn: fn
+
 # =====================
 # Carregamento de envs
 # =====================
@@ -56,9 +64,103 @@ def _load_env_priority() -> None:
 # Conexões
 # =====================
 
+# Pool opcional para processos residentes (daemon de boletins): GVG_DB_POOL_SIZE > 0 ou
+# enable_connection_pool(n). Com pool, create_connection() devolve uma conexão reaproveitada
+# e conn.close() a devolve ao pool (rollback antes); sem pool, comportamento original.
+_POOL_IDLE_PING_S = 30.0
+_pool_lock = threading.Lock()
+_pool_idle: "queue.LifoQueue" = queue.LifoQueue()
+_pool_size = 0
+_pool_stats = {'opened': 0, 'reused': 0, 'returned': 0, 'discarded': 0}
+try:
+    _pool_size = max(0, int(os.getenv('GVG_DB_POOL_SIZE', '0') or 0))
+except Exception:
+    _pool_size = 0
+
+
+class _PooledConnection(psycopg2.extensions.connection):
+    """Conexão cujo close() devolve ao pool (se saudável e houver vaga)."""
+
+    _gvg_last_used = 0.0
+
+    def close(self):  # type: ignore[override]
+        if self.closed or _pool_size <= 0:
+            return super().close()
+        try:
+            if self.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                self.rollback()
+            if self.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE and _pool_idle.qsize() < _pool_size:
+                self._gvg_last_used = time.monotonic()
+                _pool_idle.put(self)
+                with _pool_lock:
+                    _pool_stats['returned'] += 1
+                return None
+        except Exception:
+            pass
+        with _pool_lock:
+            _pool_stats['discarded'] += 1
+        return super().close()
+
+
+def enable_connection_pool(size: int) -> None:
+    """Liga (size > 0) ou desliga (0) o reaproveitamento de conexões neste processo."""
+    global _pool_size
+    _pool_size = max(0, int(size or 0))
+    if _pool_size == 0:
+        close_connection_pool()
+
+
+def close_connection_pool() -> None:
+    while True:
+        try:
+            conn = _pool_idle.get_nowait()
+        except queue.Empty:
+            break
+        try:
+            psycopg2.extensions.connection.close(conn)
+        except Exception:
+            pass
+
+
+def connection_pool_stats() -> dict:
+    with _pool_lock:
+        return dict(_pool_stats, size=_pool_size, idle=_pool_idle.qsize())
+
+
+def _take_pooled() -> Optional[psycopg2.extensions.connection]:
+    while True:
+        try:
+            conn = _pool_idle.get_nowait()
+        except queue.Empty:
+            return None
+        if conn.closed:
+            continue
+        if time.monotonic() - conn._gvg_last_used > _POOL_IDLE_PING_S:
+            # Ociosa: o servidor/pooler pode ter derrubado a sessão
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                try:
+                    psycopg2.extensions.connection.close(conn)
+                except Exception:
+                    pass
+                with _pool_lock:
+                    _pool_stats['discarded'] += 1
+                continue
+        with _pool_lock:
+            _pool_stats['reused'] += 1
+        return conn
+
+
 def create_connection() -> Optional[psycopg2.extensions.connection]:
-    """Cria conexão psycopg2 com base V1."""
+    """Cria conexão psycopg2 com base V1 (ou reaproveita uma do pool, se ligado)."""
     try:
+        if _pool_size > 0:
+            conn = _take_pooled()
+            if conn is not None:
+                return conn
         _load_env_priority()
         connection = psycopg2.connect(
             host=os.getenv("SUPABASE_HOST", "aws-0-sa-east-1.pooler.supabase.com"),
@@ -67,7 +169,11 @@ def create_connection() -> Optional[psycopg2.extensions.connection]:
             password=os.getenv("SUPABASE_PASSWORD"),
             port=os.getenv("SUPABASE_PORT", "6543"),
             connect_timeout=10,
+            **({'connection_factory': _PooledConnection} if _pool_size > 0 else {}),
         )
+        if _pool_size > 0:
+            with _pool_lock:
+                _pool_stats['opened'] += 1
         return connection
     except Exception as e:
         try:
@@ -112,6 +218,7 @@ def _rows_to_dicts(cur, rows: Sequence[Sequence[Any]]) -> List[dict]:
 # Wrappers com métricas [DB]
 # =====================
 
+@limited('db')
 def db_fetch_all(sql: str, params: Optional[Sequence[Any]] = None, *, as_dict: bool = False, ctx: Optional[str] = None) -> List[Any]:
     """Executa SELECT e retorna todas as linhas. Quando as_dict=True, retorna List[dict].
 
@@ -159,6 +266,7 @@ def db_fetch_all(sql: str, params: Optional[Sequence[Any]] = None, *, as_dict: b
                 pass
 
 
+@limited('db')
 def db_fetch_one(sql: str, params: Optional[Sequence[Any]] = None, *, as_dict: bool = False, ctx: Optional[str] = None) -> Any:
     """Executa SELECT e retorna uma única linha (ou None). Quando as_dict=True, retorna dict.
 
@@ -213,6 +321,7 @@ def db_fetch_one(sql: str, params: Optional[Sequence[Any]] = None, *, as_dict: b
                 pass
 
 
+@limited('db')
 def db_execute(sql: str, params: Optional[Sequence[Any]] = None, *, ctx: Optional[str] = None) -> int:
     """Executa comando DML e commita. Retorna número de linhas afetadas (ou 0).
 
@@ -268,6 +377,7 @@ def db_execute(sql: str, params: Optional[Sequence[Any]] = None, *, ctx: Optiona
                 pass
 
 
+@limited('db')
 def db_execute_many(sql: str, seq_params: Iterable[Sequence[Any]], *, ctx: Optional[str] = None) -> int:
     """Executa executemany e commita. Retorna total afetado (se disponível).
 
@@ -323,6 +433,7 @@ def db_execute_many(sql: str, seq_params: Iterable[Sequence[Any]], *, ctx: Optio
                 pass
 
 
+@limited('db')
 def db_execute_returning_one(sql: str, params: Optional[Sequence[Any]] = None, *, as_dict: bool = False, ctx: Optional[str] = None) -> Any:
     """Executa DML com RETURNING e commita; retorna a linha retornada (ou None).
 
@@ -383,6 +494,7 @@ def db_execute_returning_one(sql: str, params: Optional[Sequence[Any]] = None, *
                 pass
 
 
+@limited('db')
 def db_read_df(sql: str, params: Optional[Sequence[Any]] = None, *, ctx: Optional[str] = None):
     """Executa SELECT e retorna pandas.DataFrame, ou None se pandas/engine indisponíveis.
 
@@ -448,6 +560,11 @@ def _parse_numero_controle_pncp(numero_controle: str):
     return m.group(1), m.group(2), m.group(3)
 
 
+try:
+    DOCS_API_WORKERS = max(1, int(os.getenv('GVG_DOCS_API_WORKERS', '4')))
+except Exception:
+    DOCS_API_WORKERS = 4
+
 def fetch_documentos(numero_controle: str) -> List[dict]:
     """Busca documentos de um processo com cache em BD (lista_documentos) e fallback para API.
 
@@ -459,91 +576,125 @@ def fetch_documentos(numero_controle: str) -> List[dict]:
     """
     if not numero_controle:
         return []
+    return fetch_documentos_for_many([numero_controle]).get(str(numero_controle), [])
 
-    documentos: List[dict] = []
 
-    # 1) Tentar ler do BD (lista_documentos)
-    src_list = None
-    came_from = None
+def fetch_documentos_for_many(ids: Sequence[str], max_workers: Optional[int] = None) -> dict:
+    """Versão em lote de fetch_documentos: {numero_controle_pncp: [documentos normalizados]}.
+
+    - Uma única query (= ANY) em public.contratacao.lista_documentos.
+    - Ausentes no BD: API PNCP em paralelo (pool limitado, sessão HTTP compartilhada),
+      persistindo o resultado em lista_documentos.
+    """
+    uniq: List[str] = []
+    for pid in (ids or []):
+        p = str(pid or '').strip()
+        if p and p not in uniq:
+            uniq.append(p)
+    out: dict = {p: [] for p in uniq}
+    if not uniq:
+        return out
+
+    # 1) BD (lista_documentos) em uma query
+    have: dict = {}
     try:
-        row = db_fetch_one(
+        rows = db_fetch_all(
             """
-            SELECT lista_documentos
+            SELECT numero_controle_pncp, lista_documentos
             FROM public.contratacao
-            WHERE numero_controle_pncp = %s
-            LIMIT 1
+            WHERE numero_controle_pncp = ANY(%s::text[])
             """,
-            (numero_controle,), as_dict=False, ctx="DOCS.fetch_documentos:read_json"
-        )
-        if row is not None:
-            try:
-                val = row[0]
-                # psycopg2 já desserializa jsonb para tipos Python (list/dict)
-                if isinstance(val, list):
-                    src_list = val
-                    came_from = 'bd'
-            except Exception:
-                src_list = None
+            (uniq,), as_dict=False, ctx="DOCS.fetch_documentos_for_many:read_json"
+        ) or []
+        for pid, val in rows:
+            # psycopg2 já desserializa jsonb para tipos Python (list/dict)
+            if isinstance(val, list) and val:
+                have[str(pid)] = val
     except Exception as e:
         # Coluna pode não existir ou BD indisponível — seguir para API
         try:
             dbg('DOCS', f"fetch_documentos BD skip: {e}")
         except Exception:
             pass
-        src_list = None
+    for pid, src_list in have.items():
+        out[pid] = _normalize_documentos(src_list, 'bd')
+
+    # 2) Ausentes: API PNCP (concorrência limitada) + persistência
+    missing = [p for p in uniq if p not in have]
+    if missing:
+        # Agregador de uso é thread-local: capturar aqui e repassar aos workers
+        try:
+            from gvg_usage import _get_current_aggregator
+            aggr = _get_current_aggregator()
+        except Exception:
+            aggr = None
+        workers = max(1, min(len(missing), int(max_workers or DOCS_API_WORKERS)))
+        if workers == 1:
+            fetched = [_fetch_documentos_api(p, aggr) for p in missing]
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gvg-docs') as pool:
+                fetched = list(pool.map(lambda p: _fetch_documentos_api(p, aggr), missing))
+        for pid, src_list in zip(missing, fetched):
+            if src_list:
+                _persist_documentos(pid, src_list)
+                out[pid] = _normalize_documentos(src_list, 'api')
+    return out
+
+
+def _fetch_documentos_api(numero_controle: str, aggr: Any = None) -> Optional[List[dict]]:
+    """Lista de arquivos de uma contratação direto da API PNCP (None em falha)."""
+    cnpj, sequencial, ano = _parse_numero_controle_pncp(numero_controle)
+    if not all([cnpj, sequencial, ano]):
+        return None
+    api_url = (
+        f"https://pncp.gov.br/api/pncp/v1/orgaos/{cnpj}/compras/{ano}/{sequencial}/arquivos"
+    )
+    try:
+        # Sessão compartilhada (keep-alive + retry com backoff em 429/5xx/timeout)
+        from gvg_http import http_session  # import tardio para evitar ciclos
+        resp = http_session().get(api_url, timeout=20)
+        if resp.status_code != 200:
+            dbg('DOCS', f"API documentos status {resp.status_code} ({numero_controle})")
+            return None
+        # contabilizar bytes baixados
+        try:
+            if aggr:
+                aggr.add_file_in(len(resp.content or b''))
+        except Exception:
+            pass
+        data = resp.json()
+        if isinstance(data, list):
+            return [item for item in data if isinstance(item, dict)]
+    except Exception as e:
+        dbg('DOCS', f"API documentos erro: {e}")
+    return None
+
 
-    # 2) Se não houver no BD, chamar API e tentar persistir
-    if not src_list:
-        cnpj, sequencial, ano = _parse_numero_controle_pncp(numero_controle)
-        if not all([cnpj, sequencial, ano]):
-            return []
-        api_url = (
-            f"https://pncp.gov.br/api/pncp/v1/orgaos/{cnpj}/compras/{ano}/{sequencial}/arquivos"
+def _persist_documentos(numero_controle: str, src_list: List[dict]) -> None:
+    """Persiste a lista vinda da API em public.contratacao.lista_documentos (best-effort)."""
+    try:
+        # Usar psycopg2.extras.Json para garantir serialização correta
+        from psycopg2.extras import Json  # type: ignore
+        db_execute(
+            """
+            UPDATE public.contratacao
+            SET lista_documentos = %s, updated_at = COALESCE(updated_at, now())
+            WHERE numero_controle_pncp = %s
+            """,
+            (Json(src_list), numero_controle),
+            ctx="DOCS.fetch_documentos:write_json"
         )
+    except Exception as e:
         try:
-            resp = requests.get(api_url, timeout=20)
-            if resp.status_code == 200:
-                data = resp.json()
-                if isinstance(data, list):
-                    src_list = [item for item in data if isinstance(item, dict)]
-                    came_from = 'api'
-                # contabilizar bytes baixados
-                try:
-                    from gvg_usage import _get_current_aggregator
-                    aggr = _get_current_aggregator()
-                    if aggr:
-                        aggr.add_file_in(len(resp.content or b''))
-                except Exception:
-                    pass
-            else:
-                dbg('DOCS', f"API documentos status {resp.status_code} ({numero_controle})")
-        except Exception as e:
-            dbg('DOCS', f"API documentos erro: {e}")
+            dbg('DOCS', f"persist lista_documentos FAIL: {e}")
+        except Exception:
+            pass
 
-        # Persistir no BD se veio da API e houver conexão/coluna
-        if src_list and came_from == 'api':
-            try:
-                # Usar psycopg2.extras.Json para garantir serialização correta
-                from psycopg2.extras import Json  # type: ignore
-                affected = db_execute(
-                    """
-                    UPDATE public.contratacao
-                    SET lista_documentos = %s, updated_at = COALESCE(updated_at, now())
-                    WHERE numero_controle_pncp = %s
-                    """,
-                    (Json(src_list), numero_controle),
-                    ctx="DOCS.fetch_documentos:write_json"
-                )
-                if not affected:
-                    # Caso não atualize (registro não encontrado), tentar um UPSERT mínimo se permitido
-                    pass
-            except Exception as e:
-                try:
-                    dbg('DOCS', f"persist lista_documentos FAIL: {e}")
-                except Exception:
-                    pass
 
-    # 3) Normalizar saída
+def _normalize_documentos(src_list, came_from: Optional[str]) -> List[dict]:
+    """Normaliza itens da API/lista_documentos para o formato da UI e ordena por sequencial."""
+    documentos: List[dict] = []
     for item in (src_list or []):
         try:
             url = item.get('url') or item.get('uri') or ''
@@ -0,0 +1,241 @@
+"""
+gvg_doc_index.py
+Índice de trechos (passagens) do Markdown convertido dos documentos, com busca vetorial.
+
+Objetivo:
+  Acessos repetidos a documentos grandes (perguntas, resumos por aspecto) enviam
+  ao modelo só as passagens relevantes (alguns milhares de tokens) em vez do
+  Markdown inteiro, sem novo download/conversão.
+
+Modelo:
+  • Chave: SHA-256 do arquivo baixado (o mesmo de gvg_artifacts).
+  • Passagens: split_markdown_sections (gvg_summarize) com GVG_DOC_INDEX_PASSAGE_CHARS.
+  • Embeddings em lotes (get_embeddings_batch) → public.doc_chunk (pgvector halfvec(3072),
+    dimensão do text-embedding-3-large, a mesma das demais tabelas de embedding).
+  • public.doc_chunk_index marca documentos completamente indexados.
+  • Indexação em segundo plano (schedule_index) após a conversão; busca filtra por
+    doc_sha (poucas centenas de linhas por documento → sem índice ANN).
+
+Variáveis:
+  GVG_DOC_INDEX (padrão = GVG_SUMMARY_RETRIEVAL, que é off: sem leitor, não indexa;
+  ligar só GVG_DOC_INDEX pré-aquece o índice antes de ativar a recuperação),
+  GVG_DOC_INDEX_PASSAGE_CHARS (2000),
+  GVG_DOC_INDEX_BATCH (64), GVG_DOC_INDEX_TOP_K (8), GVG_DOC_INDEX_CONTEXT_CHARS (16000)
+"""
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from gvg_ai_utils import EMBEDDING_MODEL, get_embedding, get_embeddings_batch
+from gvg_database import db_fetch_all, db_fetch_one, db_execute, db_execute_many
+from gvg_summarize import split_markdown_sections
+
+try:
+    from gvg_debug import debug_log as dbg  # type: ignore
+except Exception:  # pragma: no cover
+    def dbg(*_a, **_k):
+        pass
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+DOC_INDEX_ENABLED = (
+    os.getenv('GVG_DOC_INDEX', os.getenv('GVG_SUMMARY_RETRIEVAL', 'false')) or ''
+).strip().lower() in ('1', 'true', 'yes', 'on')
+PASSAGE_CHARS = max(1_000, _env_int('GVG_DOC_INDEX_PASSAGE_CHARS', 2_000))
+EMBED_BATCH = max(1, _env_int('GVG_DOC_INDEX_BATCH', 64))
+TOP_K = max(1, _env_int('GVG_DOC_INDEX_TOP_K', 8))
+CONTEXT_CHARS = max(2_000, _env_int('GVG_DOC_INDEX_CONTEXT_CHARS', 16_000))
+
+# Aspectos padrão do resumo de edital (uma consulta vetorial por aspecto)
+SUMMARY_ASPECTS = [
+    'objeto da contratação, itens, lotes e quantidades',
+    'valor estimado, preços de referência e dotação orçamentária',
+    'datas, prazos de entrega, vigência e sessão de disputa',
+    'requisitos de habilitação, qualificação técnica e documentos exigidos',
+    'critério de julgamento, modo de disputa e propostas',
+    'local e condições de entrega, recebimento e pagamento',
+    'garantias, sanções, penalidades e multas',
+]
+
+_INFLIGHT: set = set()
+_INFLIGHT_LOCK = threading.Lock()
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+
+def _vec_literal(vec: Iterable[float]) -> str:
+    return '[' + ','.join(f"{float(x):.6g}" for x in vec) + ']'
+
+
+# =====================
+# Indexação
+# =====================
+def is_indexed(doc_sha: Optional[str]) -> bool:
+    if not DOC_INDEX_ENABLED or not doc_sha:
+        return False
+    try:
+        row = db_fetch_one(
+            "SELECT 1 FROM public.doc_chunk_index WHERE doc_sha = %s AND model = %s",
+            (doc_sha, EMBEDDING_MODEL), as_dict=False, ctx="IDX.is_indexed",
+        )
+        return bool(row)
+    except Exception:
+        return False
+
+
+def index_document(doc_sha: Optional[str], markdown: Optional[str]) -> int:
+    """Divide, gera embeddings em lote e grava as passagens. Idempotente; retorna nº de passagens."""
+    if not DOC_INDEX_ENABLED or not doc_sha or not isinstance(markdown, str) or not markdown.strip():
+        return 0
+    if is_indexed(doc_sha):
+        return 0
+    with _INFLIGHT_LOCK:
+        if doc_sha in _INFLIGHT:
+            return 0
+        _INFLIGHT.add(doc_sha)
+    try:
+        passages = split_markdown_sections(markdown, PASSAGE_CHARS)
+        if not passages:
+            return 0
+        vectors = get_embeddings_batch([p['text'] for p in passages], batch_size=EMBED_BATCH, feature='doc_index')
+        rows = [
+            (doc_sha, p['index'], p['title'] or None, p['text'], _vec_literal(vec))
+            for p, vec in zip(passages, vectors) if vec
+        ]
+        if len(rows) < len(passages):
+            # Índice parcial daria respostas incompletas: não marcar como indexado
+            dbg('DOCS', f"doc index incompleto sha={doc_sha[:12]} ok={len(rows)}/{len(passages)}")
+            return 0
+        db_execute_many(
+            """
+            INSERT INTO public.doc_chunk (doc_sha, chunk_no, title, content, embedding)
+            VALUES (%s, %s, %s, %s, %s::halfvec(3072))
+            ON CONFLICT (doc_sha, chunk_no) DO UPDATE SET title = EXCLUDED.title,
+                content = EXCLUDED.content, embedding = EXCLUDED.embedding
+            """,
+            rows, ctx="IDX.put_chunks",
+        )
+        # Sobras de uma indexação anterior (outro modelo/tamanho de passagem)
+        db_execute(
+            "DELETE FROM public.doc_chunk WHERE doc_sha = %s AND chunk_no >= %s",
+            (doc_sha, len(rows)), ctx="IDX.trim_chunks",
+        )
+        db_execute(
+            """
+            INSERT INTO public.doc_chunk_index (doc_sha, model, chunks, chars)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (doc_sha) DO UPDATE SET model = EXCLUDED.model, chunks = EXCLUDED.chunks,
+                chars = EXCLUDED.chars, created_at = now()
+            """,
+            (doc_sha, EMBEDDING_MODEL, len(rows), len(markdown)), ctx="IDX.put_index",
+        )
+        dbg('DOCS', f"doc index sha={doc_sha[:12]} passagens={len(rows)} chars={len(markdown)}")
+        return len(rows)
+    except Exception as e:
+        dbg('DOCS', f"doc index erro: {e}")
+        return 0
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.discard(doc_sha)
+
+
+def schedule_index(doc_sha: Optional[str], markdown: Optional[str]) -> None:
+    """Indexa em segundo plano (não atrasa o resumo que disparou a conversão)."""
+    global _EXECUTOR
+    if not DOC_INDEX_ENABLED or not doc_sha or not isinstance(markdown, str) or not markdown.strip():
+        return
+    try:
+        if _EXECUTOR is None:
+            with _INFLIGHT_LOCK:
+                if _EXECUTOR is None:
+                    _EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gvg-docindex')
+        _EXECUTOR.submit(index_document, doc_sha, markdown)
+    except Exception as e:
+        dbg('DOCS', f"doc index agendamento erro: {e}")
+
+
+# =====================
+# Recuperação
+# =====================
+def _search(doc_sha: str, vec: List[float], top_k: int) -> List[Dict[str, Any]]:
+    rows = db_fetch_all(
+        """
+        SELECT chunk_no, title, content, (embedding <=> %s::halfvec(3072)) AS distance
+          FROM public.doc_chunk
+         WHERE doc_sha = %s
+         ORDER BY embedding <=> %s::halfvec(3072)
+         LIMIT %s
+        """,
+        (_vec_literal(vec), doc_sha, _vec_literal(vec), int(top_k)), as_dict=True, ctx="IDX.search",
+    ) or []
+    return [dict(r) for r in rows]
+
+
+def _select(hits: List[Dict[str, Any]], max_chars: int) -> List[Dict[str, Any]]:
+    """Melhores passagens dentro do orçamento de caracteres, devolvidas na ordem do documento."""
+    chosen: Dict[int, Dict[str, Any]] = {}
+    used = 0
+    for h in sorted(hits, key=lambda r: float(r.get('distance') or 0.0)):
+        no = int(h['chunk_no'])
+        if no in chosen:
+            continue
+        size = len(h.get('content') or '')
+        if chosen and used + size > max_chars:
+            continue
+        chosen[no] = h
+        used += size
+    return [chosen[k] for k in sorted(chosen)]
+
+
+def retrieve_passages(doc_sha: Optional[str], query: str, top_k: int = TOP_K, max_chars: int = CONTEXT_CHARS) -> List[Dict[str, Any]]:
+    """Top passagens de um documento para uma pergunta → [{'chunk_no','title','content','distance'}]."""
+    if not DOC_INDEX_ENABLED or not doc_sha or not (query or '').strip():
+        return []
+    vec = get_embedding(query, feature='doc_index_query')
+    if not vec:
+        return []
+    try:
+        return _select(_search(doc_sha, vec, top_k), max_chars)
+    except Exception as e:
+        dbg('DOCS', f"doc index busca erro: {e}")
+        return []
+
+
+def retrieve_for_aspects(doc_sha: Optional[str], aspects: Optional[List[str]] = None, per_aspect: int = 3,
+                         max_chars: int = CONTEXT_CHARS) -> List[Dict[str, Any]]:
+    """União das melhores passagens para vários aspectos (embeddings dos aspectos em um lote)."""
+    aspects = list(aspects or SUMMARY_ASPECTS)
+    if not DOC_INDEX_ENABLED or not doc_sha or not aspects:
+        return []
+    vectors = get_embeddings_batch(aspects, feature='doc_index_query')
+    hits: List[Dict[str, Any]] = []
+    try:
+        for vec in vectors:
+            if vec:
+                hits.extend(_search(doc_sha, vec, per_aspect))
+    except Exception as e:
+        dbg('DOCS', f"doc index busca (aspectos) erro: {e}")
+        return []
+    return _select(hits, max_chars)
+
+
+def passages_to_markdown(passages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for p in passages or []:
+        head = f"## Trecho {int(p['chunk_no']) + 1}" + (f" — {p['title']}" if p.get('title') else '')
+        parts.append(f"{head}\n\n{p.get('content') or ''}")
+    return "\n\n".join(parts)
+
+
+__all__ = [
+    'DOC_INDEX_ENABLED', 'SUMMARY_ASPECTS', 'is_indexed', 'index_document', 'schedule_index',
+    'retrieve_passages', 'retrieve_for_aspects', 'passages_to_markdown',
+]
@@ -0,0 +1,308 @@
+"""
+gvg_docling_pool.py
+Pool persistente de processos Docling (conversão PDF → Markdown) pré-aquecidos.
+
+Objetivo:
+  Evitar o custo de import do Docling e de inicialização dos modelos
+  (DocumentConverter + TableFormer FAST) a cada documento. Cada worker
+  importa o Docling e monta o conversor uma única vez e atende vários jobs.
+
+Modelo:
+  • N processos (spawn) aguardando jobs; quem chama faz checkout de um worker
+    ocioso (fila), envia o caminho do arquivo e espera a resposta.
+  • Timeout por job: o worker é encerrado e substituído (isolamento de falhas).
+  • Crash do worker (segfault/OOM): erro para o job corrente e novo worker.
+  • Reciclagem: após GVG_DOCLING_MAX_JOBS jobs ou quando o RSS passa de
+    GVG_DOCLING_MAX_RSS_MB.
+
+Variáveis:
+  GVG_DOCLING_POOL (padrão on), GVG_DOCLING_WORKERS (2), GVG_DOCLING_THREADS (4),
+  GVG_DOCLING_TIMEOUT (180 s), GVG_DOCLING_MAX_JOBS (50), GVG_DOCLING_MAX_RSS_MB (2048)
+"""
+from __future__ import annotations
+
+import os
+import time
+import queue
+import threading
+import multiprocessing as mp
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from gvg_debug import debug_log as dbg  # type: ignore
+except Exception:  # pragma: no cover
+    def dbg(*_a, **_k):
+        pass
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+DOCLING_POOL_ENABLED = (os.getenv('GVG_DOCLING_POOL', 'true') or '').strip().lower() in ('1', 'true', 'yes', 'on')
+DOCLING_WORKERS = max(1, _env_int('GVG_DOCLING_WORKERS', 2))
+DOCLING_THREADS = max(1, _env_int('GVG_DOCLING_THREADS', 4))
+DOCLING_TIMEOUT = max(10, _env_int('GVG_DOCLING_TIMEOUT', 180))
+DOCLING_MAX_JOBS = max(1, _env_int('GVG_DOCLING_MAX_JOBS', 50))
+DOCLING_MAX_RSS_MB = max(256, _env_int('GVG_DOCLING_MAX_RSS_MB', 2048))
+DOCLING_START_TIMEOUT = 120
+
+
+# =====================
+# Processo worker
+# =====================
+def _rss_mb() -> float:
+    try:
+        import psutil  # type: ignore
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except Exception:
+        pass
+    try:
+        import resource  # type: ignore
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # KB (Linux)
+    except Exception:
+        return 0.0
+
+
+def build_docling_converter(num_threads: int = DOCLING_THREADS):
+    """DocumentConverter com PyPdfium + TableFormer FAST (mesmas opções do caminho em subprocesso)."""
+    from docling.document_converter import DocumentConverter, PdfFormatOption
+    from docling.datamodel.pipeline_options import PdfPipelineOptions, TableStructureOptions, TableFormerMode
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.accelerator_options import AcceleratorDevice, AcceleratorOptions
+    from docling.backend.pypdfium2_backend import PyPdfiumDocumentBackend
+    ppo = PdfPipelineOptions()
+    ppo.do_ocr = False
+    ppo.do_picture_classification = False
+    ppo.do_picture_description = False
+    ppo.do_code_enrichment = False
+    ppo.do_formula_enrichment = False
+    ppo.do_table_structure = True
+    ppo.table_structure_options = TableStructureOptions()
+    ppo.table_structure_options.mode = TableFormerMode.FAST
+    ppo.table_structure_options.do_cell_matching = False
+    ppo.generate_page_images = False
+    ppo.generate_picture_images = False
+    ppo.images_scale = 1.0
+    ppo.accelerator_options = AcceleratorOptions(num_threads=num_threads, device=AcceleratorDevice.AUTO)
+    return DocumentConverter(format_options={InputFormat.PDF: PdfFormatOption(pipeline_options=ppo, backend=PyPdfiumDocumentBackend)})
+
+
+def _worker_main(conn, num_threads: int) -> None:
+    """Loop do worker: monta o conversor uma vez e atende jobs até receber None."""
+    t0 = time.time()
+    try:
+        converter = build_docling_converter(num_threads)
+    except ImportError as e:
+        conn.send({'ready': False, 'error': f"Docling não está instalado: {e}", 'import_error': True})
+        return
+    except Exception as e:
+        conn.send({'ready': False, 'error': f"Falha ao inicializar Docling: {e}"})
+        return
+    conn.send({'ready': True, 'init_ms': int((time.time() - t0) * 1000), 'rss_mb': _rss_mb()})
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+        t1 = time.time()
+        try:
+            res = converter.convert(job['path'])
+            md = res.document.export_to_markdown()
+            conn.send({'ok': True, 'markdown': md, 'ms': int((time.time() - t1) * 1000), 'rss_mb': _rss_mb()})
+        except Exception as e:
+            conn.send({'ok': False, 'error': str(e), 'ms': int((time.time() - t1) * 1000), 'rss_mb': _rss_mb()})
+
+
+# =====================
+# Lado do processo principal
+# =====================
+class _Worker:
+    def __init__(self, ctx, num_threads: int):
+        self.conn, child = ctx.Pipe(duplex=True)
+        self.proc = ctx.Process(target=_worker_main, args=(child, num_threads), daemon=True, name='gvg-docling')
+        self.proc.start()
+        child.close()
+        self.jobs = 0
+        self.rss_mb = 0.0
+        self.ready = False
+        self.init_error: Optional[str] = None
+        self.import_error = False
+
+    def wait_ready(self, timeout: float) -> bool:
+        if self.ready:
+            return True
+        if not self.conn.poll(timeout):
+            self.init_error = 'Timeout na inicialização do Docling'
+            return False
+        try:
+            msg = self.conn.recv()
+        except Exception as e:
+            self.init_error = f"Worker Docling encerrou na inicialização: {e}"
+            return False
+        self.ready = bool(msg.get('ready'))
+        self.rss_mb = float(msg.get('rss_mb') or 0.0)
+        if not self.ready:
+            self.init_error = msg.get('error') or 'Falha ao inicializar Docling'
+            self.import_error = bool(msg.get('import_error'))
+        else:
+            dbg('DOCS', f"docling worker pronto pid={self.proc.pid} init_ms={msg.get('init_ms')}")
+        return self.ready
+
+    def alive(self) -> bool:
+        return self.proc.is_alive()
+
+    def stop(self, kill: bool = False) -> None:
+        try:
+            if not kill and self.proc.is_alive():
+                self.conn.send(None)
+                self.proc.join(5)
+        except Exception:
+            pass
+        try:
+            if self.proc.is_alive():
+                self.proc.kill()
+                self.proc.join(5)
+        except Exception:
+            pass
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+class DoclingPool:
+    def __init__(self, workers: int = DOCLING_WORKERS, num_threads: int = DOCLING_THREADS,
+                 timeout: int = DOCLING_TIMEOUT, max_jobs: int = DOCLING_MAX_JOBS, max_rss_mb: int = DOCLING_MAX_RSS_MB):
+        self._ctx = mp.get_context('spawn')
+        self.size = int(workers)
+        self.num_threads = int(num_threads)
+        self.timeout = int(timeout)
+        self.max_jobs = int(max_jobs)
+        self.max_rss_mb = int(max_rss_mb)
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self.stats: Dict[str, Any] = {'jobs': 0, 'ok': 0, 'errors': 0, 'timeouts': 0, 'crashes': 0, 'recycled': 0, 'busy_ms': 0}
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            for _ in range(self.size):
+                self._idle.put(_Worker(self._ctx, self.num_threads))
+            self._started = True
+
+    def _bump(self, key: str, n: int = 1) -> None:
+        # convert() roda em várias threads ao mesmo tempo
+        with self._lock:
+            self.stats[key] += n
+
+    def stats_snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats)
+
+    def _replace(self, worker: Optional[_Worker], kill: bool = True) -> None:
+        if worker is not None:
+            worker.stop(kill=kill)
+        self._idle.put(_Worker(self._ctx, self.num_threads))
+
+    def convert(self, file_path: str, timeout: Optional[int] = None) -> Tuple[bool, Optional[str], Optional[str]]:
+        """Converte um arquivo em um worker do pool → (ok, markdown, erro)."""
+        self.start()
+        tmo = int(timeout or self.timeout)
+        t_wait = time.time()
+        try:
+            worker = self._idle.get(timeout=tmo)
+        except queue.Empty:
+            return False, None, 'Pool Docling ocupado (timeout na fila)'
+        wait_ms = int((time.time() - t_wait) * 1000)
+        if worker.import_error or not worker.wait_ready(DOCLING_START_TIMEOUT) or not worker.alive():
+            err = worker.init_error or 'Worker Docling indisponível'
+            if worker.import_error:
+                # Sem Docling no ambiente: recolocar (não adianta reiniciar)
+                self._idle.put(worker)
+                return False, None, err
+            self._bump('crashes')
+            self._replace(worker)
+            return False, None, err
+        self._bump('jobs')
+        t0 = time.time()
+        try:
+            worker.conn.send({'path': file_path})
+            if not worker.conn.poll(tmo):
+                self._bump('timeouts')
+                dbg('DOCS', f"docling pool timeout {tmo}s file='{os.path.basename(file_path)}' → reinicia worker")
+                self._replace(worker)
+                return False, None, f"Timeout na conversão Docling ({tmo}s)"
+            msg = worker.conn.recv()
+        except (EOFError, OSError, BrokenPipeError) as e:
+            self._bump('crashes')
+            dbg('DOCS', f"docling pool worker caiu: {e}")
+            self._replace(worker)
+            return False, None, f"Worker Docling encerrou inesperadamente: {e}"
+        finally:
+            self._bump('busy_ms', int((time.time() - t0) * 1000))
+        worker.jobs += 1
+        worker.rss_mb = float(msg.get('rss_mb') or 0.0)
+        if worker.jobs >= self.max_jobs or worker.rss_mb >= self.max_rss_mb:
+            self._bump('recycled')
+            dbg('DOCS', f"docling pool recicla worker jobs={worker.jobs} rss={worker.rss_mb:.0f}MB")
+            self._replace(worker, kill=False)
+        else:
+            self._idle.put(worker)
+        dbg('DOCS', f"docling pool file='{os.path.basename(file_path)}' ok={msg.get('ok')} wait_ms={wait_ms} conv_ms={msg.get('ms')}")
+        if msg.get('ok'):
+            self._bump('ok')
+            return True, msg.get('markdown') or '', None
+        self._bump('errors')
+        return False, None, msg.get('error') or 'Falha na conversão Docling'
+
+    def shutdown(self) -> None:
+        with self._lock:
+            workers: List[_Worker] = []
+            while True:
+                try:
+                    workers.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            for w in workers:
+                w.stop()
+            self._started = False
+
+
+_POOL: Optional[DoclingPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_docling_pool() -> DoclingPool:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = DoclingPool()
+    return _POOL
+
+
+def docling_pool_convert(file_path: str, timeout: Optional[int] = None) -> Tuple[bool, Optional[str], Optional[str]]:
+    return get_docling_pool().convert(file_path, timeout=timeout)
+
+
+def docling_pool_stats() -> Dict[str, Any]:
+    return get_docling_pool().stats_snapshot()
+
+
+def shutdown_docling_pool() -> None:
+    if _POOL is not None:
+        _POOL.shutdown()
+
+
+__all__ = [
+    'DOCLING_POOL_ENABLED', 'DoclingPool', 'get_docling_pool', 'build_docling_converter',
+    'docling_pool_convert', 'docling_pool_stats', 'shutdown_docling_pool',
+]
@@ -1,12 +1,13 @@
 """
 gvg_documents.py
 Processamento de documentos PNCP:
-- Download, detecção e conversão para Markdown (Docling isolado em subprocesso)
-- Extração de ZIP e RAR
+- Download, detecção e conversão para Markdown (Docling em pool de processos pré-aquecidos)
+- Extração de ZIP e RAR (conversão paralela dos anexos em gvg_archive)
 - Resumo com OpenAI Assistants (ID via .env: GVG_SUMMARY_DOCUMENT_v1)
 
 Observações:
-- Mantemos Docling em subprocesso por estabilidade.
+- Docling roda fora do processo principal por estabilidade: pool persistente
+  (gvg_docling_pool) por padrão; GVG_DOCLING_POOL=false volta ao subprocesso por arquivo.
 - Paths de trabalho vêm do .env (FILES_PATH, RESULTS_PATH, TEMP_PATH).
 - Logs reduzidos via flag DOCUMENTS_DEBUG/DEBUG.
 - Preparamos terreno para futuramente enviar o arquivo original ao Assistant sem Docling.
@@ -17,7 +18,6 @@ import re
 import sys
 import json
 import subprocess
-import requests
 import tempfile
 import warnings
 import zipfile
@@ -29,6 +29,7 @@ import unicodedata
 import logging
 import re
 import time
+import threading
 from dotenv import load_dotenv
 from gvg_debug import debug_log as dbg
 from gvg_ai_utils import ai_assistant_run_text, ai_assistant_run_with_files
@@ -38,6 +39,29 @@ from gvg_database import (
     storage_get_public_url,
     upsert_user_document,
 )
+from gvg_docling_pool import DOCLING_POOL_ENABLED, docling_pool_convert
+from gvg_archive import convert_archive, convert_extracted_files, upload_archive_markdowns, build_archive_markdown
+from gvg_http import DownloadError, download_to_file
+from gvg_summarize import should_map_reduce, condense_for_reduce
+from gvg_doc_index import (
+    is_indexed,
+    schedule_index,
+    retrieve_for_aspects,
+    passages_to_markdown,
+)
+from gvg_artifacts import (
+    ARTIFACT_CACHE_ENABLED,
+    sha256_file,
+    summary_variant,
+    artifact_lookup,
+    artifact_lookup_by_url,
+    artifact_get_markdown,
+    artifact_get_summary,
+    artifact_touch,
+    artifact_register,
+    artifact_put_markdown,
+    artifact_put_summary,
+)
 
 _OPENAI_AVAILABLE = True  # compat
 
@@ -131,6 +155,8 @@ def set_markdown_enabled(enabled: bool):
 GVG_SAVE_DOCUMENTS = _truthy(os.getenv('GVG_SAVE_DOCUMENTS', 'true'), default=True)
 
 _ASSISTANT_SUMMARY_ID = os.getenv('GVG_SUMMARY_DOCUMENT_v1')
+# Documento longo já indexado: resumo a partir das passagens por aspecto (em vez do map-reduce)
+GVG_SUMMARY_RETRIEVAL = _truthy(os.getenv('GVG_SUMMARY_RETRIEVAL', 'false'), default=False)
 
 def create_files_directory():
     Path(FILE_PATH).mkdir(parents=True, exist_ok=True)
@@ -151,18 +177,29 @@ def _sanitize_pncp_id(p: str | None) -> str | None:
     return s if s else None
 
 def download_document(doc_url, timeout=30):
+    """Baixa o arquivo via cliente HTTP compartilhado (gvg_http: keep-alive, retry, Range, guardas, cache)."""
     try:
         if not doc_url or not doc_url.strip():
             return False, None, None, "URL não fornecida"
         if not doc_url.startswith(('http://', 'https://')):
             return False, None, None, "URL inválida"
-        response = requests.get(doc_url, timeout=timeout, stream=True)
-        response.raise_for_status()
+        temp_dir = TEMP_PATH or tempfile.gettempdir()
+        try:
+            # Garantir diretório temporário existente; se falhar, usar temp do sistema
+            os.makedirs(temp_dir, exist_ok=True)
+        except Exception as e:
+            _dbg(f"[GSB][RESUMO] TEMP_PATH inválido ('{temp_dir}'): {e}; usando temp padrão do sistema.")
+            temp_dir = tempfile.gettempdir()
+            os.makedirs(temp_dir, exist_ok=True)
+        try:
+            dl = download_to_file(doc_url, temp_dir, timeout=timeout)
+        except DownloadError as e:
+            return False, None, None, str(e)
         parsed_url = urlparse(doc_url)
         filename = os.path.basename(parsed_url.path)
         if not filename or '.' not in filename:
-            content_type = response.headers.get('content-type', '').lower()
-            content_disposition = response.headers.get('content-disposition', '').lower()
+            content_type = (dl.get('content_type') or '').lower()
+            content_disposition = (dl.get('content_disposition') or '').lower()
             if 'filename=' in content_disposition:
                 try:
                     cd_filename = content_disposition.split('filename=')[1].strip('"\'')
@@ -187,32 +224,148 @@ def download_document(doc_url, timeout=30):
                     filename = "documento.json"
                 else:
                     filename = "documento_temporario"
-        temp_dir = TEMP_PATH or tempfile.gettempdir()
-        try:
-            # Garantir diretório temporário existente; se falhar, usar temp do sistema
-            os.makedirs(temp_dir, exist_ok=True)
-        except Exception as e:
-            _dbg(f"[GSB][RESUMO] TEMP_PATH inválido ('{temp_dir}'): {e}; usando temp padrão do sistema.")
-            temp_dir = tempfile.gettempdir()
-            os.makedirs(temp_dir, exist_ok=True)
-        temp_path = os.path.join(temp_dir, f"pncp_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}")
-        with open(temp_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
         if filename == "documento_temporario":
-            filename = detect_file_type_by_content_v3(temp_path)
-            if filename != "documento_temporario":
-                new_temp_path = os.path.join(temp_dir, f"pncp_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}")
-                os.rename(temp_path, new_temp_path)
-                temp_path = new_temp_path
+            filename = detect_file_type_by_content_v3(dl['path'])
+        temp_path = os.path.join(temp_dir, f"pncp_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}")
+        os.replace(dl['path'], temp_path)
         return True, temp_path, filename, None
-    except requests.exceptions.RequestException as e:
-        return False, None, None, f"Erro de conexão: {str(e)}"
     except Exception as e:
         return False, None, None, f"Erro inesperado: {str(e)}"
 
-def convert_document_to_markdown(file_path, original_filename):
-    """Convert a PDF to Markdown using Docling em subprocesso (caminho estável)."""
+# ========= Conversão em camadas (fast path PDF → Docling) =========
+GVG_FAST_PDF_TIER = _truthy(os.getenv('GVG_FAST_PDF_TIER', 'true'), default=True)
+# Limiares de aceitação da extração rápida (texto nativo do PDF)
+FAST_MIN_CHARS_PER_PAGE = int(os.getenv('GVG_FAST_MIN_CHARS_PER_PAGE', '400') or 400)
+FAST_MAX_GARBAGE_RATIO = 0.05
+FAST_MAX_EMPTY_PAGES_RATIO = 0.2
+FAST_MAX_TABLE_LIKENESS = 0.25
+_CONVERSION_STATS = {'fast': 0, 'docling': 0, 'fast_ms': 0, 'docling_ms': 0, 'escalated': 0}
+_CONVERSION_LOCK = threading.Lock()
+
+def _fast_pdf_pages(file_path):
+    """Texto nativo por página via pypdfium2 (None se indisponível/ilegível)."""
+    try:
+        import pypdfium2 as pdfium  # type: ignore
+    except Exception:
+        return None
+    try:
+        pdf = pdfium.PdfDocument(file_path)
+        pages = []
+        try:
+            for i in range(len(pdf)):
+                page = pdf[i]
+                textpage = page.get_textpage()
+                pages.append(textpage.get_text_range() or '')
+                textpage.close()
+                page.close()
+        finally:
+            pdf.close()
+        return pages
+    except Exception as e:
+        dbg('DOCS', f"fast tier: pypdfium2 erro: {e}")
+        return None
+
+def score_text_quality(pages):
+    """Métricas da extração rápida: chars/página, lixo, páginas vazias e 'cara de tabela'."""
+    n = max(1, len(pages or []))
+    text = ''.join(pages or [])
+    total = max(1, len(text))
+    garbage = sum(1 for c in text if c == '\ufffd' or (ord(c) < 32 and c not in '\n\r\t') or 0xE000 <= ord(c) <= 0xF8FF)
+    empty = sum(1 for p in (pages or []) if len((p or '').strip()) < 20)
+    lines = [ln for ln in text.splitlines() if ln.strip()]
+    # Linha "tabular": várias colunas separadas por espaços largos/tab ou majoritariamente numérica
+    tabular = 0
+    for ln in lines:
+        cols = len(re.findall(r'\S(?:\s{3,}|\t)\S', ln))
+        digits = sum(ch.isdigit() for ch in ln)
+        if cols >= 2 or (len(ln) > 8 and digits / len(ln) > 0.5):
+            tabular += 1
+    return {
+        'pages': len(pages or []),
+        'chars_per_page': round(len(text) / n, 1),
+        'garbage_ratio': round(garbage / total, 4),
+        'empty_pages_ratio': round(empty / n, 3),
+        'table_likeness': round(tabular / max(1, len(lines)), 3),
+    }
+
+def _fast_quality_ok(m):
+    return (
+        m['pages'] > 0
+        and m['chars_per_page'] >= FAST_MIN_CHARS_PER_PAGE
+        and m['garbage_ratio'] <= FAST_MAX_GARBAGE_RATIO
+        and m['empty_pages_ratio'] <= FAST_MAX_EMPTY_PAGES_RATIO
+        and m['table_likeness'] <= FAST_MAX_TABLE_LIKENESS
+    )
+
+def _pages_to_markdown(pages):
+    out = []
+    for i, p in enumerate(pages, start=1):
+        body = re.sub(r'[ \t]+\n', '\n', (p or '').replace('\r\n', '\n').replace('\r', '\n'))
+        body = re.sub(r'\n{3,}', '\n\n', body).strip()
+        if body:
+            out.append(f"<!-- página {i} -->\n\n{body}")
+    return "\n\n---\n\n".join(out)
+
+def _is_pdf(file_path, original_filename):
+    if str(original_filename or file_path or '').lower().endswith('.pdf'):
+        return True
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read(5) == b'%PDF-'
+    except Exception:
+        return False
+
+def _record_conversion(tier, ms, original_filename, metrics=None, escalated=False, conv_info=None):
+    with _CONVERSION_LOCK:
+        _CONVERSION_STATS[tier] += 1
+        _CONVERSION_STATS[f"{tier}_ms"] += int(ms)
+        if escalated:
+            _CONVERSION_STATS['escalated'] += 1
+    if conv_info is not None:
+        conv_info.update({'tier': tier, 'ms': int(ms), 'escalated': bool(escalated), 'metrics': metrics})
+    dbg('DOCS', f"conversão tier={tier} ms={int(ms)} escalado={escalated} arquivo='{original_filename}' metrics={metrics or {}}")
+
+def conversion_stats():
+    """Contadores por camada (fast/docling) e tempo acumulado no processo."""
+    with _CONVERSION_LOCK:
+        return dict(_CONVERSION_STATS)
+
+def convert_document_to_markdown(file_path, original_filename, fast_tier=None, conv_info=None, timeout=None):
+    """Converte documento em Markdown: PDF com texto nativo bom sai pela camada rápida
+    (pypdfium2); o resto (ou texto ruim/tabular) vai ao Docling.
+
+    fast_tier: força (True/False) a camada rápida; None usa GVG_FAST_PDF_TIER.
+    conv_info: dict opcional preenchido com o registro do documento
+    (tier, ms, escalated, metrics).
+    timeout: limite (s) da conversão Docling; None usa o padrão do pool/subprocesso.
+    """
+    metrics = None
+    t_fast = 0.0
+    use_fast = GVG_FAST_PDF_TIER if fast_tier is None else bool(fast_tier)
+    if use_fast and _is_pdf(file_path, original_filename):
+        t0 = time.time()
+        pages = _fast_pdf_pages(file_path)
+        t_fast = (time.time() - t0) * 1000
+        if pages is not None:
+            metrics = score_text_quality(pages)
+            if _fast_quality_ok(metrics):
+                _record_conversion('fast', t_fast, original_filename, metrics, conv_info=conv_info)
+                return True, _pages_to_markdown(pages), None
+    t0 = time.time()
+    result = _convert_with_docling(file_path, original_filename, timeout=timeout)
+    _record_conversion('docling', t_fast + (time.time() - t0) * 1000, original_filename, metrics,
+                       escalated=metrics is not None, conv_info=conv_info)
+    return result
+
+def _convert_with_docling(file_path, original_filename, timeout=None):
+    """Convert a PDF to Markdown using Docling (pool pré-aquecido ou subprocesso por arquivo)."""
+    if DOCLING_POOL_ENABLED:
+        dbg('DOCS', f"Docling(pool): start original='{original_filename}' path='{file_path}'")
+        try:
+            return docling_pool_convert(file_path, timeout=timeout)
+        except Exception as e:
+            dbg('DOCS', f"Docling(pool): exceção original='{original_filename}' err={e}")
+            return False, None, f"Erro na conversão: {str(e)}"
     try:
         dbg('DOCS', f"Docling: start original='{original_filename}' path='{file_path}'")
         code = (
@@ -232,7 +385,7 @@ def convert_document_to_markdown(file_path, original_filename):
         try:
             proc = subprocess.run(
                 [sys.executable, "-c", code, file_path, original_filename],
-                capture_output=True, text=True, timeout=180
+                capture_output=True, text=True, timeout=int(timeout or 180)
             )
         except Exception as e:
             return False, None, f"Falha ao executar subprocesso Docling: {e}"
@@ -302,27 +455,41 @@ def save_summary_file(summary_content, original_filename, doc_url, timestamp=Non
     except Exception as e:
         return False, None, str(e)
 
-def generate_document_summary(markdown_content, max_tokens=None, pncp_data=None):
+def _pncp_context_block(pncp_data):
+    """Bloco compacto de contexto PNCP para os prompts de documento."""
+    ctx_lines = []
+    if isinstance(pncp_data, dict) and pncp_data:
+        try:
+            ctx_lines.append(f"ID: {pncp_data.get('id')}")
+            ctx_lines.append(f"Órgão: {pncp_data.get('orgao')} | Local: {pncp_data.get('municipio')}/{pncp_data.get('uf')}")
+            ctx_lines.append(f"Datas: Inc {pncp_data.get('data_inclusao')} | Ab {pncp_data.get('data_abertura')} | Enc {pncp_data.get('data_encerramento')}")
+            ctx_lines.append(f"Modal/Disp: {pncp_data.get('modalidade_id')} - {pncp_data.get('modalidade_nome')} | {pncp_data.get('disputa_id')} - {pncp_data.get('disputa_nome')}")
+        except Exception:
+            pass
+    return ("\n".join([l for l in ctx_lines if l])) if ctx_lines else ""
+
+def generate_document_summary(markdown_content, max_tokens=None, pncp_data=None, doc_sha=None):
     """Resumo via OpenAI Assistants (ID do .env: GVG_SUMMARY_DOCUMENT_v1) usando wrappers centrais."""
     try:
         _dbg("[GSB][RESUMO] generate_document_summary() via Assistants...")
         if not _ASSISTANT_SUMMARY_ID:
             return "OpenAI/Assistant não configurado (verifique GVG_SUMMARY_DOCUMENT_v1 no .env)."
-        # Truncagem conservadora
         content = markdown_content or ""
+        doc_header = "Documento (Markdown):\n\n"
+        # Documentos longos: passagens do índice (se habilitado) ou map-reduce por seções, em vez de truncar o final
+        if should_map_reduce(content):
+            passages = retrieve_for_aspects(doc_sha) if (GVG_SUMMARY_RETRIEVAL and is_indexed(doc_sha)) else []
+            if passages:
+                content = passages_to_markdown(passages)
+                doc_header = "Documento (trechos mais relevantes, na ordem original):\n\n"
+            else:
+                content = condense_for_reduce(content)
+                doc_header = "Documento (Markdown condensado por seções, na ordem original):\n\n"
+        # Truncagem conservadora
         if len(content) > 100_000:
             content = content[:100_000] + "\n\n...(documento truncado)"
         # Contexto compacto
-        ctx_lines = []
-        if isinstance(pncp_data, dict) and pncp_data:
-            try:
-                ctx_lines.append(f"ID: {pncp_data.get('id')}")
-                ctx_lines.append(f"Órgão: {pncp_data.get('orgao')} | Local: {pncp_data.get('municipio')}/{pncp_data.get('uf')}")
-                ctx_lines.append(f"Datas: Inc {pncp_data.get('data_inclusao')} | Ab {pncp_data.get('data_abertura')} | Enc {pncp_data.get('data_encerramento')}")
-                ctx_lines.append(f"Modal/Disp: {pncp_data.get('modalidade_id')} - {pncp_data.get('modalidade_nome')} | {pncp_data.get('disputa_id')} - {pncp_data.get('disputa_nome')}")
-            except Exception:
-                pass
-        ctx_block = ("\n".join([l for l in ctx_lines if l])) if ctx_lines else ""
+        ctx_block = _pncp_context_block(pncp_data)
         anti_citation = (
             "INSTRUÇÕES ADICIONAIS IMPORTANTES:\n"
             "- NUNCA inclua citações, referências ou marcas de fonte.\n"
@@ -332,7 +499,7 @@ def generate_document_summary(markdown_content, max_tokens=None, pncp_data=None)
         user_message = (
             (("Contexto PNCP:\n" + ctx_block + "\n\n") if ctx_block else "")
             + anti_citation
-            + "Documento (Markdown):\n\n" + content
+            + doc_header + content
         )
         out = ai_assistant_run_text(_ASSISTANT_SUMMARY_ID, user_message, context_key='doc_summary', timeout=180)
         out = strip_citations(out or "")
@@ -347,16 +514,7 @@ def generate_document_summary_from_files(file_paths: list[str], max_tokens=None,
         if not _ASSISTANT_SUMMARY_ID:
             return "OpenAI/Assistant não configurado (verifique GVG_SUMMARY_DOCUMENT_v1 no .env)."
         # Context block (compact)
-        ctx_lines = []
-        if isinstance(pncp_data, dict) and pncp_data:
-            try:
-                ctx_lines.append(f"ID: {pncp_data.get('id')}")
-                ctx_lines.append(f"Órgão: {pncp_data.get('orgao')} | Local: {pncp_data.get('municipio')}/{pncp_data.get('uf')}")
-                ctx_lines.append(f"Datas: Inc {pncp_data.get('data_inclusao')} | Ab {pncp_data.get('data_abertura')} | Enc {pncp_data.get('data_encerramento')}")
-                ctx_lines.append(f"Modal/Disp: {pncp_data.get('modalidade_id')} - {pncp_data.get('modalidade_nome')} | {pncp_data.get('disputa_id')} - {pncp_data.get('disputa_nome')}")
-            except Exception:
-                pass
-        ctx_block = ("\n".join([l for l in ctx_lines if l])) if ctx_lines else ""
+        ctx_block = _pncp_context_block(pncp_data)
         anti_citation = (
             "INSTRUÇÕES ADICIONAIS IMPORTANTES:\n"
             "- NUNCA inclua citações, referências ou marcas de fonte.\n"
@@ -582,7 +740,62 @@ def extract_all_supported_files_from_rar(rar_path: str):
     except Exception as e:
         return False, [], f"Erro ao extrair RAR: {str(e)}"
 
+def _serve_from_artifact(art, doc_url, document_name, max_tokens, pncp_data):
+    """Atende a partir do artefato compartilhado (None se não houver o suficiente).
+
+    Resumo da mesma variante (inclui o contexto PNCP) → devolve direto. Markdown disponível (modo MD) → só
+    chama o Assistant. Registro por usuário aponta para o Markdown compartilhado.
+    """
+    sha = (art or {}).get('sha256')
+    if not sha:
+        return None
+    mode = 'md' if GVG_USE_MARKDOWN_SUMMARY else 'files'
+    summary = artifact_get_summary(sha, summary_variant(max_tokens, mode, _pncp_context_block(pncp_data)))
+    markdown = None
+    if not summary and GVG_USE_MARKDOWN_SUMMARY and art.get('markdown_key'):
+        markdown = artifact_get_markdown(art)
+        if not markdown:
+            return None
+    if not summary and markdown is None:
+        return None
+    artifact_touch(sha)
+    # Registro por usuário referenciando o artefato (sem novo upload)
+    if GVG_SAVE_DOCUMENTS and art.get('markdown_url'):
+        try:
+            pncp_raw = (pncp_data or {}).get('numero_controle_pncp') or (pncp_data or {}).get('id')
+            uid_local = (pncp_data or {}).get('uid') or (pncp_data or {}).get('user_id') or os.getenv('PASS_USER_UID')
+            if uid_local and pncp_raw:
+                name = document_name or art.get('filename') or 'documento'
+                doc_type = _infer_doc_type(art.get('filename') or name, doc_url, default=None)
+                upsert_user_document(str(uid_local), str(pncp_raw), name, doc_type, art['markdown_url'], art.get('size_bytes'))
+        except Exception as e:
+            dbg('DOCS', f"artifact registro usuário erro: {e}")
+    if summary:
+        dbg('DOCS', f"artifact HIT resumo sha={sha[:12]}")
+        return summary
+    dbg('DOCS', f"artifact HIT markdown sha={sha[:12]} md_len={len(markdown)}")
+    schedule_index(sha, markdown)
+    summary = generate_document_summary(markdown, max_tokens, pncp_data, doc_sha=sha)
+    artifact_put_summary(sha, summary_variant(max_tokens, 'md', _pncp_context_block(pncp_data)), summary)
+    return summary
+
 def process_pncp_document(doc_url, max_tokens=500, document_name=None, pncp_data=None):
+    # Cache global por URL: pode pular download, conversão e Assistant
+    if ARTIFACT_CACHE_ENABLED:
+        try:
+            hit = _serve_from_artifact(artifact_lookup_by_url(doc_url), doc_url, document_name, max_tokens, pncp_data)
+            if hit is not None:
+                return hit
+        except Exception as e:
+            dbg('DOCS', f"artifact lookup (url) erro: {e}")
+    art_ctx = {'sha': None}
+    summary = _process_pncp_document(doc_url, max_tokens, document_name, pncp_data, art_ctx)
+    if art_ctx.get('sha') and not art_ctx.get('hit'):
+        mode = 'md' if GVG_USE_MARKDOWN_SUMMARY else 'files'
+        artifact_put_summary(art_ctx['sha'], summary_variant(max_tokens, mode, _pncp_context_block(pncp_data)), summary)
+    return summary
+
+def _process_pncp_document(doc_url, max_tokens, document_name, pncp_data, art_ctx):
     temp_path = None
     try:
         # Timestamp do lote (compartilhado entre todos os docs deste processamento)
@@ -611,93 +824,62 @@ def process_pncp_document(doc_url, max_tokens=500, document_name=None, pncp_data
         if not success:
             return f"Erro no download: {error}"
         final_filename = document_name if document_name else filename
-        if is_zip_file(temp_path):
+        # Cache global por conteúdo (mesmo arquivo sob outra URL)
+        if ARTIFACT_CACHE_ENABLED:
+            try:
+                sha = sha256_file(temp_path)
+                art = artifact_lookup(sha)
+                if sha and artifact_register(sha, doc_url, final_filename, os.path.getsize(temp_path)):
+                    art_ctx['sha'] = sha
+                if art:
+                    hit = _serve_from_artifact(art, doc_url, document_name, max_tokens, pncp_data)
+                    if hit is not None:
+                        art_ctx['hit'] = True
+                        return hit
+            except Exception as e:
+                dbg('DOCS', f"artifact lookup (sha) erro: {e}")
+        archive_kind = 'zip' if is_zip_file(temp_path) else ('rar' if is_rar_file(temp_path) else None)
+        if archive_kind:
+            label = archive_kind.upper()
             try:
                 size_mb = (os.path.getsize(temp_path) / (1024*1024)) if os.path.exists(temp_path) else 0.0
             except Exception:
                 size_mb = 0.0
-            dbg('DOCS', f"detect: ZIP size={size_mb:.2f}MB path='{temp_path}'")
-            dbg('DOCS', "📦 Arquivo ZIP detectado. Extraindo TODOS os arquivos suportados...")
-            success, extracted_files_list, error = extract_all_supported_files_from_zip(temp_path)
-            if not success:
-                return f"Erro ao extrair arquivos do ZIP: {error}"
-            if not extracted_files_list:
-                return "Erro: Nenhum arquivo suportado encontrado no ZIP"
-            dbg('DOCS', f"extract ZIP: total={len(extracted_files_list)}")
+            dbg('DOCS', f"detect: {label} size={size_mb:.2f}MB path='{temp_path}'")
+            pncp_raw = (pncp_data or {}).get('numero_controle_pncp') or (pncp_data or {}).get('id')
+            pncp_raw = str(pncp_raw) if pncp_raw else None
+            uid_local = (pncp_data or {}).get('uid') or (pncp_data or {}).get('user_id')
             if GVG_USE_MARKDOWN_SUMMARY:
-                # Docling -> Markdown -> Assistant
-                all_markdown_content = f"# Documento PNCP: {final_filename} (ZIP com múltiplos arquivos)\n\n"
-                all_markdown_content += f"**Arquivo original:** `{final_filename}`  \n"
-                all_markdown_content += f"**Processado em:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}  \n"
-                all_markdown_content += f"**Ferramenta:** Docling SUPER OTIMIZADO (PyPdfium + TableFormer FAST) + OpenAI GPT-4o  \n"
-                all_markdown_content += f"**Arquivos extraídos:** {len(extracted_files_list)}  \n\n"
-                all_markdown_content += "---\n\n"
-                processed_files = []
-                doc_counter = 0
-                for extracted_path, original_name in extracted_files_list:
-                    dbg('DOCS', f"📄 Processando arquivo extraído: {original_name}")
-                    if os.path.exists(extracted_path):
-                        file_size_extracted = os.path.getsize(extracted_path) / (1024 * 1024)
-                        dbg('DOCS', f"Docling: arquivo extraído size={file_size_extracted:.2f}MB name='{original_name}'")
-                        file_success, file_markdown, file_error = convert_document_to_markdown(extracted_path, original_name)
-                        if file_success:
-                            doc_counter += 1
-                            all_markdown_content += f"## 📄 Arquivo: {original_name}\n\n"
-                            all_markdown_content += f"**Tamanho:** {file_size_extracted:.2f} MB  \n"
-                            all_markdown_content += f"**Status:** ✅ Processado com sucesso  \n\n"
-                            all_markdown_content += "### Conteúdo:\n\n"
-                            all_markdown_content += file_markdown
-                            all_markdown_content += "\n\n---\n\n"
-                            # Upload best-effort por arquivo
-                            if GVG_SAVE_DOCUMENTS:
-                                try:
-                                    # Monta nome padronizado
-                                    pncp_raw = (pncp_data or {}).get('numero_controle_pncp') or (pncp_data or {}).get('id')
-                                    pncp_raw = str(pncp_raw) if pncp_raw else None
-                                    pncp_key = _sanitize_pncp_id(pncp_raw)
-                                    if pncp_key:
-                                        key = f"DOCUMENTS/PNCP_{pncp_key}_DOC{doc_counter}.md"
-                                        ok, public_url, size_bytes = storage_put_text('govgo', key, file_markdown)
-                                        dbg('DOCS', f"upload file ok={ok} key='{key}' size={size_bytes} url='{public_url}' pncp_raw='{pncp_raw}' pncp_key='{pncp_key}'")
-                                        if ok and public_url:
-                                            uid = (pncp_data or {}).get('uid') or (pncp_data or {}).get('user_id')
-                                            if uid and pncp_raw:
-                                                doc_type = _infer_doc_type(original_name, doc_url, default=None)
-                                                ok_db = upsert_user_document(str(uid), str(pncp_raw), original_name, doc_type, public_url, size_bytes)
-                                                dbg('DOCS', f"db insert user_documents ok={ok_db} uid={uid} pncp_raw='{pncp_raw}' name='{original_name}'")
-                                except Exception as _e:
-                                    dbg('DOCS', f"upload/db erro arquivo='{original_name}' err={_e}")
-                            processed_files.append({'name': original_name, 'success': True})
-                            dbg('DOCS', f"✅ {original_name} processado com sucesso")
-                        else:
-                            all_markdown_content += f"## ❌ Arquivo: {original_name}\n\n"
-                            all_markdown_content += f"**Tamanho:** {file_size_extracted:.2f} MB  \n"
-                            all_markdown_content += f"**Status:** ❌ Erro no processamento  \n"
-                            all_markdown_content += f"**Erro:** {file_error}  \n\n"
-                            all_markdown_content += "---\n\n"
-                            processed_files.append({'name': original_name, 'success': False})
-                            dbg('DOCS', f"❌ Erro em {original_name}: {file_error}")
-                    else:
-                        dbg('DOCS', f"❌ Arquivo extraído não encontrado: {original_name}")
-                # Cleanup
+                # Docling -> Markdown -> Assistant (entradas convertidas em paralelo, principal primeiro)
+                dbg('DOCS', f"📦 Arquivo {label} detectado. Convertendo arquivos suportados em paralelo...")
                 try:
-                    if extracted_files_list:
-                        extract_dir = os.path.dirname(extracted_files_list[0][0])
-                        if os.path.exists(extract_dir):
-                            shutil.rmtree(extract_dir)
-                except Exception as cleanup_error:
-                    dbg('DOCS', f"cleanup ZIP erro: {cleanup_error}")
-                successful_files = [f for f in processed_files if f['success']]
-                if successful_files:
-                    success = True
-                    markdown_content = all_markdown_content
-                    error = None
-                    final_filename = f"{final_filename} ({len(successful_files)}-{len(processed_files)} arquivos)"
-                    dbg('DOCS', f"✅ ZIP processado: {len(successful_files)}/{len(processed_files)} arquivos com sucesso")
-                else:
-                    return "Erro: Nenhum arquivo do ZIP foi processado com sucesso"
+                    result = convert_archive(temp_path, archive_kind)
+                except Exception as e:
+                    return f"Erro ao extrair arquivos do {label}: {e}"
+                files = result['files']
+                if not files:
+                    return f"Erro: Nenhum arquivo suportado encontrado no {label}"
+                ok_files = [f for f in files if f['ok']]
+                if not ok_files:
+                    return f"Erro: Nenhum arquivo do {label} foi processado com sucesso"
+                upload_ms = 0
+                if GVG_SAVE_DOCUMENTS:
+                    upload_ms = upload_archive_markdowns(ok_files, pncp_raw, uid_local, doc_url).get('ms', 0)
+                markdown_content = build_archive_markdown(final_filename, label, result)
+                success = True
+                error = None
+                final_filename = f"{final_filename} ({len(ok_files)}-{len(files)} arquivos)"
+                st = result['stats']
+                dbg('DOCS', f"✅ {label} processado: {len(ok_files)}/{len(files)} ok skipped={st['skipped']} "
+                            f"extract_ms={st['extract_ms']} convert_total_ms={st['total_ms']} upload_ms={upload_ms}")
             else:
                 # Assistant direto com arquivos originais
+                extractor = extract_all_supported_files_from_zip if archive_kind == 'zip' else extract_all_supported_files_from_rar
+                success, extracted_files_list, error = extractor(temp_path)
+                if not success:
+                    return f"Erro ao extrair arquivos do {label}: {error}"
+                if not extracted_files_list:
+                    return f"Erro: Nenhum arquivo suportado encontrado no {label}"
                 try:
                     files_to_send = [p for (p, _n) in extracted_files_list if os.path.exists(p)]
                     summary = generate_document_summary_from_files(files_to_send, max_tokens, pncp_data)
@@ -705,133 +887,34 @@ def process_pncp_document(doc_url, max_tokens=500, document_name=None, pncp_data
                     summary_success, summary_path, summary_error = save_summary_file(summary, final_filename, doc_url, processing_timestamp, pncp_data, method_label=method_label, markdown_filename=None)
                     if not summary_success:
                         dbg('DOCS', f"⚠️ Aviso: Erro ao salvar resumo: {summary_error}")
-                    # Além do resumo, se habilitado, converter e salvar MD de cada item
-                    if GVG_SAVE_DOCUMENTS:
+                    # Além do resumo, se habilitado, converter e salvar MD de cada item (reusa a extração acima)
+                    if GVG_SAVE_DOCUMENTS and pncp_raw and uid_local:
                         try:
-                            pncp_raw = (pncp_data or {}).get('numero_controle_pncp') or (pncp_data or {}).get('id')
-                            pncp_raw = str(pncp_raw) if pncp_raw else None
-                            pncp_key = _sanitize_pncp_id(pncp_raw)
-                            uid = (pncp_data or {}).get('uid') or (pncp_data or {}).get('user_id')
-                            doc_counter = 0
-                            if pncp_key and uid:
-                                for extracted_path, original_name in extracted_files_list:
-                                    if os.path.exists(extracted_path):
-                                        conv_ok, conv_md, conv_err = convert_document_to_markdown(extracted_path, original_name)
-                                        if conv_ok and isinstance(conv_md, str) and conv_md.strip():
-                                            doc_counter += 1
-                                            key = f"DOCUMENTS/PNCP_{pncp_key}_DOC{doc_counter}.md"
-                                            ok, public_url, size_bytes = storage_put_text('govgo', key, conv_md)
-                                            dbg('DOCS', f"upload conv ok={ok} key='{key}' size={size_bytes} url='{public_url}' pncp_raw='{pncp_raw}' pncp_key='{pncp_key}'")
-                                            if ok and public_url and pncp_raw:
-                                                doc_type = _infer_doc_type(original_name, doc_url, default=None)
-                                                ok_db = upsert_user_document(str(uid), str(pncp_raw), original_name, doc_type, public_url, size_bytes)
-                                                dbg('DOCS', f"db insert user_documents ok={ok_db} uid={uid} pncp_raw='{pncp_raw}' name='{original_name}'")
-                        except Exception:
-                            dbg('DOCS', 'upload conv erro (ZIP)')
-                    # Cleanup extract dir
-                    try:
-                        if extracted_files_list:
-                            extract_dir = os.path.dirname(extracted_files_list[0][0])
-                            if os.path.exists(extract_dir):
-                                shutil.rmtree(extract_dir)
-                    except Exception as cleanup_error:
-                        dbg('DOCS', f"⚠️ Aviso: Erro na limpeza: {cleanup_error}")
+                            result = convert_extracted_files(extracted_files_list, archive_kind)
+                            upload_archive_markdowns(result['files'], pncp_raw, uid_local, doc_url)
+                        except Exception as e:
+                            dbg('DOCS', f"upload conv erro ({label}): {e}")
                     # Return only assistant output so the UI shows the exact text
                     return summary
                 finally:
-                    # Ensure temp is removed
-                    pass
-        elif is_rar_file(temp_path):
-            try:
-                size_mb = (os.path.getsize(temp_path) / (1024*1024)) if os.path.exists(temp_path) else 0.0
-            except Exception:
-                size_mb = 0.0
-            dbg('DOCS', f"detect: RAR size={size_mb:.2f}MB path='{temp_path}'")
-            dbg('DOCS', "📦 Arquivo RAR detectado. Extraindo TODOS os arquivos suportados...")
-            success, extracted_files_list, error = extract_all_supported_files_from_rar(temp_path)
-            if not success:
-                return f"Erro ao extrair arquivos do RAR: {error}"
-            if not extracted_files_list:
-                return "Erro: Nenhum arquivo suportado encontrado no RAR"
-            dbg('DOCS', f"extract RAR: total={len(extracted_files_list)}")
-            if GVG_USE_MARKDOWN_SUMMARY:
-                # Docling -> Markdown -> Assistant
-                all_markdown_content = f"# Documento PNCP: {final_filename} (RAR com múltiplos arquivos)\n\n"
-                all_markdown_content += f"**Arquivo original:** `{final_filename}`  \n"
-                all_markdown_content += f"**Processado em:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}  \n"
-                all_markdown_content += f"**Ferramenta:** Docling SUPER OTIMIZADO (PyPdfium + TableFormer FAST) + OpenAI GPT-4o  \n"
-                all_markdown_content += f"**Arquivos extraídos:** {len(extracted_files_list)}  \n\n"
-                all_markdown_content += "---\n\n"
-                processed_files = []
-                for extracted_path, original_name in extracted_files_list:
-                    dbg('DOCS', f"📄 Processando arquivo extraído: {original_name}")
-                    if os.path.exists(extracted_path):
-                        file_size_extracted = os.path.getsize(extracted_path) / (1024 * 1024)
-                        dbg('DOCS', f"📏 Tamanho: {file_size_extracted:.2f} MB")
-                        file_success, file_markdown, file_error = convert_document_to_markdown(extracted_path, original_name)
-                        if file_success:
-                            all_markdown_content += f"## 📄 Arquivo: {original_name}\n\n"
-                            all_markdown_content += f"**Tamanho:** {file_size_extracted:.2f} MB  \n"
-                            all_markdown_content += f"**Status:** ✅ Processado com sucesso  \n\n"
-                            all_markdown_content += "### Conteúdo:\n\n"
-                            all_markdown_content += file_markdown
-                            all_markdown_content += "\n\n---\n\n"
-                            processed_files.append({'name': original_name, 'success': True})
-                            dbg('DOCS', f"✅ {original_name} processado com sucesso")
-                        else:
-                            all_markdown_content += f"## ❌ Arquivo: {original_name}\n\n"
-                            all_markdown_content += f"**Tamanho:** {file_size_extracted:.2f} MB  \n"
-                            all_markdown_content += f"**Status:** ❌ Erro no processamento  \n"
-                            all_markdown_content += f"**Erro:** {file_error}  \n\n"
-                            all_markdown_content += "---\n\n"
-                            processed_files.append({'name': original_name, 'success': False})
-                            dbg('DOCS', f"❌ Erro em {original_name}: {file_error}")
-                    else:
-                        dbg('DOCS', f"❌ Arquivo extraído não encontrado: {original_name}")
-                try:
-                    if extracted_files_list:
+                    try:
                         extract_dir = os.path.dirname(extracted_files_list[0][0])
                         if os.path.exists(extract_dir):
                             shutil.rmtree(extract_dir)
-                except Exception as cleanup_error:
-                    dbg('DOCS', f"⚠️ Aviso: Erro na limpeza: {cleanup_error}")
-                successful_files = [f for f in processed_files if f['success']]
-                if successful_files:
-                    success = True
-                    markdown_content = all_markdown_content
-                    error = None
-                    final_filename = f"{final_filename} ({len(successful_files)}-{len(processed_files)} arquivos)"
-                    dbg('DOCS', f"✅ RAR processado: {len(successful_files)}/{len(processed_files)} arquivos com sucesso")
-                else:
-                    return "Erro: Nenhum arquivo do RAR foi processado com sucesso"
-            else:
-                # Assistant direto com arquivos originais
-                try:
-                    files_to_send = [p for (p, _n) in extracted_files_list if os.path.exists(p)]
-                    summary = generate_document_summary_from_files(files_to_send, max_tokens, pncp_data)
-                    method_label = "Assistant (arquivos originais)"
-                    summary_success, summary_path, summary_error = save_summary_file(summary, final_filename, doc_url, processing_timestamp, pncp_data, method_label=method_label, markdown_filename=None)
-                    if not summary_success:
-                        dbg('DOCS', f"⚠️ Aviso: Erro ao salvar resumo: {summary_error}")
-                    try:
-                        if extracted_files_list:
-                            extract_dir = os.path.dirname(extracted_files_list[0][0])
-                            if os.path.exists(extract_dir):
-                                shutil.rmtree(extract_dir)
                     except Exception as cleanup_error:
-                        dbg('DOCS', f"cleanup RAR erro: {cleanup_error}")
-                    return summary
-                finally:
-                    pass
+                        dbg('DOCS', f"⚠️ Aviso: Erro na limpeza: {cleanup_error}")
         else:
             dbg('DOCS', f"detect: arquivo único nome='{final_filename}'")
             file_to_process = temp_path
             dbg('DOCS', f"Converter -> path='{file_to_process}' nome='{final_filename}'")
 
             if GVG_USE_MARKDOWN_SUMMARY:
-                success, markdown_content, error = convert_document_to_markdown(file_to_process, final_filename)
+                success, markdown_content, error = convert_document_to_markdown(
+                    file_to_process, final_filename, conv_info=art_ctx.setdefault('conversion', {}))
                 if not success:
                     return f"Erro na conversão: {error}"
+                artifact_put_markdown(art_ctx.get('sha'), markdown_content, art_ctx.get('conversion'))
+                schedule_index(art_ctx.get('sha'), markdown_content)
                 
                 dbg('DOCS', "Salvar MD local...")
                 save_success, saved_path, save_error = save_markdown_file(markdown_content, final_filename, doc_url, processing_timestamp)
@@ -858,7 +941,7 @@ def process_pncp_document(doc_url, max_tokens=500, document_name=None, pncp_data
                                 dbg('DOCS', 'db insert skipped: uid ausente')
                     except Exception:
                         dbg('DOCS', 'upload single erro')
-                summary = generate_document_summary(markdown_content, max_tokens, pncp_data)
+                summary = generate_document_summary(markdown_content, max_tokens, pncp_data, doc_sha=art_ctx.get('sha'))
                 
                 dbg('DOCS', f"resumo gerado len={len(summary) if isinstance(summary,str) else 'N/A'}")
                 summary_success, summary_path, summary_error = save_summary_file(summary, final_filename, doc_url, processing_timestamp, pncp_data, method_label="Docling + Assistant", markdown_filename=os.path.basename(saved_path) if save_success else None)
@@ -875,8 +958,10 @@ def process_pncp_document(doc_url, max_tokens=500, document_name=None, pncp_data
                 # Upload MD do arquivo original (somente armazenamento)
                 if GVG_SAVE_DOCUMENTS and os.path.exists(file_to_process):
                     try:
-                        conv_ok, conv_md, conv_err = convert_document_to_markdown(file_to_process, final_filename)
+                        conv_ok, conv_md, conv_err = convert_document_to_markdown(
+                            file_to_process, final_filename, conv_info=art_ctx.setdefault('conversion', {}))
                         if conv_ok and isinstance(conv_md, str) and conv_md.strip():
+                            schedule_index(art_ctx.get('sha'), conv_md)
                             pncp_raw = (pncp_data or {}).get('numero_controle_pncp') or (pncp_data or {}).get('id')
                             pncp_raw = str(pncp_raw) if pncp_raw else None
                             pncp_key = _sanitize_pncp_id(pncp_raw)
@@ -896,6 +981,8 @@ def process_pncp_document(doc_url, max_tokens=500, document_name=None, pncp_data
                         dbg('DOCS', 'upload original->md erro')
                 return summary
         # Caminho comum (Markdown consolidado) segue abaixo para salvar markdown + resumo
+        artifact_put_markdown(art_ctx.get('sha'), markdown_content)
+        schedule_index(art_ctx.get('sha'), markdown_content)
         dbg('DOCS', "Salvar MD consolidado...")
         save_success, saved_path, save_error = save_markdown_file(markdown_content, final_filename, doc_url, processing_timestamp)
         if not save_success:
@@ -919,7 +1006,7 @@ def process_pncp_document(doc_url, max_tokens=500, document_name=None, pncp_data
                         dbg('DOCS', f"db insert user_documents ok={ok_db} uid={uid} pncp_raw='{pncp_raw}' name='{final_filename}'")
             except Exception:
                 dbg('DOCS', 'upload consolidado erro')
-        summary = generate_document_summary(markdown_content, max_tokens, pncp_data)
+        summary = generate_document_summary(markdown_content, max_tokens, pncp_data, doc_sha=art_ctx.get('sha'))
         dbg('DOCS', f"resumo gerado (consolidado) len={len(summary) if isinstance(summary,str) else 'N/A'}")
         summary_success, summary_path, summary_error = save_summary_file(summary, final_filename, doc_url, processing_timestamp, pncp_data, method_label="Docling + Assistant", markdown_filename=os.path.basename(saved_path) if save_success else None)
         if not summary_success:
@@ -950,6 +1037,8 @@ __all__ = [
     'process_pncp_document',
     'download_document',
     'convert_document_to_markdown',
+    'score_text_quality',
+    'conversion_stats',
     'save_markdown_file',
     'save_summary_file',
     'generate_document_summary',
@@ -53,14 +53,11 @@ def _get_smtp_config():
         "subject_prefix": subject_prefix,
     }
 
-def send_html_email(to: str, subject: str, html: str, text_alt: Optional[str] = None) -> bool:
-    cfg = _get_smtp_config()
-    # Dry-run se faltar configuração crítica
-    if not cfg["host"] or not cfg["from"] or (not cfg["use_ssl"] and not cfg["use_tls"] and not cfg["port"]):
-        # Log simplificado; o caller deve ter um logger
-        print(f"[EMAIL] Dry-run: to={to} subject={subject} (config SMTP ausente)")
-        return False
+def _smtp_configured(cfg: Dict[str, Any]) -> bool:
+    return bool(cfg["host"] and cfg["from"] and (cfg["use_ssl"] or cfg["use_tls"] or cfg["port"]))
 
+
+def _build_message(cfg: Dict[str, Any], to: str, subject: str, html: str, text_alt: Optional[str] = None) -> EmailMessage:
     msg = EmailMessage()
     msg["From"] = cfg["from"]
     msg["To"] = to
@@ -74,23 +71,43 @@ def send_html_email(to: str, subject: str, html: str, text_alt: Optional[str] =
         text_alt = "Veja este boletim em um cliente compatível com HTML."
     msg.set_content(text_alt)
     msg.add_alternative(html, subtype="html")
+    return msg
+
+
+def _open_smtp(cfg: Dict[str, Any]) -> smtplib.SMTP:
+    """Abre conexão SMTP já autenticada (SSL ou STARTTLS conforme configuração)."""
+    if cfg["use_ssl"]:
+        server = smtplib.SMTP_SSL(cfg["host"], cfg["port"], context=ssl.create_default_context(), timeout=cfg["timeout"])
+    else:
+        server = smtplib.SMTP(cfg["host"], cfg["port"], timeout=cfg["timeout"])
+    try:
+        if not cfg["use_ssl"] and cfg["use_tls"]:
+            server.starttls(context=ssl.create_default_context())
+        if cfg["user"] and cfg["pwd"]:
+            server.login(cfg["user"], cfg["pwd"])
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+        raise
+    return server
+
+
+def send_html_email(to: str, subject: str, html: str, text_alt: Optional[str] = None) -> bool:
+    """Envio avulso (uma conexão por mensagem). Envios em lote: gvg_mailer (sessões SMTP reutilizadas)."""
+    cfg = _get_smtp_config()
+    # Dry-run se faltar configuração crítica
+    if not _smtp_configured(cfg):
+        # Log simplificado; o caller deve ter um logger
+        print(f"[EMAIL] Dry-run: to={to} subject={subject} (config SMTP ausente)")
+        return False
 
+    msg = _build_message(cfg, to, subject, html, text_alt)
     try:
-        if cfg["use_ssl"]:
-            context = ssl.create_default_context()
-            with smtplib.SMTP_SSL(cfg["host"], cfg["port"], context=context, timeout=cfg["timeout"]) as server:
-                if cfg["user"] and cfg["pwd"]:
-                    server.login(cfg["user"], cfg["pwd"])
-                server.send_message(msg)
-                return True
-        else:
-            with smtplib.SMTP(cfg["host"], cfg["port"], timeout=cfg["timeout"]) as server:
-                if cfg["use_tls"]:
-                    server.starttls(context=ssl.create_default_context())
-                if cfg["user"] and cfg["pwd"]:
-                    server.login(cfg["user"], cfg["pwd"])
-                server.send_message(msg)
-                return True
+        with _open_smtp(cfg) as server:
+            server.send_message(msg)
+            return True
     except Exception as e:
         print(f"[EMAIL] Falha ao enviar para {to}: {e}")
         return False
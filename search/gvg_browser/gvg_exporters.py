@@ -13,6 +13,9 @@ Assinaturas expostas:
   export_results_excel(results, query, params, output_dir)
   export_results_pdf(results, query, params, output_dir)  (silencioso se reportlab ausente)
 
+`results` pode ser list[dict] ou o payload colunar de gvg_wire (decodificado
+com texto integral antes da exportação).
+
 O objeto `params` pode ser:
   - argparse.Namespace (atributos) ou
   - dict com chaves: search, approach, relevance, order
@@ -41,6 +44,7 @@ except Exception:  # pragma: no cover
 # Importar formatters (após fusão solicitada devem residir em gvg_preprocessing)
 from gvg_preprocessing import format_currency, format_date, decode_poder, decode_esfera
 from gvg_search_core import get_intelligent_status
+from gvg_wire import decode_results
 
 # Mapas reutilizados (evita import circular com scripts)
 SEARCH_TYPES = {1: {"name": "Semântica"}, 2: {"name": "Palavras-chave"}, 3: {"name": "Híbrida"}}
@@ -85,6 +89,7 @@ def _collect_metadata(results: List[dict], query: str, params) -> dict:
 
 
 def export_results_json(results: List[dict], query: str, params, output_dir: str) -> str:
+    results = decode_results(results, full_text=True, aliases=False)
     status = get_intelligent_status()
     filename = generate_export_filename(
         query,
@@ -125,6 +130,7 @@ def export_results_json(results: List[dict], query: str, params, output_dir: str
 
 
 def export_results_excel(results: List[dict], query: str, params, output_dir: str) -> str:
+    results = decode_results(results, full_text=True, aliases=False)
     filename = generate_export_filename(
         query,
         _get_attr(params, 'search'),
@@ -155,6 +161,7 @@ def export_results_excel(results: List[dict], query: str, params, output_dir: st
 
 def export_results_csv(results: List[dict], query: str, params, output_dir: str) -> str:
     """Exporta resultados em CSV (compatível com Excel)."""
+    results = decode_results(results, full_text=True, aliases=False)
     filename = generate_export_filename(
         query,
         _get_attr(params, 'search'),
@@ -187,6 +194,7 @@ def export_results_csv(results: List[dict], query: str, params, output_dir: str)
 def export_results_pdf(results: List[dict], query: str, params, output_dir: str):  # pragma: no cover
     if not REPORTLAB_AVAILABLE:
         return None
+    results = decode_results(results, full_text=True, aliases=False)
     filename = generate_export_filename(
         query,
         _get_attr(params, 'search'),
@@ -234,6 +242,7 @@ def export_results_pdf(results: List[dict], query: str, params, output_dir: str)
 
 def export_results_html(results: List[dict], query: str, params, output_dir: str) -> str:
         """Exporta resultados em HTML simples, sem dependências extras."""
+        results = decode_results(results, full_text=True, aliases=False)
         filename = generate_export_filename(
                 query,
                 _get_attr(params, 'search'),
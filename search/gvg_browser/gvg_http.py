@@ -0,0 +1,375 @@
+"""
+gvg_http.py
+Cliente HTTP compartilhado para a API PNCP e para o download de arquivos de documentos.
+
+Recursos:
+  • Sessão única (keep-alive) com pool de conexões por host.
+  • Retry com backoff exponencial em 429/5xx e falhas de conexão/timeout, em uma
+    única camada: o adapter urllib3 na sessão da API; o laço de retomada no
+    download (sessão própria, adapter sem retry).
+  • Retomada por Range quando a conexão cai no meio do corpo (If-Range com ETag/Last-Modified).
+  • Guardas de tamanho (Content-Length e contagem durante o stream) e de Content-Type,
+    abortando antes de baixar o resto.
+  • Cache em disco por URL + validadores (ETag/Last-Modified): revalida com
+    If-None-Match/If-Modified-Since e reaproveita o arquivo em 304.
+
+Variáveis:
+  GVG_HTTP_POOL (16), GVG_HTTP_RETRIES (3), GVG_HTTP_BACKOFF (0.5 s),
+  GVG_DOWNLOAD_MAX_MB (200), GVG_DOWNLOAD_BLOCKED_TYPES ("video/,audio/"),
+  GVG_DOWNLOAD_CACHE (padrão on), GVG_DOWNLOAD_CACHE_PATH, GVG_DOWNLOAD_CACHE_MAX_MB (2048),
+  GVG_DOWNLOAD_CACHE_FRESH_S (600; dentro dessa janela não revalida)
+"""
+from __future__ import annotations
+
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from gvg_debug import debug_log as dbg  # type: ignore
+except Exception:  # pragma: no cover
+    def dbg(*_a, **_k):
+        pass
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+HTTP_POOL = max(4, _env_int('GVG_HTTP_POOL', 16))
+HTTP_RETRIES = max(0, _env_int('GVG_HTTP_RETRIES', 3))
+HTTP_BACKOFF = max(0.0, _env_float('GVG_HTTP_BACKOFF', 0.5))
+HTTP_USER_AGENT = 'GovGo/1.0 (+https://pncp.gov.br)'
+DOWNLOAD_MAX_BYTES = max(1, _env_int('GVG_DOWNLOAD_MAX_MB', 200)) * 1024 * 1024
+DOWNLOAD_BLOCKED_TYPES = tuple(
+    t.strip().lower() for t in (os.getenv('GVG_DOWNLOAD_BLOCKED_TYPES', 'video/,audio/') or '').split(',') if t.strip()
+)
+DOWNLOAD_CACHE_ENABLED = (os.getenv('GVG_DOWNLOAD_CACHE', 'true') or '').strip().lower() in ('1', 'true', 'yes', 'on')
+DOWNLOAD_CACHE_PATH = os.getenv('GVG_DOWNLOAD_CACHE_PATH') or os.path.join(
+    os.getenv('TEMP_PATH') or tempfile.gettempdir(), 'gvg_download_cache'
+)
+DOWNLOAD_CACHE_MAX_BYTES = max(16, _env_int('GVG_DOWNLOAD_CACHE_MAX_MB', 2048)) * 1024 * 1024
+DOWNLOAD_CACHE_FRESH_S = max(0, _env_int('GVG_DOWNLOAD_CACHE_FRESH_S', 600))
+_CHUNK = 64 * 1024
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+_SESSION: Optional[requests.Session] = None
+_DOWNLOAD_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+_CACHE_LOCK = threading.Lock()
+_STATS: Dict[str, int] = {'downloads': 0, 'bytes': 0, 'cache_hits': 0, 'revalidated': 0, 'resumed': 0, 'aborted': 0}
+_STATS_LOCK = threading.Lock()
+
+
+class DownloadError(Exception):
+    """Falha de download já descrita para o usuário (guarda de tamanho/tipo, HTTP, conexão)."""
+
+
+class _RetryableStatus(Exception):
+    """Resposta 429/5xx no download: tratada pelo laço de retry como falha de conexão."""
+
+    def __init__(self, status: int, retry_after: Optional[str] = None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+# =====================
+# Sessão
+# =====================
+def _new_session(max_retries: Any) -> requests.Session:
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL, pool_maxsize=HTTP_POOL, max_retries=max_retries)
+    sess = requests.Session()
+    sess.headers.update({'User-Agent': HTTP_USER_AGENT})
+    sess.mount('https://', adapter)
+    sess.mount('http://', adapter)
+    return sess
+
+
+def http_session() -> requests.Session:
+    """Sessão HTTP compartilhada (keep-alive + retry com backoff para GET)."""
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                retry = Retry(
+                    total=HTTP_RETRIES, connect=HTTP_RETRIES, read=HTTP_RETRIES, status=HTTP_RETRIES,
+                    backoff_factor=HTTP_BACKOFF, status_forcelist=_RETRY_STATUS,
+                    allowed_methods=frozenset(['GET', 'HEAD']), raise_on_status=False,
+                    respect_retry_after_header=True,
+                )
+                _SESSION = _new_session(retry)
+    return _SESSION
+
+
+def _download_session() -> requests.Session:
+    """Sessão dos downloads: sem retry no adapter (o laço de download_to_file é a única camada)."""
+    global _DOWNLOAD_SESSION
+    if _DOWNLOAD_SESSION is None:
+        with _SESSION_LOCK:
+            if _DOWNLOAD_SESSION is None:
+                _DOWNLOAD_SESSION = _new_session(0)
+    return _DOWNLOAD_SESSION
+
+
+def _stat(key: str, n: int = 1) -> None:
+    with _STATS_LOCK:
+        _STATS[key] += n
+
+
+def http_stats() -> Dict[str, int]:
+    with _STATS_LOCK:
+        return dict(_STATS)
+
+
+# =====================
+# Cache em disco
+# =====================
+def _cache_paths(url: str):
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    base = Path(DOWNLOAD_CACHE_PATH) / key[:2]
+    return base / f"{key}.bin", base / f"{key}.json"
+
+
+def _cache_read(url: str) -> Optional[Dict[str, Any]]:
+    if not DOWNLOAD_CACHE_ENABLED:
+        return None
+    data_path, meta_path = _cache_paths(url)
+    try:
+        if not data_path.exists() or not meta_path.exists():
+            return None
+        meta = json.loads(meta_path.read_text(encoding='utf-8'))
+        if meta.get('url') != url or int(meta.get('size') or -1) != data_path.stat().st_size:
+            return None
+        meta['path'] = str(data_path)
+        return meta
+    except Exception:
+        return None
+
+
+def _cache_store(url: str, src_path: str, meta: Dict[str, Any]) -> None:
+    """Guarda o arquivo baixado (somente com ETag/Last-Modified, que permitem revalidar)."""
+    if not DOWNLOAD_CACHE_ENABLED or not (meta.get('etag') or meta.get('last_modified')):
+        return
+    data_path, meta_path = _cache_paths(url)
+    try:
+        data_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = data_path.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+        _link_or_copy(src_path, str(tmp))
+        os.replace(tmp, data_path)
+        meta = dict(meta, url=url, size=os.path.getsize(data_path), stored_at=time.time())
+        meta.pop('path', None)
+        meta_path.write_text(json.dumps(meta), encoding='utf-8')
+        _cache_evict()
+    except Exception as e:
+        dbg('DOCS', f"download cache gravação erro: {e}")
+
+
+def _cache_touch(url: str, meta: Dict[str, Any]) -> None:
+    _data_path, meta_path = _cache_paths(url)
+    try:
+        meta = dict(meta, stored_at=time.time())
+        meta.pop('path', None)
+        meta_path.write_text(json.dumps(meta), encoding='utf-8')
+    except Exception:
+        pass
+
+
+def _cache_evict() -> None:
+    """Remove os arquivos menos recentes quando o cache passa do limite."""
+    with _CACHE_LOCK:
+        try:
+            files = [p for p in Path(DOWNLOAD_CACHE_PATH).glob('*/*.bin')]
+            total = sum(p.stat().st_size for p in files)
+            if total <= DOWNLOAD_CACHE_MAX_BYTES:
+                return
+            for p in sorted(files, key=lambda x: x.stat().st_mtime):
+                size = p.stat().st_size
+                p.unlink(missing_ok=True)
+                p.with_suffix('.json').unlink(missing_ok=True)
+                total -= size
+                if total <= DOWNLOAD_CACHE_MAX_BYTES * 0.8:
+                    break
+        except Exception as e:
+            dbg('DOCS', f"download cache limpeza erro: {e}")
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except Exception:
+        shutil.copyfile(src, dst)
+
+
+# =====================
+# Download
+# =====================
+def _check_headers(resp: requests.Response, max_bytes: int, blocked_types) -> None:
+    ctype = (resp.headers.get('content-type') or '').lower()
+    if ctype and any(ctype.startswith(b) for b in blocked_types):
+        raise DownloadError(f"Tipo de conteúdo não suportado: {ctype}")
+    try:
+        length = int(resp.headers.get('content-length') or 0)
+    except Exception:
+        length = 0
+    if resp.status_code == 206:
+        # Content-Range: bytes a-b/total
+        try:
+            length = int((resp.headers.get('content-range') or '').rsplit('/', 1)[1])
+        except Exception:
+            pass
+    if length and length > max_bytes:
+        raise DownloadError(f"Arquivo excede o limite ({length / (1024 * 1024):.1f} MB > {max_bytes // (1024 * 1024)} MB)")
+
+
+def download_to_file(url: str, dest_dir: Optional[str] = None, timeout: float = 30,
+                     max_bytes: Optional[int] = None, blocked_types=None, use_cache: bool = True) -> Dict[str, Any]:
+    """Baixa url para um arquivo em dest_dir e devolve metadados.
+
+    Retorno: {'path', 'size', 'content_type', 'content_disposition', 'etag', 'last_modified',
+              'from_cache', 'resumed', 'ms'}. Lança DownloadError em falha.
+    """
+    t0 = time.time()
+    max_bytes = int(max_bytes or DOWNLOAD_MAX_BYTES)
+    blocked = tuple(blocked_types) if blocked_types is not None else DOWNLOAD_BLOCKED_TYPES
+    dest_dir = dest_dir or tempfile.gettempdir()
+    os.makedirs(dest_dir, exist_ok=True)
+    out_path = os.path.join(dest_dir, f"dl_{uuid.uuid4().hex}.part")
+    sess = _download_session()
+    cached = _cache_read(url) if use_cache else None
+
+    def _from_cache(meta: Dict[str, Any], revalidated: bool) -> Dict[str, Any]:
+        _link_or_copy(meta['path'], out_path)
+        try:
+            os.utime(meta['path'])  # recência para a limpeza do cache
+        except Exception:
+            pass
+        _stat('cache_hits')
+        if revalidated:
+            _stat('revalidated')
+            _cache_touch(url, meta)
+        res = dict(meta, path=out_path, from_cache=True, resumed=0, ms=int((time.time() - t0) * 1000))
+        dbg('DOCS', f"download cache HIT revalidado={revalidated} size={meta.get('size')} url='{url[:80]}'")
+        return res
+
+    if cached and DOWNLOAD_CACHE_FRESH_S and time.time() - float(cached.get('stored_at') or 0) < DOWNLOAD_CACHE_FRESH_S:
+        return _from_cache(cached, False)
+
+    headers: Dict[str, str] = {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    written = 0
+    resumed = 0
+    meta: Dict[str, Any] = {}
+    attempts = 0
+    try:
+        while True:
+            req_headers = dict(headers)
+            if written:
+                req_headers['Range'] = f"bytes={written}-"
+                validator = meta.get('etag') or meta.get('last_modified')
+                if validator:
+                    req_headers['If-Range'] = validator
+            try:
+                with sess.get(url, headers=req_headers, timeout=timeout, stream=True) as resp:
+                    if resp.status_code == 304 and cached:
+                        return _from_cache(cached, True)
+                    if resp.status_code in _RETRY_STATUS:
+                        raise _RetryableStatus(resp.status_code, resp.headers.get('retry-after'))
+                    if resp.status_code >= 400:
+                        raise DownloadError(f"Erro de conexão: HTTP {resp.status_code}")
+                    _check_headers(resp, max_bytes, blocked)
+                    if written and resp.status_code != 206:
+                        # Servidor ignorou o Range (ou o arquivo mudou): recomeçar do zero
+                        written = 0
+                    if not written:
+                        meta = {
+                            'content_type': resp.headers.get('content-type') or '',
+                            'content_disposition': resp.headers.get('content-disposition') or '',
+                            'etag': resp.headers.get('etag'),
+                            'last_modified': resp.headers.get('last-modified'),
+                        }
+                    with open(out_path, 'ab' if written else 'wb') as f:
+                        for chunk in resp.iter_content(chunk_size=_CHUNK):
+                            if not chunk:
+                                continue
+                            written += len(chunk)
+                            if written > max_bytes:
+                                raise DownloadError(f"Arquivo excede o limite de {max_bytes // (1024 * 1024)} MB")
+                            f.write(chunk)
+                    try:
+                        expected = int(resp.headers.get('content-length') or 0)
+                    except Exception:
+                        expected = 0
+                    if resp.status_code == 200 and expected and written < expected:
+                        raise requests.exceptions.ChunkedEncodingError(f"corpo incompleto {written}/{expected}")
+                break
+            except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout, _RetryableStatus) as e:
+                attempts += 1
+                if attempts > HTTP_RETRIES:
+                    raise DownloadError(f"Erro de conexão: {e}")
+                if written:
+                    resumed += 1
+                    _stat('resumed')
+                dbg('DOCS', f"download retomada tentativa={attempts} bytes={written} err={e}")
+                delay = HTTP_BACKOFF * (2 ** (attempts - 1))
+                try:
+                    delay = max(delay, float(getattr(e, 'retry_after', None) or 0))
+                except Exception:
+                    pass
+                time.sleep(delay)
+    except DownloadError:
+        _stat('aborted')
+        _remove(out_path)
+        raise
+    except Exception as e:
+        _remove(out_path)
+        raise DownloadError(f"Erro inesperado: {e}")
+
+    _stat('downloads')
+    _stat('bytes', written)
+    if use_cache:
+        _cache_store(url, out_path, meta)
+    ms = int((time.time() - t0) * 1000)
+    dbg('DOCS', f"download ok size={written} resumed={resumed} ms={ms} url='{url[:80]}'")
+    return dict(meta, path=out_path, size=written, from_cache=False, resumed=resumed, ms=ms)
+
+
+def _remove(path: str) -> None:
+    try:
+        if path and os.path.exists(path):
+            os.remove(path)
+    except Exception:
+        pass
+
+
+__all__ = [
+    'DownloadError', 'http_session', 'http_stats', 'download_to_file',
+    'DOWNLOAD_MAX_BYTES', 'DOWNLOAD_CACHE_ENABLED',
+]
@@ -0,0 +1,285 @@
+"""
+gvg_jobs.py
+Execução em background (buscas, resumos, exportações) com progresso por job.
+
+Objetivo:
+  Tirar trabalho longo dos callbacks síncronos do Dash. O callback apenas
+  submete o job e devolve seu id; um Interval consulta o estado e aplica o
+  resultado quando concluído. Substitui o dict global PROGRESS (compartilhado
+  entre todos os usuários) por registros de progresso por job.
+
+Modelo:
+  • Pool local de threads (GVG_JOB_WORKERS, padrão 4).
+  • Job = (id, scope, kind, key). `scope` é o usuário/sessão; consultas com
+    scope diferente não enxergam o job. `key` deduplica jobs ativos
+    (ex.: um resumo por PNCP).
+  • Snapshot (status, percent, label, result, error) publicado no store de
+    sessão (gvg_session_store) → visível a todos os workers quando há backend
+    compartilhado (sqlite/redis).
+  • Cancelamento cooperativo: job_progress()/job_check_cancel() levantam
+    JobCancelled dentro do job quando cancel_job foi pedido.
+
+Observações:
+  • JobCancelled deriva de BaseException para atravessar os blocos
+    `except Exception` defensivos do código de busca.
+  • Resultados devem ser serializáveis em JSON (vão para o store).
+"""
+from __future__ import annotations
+
+import os
+import time
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from gvg_session_store import store_put, store_get, store_delete
+
+try:
+    from gvg_debug import debug_log as dbg  # type: ignore
+except Exception:  # pragma: no cover
+    def dbg(*_a, **_k):
+        pass
+
+
+try:
+    JOB_WORKERS = max(1, int(os.getenv('GVG_JOB_WORKERS', '4')))
+except Exception:
+    JOB_WORKERS = 4
+JOB_RETENTION_SECONDS = 1800
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_ERROR = 'error'
+STATUS_CANCELLED = 'cancelled'
+FINAL_STATUSES = (STATUS_DONE, STATUS_ERROR, STATUS_CANCELLED)
+
+
+class JobCancelled(BaseException):
+    """Levantada dentro do job quando o cancelamento foi solicitado."""
+
+
+class _Job:
+    __slots__ = (
+        'id', 'scope', 'kind', 'key', 'status', 'percent', 'label',
+        'result', 'error', 'created_at', 'started_at', 'finished_at', 'cancel_event',
+    )
+
+    def __init__(self, scope: str, kind: str, key: Optional[str]):
+        self.id = secrets.token_urlsafe(12)
+        self.scope = scope
+        self.kind = kind
+        self.key = key
+        self.status = STATUS_QUEUED
+        self.percent = 0
+        self.label = ''
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'id': self.id, 'scope': self.scope, 'kind': self.kind, 'key': self.key,
+            'status': self.status, 'percent': self.percent, 'label': self.label,
+            'result': self.result, 'error': self.error,
+            'created_at': self.created_at, 'started_at': self.started_at, 'finished_at': self.finished_at,
+        }
+
+
+def _job_handle(job_id: str) -> str:
+    return f"h:job:{job_id}"
+
+
+def _cancel_handle(job_id: str) -> str:
+    return f"h:jobcancel:{job_id}"
+
+
+_TLS = threading.local()
+
+
+class JobManager:
+    def __init__(self, max_workers: int = JOB_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gvg-job')
+        self._jobs: Dict[str, _Job] = {}
+        self._lock = threading.Lock()
+
+    # ---------- ciclo de vida ----------
+    def submit(self, scope: str, kind: str, fn: Callable[..., Any], *args, key: Optional[str] = None, **kwargs) -> str:
+        scope = str(scope or 'anon')
+        self._gc()
+        with self._lock:
+            if key is not None:
+                for j in self._jobs.values():
+                    if j.scope == scope and j.kind == kind and j.key == key and j.status not in FINAL_STATUSES:
+                        return j.id
+            job = _Job(scope, kind, key)
+            self._jobs[job.id] = job
+        self._publish(job)
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        dbg('BROWSER', f"job submit kind={kind} id={job.id} key={key}")
+        return job.id
+
+    def _run(self, job: _Job, fn: Callable[..., Any], args, kwargs) -> None:
+        _TLS.job = job
+        job.status = STATUS_RUNNING
+        job.started_at = time.time()
+        self._publish(job)
+        try:
+            if self._cancel_requested(job):
+                raise JobCancelled()
+            job.result = fn(*args, **kwargs)
+            job.status = STATUS_DONE
+            job.percent = 100
+        except JobCancelled:
+            job.status = STATUS_CANCELLED
+        except Exception as e:
+            job.status = STATUS_ERROR
+            job.error = str(e)
+            dbg('ERROR', f"job {job.kind} id={job.id} falhou: {e}")
+        finally:
+            job.finished_at = time.time()
+            _TLS.job = None
+            self._publish(job)
+            try:
+                dbg('BROWSER', f"job end kind={job.kind} id={job.id} status={job.status} ms={int((job.finished_at - (job.started_at or job.finished_at))*1000)}")
+            except Exception:
+                pass
+
+    def _publish(self, job: _Job) -> None:
+        try:
+            store_put(job.snapshot(), handle=_job_handle(job.id))
+        except Exception as e:
+            dbg('BROWSER', f"job publish erro: {e}")
+
+    def _cancel_requested(self, job: _Job) -> bool:
+        if job.cancel_event.is_set():
+            return True
+        try:
+            if store_get(_cancel_handle(job.id), fresh=True):
+                job.cancel_event.set()
+                return True
+        except Exception:
+            pass
+        return False
+
+    def _gc(self) -> None:
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        with self._lock:
+            old = [jid for jid, j in self._jobs.items() if j.finished_at and j.finished_at < cutoff]
+            for jid in old:
+                self._jobs.pop(jid, None)
+
+    # ---------- consulta/controle ----------
+    def get(self, job_id: Optional[str], scope: str) -> Optional[Dict[str, Any]]:
+        if not job_id:
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        # job de outro worker: snapshot direto do backend compartilhado (nunca do L1 local)
+        snap = job.snapshot() if job is not None else store_get(_job_handle(job_id), fresh=True)
+        if not isinstance(snap, dict) or snap.get('scope') != str(scope or 'anon'):
+            return None
+        return snap
+
+    def cancel(self, job_id: Optional[str], scope: str) -> bool:
+        snap = self.get(job_id, scope)
+        if not snap or snap.get('status') in FINAL_STATUSES:
+            return False
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            job.cancel_event.set()
+        store_put({'cancel': True}, handle=_cancel_handle(job_id))
+        dbg('BROWSER', f"job cancel id={job_id}")
+        return True
+
+    def cancel_scope(self, scope: str, kind: Optional[str] = None) -> int:
+        n = 0
+        with self._lock:
+            ids = [j.id for j in self._jobs.values()
+                   if j.scope == str(scope or 'anon') and (kind is None or j.kind == kind) and j.status not in FINAL_STATUSES]
+        for jid in ids:
+            n += 1 if self.cancel(jid, scope) else 0
+        return n
+
+    def forget(self, job_id: Optional[str]) -> None:
+        if not job_id:
+            return
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        store_delete(_job_handle(job_id))
+        store_delete(_cancel_handle(job_id))
+
+
+_MANAGER: Optional[JobManager] = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    global _MANAGER
+    if _MANAGER is None:
+        with _MANAGER_LOCK:
+            if _MANAGER is None:
+                _MANAGER = JobManager()
+    return _MANAGER
+
+
+def submit_job(scope: str, kind: str, fn: Callable[..., Any], *args, key: Optional[str] = None, **kwargs) -> str:
+    return get_job_manager().submit(scope, kind, fn, *args, key=key, **kwargs)
+
+
+def get_job(job_id: Optional[str], scope: str) -> Optional[Dict[str, Any]]:
+    return get_job_manager().get(job_id, scope)
+
+
+def cancel_job(job_id: Optional[str], scope: str) -> bool:
+    return get_job_manager().cancel(job_id, scope)
+
+
+def cancel_scope_jobs(scope: str, kind: Optional[str] = None) -> int:
+    return get_job_manager().cancel_scope(scope, kind)
+
+
+def forget_job(job_id: Optional[str]) -> None:
+    get_job_manager().forget(job_id)
+
+
+# =====================
+# API para o código que roda dentro do job
+# =====================
+def current_job_id() -> Optional[str]:
+    job = getattr(_TLS, 'job', None)
+    return job.id if job is not None else None
+
+
+def job_check_cancel() -> None:
+    job = getattr(_TLS, 'job', None)
+    if job is not None and get_job_manager()._cancel_requested(job):
+        raise JobCancelled()
+
+
+def job_progress(percent: int, label: Optional[str] = None) -> None:
+    """Atualiza o progresso do job corrente (no-op fora de job) e checa cancelamento."""
+    job = getattr(_TLS, 'job', None)
+    if job is None:
+        return
+    try:
+        job.percent = int(max(0, min(100, percent)))
+    except Exception:
+        job.percent = 0
+    if label is not None:
+        job.label = str(label)
+    get_job_manager()._publish(job)
+    job_check_cancel()
+
+
+__all__ = [
+    'JobCancelled', 'JobManager', 'get_job_manager',
+    'submit_job', 'get_job', 'cancel_job', 'cancel_scope_jobs', 'forget_job',
+    'current_job_id', 'job_check_cancel', 'job_progress',
+    'STATUS_QUEUED', 'STATUS_RUNNING', 'STATUS_DONE', 'STATUS_ERROR', 'STATUS_CANCELLED', 'FINAL_STATUSES',
+]
@@ -4,6 +4,7 @@ Funções principais:
 - get_user_plan_limits(user_id)
 - count_usage_today(user_id, event_type)
 - ensure_capacity(user_id, tipo)
+- get_usage_status(user_id)
 
 Tipos suportados para ensure_capacity:
 - 'consultas'   -> event_type='query'
@@ -11,13 +12,23 @@ Tipos suportados para ensure_capacity:
 - 'boletim_run' -> event_type='boletim_run'
 - 'favoritos'   -> usa COUNT em user_bookmarks active=true
 
+Motor de cotas:
+- Uma única consulta traz limites do plano, contadores diários (user_usage_daily,
+  mantidos pelo flusher de gvg_usage) e favoritos ativos.
+- Visão em memória por usuário: incrementada localmente a cada evento gravado
+  (note_usage) e reconciliada com o banco a cada GVG_LIMITS_RECONCILE_S (30 s).
+- Mudança de plano (gvg_billing) invalida a visão (invalidate_user_plan).
+- Sem a tabela user_usage_daily, cai no caminho antigo (COUNT em user_usage_events).
+
 Obs: apenas bloqueio; geração de toasts será implementada depois.
 """
 from __future__ import annotations
-from typing import Dict, Any
-from datetime import date
+from typing import Dict, Any, Optional
+from datetime import datetime, timezone
 import os
 import csv
+import time
+import threading
 
 from gvg_database import db_fetch_all
 from gvg_debug import debug_log as dbg
@@ -152,31 +163,134 @@ def count_favoritos(user_id: str) -> int:
     except Exception:
         return 0
 
+# =============================
+# Visão de uso por usuário (cache + reconciliação)
+# =============================
+try:
+    _RECONCILE_S = max(1.0, float(os.getenv('GVG_LIMITS_RECONCILE_S', '30')))
+except Exception:
+    _RECONCILE_S = 30.0
+
+_VIEWS: Dict[str, Dict[str, Any]] = {}
+_VIEWS_LOCK = threading.Lock()
+_EVENT_TO_TIPO = {ev: tipo for tipo, ev in EVENT_TYPE_MAP.items()}
+
+_STATUS_SQL = """
+SELECT p.limit_consultas_per_day,
+       p.limit_resumos_per_day,
+       p.limit_boletim_per_day,
+       p.limit_favoritos_capacity,
+       COALESCE((SELECT jsonb_object_agg(d.metric_key, d.metric_value)
+                   FROM public.user_usage_daily d
+                  WHERE d.user_id = u.user_id
+                    AND d.usage_date = (now() AT TIME ZONE 'UTC')::date
+                    AND d.metric_key = ANY(%s)), '{}'::jsonb) AS daily,
+       (SELECT COUNT(*) FROM public.user_bookmarks b
+         WHERE b.user_id = u.user_id AND b.active = true) AS favoritos
+FROM (SELECT %s::uuid AS user_id) u
+LEFT JOIN public.user_settings us ON us.user_id = u.user_id
+LEFT JOIN public.system_plans p ON p.id = us.plan_id
+"""
+
+def _utc_day():
+    return datetime.now(timezone.utc).date()
+
+def _limits_from_values(c, s, b, f) -> Dict[str, int]:
+    free_limits = _load_plans_fallback().get('FREE', {})
+    return {
+        'limit_consultas_per_day': int(c) if c is not None else free_limits.get('limit_consultas_per_day', 5),
+        'limit_resumos_per_day': int(s) if s is not None else free_limits.get('limit_resumos_per_day', 1),
+        'limit_boletim_per_day': int(b) if b is not None else free_limits.get('limit_boletim_per_day', 1),
+        'limit_favoritos_capacity': int(f) if f is not None else free_limits.get('limit_favoritos_capacity', 10),
+    }
+
+def _load_view(user_id: str) -> Dict[str, Any]:
+    """Limites + uso do dia + favoritos em uma ida ao banco (fallback: consultas antigas)."""
+    rows = db_fetch_all(_STATUS_SQL, (list(EVENT_TYPE_MAP.values()), user_id), as_dict=True, ctx="LIMITS.status")
+    if rows:
+        r = rows[0]
+        daily = r.get('daily') or {}
+        if isinstance(daily, str):
+            import json
+            daily = json.loads(daily or '{}')
+        return {
+            'limits': _limits_from_values(r.get('limit_consultas_per_day'), r.get('limit_resumos_per_day'),
+                                          r.get('limit_boletim_per_day'), r.get('limit_favoritos_capacity')),
+            'used': {tipo: int(daily.get(ev) or 0) for tipo, ev in EVENT_TYPE_MAP.items()},
+            'favoritos': int(r.get('favoritos') or 0),
+        }
+    dbg('LIMIT', 'status em uma consulta indisponível; usando contagens por tipo')
+    return {
+        'limits': get_user_plan_limits(user_id),
+        'used': {tipo: count_usage_today(user_id, ev) for tipo, ev in EVENT_TYPE_MAP.items()},
+        'favoritos': count_favoritos(user_id),
+    }
+
+def _get_view(user_id: str, force: bool = False) -> Dict[str, Any]:
+    now = time.monotonic()
+    day = _utc_day()
+    with _VIEWS_LOCK:
+        view = _VIEWS.get(user_id)
+        if view and not force and view['day'] == day and now - view['synced'] < _RECONCILE_S:
+            return view
+    fresh = _load_view(user_id)
+    with _VIEWS_LOCK:
+        old = _VIEWS.get(user_id)
+        if old and old['day'] == day:
+            # Contadores do dia só crescem: manter incrementos locais ainda não gravados pelo flusher
+            for tipo, n in old['used'].items():
+                fresh['used'][tipo] = max(fresh['used'].get(tipo, 0), n)
+        fresh['day'] = day
+        fresh['synced'] = now
+        _VIEWS[user_id] = fresh
+        return fresh
+
+def note_usage(user_id: str, event_type: str) -> None:
+    """Atualiza a visão local após um evento de uso (chamado por gvg_usage.record_usage)."""
+    if not user_id:
+        return
+    with _VIEWS_LOCK:
+        view = _VIEWS.get(user_id)
+        if not view or view['day'] != _utc_day():
+            return
+        tipo = _EVENT_TO_TIPO.get(event_type)
+        if tipo:
+            view['used'][tipo] = view['used'].get(tipo, 0) + 1
+        elif event_type == 'favorite_add':
+            view['favoritos'] += 1
+        elif event_type == 'favorite_remove':
+            view['favoritos'] = max(0, view['favoritos'] - 1)
+
+def invalidate_user_plan(user_id: Optional[str] = None) -> None:
+    """Descarta a visão (limites + uso) de um usuário, ou de todos quando user_id=None."""
+    with _VIEWS_LOCK:
+        if user_id is None:
+            _VIEWS.clear()
+        else:
+            _VIEWS.pop(str(user_id), None)
+
 def ensure_capacity(user_id: str, tipo: str):
     if tipo not in PLAN_LIMIT_COLUMNS:
         return
-    limits = get_user_plan_limits(user_id)
-    limit_col = PLAN_LIMIT_COLUMNS[tipo]
-    plan_limit = limits.get(limit_col)
+    view = _get_view(user_id)
+    plan_limit = view['limits'].get(PLAN_LIMIT_COLUMNS[tipo])
     if plan_limit is None or plan_limit < 0:
         return
     if tipo == 'favoritos':
-        used = count_favoritos(user_id)
+        used = view['favoritos']
     else:
-        event_type = EVENT_TYPE_MAP.get(tipo)
-        if not event_type:
-            return
-        used = count_usage_today(user_id, event_type)
+        used = view['used'].get(tipo, 0)
     if used >= plan_limit:
-        dbg('LIMIT', f"Excedido tipo={tipo} used={used} limit={plan_limit}")
-        raise LimitExceeded(tipo, plan_limit)
+        # Perto do limite a visão pode estar atrasada em relação a outros workers: confirmar no banco
+        view = _get_view(user_id, force=True)
+        used = view['favoritos'] if tipo == 'favoritos' else view['used'].get(tipo, 0)
+        plan_limit = view['limits'].get(PLAN_LIMIT_COLUMNS[tipo])
+        if plan_limit is not None and plan_limit >= 0 and used >= plan_limit:
+            dbg('LIMIT', f"Excedido tipo={tipo} used={used} limit={plan_limit}")
+            raise LimitExceeded(tipo, plan_limit)
     dbg('LIMIT', f"OK tipo={tipo} used={used} limit={plan_limit}")
     return
 
-__all__ = [
-    'LimitExceeded', 'ensure_capacity', 'get_user_plan_limits', 'count_usage_today', 'get_usage_status'
-]
-
 def get_usage_status(user_id: str) -> Dict[str, Any]:
     """Retorna dict com usados, limites e percentuais para UI.
 
@@ -188,17 +302,23 @@ def get_usage_status(user_id: str) -> Dict[str, Any]:
       'favoritos': {...}
     }
     """
-    limits = get_user_plan_limits(user_id)
+    view = _get_view(user_id)
+    limits = view['limits']
     out: Dict[str, Any] = {}
-    # Consultas / Resumos / Boletim via eventos
-    for tipo, ev in EVENT_TYPE_MAP.items():
-        used = count_usage_today(user_id, ev)
+    # Consultas / Resumos / Boletim via contadores diários
+    for tipo in EVENT_TYPE_MAP:
+        used = view['used'].get(tipo, 0)
         limit_val = limits.get(PLAN_LIMIT_COLUMNS[tipo])
         pct = (used / limit_val * 100.0) if limit_val else 0.0
         out[tipo] = {'used': used, 'limit': limit_val, 'pct': round(pct, 1)}
     # Favoritos
-    fav_used = count_favoritos(user_id)
+    fav_used = view['favoritos']
     fav_limit = limits.get('limit_favoritos_capacity')
     fav_pct = (fav_used / fav_limit * 100.0) if fav_limit else 0.0
     out['favoritos'] = {'used': fav_used, 'limit': fav_limit, 'pct': round(fav_pct, 1)}
     return out
+
+__all__ = [
+    'LimitExceeded', 'ensure_capacity', 'get_user_plan_limits', 'count_usage_today', 'count_favoritos',
+    'get_usage_status', 'note_usage', 'invalidate_user_plan'
+]
@@ -0,0 +1,386 @@
+"""
+gvg_mailer.py
+Entrega de e-mails em lote: sessões SMTP reutilizadas, envio concorrente com taxa,
+retentativas e dead-letter.
+
+Objetivo:
+  send_html_email abre conexão + login a cada mensagem. Para o envio diário de
+  boletins (e favoritos/históricos com vários destinatários) isso domina o tempo e
+  esbarra nos limites do provedor. Aqui:
+  • SmtpPool: até SMTP_POOL_SIZE conexões abertas, reutilizadas entre mensagens;
+    cada conexão é reciclada após SMTP_MAX_MSGS_PER_CONN mensagens (limite por sessão
+    dos provedores) e verificada com NOOP se ficou ociosa mais que SMTP_POOL_IDLE_S.
+  • Mailer.deliver(jobs): SMTP_SEND_WORKERS threads; taxa/concorrência global pelo
+    orçamento 'smtp' de gvg_budget (GVG_BUDGET_SMTP_RPS / GVG_BUDGET_SMTP_CONCURRENCY).
+  • Retentativas: erros transitórios (4xx, desconexão, timeout) até SMTP_MAX_ATTEMPTS
+    tentativas com backoff exponencial (SMTP_RETRY_BACKOFF_S); erro de rede descarta a
+    conexão, recusa do servidor a mantém no pool. Erros permanentes (5xx) não são repetidos.
+  • Dead-letter: falhas definitivas gravadas em public.email_dead_letter (reenvio manual).
+  • DeliveryReport.stats: enviados, falhas, retentativas, conexões abertas, msgs/s.
+
+Sem configuração SMTP (SMTP_HOST/SMTP_FROM) tudo é dry-run (falha sem dead-letter),
+como em send_html_email.
+"""
+from __future__ import annotations
+
+import os
+import json
+import time
+import queue
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    from search.gvg_browser.gvg_email import _get_smtp_config, _smtp_configured, _build_message, _open_smtp  # type: ignore
+except Exception:
+    from gvg_email import _get_smtp_config, _smtp_configured, _build_message, _open_smtp  # type: ignore
+
+try:
+    from gvg_debug import debug_log as dbg  # type: ignore
+except Exception:  # pragma: no cover
+    def dbg(*_a, **_k):
+        pass
+
+# Orçamento global: sempre o módulo "gvg_budget" (nome simples), compartilhado com os scripts
+from gvg_budget import limit as budget_limit
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+SMTP_POOL_SIZE = max(1, _env_int('SMTP_POOL_SIZE', 4))
+SMTP_MAX_MSGS_PER_CONN = max(1, _env_int('SMTP_MAX_MSGS_PER_CONN', 100))
+SMTP_POOL_IDLE_S = max(1.0, _env_float('SMTP_POOL_IDLE_S', 30.0))
+SMTP_SEND_WORKERS = max(1, _env_int('SMTP_SEND_WORKERS', 4))
+SMTP_MAX_ATTEMPTS = max(1, _env_int('SMTP_MAX_ATTEMPTS', 3))
+SMTP_RETRY_BACKOFF_S = max(0.0, _env_float('SMTP_RETRY_BACKOFF_S', 1.0))
+SMTP_DEAD_LETTER = (os.getenv('SMTP_DEAD_LETTER', 'true') or '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# =====================
+# Mensagens
+# =====================
+@dataclass
+class EmailJob:
+    to: str
+    subject: str
+    html: str
+    text_alt: Optional[str] = None
+    kind: str = 'generic'            # boletim | favorito | history | ...
+    ref_id: Optional[str] = None     # id do boletim / PNCP / prompt
+    user_id: Optional[str] = None
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class EmailResult:
+    job: EmailJob
+    ok: bool
+    attempts: int = 0
+    error: Optional[str] = None
+    permanent: bool = False
+    elapsed_ms: int = 0
+
+
+@dataclass
+class DeliveryReport:
+    results: List[EmailResult]
+    stats: Dict[str, Any]
+
+    @property
+    def sent(self) -> List[EmailResult]:
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self) -> List[EmailResult]:
+        return [r for r in self.results if not r.ok]
+
+
+def _error_codes(err: BaseException) -> List[int]:
+    if isinstance(err, smtplib.SMTPRecipientsRefused):
+        return [int(v[0]) for v in (err.recipients or {}).values() if v]
+    code = getattr(err, 'smtp_code', None)
+    return [int(code)] if isinstance(code, int) else []
+
+
+def _is_permanent(err: BaseException) -> bool:
+    """5xx (inclui destinatário recusado com 5xx) não melhora com nova tentativa; 4xx/rede sim."""
+    codes = _error_codes(err)
+    return bool(codes) and all(c >= 500 for c in codes)
+
+
+def _session_reusable(err: BaseException) -> bool:
+    """Recusa do servidor (resposta SMTP) mantém a sessão válida (smtplib já envia RSET); rede/protocolo não."""
+    return isinstance(err, (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException)) \
+        and not isinstance(err, smtplib.SMTPServerDisconnected)
+
+
+# =====================
+# Pool de conexões
+# =====================
+class _Conn:
+    __slots__ = ('server', 'sent', 'last_used', 'opened_at')
+
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.sent = 0
+        self.opened_at = self.last_used = time.monotonic()
+
+
+class SmtpPool:
+    """Conexões SMTP autenticadas reutilizáveis (uma por thread em uso; LIFO entre usos)."""
+
+    def __init__(self, cfg: Optional[Dict[str, Any]] = None, size: int = SMTP_POOL_SIZE,
+                 max_msgs_per_conn: int = SMTP_MAX_MSGS_PER_CONN, idle_s: float = SMTP_POOL_IDLE_S):
+        self.cfg = cfg or _get_smtp_config()
+        self.size = max(1, int(size))
+        self.max_msgs_per_conn = max(1, int(max_msgs_per_conn))
+        self.idle_s = float(idle_s)
+        self._idle: "queue.LifoQueue[_Conn]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.recycled = 0
+        self.discarded = 0
+
+    @property
+    def configured(self) -> bool:
+        return _smtp_configured(self.cfg)
+
+    def _open(self) -> _Conn:
+        conn = _Conn(_open_smtp(self.cfg))
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    @staticmethod
+    def _close(conn: _Conn) -> None:
+        try:
+            conn.server.quit()
+        except Exception:
+            try:
+                conn.server.close()
+            except Exception:
+                pass
+
+    def _take_idle(self) -> Optional[_Conn]:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if time.monotonic() - conn.last_used <= self.idle_s:
+                return conn
+            # Ociosa demais: o servidor pode ter encerrado a sessão
+            try:
+                if conn.server.noop()[0] == 250:
+                    return conn
+            except Exception:
+                pass
+            self._close(conn)
+            with self._lock:
+                self.discarded += 1
+
+    @contextmanager
+    def session(self) -> Iterator[smtplib.SMTP]:
+        """Conexão exclusiva durante o bloco; erro de rede no bloco descarta a conexão, recusa SMTP a devolve."""
+        self._slots.acquire()
+        conn: Optional[_Conn] = None
+        try:
+            conn = self._take_idle() or self._open()
+            try:
+                yield conn.server
+            except BaseException as e:
+                if isinstance(e, Exception) and _session_reusable(e):
+                    conn.last_used = time.monotonic()
+                    self._idle.put(conn)
+                else:
+                    self._close(conn)
+                    with self._lock:
+                        self.discarded += 1
+                conn = None
+                raise
+            conn.sent += 1
+            conn.last_used = time.monotonic()
+            if conn.sent >= self.max_msgs_per_conn:
+                self._close(conn)
+                with self._lock:
+                    self.recycled += 1
+            else:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'opened': self.opened, 'recycled': self.recycled, 'discarded': self.discarded,
+                    'idle': self._idle.qsize(), 'size': self.size, 'max_msgs_per_conn': self.max_msgs_per_conn}
+
+
+# =====================
+# Entrega
+# =====================
+class Mailer:
+    def __init__(self, pool: Optional[SmtpPool] = None, workers: int = SMTP_SEND_WORKERS,
+                 max_attempts: int = SMTP_MAX_ATTEMPTS, backoff_s: float = SMTP_RETRY_BACKOFF_S,
+                 dead_letter: bool = SMTP_DEAD_LETTER):
+        self.pool = pool or SmtpPool()
+        self.workers = max(1, int(workers))
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff_s = float(backoff_s)
+        self.dead_letter = bool(dead_letter)
+        self._lock = threading.Lock()
+        self._retries = 0
+
+    def send(self, job: EmailJob) -> EmailResult:
+        """Envia uma mensagem com retentativas (bloqueante)."""
+        t0 = time.monotonic()
+        if not self.pool.configured:
+            print(f"[EMAIL] Dry-run: to={job.to} subject={job.subject} (config SMTP ausente)")
+            return EmailResult(job, ok=False, attempts=0, error='config SMTP ausente', permanent=True)
+        msg = _build_message(self.pool.cfg, job.to, job.subject, job.html, job.text_alt)
+        err: Optional[BaseException] = None
+        attempt = 0
+        while attempt < self.max_attempts:
+            attempt += 1
+            if attempt > 1:
+                with self._lock:
+                    self._retries += 1
+                time.sleep(self.backoff_s * (2 ** (attempt - 2)))
+            try:
+                with budget_limit('smtp'):
+                    with self.pool.session() as server:
+                        server.send_message(msg)
+                return EmailResult(job, ok=True, attempts=attempt, elapsed_ms=int((time.monotonic() - t0) * 1000))
+            except Exception as e:
+                err = e
+                if _is_permanent(e):
+                    break
+        dbg('EMAIL', f"falha envio to={job.to} kind={job.kind} ref={job.ref_id} tentativas={attempt}: {err}")
+        return EmailResult(job, ok=False, attempts=attempt, error=f"{type(err).__name__}: {err}",
+                           permanent=_is_permanent(err) if err else False,
+                           elapsed_ms=int((time.monotonic() - t0) * 1000))
+
+    def deliver(self, jobs: List[EmailJob], on_result: Optional[Callable[[EmailResult], None]] = None) -> DeliveryReport:
+        """Envia todas as mensagens em paralelo; on_result é chamado (na thread do worker) a cada conclusão."""
+        t0 = time.monotonic()
+        opened0 = self.pool.stats()['opened']
+        with self._lock:
+            retries0 = self._retries
+        results: List[EmailResult] = []
+        res_lock = threading.Lock()
+
+        def _one(job: EmailJob) -> None:
+            try:
+                r = self.send(job)
+            except Exception as e:  # não deve ocorrer; garante um resultado por job
+                r = EmailResult(job, ok=False, error=f"{type(e).__name__}: {e}")
+            with res_lock:
+                results.append(r)
+            if on_result is not None:
+                try:
+                    on_result(r)
+                except Exception as e:
+                    dbg('EMAIL', f"on_result erro: {e}")
+
+        if jobs:
+            if self.workers == 1 or len(jobs) == 1:
+                for job in jobs:
+                    _one(job)
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.workers, len(jobs)), thread_name_prefix='gvg-mail') as ex:
+                    list(ex.map(_one, jobs))
+
+        failed = [r for r in results if not r.ok]
+        dead = [r for r in failed if r.attempts > 0]
+        if self.dead_letter and dead:
+            record_dead_letters(dead)
+        elapsed = time.monotonic() - t0
+        sent = len(results) - len(failed)
+        with self._lock:
+            retries = self._retries - retries0
+        stats = {
+            'jobs': len(jobs), 'sent': sent, 'failed': len(failed), 'dead_letter': len(dead) if self.dead_letter else 0,
+            'retries': retries, 'connections': self.pool.stats()['opened'] - opened0,
+            'elapsed_s': round(elapsed, 3), 'msgs_per_s': round(sent / elapsed, 2) if elapsed > 0 else 0.0,
+            'workers': self.workers,
+        }
+        stats['msgs_per_conn'] = round(sent / stats['connections'], 1) if stats['connections'] else 0.0
+        return DeliveryReport(results=results, stats=stats)
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+def record_dead_letters(results: List[EmailResult]) -> int:
+    """Grava falhas definitivas em public.email_dead_letter (HTML incluso para reenvio)."""
+    if not results:
+        return 0
+    try:
+        try:
+            from search.gvg_browser.gvg_database import db_execute_many  # type: ignore
+        except Exception:
+            from gvg_database import db_execute_many  # type: ignore
+        data = [
+            (
+                r.job.kind, r.job.ref_id, r.job.user_id, r.job.to, r.job.subject, r.job.html,
+                r.error, r.attempts, r.permanent, json.dumps(r.job.meta or {}, default=str),
+            )
+            for r in results
+        ]
+        aff = db_execute_many(
+            "INSERT INTO public.email_dead_letter (kind, ref_id, user_id, recipient, subject, body_html, error, attempts, permanent, meta) "
+            "VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s::jsonb)",
+            data, ctx="EMAIL.record_dead_letters",
+        )
+        return int(aff or 0)
+    except Exception as e:
+        dbg('EMAIL', f"dead-letter indisponível ({e}); {len(results)} falha(s) não registradas")
+        return 0
+
+
+_MAILER: Optional[Mailer] = None
+_MAILER_LOCK = threading.Lock()
+
+
+def get_mailer() -> Mailer:
+    """Mailer do processo (pool reaproveitado entre requisições do app)."""
+    global _MAILER
+    if _MAILER is None:
+        with _MAILER_LOCK:
+            if _MAILER is None:
+                _MAILER = Mailer()
+    return _MAILER
+
+
+def send_emails(jobs: List[EmailJob]) -> DeliveryReport:
+    return get_mailer().deliver(jobs)
+
+
+__all__ = [
+    'EmailJob', 'EmailResult', 'DeliveryReport', 'SmtpPool', 'Mailer',
+    'record_dead_letters', 'get_mailer', 'send_emails',
+]
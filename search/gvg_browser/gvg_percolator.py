@@ -0,0 +1,427 @@
+"""
+gvg_percolator.py
+Percolação de boletins: casa as contratações recém-embedadas contra as consultas salvas.
+
+Objetivo:
+  Em vez de rodar cada boletim contra a tabela inteira, inverte o problema: o lote de
+  contratações embedadas desde o último run (contratacao_emb.created_at) é pontuado de
+  uma vez contra a matriz de vetores de consulta de todos os boletins elegíveis; filtros
+  e cortes de cada boletim são aplicados e os acertos vão direto para user_boletim.
+
+Elegibilidade (decidida pelo executor 01_run_scheduled_boletins; os demais seguem nos planos):
+  • busca semântica direta (search_type=1, search_approach=1) sem filtro de relevância por IA;
+  • preproc_output salvo (mesmos termos/negação/sql_conditions do executor);
+  • modo delta (user_schedule com delta_cutoff válido): o corte de similaridade da última
+    execução completa é o limiar do boletim, e a reconciliação periódica continua no executor.
+
+Índice de consultas:
+  public.user_schedule_vec guarda o vetor de cada boletim (halfvec) e a chave
+  (modelo, peso de negação, texto de embedding); load_query_vectors() só recalcula
+  (em lote) os boletins cuja chave mudou. A matriz fica em memória (float32, normalizada).
+
+Filtros:
+  As sql_conditions de cada boletim são avaliadas no Postgres apenas sobre o lote do dia,
+  uma consulta por conjunto distinto de condições (agrupadas em UNION ALL), gerando uma
+  máscara booleana por grupo. Grupo com SQL inválido → boletins devolvidos ao executor.
+"""
+from __future__ import annotations
+
+import os
+import time
+import uuid
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+try:
+    from search.gvg_browser.gvg_database import db_fetch_all, db_execute_many  # type: ignore
+    from search.gvg_browser.gvg_ai_utils import get_embeddings_batch, EMBEDDING_MODEL, NEGATION_EMB_WEIGHT  # type: ignore
+    from search.gvg_browser.gvg_search_core import _sanitize_sql_conditions, _augment_aliases  # type: ignore
+    from search.gvg_browser.gvg_schema import (  # type: ignore
+        CONTRATACAO_TABLE, CONTRATACAO_EMB_TABLE, PRIMARY_KEY, EMB_VECTOR_FIELD,
+        CONTRATACAO_FIELDS, get_contratacao_core_columns,
+    )
+    from search.gvg_browser.gvg_boletim import build_boletim_rows, record_boletim_hits, touch_last_run_many  # type: ignore
+    from search.gvg_browser.gvg_debug import debug_log as dbg  # type: ignore
+except Exception:
+    from gvg_database import db_fetch_all, db_execute_many  # type: ignore
+    from gvg_ai_utils import get_embeddings_batch, EMBEDDING_MODEL, NEGATION_EMB_WEIGHT  # type: ignore
+    from gvg_search_core import _sanitize_sql_conditions, _augment_aliases  # type: ignore
+    from gvg_schema import (  # type: ignore
+        CONTRATACAO_TABLE, CONTRATACAO_EMB_TABLE, PRIMARY_KEY, EMB_VECTOR_FIELD,
+        CONTRATACAO_FIELDS, get_contratacao_core_columns,
+    )
+    from gvg_boletim import build_boletim_rows, record_boletim_hits, touch_last_run_many  # type: ignore
+    from gvg_debug import debug_log as dbg  # type: ignore
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+PERCOLATOR_CHUNK = max(16, _env_int('GVG_PERCOLATOR_CHUNK', 512))            # consultas por bloco de produto matricial
+PERCOLATOR_GROUPS_PER_SQL = max(1, _env_int('GVG_PERCOLATOR_GROUPS_PER_SQL', 200))  # grupos de filtros por consulta UNION ALL
+PERCOLATOR_EMBED_BATCH = max(1, _env_int('GVG_PERCOLATOR_EMBED_BATCH', 64))
+PERCOLATOR_FETCH_CHUNK = max(100, _env_int('GVG_PERCOLATOR_FETCH_CHUNK', 1000))    # vetores por SELECT
+
+
+# =====================
+# Vetores
+# =====================
+def query_embedding_text(query_text: str, preproc: Optional[Dict[str, Any]]) -> str:
+    """Texto de embedding idêntico ao de semantic_search para o query_obj do executor."""
+    info = preproc if isinstance(preproc, dict) else {}
+    terms = (info.get('search_terms') or query_text or '').strip()
+    neg = (info.get('negative_terms') or '').strip()
+    return f"{terms} -- {neg}".strip() if neg else terms
+
+
+def query_embedding_key(text: str) -> str:
+    raw = f"{EMBEDDING_MODEL}|{NEGATION_EMB_WEIGHT}|{text}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _split_negation(text: str) -> Tuple[str, str]:
+    # Mesma divisão de get_negation_embedding ("positivo -- negativo")
+    if '--' in text:
+        pos, neg = text.split('--', 1)
+        return pos.strip(), neg.strip()
+    return text.strip(), ''
+
+
+def embed_queries(texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+    """Embeddings de consulta com negação (pos - peso*neg), em lotes; textos repetidos embedados uma vez."""
+    parts = [_split_negation(t or '') for t in texts]
+    uniq = sorted({p for pair in parts for p in pair if p})
+    embs = get_embeddings_batch(uniq, batch_size=PERCOLATOR_EMBED_BATCH, feature='percolator') if uniq else []
+    by_text = {t: (np.asarray(e, dtype=np.float32) if e is not None else None) for t, e in zip(uniq, embs)}
+    out: List[Optional[np.ndarray]] = []
+    for pos, neg in parts:
+        pos_emb = by_text.get(pos) if pos else None
+        if pos_emb is None:
+            out.append(None)
+            continue
+        neg_emb = by_text.get(neg) if neg else None
+        # Falha no negativo → somente positivo (como get_negation_embedding)
+        out.append(pos_emb - NEGATION_EMB_WEIGHT * neg_emb if neg_emb is not None else pos_emb)
+    return out
+
+
+def parse_vector(value: Any) -> Optional[np.ndarray]:
+    """vector/halfvec do Postgres (texto '[...]' ou lista) → ndarray float32."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        body = value.strip().strip('[]')
+        if not body:
+            return None
+        return np.array(body.split(','), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def _normalize_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (m / norms).astype(np.float32, copy=False)
+
+
+def load_query_vectors(entries: List[Dict[str, Any]]) -> Tuple[Dict[Any, np.ndarray], int]:
+    """Vetores de consulta por boletim: lidos de user_schedule_vec; ausentes/obsoletos recalculados e salvos.
+
+    Retorna ({id: vetor}, quantidade recalculada).
+    """
+    keys: Dict[Any, Tuple[str, str]] = {}
+    for e in entries:
+        text = query_embedding_text(e.get('query_text') or '', e.get('preproc_output'))
+        if text:
+            keys[e['id']] = (text, query_embedding_key(text))
+    ids = list(keys.keys())
+    vectors: Dict[Any, np.ndarray] = {}
+    for start in range(0, len(ids), PERCOLATOR_FETCH_CHUNK):
+        chunk = ids[start:start + PERCOLATOR_FETCH_CHUNK]
+        rows = db_fetch_all(
+            "SELECT schedule_id, emb_key, embedding::text FROM public.user_schedule_vec WHERE schedule_id = ANY(%s)",
+            (chunk,), ctx="PERCOLATOR.load_query_vectors",
+        ) or []
+        for sid, key, emb in rows:
+            if sid in keys and keys[sid][1] == key:
+                vec = parse_vector(emb)
+                if vec is not None:
+                    vectors[sid] = vec
+    stale = [sid for sid in ids if sid not in vectors]
+    if stale:
+        embs = embed_queries([keys[sid][0] for sid in stale])
+        upserts = []
+        for sid, vec in zip(stale, embs):
+            if vec is None:
+                continue
+            vectors[sid] = vec
+            upserts.append((sid, keys[sid][1], vec.tolist()))
+        if upserts:
+            db_execute_many(
+                "INSERT INTO public.user_schedule_vec (schedule_id, emb_key, embedding, updated_at) "
+                "VALUES (%s, %s, %s::halfvec(3072), now()) "
+                "ON CONFLICT (schedule_id) DO UPDATE SET emb_key = EXCLUDED.emb_key, embedding = EXCLUDED.embedding, updated_at = now()",
+                upserts, ctx="PERCOLATOR.save_query_vectors",
+            )
+    return vectors, len(stale)
+
+
+# =====================
+# Índice e lote
+# =====================
+@dataclass
+class QueryIndex:
+    """Matriz de consultas (uma linha por boletim) + limiar, limite, marca d'água e grupo de filtros."""
+    ids: List[Any]
+    matrix: np.ndarray       # (n, d) float32 normalizada
+    cutoffs: np.ndarray      # (n,) similaridade mínima
+    limits: np.ndarray       # (n,) max_results
+    since: np.ndarray        # (n,) epoch do last_run_at (created_at >= since)
+    groups: np.ndarray       # (n,) índice do grupo de filtros
+
+    @classmethod
+    def build(cls, ids: List[Any], vectors: List[np.ndarray], cutoffs: Sequence[float], limits: Sequence[int],
+              since: Sequence[float], groups: Sequence[int]) -> 'QueryIndex':
+        matrix = _normalize_rows(np.vstack(vectors).astype(np.float32, copy=False)) if vectors else np.zeros((0, 0), np.float32)
+        return cls(
+            ids=list(ids), matrix=matrix,
+            cutoffs=np.asarray(cutoffs, dtype=np.float32), limits=np.asarray(limits, dtype=np.int32),
+            since=np.asarray(since, dtype=np.float64), groups=np.asarray(groups, dtype=np.int32),
+        )
+
+
+@dataclass
+class ContractBatch:
+    """Contratações novas: vetores normalizados, created_at (epoch) e linha de user_boletim pré-montada."""
+    pks: List[str]
+    matrix: np.ndarray       # (m, d) float32 normalizada
+    created: np.ndarray      # (m,) epoch
+    rows: List[Dict[str, Any]]
+
+    def __len__(self) -> int:
+        return len(self.pks)
+
+
+def load_contract_batch(since: datetime, until: datetime) -> ContractBatch:
+    """Contratações embedadas em [since, until) ainda abertas (mesmo filtro de encerradas do executor)."""
+    cols = ",\n  ".join(get_contratacao_core_columns('c'))
+    sql = (
+        f"SELECT\n  {cols},\n  ce.created_at AS emb_created_at,\n  ce.{EMB_VECTOR_FIELD}::text AS emb\n"
+        f"FROM {CONTRATACAO_EMB_TABLE} ce\n"
+        f"JOIN {CONTRATACAO_TABLE} c ON c.{PRIMARY_KEY} = ce.{PRIMARY_KEY}\n"
+        f"WHERE ce.created_at >= %s AND ce.created_at < %s AND ce.{EMB_VECTOR_FIELD} IS NOT NULL\n"
+        "  AND to_date(NULLIF(c.data_encerramento_proposta,''),'YYYY-MM-DD') >= CURRENT_DATE"
+    )
+    records = db_fetch_all(sql, (since, until), as_dict=True, ctx="PERCOLATOR.load_contract_batch") or []
+    core_keys = set(CONTRATACAO_FIELDS.keys())
+    pks: List[str] = []
+    vecs: List[np.ndarray] = []
+    created: List[float] = []
+    results: List[Dict[str, Any]] = []
+    for rec in records:
+        vec = parse_vector(rec.get('emb'))
+        pid = rec.get(PRIMARY_KEY)
+        if vec is None or not pid:
+            continue
+        details = _augment_aliases({k: v for k, v in rec.items() if k in core_keys})
+        pks.append(str(pid))
+        vecs.append(vec)
+        ts = rec.get('emb_created_at')
+        created.append(ts.timestamp() if isinstance(ts, datetime) else 0.0)
+        results.append({'id': pid, 'similarity': None, 'details': details})
+    matrix = _normalize_rows(np.vstack(vecs)) if vecs else np.zeros((0, 0), np.float32)
+    return ContractBatch(pks=pks, matrix=matrix, created=np.asarray(created, dtype=np.float64), rows=build_boletim_rows(results))
+
+
+# =====================
+# Filtros por grupo
+# =====================
+def _group_branch(g: int, conds: Tuple[str, ...]) -> str:
+    where = " AND ".join(f"({c})" for c in conds)
+    return (
+        f"SELECT {int(g)} AS g, c.{PRIMARY_KEY} AS pk FROM lote l\n"
+        f"  JOIN {CONTRATACAO_TABLE} c ON c.{PRIMARY_KEY} = l.pk\n"
+        f"  JOIN {CONTRATACAO_EMB_TABLE} ce ON ce.{PRIMARY_KEY} = c.{PRIMARY_KEY}\n"
+        f"  WHERE {where}"
+    )
+
+
+def _eval_groups_sql(pks: List[str], items: List[Tuple[int, Tuple[str, ...]]]) -> Optional[List[Tuple[int, str]]]:
+    # Linha sentinela (-1): distingue "nenhum acerto" de erro (db_fetch_all devolve [] nos dois casos)
+    sql = (
+        "WITH lote AS (SELECT unnest(%s::text[]) AS pk)\n"
+        "SELECT -1 AS g, NULL::text AS pk\nUNION ALL\n"
+        + "\nUNION ALL\n".join(_group_branch(g, conds) for g, conds in items)
+    )
+    rows = db_fetch_all(sql, (pks,), ctx="PERCOLATOR.eval_filter_groups") or []
+    if not any(r[0] == -1 for r in rows):
+        return None
+    return [(r[0], r[1]) for r in rows if r[0] != -1]
+
+
+def evaluate_filter_groups(batch: ContractBatch, groups: List[Tuple[str, ...]]) -> Tuple[np.ndarray, Set[int]]:
+    """Máscara (grupos x contratações) das sql_conditions de cada grupo sobre o lote; grupos com erro em `failed`."""
+    masks = np.zeros((len(groups), len(batch)), dtype=bool)
+    failed: Set[int] = set()
+    if not len(batch):
+        return masks, failed
+    pos = {pk: i for i, pk in enumerate(batch.pks)}
+    pending: List[Tuple[int, Tuple[str, ...]]] = []
+    for g, conds in enumerate(groups):
+        if conds:
+            pending.append((g, conds))
+        else:
+            masks[g, :] = True
+    for start in range(0, len(pending), PERCOLATOR_GROUPS_PER_SQL):
+        chunk = pending[start:start + PERCOLATOR_GROUPS_PER_SQL]
+        hits = _eval_groups_sql(batch.pks, chunk)
+        if hits is None:
+            # Alguma condição inválida derrubou o bloco: reavalia grupo a grupo
+            hits = []
+            for item in chunk:
+                one = _eval_groups_sql(batch.pks, [item])
+                if one is None:
+                    failed.add(item[0])
+                    dbg('BOLETIM', f"percolação: filtro inválido no grupo {item[0]}: {list(item[1])[:3]}")
+                else:
+                    hits.extend(one)
+        for g, pk in hits:
+            i = pos.get(str(pk))
+            if i is not None:
+                masks[g, i] = True
+    return masks, failed
+
+
+# =====================
+# Casamento
+# =====================
+def match(index: QueryIndex, batch: ContractBatch, group_masks: np.ndarray,
+          chunk: int = PERCOLATOR_CHUNK) -> List[List[Tuple[int, float]]]:
+    """Top-N por boletim entre as contratações do lote que passam em filtro, marca d'água e corte.
+
+    Retorna, por consulta do índice, [(posição no lote, similaridade)] em ordem decrescente.
+    """
+    n, m = len(index.ids), len(batch)
+    out: List[List[Tuple[int, float]]] = [[] for _ in range(n)]
+    if not n or not m:
+        return out
+    cmat_t = np.ascontiguousarray(batch.matrix.T)
+    for start in range(0, n, chunk):
+        end = min(n, start + chunk)
+        sims = index.matrix[start:end] @ cmat_t                     # (b, m) cosseno
+        allowed = sims >= index.cutoffs[start:end, None]
+        allowed &= batch.created[None, :] >= index.since[start:end, None]
+        allowed &= group_masks[index.groups[start:end]]
+        sims = np.where(allowed, sims, -np.inf)
+        k = int(min(m, index.limits[start:end].max()))
+        if k <= 0:
+            continue
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k] if k < m else np.tile(np.arange(m), (end - start, 1))
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_sims, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_sims = np.take_along_axis(top_sims, order, axis=1)
+        for row in range(end - start):
+            lim = int(index.limits[start + row])
+            vals = top_sims[row, :lim]
+            keep = int(np.isfinite(vals).sum())
+            if keep:
+                out[start + row] = list(zip(top[row, :keep].tolist(), vals[:keep].tolist()))
+    return out
+
+
+def percolate(entries: List[Dict[str, Any]], now: datetime) -> Dict[str, Any]:
+    """Percola o lote de contratações novas contra os boletins e grava os acertos em user_boletim.
+
+    entries: [{'id','user_id','query_text','preproc_output','since' (datetime),'cutoff','max_results'}]
+    Retorna {'delivered': [ids], 'fallback': [ids], 'hits', 'contracts', 'embedded', 'timings'}.
+    Boletins em 'fallback' (sem vetor, filtro inválido, falha de escrita) devem seguir no executor.
+    """
+    timings: Dict[str, float] = {}
+    t0 = time.monotonic()
+    fallback: List[Any] = []
+    vectors, embedded = load_query_vectors(entries)
+    timings['vectors_s'] = time.monotonic() - t0
+    ready = []
+    for e in entries:
+        (ready if e['id'] in vectors else fallback).append(e)
+    if not ready:
+        return {'delivered': [], 'fallback': [e['id'] for e in entries], 'hits': 0, 'contracts': 0, 'embedded': embedded, 'timings': timings}
+
+    t1 = time.monotonic()
+    batch = load_contract_batch(min(e['since'] for e in ready), now)
+    timings['batch_s'] = time.monotonic() - t1
+
+    # Grupos de filtros: conjuntos distintos de sql_conditions (como chegam em semantic_search)
+    t2 = time.monotonic()
+    group_of: Dict[Tuple[str, ...], int] = {}
+    entry_group: List[int] = []
+    for e in ready:
+        info = e.get('preproc_output') if isinstance(e.get('preproc_output'), dict) else {}
+        conds = tuple(_sanitize_sql_conditions(info.get('sql_conditions') or [], context='semantic'))
+        entry_group.append(group_of.setdefault(conds, len(group_of)))
+    masks, failed = evaluate_filter_groups(batch, list(group_of.keys()))
+    timings['filters_s'] = time.monotonic() - t2
+    kept = []
+    for e, g in zip(ready, entry_group):
+        if g in failed:
+            fallback.append(e)
+        else:
+            kept.append((e, g))
+
+    t3 = time.monotonic()
+    index = QueryIndex.build(
+        [e['id'] for e, _ in kept],
+        [vectors[e['id']] for e, _ in kept],
+        [float(e['cutoff']) for e, _ in kept],
+        [int(e['max_results']) for e, _ in kept],
+        [e['since'].timestamp() for e, _ in kept],
+        [g for _, g in kept],
+    )
+    matches = match(index, batch, masks)
+    timings['match_s'] = time.monotonic() - t3
+
+    # Escrita: uma inserção em bloco para todos os boletins + last_run em lote
+    t4 = time.monotonic()
+    items = []
+    owners: Dict[Any, str] = {}
+    per_entry: Dict[Any, int] = {}
+    for (e, _), hits in zip(kept, matches):
+        owners[e['id']] = e['user_id']
+        per_entry[e['id']] = len(hits)
+        run_token = uuid.uuid4().hex
+        for ci, sim in hits:
+            items.append((e['id'], e['user_id'], run_token, now, dict(batch.rows[ci], similarity=sim)))
+    written, failed_ids = record_boletim_hits(items) if items else (0, set())
+    if failed_ids:
+        # Bloco não persistido: só esses boletins voltam ao executor (sem last_run); os demais seguem
+        dbg('BOLETIM', f"percolação: falha ao gravar acertos de {len(failed_ids)} boletim(ns); gravados={written}")
+        fallback.extend(e for e, _ in kept if e['id'] in failed_ids)
+        for sid in failed_ids:
+            owners.pop(sid, None)
+    touch_last_run_many(owners, now)
+    try:
+        from gvg_usage import usage_event_start, usage_event_finish  # type: ignore
+        for sid, uid in owners.items():
+            usage_event_start(str(uid), 'boletim_run', ref_type='boletim', ref_id=str(sid))
+            usage_event_finish({'results': per_entry.get(sid, 0), 'percolated': True})
+    except Exception:
+        pass
+    timings['write_s'] = time.monotonic() - t4
+    return {
+        'delivered': list(owners.keys()), 'fallback': [e['id'] for e in fallback], 'hits': written,
+        'contracts': len(batch), 'embedded': embedded, 'timings': timings,
+    }
+
+
+__all__ = [
+    'QueryIndex', 'ContractBatch', 'query_embedding_text', 'query_embedding_key', 'embed_queries', 'parse_vector',
+    'load_query_vectors', 'load_contract_batch', 'evaluate_filter_groups', 'match', 'percolate',
+]
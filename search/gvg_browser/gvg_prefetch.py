@@ -0,0 +1,172 @@
+"""
+gvg_prefetch.py
+Pré-carregamento (prefetch) de itens e listas de documentos dos top-N resultados.
+
+Objetivo:
+  Logo após uma busca, aquecer em background os dados que os painéis
+  "Itens" / "Documentos" / "Resumo" dos cards vão pedir, para que abram sem
+  round trip ao BD ou à API PNCP no clique.
+
+Desenho:
+  • prefetch_for_results(uid, ids) não bloqueia: agenda em um pool dedicado.
+  • Itens: fetch_itens_for_many (uma query = ANY, limite por PNCP).
+  • Documentos: fetch_documentos_for_many (uma query em lista_documentos; os
+    ausentes vão à API com concorrência limitada por GVG_PREFETCH_WORKERS).
+  • Orçamento por sessão (usuário logado ou sessão anônima): no máximo
+    GVG_PREFETCH_USER_BUDGET PNCPs por janela de 10 min e um prefetch em
+    andamento por sessão.
+  • Cache no store de sessão (gvg_session_store; handles h:preitens:/h:predocs:
+    por PNCP, expiração de 10 min no envelope) consultado pelos callbacks dos
+    cards antes de ir ao BD: get_prefetched_itens / get_prefetched_docs.
+    Com L2 compartilhado o clique aproveita o prefetch em qualquer worker.
+
+Variáveis:
+  GVG_PREFETCH_ENABLE (padrão on), GVG_PREFETCH_TOP_N (10),
+  GVG_PREFETCH_WORKERS (4), GVG_PREFETCH_USER_BUDGET (100)
+"""
+from __future__ import annotations
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from gvg_session_store import store_get, store_put
+
+try:
+    from gvg_debug import debug_log as dbg  # type: ignore
+except Exception:  # pragma: no cover
+    def dbg(*_a, **_k):
+        pass
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+PREFETCH_ENABLED = (os.getenv('GVG_PREFETCH_ENABLE', 'true') or '').strip().lower() in ('1', 'true', 'yes', 'on')
+PREFETCH_TOP_N = _env_int('GVG_PREFETCH_TOP_N', 10)
+PREFETCH_WORKERS = max(1, _env_int('GVG_PREFETCH_WORKERS', 4))
+PREFETCH_USER_BUDGET = _env_int('GVG_PREFETCH_USER_BUDGET', 100)
+PREFETCH_WINDOW_SECONDS = 600
+PREFETCH_TTL_SECONDS = 600
+PREFETCH_ITENS_LIMIT = 500
+
+
+# =====================
+# Cache no store de sessão (compartilhado entre workers quando há L2)
+# =====================
+def _handle(kind: str, pid: str) -> str:
+    return f"h:pre{kind}:{pid}"
+
+
+def _cache_get(kind: str, pid: str) -> Optional[List[dict]]:
+    if not pid:
+        return None
+    entry = store_get(_handle(kind, str(pid)))
+    if not isinstance(entry, dict) or entry.get('exp', 0) < time.time():
+        return None
+    return entry.get('v')
+
+
+def _cache_set(kind: str, pid: str, val: List[dict]) -> None:
+    # envelope com expiração própria (o TTL do store é o da sessão) e que aceita lista vazia
+    store_put({'exp': time.time() + PREFETCH_TTL_SECONDS, 'v': val or []}, handle=_handle(kind, str(pid)))
+
+
+def get_prefetched_itens(pid: str) -> Optional[List[dict]]:
+    return _cache_get('itens', pid)
+
+
+def get_prefetched_docs(pid: str) -> Optional[List[dict]]:
+    return _cache_get('docs', pid)
+
+
+# =====================
+# Orçamento por sessão
+# =====================
+_BUDGET: Dict[str, List[float]] = {}
+_INFLIGHT: set = set()
+_BUDGET_LOCK = threading.Lock()
+
+
+def _reserve(uid: str, n: int) -> int:
+    """Reserva até n PNCPs do orçamento da sessão; 0 se sem saldo ou já em andamento."""
+    now = time.time()
+    with _BUDGET_LOCK:
+        if uid in _INFLIGHT:
+            return 0
+        hist = [t for t in _BUDGET.get(uid, []) if t > now - PREFETCH_WINDOW_SECONDS]
+        allowed = max(0, min(n, PREFETCH_USER_BUDGET - len(hist)))
+        if allowed:
+            hist.extend([now] * allowed)
+            _INFLIGHT.add(uid)
+        _BUDGET[uid] = hist
+        return allowed
+
+
+def _release(uid: str) -> None:
+    with _BUDGET_LOCK:
+        _INFLIGHT.discard(uid)
+
+
+# =====================
+# Orquestração
+# =====================
+_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix='gvg-prefetch')
+
+
+def _run_prefetch(uid: str, ids: List[str]) -> None:
+    t0 = time.time()
+    try:
+        need_itens = [p for p in ids if get_prefetched_itens(p) is None]
+        if need_itens:
+            try:
+                from gvg_search_core import fetch_itens_for_many  # type: ignore
+                for pid, itens in fetch_itens_for_many(need_itens, PREFETCH_ITENS_LIMIT).items():
+                    _cache_set('itens', pid, itens)
+            except Exception as e:
+                dbg('PRE', f"prefetch itens erro: {e}")
+        need_docs = [p for p in ids if get_prefetched_docs(p) is None]
+        if need_docs:
+            try:
+                from gvg_database import fetch_documentos_for_many  # type: ignore
+                for pid, docs in fetch_documentos_for_many(need_docs, max_workers=PREFETCH_WORKERS).items():
+                    _cache_set('docs', pid, docs)
+            except Exception as e:
+                dbg('PRE', f"prefetch docs erro: {e}")
+        dbg('PRE', f"prefetch uid={uid[:8]} ids={len(ids)} itens={len(need_itens)} docs={len(need_docs)} ms={int((time.time()-t0)*1000)}")
+    finally:
+        _release(uid)
+
+
+def prefetch_for_results(uid: str, ids: Sequence[str], top_n: Optional[int] = None) -> int:
+    """Agenda o prefetch dos top-N PNCPs (não bloqueia). Retorna quantos foram agendados.
+
+    `uid` é a chave do orçamento: o usuário logado ou um escopo por sessão anônima.
+    """
+    if not PREFETCH_ENABLED or not ids:
+        return 0
+    n = PREFETCH_TOP_N if top_n is None else int(top_n)
+    uniq: List[str] = []
+    for pid in ids:
+        p = str(pid or '').strip()
+        if p and p != 'N/A' and p not in uniq:
+            uniq.append(p)
+        if len(uniq) >= n:
+            break
+    key = str(uid or 'anon')
+    allowed = _reserve(key, len(uniq))
+    if not allowed:
+        return 0
+    _POOL.submit(_run_prefetch, key, uniq[:allowed])
+    return allowed
+
+
+__all__ = [
+    'PREFETCH_TOP_N', 'prefetch_for_results', 'get_prefetched_itens', 'get_prefetched_docs',
+]
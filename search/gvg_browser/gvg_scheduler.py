@@ -0,0 +1,199 @@
+"""
+gvg_scheduler.py
+Agenda em memória dos boletins (user_schedule) para o daemon residente.
+
+Objetivo:
+  O pipeline em lote (00_pipeline_boletim → 01/02) sobe processos novos a cada disparo,
+  reimporta toda a pilha e varre todos os boletins para descobrir quais vencem. Aqui:
+  • next_due(item, now): próximo horário de execução a partir da frequência e do config
+    (schedule_type, schedule_detail.days / time / min_interval_minutes, last_run_at);
+  • DueQueue: fila de prioridade (heap) por horário, com versões para remoção/reagendamento
+    preguiçosos e espera que acorda exatamente no próximo vencimento (ou em wake()).
+
+Semântica (espelha 01_run_scheduled_boletins._should_skip):
+  • DIARIO / SEMANAL: uma vez por dia permitido, no horário do dia (schedule_detail.time 'HH:MM'
+    ou GVG_SCHEDULER_RUN_AT, padrão 07:00, fuso GVG_SCHEDULER_TZ); se o horário de hoje já
+    passou e ainda não rodou hoje, vence imediatamente (recuperação).
+  • MULTIDIARIO: em dias permitidos, a partir do horário do dia, a cada min_interval_minutes
+    (ou GVG_SCHEDULER_MULTI_INTERVAL_MIN, padrão 240) desde o last_run_at.
+  • Sem dias permitidos / tipo desconhecido → None (não agendado).
+"""
+from __future__ import annotations
+
+import heapq
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone, time as dtime
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from zoneinfo import ZoneInfo
+except Exception:  # pragma: no cover
+    ZoneInfo = None  # type: ignore
+
+try:
+    from search.gvg_browser.gvg_boletim import schedule_days  # type: ignore
+except Exception:
+    try:
+        from .gvg_boletim import schedule_days  # type: ignore
+    except Exception:
+        from gvg_boletim import schedule_days  # type: ignore
+
+
+def _parse_hhmm(v: Any) -> Optional[dtime]:
+    try:
+        hh, mm = str(v).strip().split(':')[:2]
+        return dtime(int(hh), int(mm))
+    except Exception:
+        return None
+
+
+def _load_tz(name: str):
+    try:
+        return ZoneInfo(name) if ZoneInfo else timezone.utc
+    except Exception:
+        return timezone.utc
+
+
+SCHEDULER_TZ = _load_tz(os.getenv('GVG_SCHEDULER_TZ', 'America/Sao_Paulo'))
+SCHEDULER_RUN_AT = _parse_hhmm(os.getenv('GVG_SCHEDULER_RUN_AT', '07:00')) or dtime(7, 0)
+try:
+    SCHEDULER_MULTI_INTERVAL_MIN = max(1, int(os.getenv('GVG_SCHEDULER_MULTI_INTERVAL_MIN', '240')))
+except Exception:
+    SCHEDULER_MULTI_INTERVAL_MIN = 240
+
+_DOW = {0: 'seg', 1: 'ter', 2: 'qua', 3: 'qui', 4: 'sex', 5: 'sab', 6: 'dom'}
+
+
+def _to_dt(x: Any) -> Optional[datetime]:
+    if not x:
+        return None
+    if isinstance(x, datetime):
+        return x if x.tzinfo else x.replace(tzinfo=timezone.utc)
+    try:
+        d = datetime.fromisoformat(str(x).replace('Z', '+00:00'))
+        return d if d.tzinfo else d.replace(tzinfo=timezone.utc)
+    except Exception:
+        return None
+
+
+# =====================
+# Próximo vencimento
+# =====================
+def next_due(item: Dict[str, Any], now: datetime, tz=None, run_at: Optional[dtime] = None,
+             multi_interval_min: Optional[int] = None) -> Optional[datetime]:
+    """Próximo horário (aware) em que o boletim deve rodar; pode estar no passado (= vencido agora)."""
+    tz = tz or SCHEDULER_TZ
+    stype = (item.get('schedule_type') or '').upper()
+    detail = item.get('_detail')
+    if not isinstance(detail, dict):
+        detail = item.get('schedule_detail') if isinstance(item.get('schedule_detail'), dict) else {}
+    days = set(schedule_days(stype, detail))
+    if not days:
+        return None
+    slot_t = _parse_hhmm(detail.get('time')) or run_at or SCHEDULER_RUN_AT
+    last = _to_dt(item.get('last_run_at'))
+    last_local_date = last.astimezone(tz).date() if last else None
+    earliest: Optional[datetime] = None
+    if stype == 'MULTIDIARIO':
+        v = detail.get('min_interval_minutes')
+        interval = int(v) if isinstance(v, (int, float)) and v > 0 else int(multi_interval_min or SCHEDULER_MULTI_INTERVAL_MIN)
+        earliest = (last + timedelta(minutes=interval)) if last else now
+    today = now.astimezone(tz).date()
+    for k in range(0, 8):
+        d = today + timedelta(days=k)
+        if _DOW[d.weekday()] not in days:
+            continue
+        slot = datetime.combine(d, slot_t, tzinfo=tz)
+        if earliest is None:
+            if last_local_date is not None and last_local_date >= d:
+                continue  # já rodou neste dia
+            return slot
+        end = datetime.combine(d + timedelta(days=1), dtime(0, 0), tzinfo=tz)
+        cand = max(slot, earliest)
+        if cand < end:
+            return cand
+    return None
+
+
+# =====================
+# Fila de vencimentos
+# =====================
+class DueQueue:
+    """Heap (vencimento, seq, id) com versão por id: reagendar/remover invalida entradas antigas."""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._current: Dict[Any, Tuple[float, int]] = {}
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._current)
+
+    def schedule(self, key: Any, due: Optional[datetime]) -> None:
+        """(Re)agenda key em due; due=None remove."""
+        with self._cond:
+            if due is None:
+                self._current.pop(key, None)
+                return
+            self._seq += 1
+            ts = due.timestamp()
+            self._current[key] = (ts, self._seq)
+            heapq.heappush(self._heap, (ts, self._seq, key))
+            if self._heap[0][2] == key and self._heap[0][1] == self._seq:
+                self._cond.notify_all()  # novo primeiro da fila: reavaliar a espera
+
+    def remove(self, key: Any) -> None:
+        self.schedule(key, None)
+
+    def due_of(self, key: Any) -> Optional[float]:
+        with self._cond:
+            cur = self._current.get(key)
+            return cur[0] if cur else None
+
+    def _clean_head(self) -> None:
+        while self._heap:
+            ts, seq, key = self._heap[0]
+            cur = self._current.get(key)
+            if cur is not None and cur[1] == seq:
+                return
+            heapq.heappop(self._heap)
+
+    def peek(self) -> Optional[float]:
+        """Timestamp do próximo vencimento (ou None)."""
+        with self._cond:
+            self._clean_head()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now_ts: float, coalesce_s: float = 0.0) -> List[Tuple[Any, float]]:
+        """Remove e devolve [(id, vencimento)] com vencimento <= now_ts + coalesce_s, em ordem."""
+        out: List[Tuple[Any, float]] = []
+        with self._cond:
+            limit = now_ts + max(0.0, coalesce_s)
+            while True:
+                self._clean_head()
+                if not self._heap or self._heap[0][0] > limit:
+                    break
+                ts, seq, key = heapq.heappop(self._heap)
+                self._current.pop(key, None)
+                out.append((key, ts))
+        return out
+
+    def wait(self, deadline_ts: Optional[float] = None) -> None:
+        """Dorme até o próximo vencimento, deadline_ts ou wake() — o que vier primeiro."""
+        with self._cond:
+            self._clean_head()
+            targets = [t for t in (self._heap[0][0] if self._heap else None, deadline_ts) if t is not None]
+            timeout = (min(targets) - time.time()) if targets else None
+            if timeout is None or timeout > 0:
+                self._cond.wait(timeout)
+
+    def wake(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+
+__all__ = ['next_due', 'DueQueue', 'SCHEDULER_TZ', 'SCHEDULER_RUN_AT', 'SCHEDULER_MULTI_INTERVAL_MIN']
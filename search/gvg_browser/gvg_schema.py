@@ -212,6 +212,21 @@ def build_itens_by_pncp_select(limit_placeholder: str = '%s') -> str:
         f"LIMIT {limit_placeholder}"
     )
 
+def build_itens_by_many_pncp_select() -> str:
+    """SELECT de itens para vários numero_controle_pncp (= ANY) com limite por PNCP (ROW_NUMBER).
+
+    Parâmetros: (lista_de_pncps, limite_por_pncp).
+    """
+    cols = ",\n    ".join(get_item_contratacao_columns('i'))
+    return (
+        "SELECT * FROM (\n  SELECT\n    " + cols + ",\n"
+        "    ROW_NUMBER() OVER (PARTITION BY i.numero_controle_pncp ORDER BY "
+        "NULLIF(regexp_replace(i.numero_item,'[^0-9]','','g'),'')::int NULLS LAST, i.numero_item ASC) AS rn\n"
+        f"  FROM {ITEM_CONTRATACAO_TABLE} i\n"
+        "  WHERE i.numero_controle_pncp = ANY(%s::text[])\n"
+        ") t\nWHERE t.rn <= %s\nORDER BY t.numero_controle_pncp, t.rn"
+    )
+
 def normalize_item_contratacao_row(row: Dict[str, Any]) -> Dict[str, Any]:
     out = {}
     for logical, meta in ITEM_CONTRATACAO_FIELDS.items():
@@ -242,6 +257,6 @@ __all__ = [
     'ITEM_CONTRATACAO_TABLE','ITEM_CONTRATACAO_FIELDS','ITEM_CONTRATACAO_ORDER',
     'FTS_SOURCE_FIELD','PRIMARY_KEY','EMB_VECTOR_FIELD','CATEGORY_VECTOR_FIELD',
     'get_contratacao_core_columns','build_core_select_clause','build_semantic_select',
-    'build_category_similarity_select','build_itens_by_pncp_select','get_item_contratacao_columns',
+    'build_category_similarity_select','build_itens_by_pncp_select','build_itens_by_many_pncp_select','get_item_contratacao_columns',
     'normalize_contratacao_row','normalize_item_contratacao_row','project_result_for_output'
 ]
\ No newline at end of file
@@ -26,7 +26,7 @@ from gvg_schema import (
 	PRIMARY_KEY, EMB_VECTOR_FIELD, CATEGORY_VECTOR_FIELD,
 	build_semantic_select, get_contratacao_core_columns, build_category_similarity_select,
 	CONTRATACAO_FIELDS,
-	build_itens_by_pncp_select, normalize_item_contratacao_row
+	build_itens_by_pncp_select, build_itens_by_many_pncp_select, normalize_item_contratacao_row
 )
 
 # Pré-processamento agora é responsabilidade externa (Browser / Scheduler). Este core aceita string ou dict pré-processado.
@@ -1019,7 +1019,7 @@ __all__ = [
 	'apply_relevance_filter','set_relevance_filter_level','toggle_relevance_filter','get_relevance_filter_status',
 	'toggle_intelligent_processing','get_intelligent_status','set_sql_debug',
 	'get_top_categories_for_query','correspondence_search','category_filtered_search',
-	'fetch_itens_contratacao','fetch_contratacao_by_pncp'
+	'fetch_itens_contratacao','fetch_itens_for_many','fetch_contratacao_by_pncp'
 ]
 
 
@@ -1047,6 +1047,33 @@ def fetch_itens_contratacao(numero_controle_pncp: str, limit: int = 500) -> List
 		return []
 
 
+def fetch_itens_for_many(ids: List[str], limit_per_id: int = 500) -> Dict[str, List[Dict[str, Any]]]:
+	"""Versão em lote de fetch_itens_contratacao: {numero_controle_pncp: [itens]}.
+
+	Uma única query (= ANY) com limite por PNCP via ROW_NUMBER(); PNCPs sem itens retornam [].
+	"""
+	uniq: List[str] = []
+	for pid in (ids or []):
+		p = str(pid or '').strip()
+		if p and p not in uniq:
+			uniq.append(p)
+	out: Dict[str, List[Dict[str, Any]]] = {p: [] for p in uniq}
+	if not uniq:
+		return out
+	try:
+		sql = build_itens_by_many_pncp_select()
+		rows = db_fetch_all(sql, (uniq, int(limit_per_id)), as_dict=True, ctx="SC.fetch_itens_for_many") if db_fetch_all else []
+		for rec in (rows or []):
+			try:
+				out.setdefault(str(rec.get('numero_controle_pncp')), []).append(normalize_item_contratacao_row(rec))
+			except Exception:
+				pass
+	except Exception as e:
+		if SQL_DEBUG:
+			dbg('SQL', f"[ERRO][fetch_itens_for_many] {e}")
+	return out
+
+
 def fetch_contratacao_by_pncp(numero_controle_pncp: str) -> Optional[Dict[str, Any]]:
 	"""Busca um único registro de contratacao por numero_controle_pncp com colunas core.
 
@@ -0,0 +1,385 @@
+"""
+gvg_session_store.py
+Store de sessão no servidor (resultados, abas e caches de itens/documentos/resumos).
+
+Objetivo:
+  Manter os dados pesados no servidor e deixar no browser (dcc.Store) apenas
+  handles opacos. Callbacks resolvem o handle server-side, evitando re-upload
+  de megabytes a cada callback que recebe essas stores como State.
+
+Camadas:
+  • L1 em processo (OrderedDict LRU) com TTL deslizante e orçamento em bytes.
+  • L2 compartilhado opcional (necessário com múltiplos workers gunicorn):
+      GVG_SESSION_STORE=sqlite → arquivo sqlite local (GVG_SESSION_STORE_PATH)
+      GVG_SESSION_STORE=redis  → Redis (REDIS_URL, padrão redis://localhost:6379/0)
+      (vazio/memory)           → somente L1
+  • Com L2 configurado, toda leitura passa pelo L2 (fonte da verdade): handles
+    reescritos no lugar (caches de itens/docs/resumo, '~sorted', jobs) por outro
+    worker são vistos de imediato. O L1 só responde se o L2 falhar.
+
+Variáveis:
+  GVG_SESSION_STORE_TTL     (segundos, padrão 21600)
+  GVG_SESSION_STORE_MAX_MB  (orçamento do L1 e do sqlite, padrão 256)
+
+Observações:
+  • Valores são serializados em JSON + zlib (contabilidade de bytes consistente).
+  • Valores vazios não geram handle (store_put devolve o próprio valor), preservando
+    as checagens `if not results` existentes na UI.
+  • store_get aceita o valor legado inline (não-handle) e o devolve como está.
+  • Handle expirado → default (a UI trata como ausência de dados).
+"""
+from __future__ import annotations
+
+import os
+import json
+import time
+import zlib
+import secrets
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from gvg_debug import debug_log as dbg  # type: ignore
+except Exception:  # pragma: no cover
+    def dbg(*_a, **_k):
+        pass
+
+try:  # Redis opcional
+    import redis  # type: ignore
+except Exception:  # pragma: no cover
+    redis = None  # type: ignore
+
+
+HANDLE_PREFIX = 'h:'
+
+try:
+    SESSION_STORE_TTL = int(os.getenv('GVG_SESSION_STORE_TTL', '21600'))
+except Exception:
+    SESSION_STORE_TTL = 21600
+try:
+    SESSION_STORE_MAX_BYTES = int(float(os.getenv('GVG_SESSION_STORE_MAX_MB', '256')) * 1024 * 1024)
+except Exception:
+    SESSION_STORE_MAX_BYTES = 256 * 1024 * 1024
+
+
+# =====================
+# Serialização
+# =====================
+def _dumps(value: Any) -> bytes:
+    raw = json.dumps(value, ensure_ascii=False, default=str, separators=(',', ':')).encode('utf-8')
+    return zlib.compress(raw, 1)
+
+
+def _loads(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+# =====================
+# Backends
+# =====================
+class _MemoryBackend:
+    """LRU em processo com TTL e orçamento de bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = int(max_bytes)
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str, ttl: int) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, blob = item
+            if expires < now:
+                self._pop(key)
+                return None
+            self._data[key] = (now + ttl, blob)
+            self._data.move_to_end(key)
+            return blob
+
+    def set(self, key: str, blob: bytes, ttl: int) -> None:
+        now = time.time()
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (now + ttl, blob)
+            self._bytes += len(blob)
+            # Expirados primeiro, depois LRU até caber no orçamento
+            for k in [k for k, (exp, _) in self._data.items() if exp < now]:
+                self._pop(k)
+            while self._bytes > self.max_bytes and len(self._data) > 1:
+                k = next(iter(self._data))
+                self._pop(k)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def _pop(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= len(item[1])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'items': len(self._data), 'bytes': self._bytes, 'evictions': self.evictions}
+
+
+class _SqliteBackend:
+    """Arquivo sqlite compartilhado entre workers do mesmo host."""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (k TEXT PRIMARY KEY, expires REAL NOT NULL, size INTEGER NOT NULL, v BLOB NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS kv_expires ON kv(expires)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            except Exception:
+                pass
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, ttl: int) -> Optional[bytes]:
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute("SELECT expires, v FROM kv WHERE k=?", (key,)).fetchone()
+        if not row:
+            return None
+        if row[0] < now:
+            conn.execute("DELETE FROM kv WHERE k=?", (key,))
+            conn.commit()
+            return None
+        # Renova o TTL só quando passou da metade: leituras comuns não escrevem no arquivo
+        if row[0] - now < ttl / 2:
+            conn.execute("UPDATE kv SET expires=? WHERE k=?", (now + ttl, key))
+            conn.commit()
+        return row[1]
+
+    def set(self, key: str, blob: bytes, ttl: int) -> None:
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO kv (k, expires, size, v) VALUES (?,?,?,?)",
+            (key, now + ttl, len(blob), sqlite3.Binary(blob)),
+        )
+        conn.commit()
+        self._writes += 1
+        if self._writes % 50 == 0:
+            self._prune(conn, now)
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        try:
+            conn.execute("DELETE FROM kv WHERE expires < ?", (now,))
+            total = conn.execute("SELECT COALESCE(SUM(size),0) FROM kv").fetchone()[0] or 0
+            if total > self.max_bytes:
+                # Remove os que expiram primeiro até voltar ao orçamento
+                excess = total - self.max_bytes
+                rows = conn.execute("SELECT k, size FROM kv ORDER BY expires ASC").fetchall()
+                drop = []
+                for k, size in rows:
+                    if excess <= 0:
+                        break
+                    drop.append((k,))
+                    excess -= size
+                conn.executemany("DELETE FROM kv WHERE k=?", drop)
+            conn.commit()
+        except Exception as e:
+            dbg('BROWSER', f"session_store sqlite prune erro: {e}")
+
+    def delete(self, key: str) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM kv WHERE k=?", (key,))
+        conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            row = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size),0) FROM kv").fetchone()
+            return {'items': int(row[0]), 'bytes': int(row[1])}
+        except Exception:
+            return {}
+
+
+class _RedisBackend:
+    """Redis compartilhado (orçamento de memória delegado ao maxmemory do servidor)."""
+
+    def __init__(self, url: str):
+        self._r = redis.Redis.from_url(url)  # type: ignore[union-attr]
+        self._ns = 'gvg:sess:'
+
+    def get(self, key: str, ttl: int) -> Optional[bytes]:
+        pipe = self._r.pipeline()
+        pipe.get(self._ns + key)
+        pipe.expire(self._ns + key, ttl)
+        blob, _ = pipe.execute()
+        return blob
+
+    def set(self, key: str, blob: bytes, ttl: int) -> None:
+        self._r.setex(self._ns + key, ttl, blob)
+
+    def delete(self, key: str) -> None:
+        self._r.delete(self._ns + key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+# =====================
+# Store
+# =====================
+class SessionStore:
+    def __init__(self, ttl: int = SESSION_STORE_TTL, max_bytes: int = SESSION_STORE_MAX_BYTES, shared: Optional[str] = None):
+        self.ttl = int(ttl)
+        self.l1 = _MemoryBackend(max_bytes)
+        self.l2 = None
+        kind = (shared if shared is not None else os.getenv('GVG_SESSION_STORE', '')).strip().lower()
+        try:
+            if kind == 'sqlite':
+                path = os.getenv('GVG_SESSION_STORE_PATH') or os.path.join(tempfile.gettempdir(), 'gvg_session_store.sqlite')
+                self.l2 = _SqliteBackend(path, max_bytes)
+            elif kind == 'redis':
+                if redis is None:
+                    raise RuntimeError('pacote redis não instalado')
+                self.l2 = _RedisBackend(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+        except Exception as e:
+            dbg('BROWSER', f"session_store backend '{kind}' indisponível ({e}); usando somente memória")
+            self.l2 = None
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def put(self, value: Any, handle: Optional[str] = None, ns: str = 'data') -> Any:
+        if not value:
+            return value
+        if not is_handle(handle):
+            handle = f"{HANDLE_PREFIX}{ns}:{secrets.token_urlsafe(16)}"
+        blob = _dumps(value)
+        self.l1.set(handle, blob, self.ttl)
+        if self.l2 is not None:
+            try:
+                self.l2.set(handle, blob, self.ttl)
+            except Exception as e:
+                dbg('BROWSER', f"session_store L2 set erro: {e}")
+        return handle
+
+    def get(self, data: Any, default: Any = None, fresh: bool = False) -> Any:
+        """fresh=True lê só do L2 (sem preencher o L1): estado volátil como jobs."""
+        if not is_handle(data):
+            return data if data is not None else default
+        if fresh and self.l2 is not None:
+            try:
+                blob = self.l2.get(data, self.ttl)
+            except Exception as e:
+                dbg('BROWSER', f"session_store L2 get erro: {e}")
+                blob = None
+        elif self.l2 is None:
+            blob = self.l1.get(data, self.ttl)
+        else:
+            # L2 é a fonte da verdade: outro worker pode ter reescrito o handle no lugar
+            try:
+                blob = self.l2.get(data, self.ttl)
+            except Exception as e:
+                dbg('BROWSER', f"session_store L2 get erro: {e}")
+                blob = self.l1.get(data, self.ttl)
+            else:
+                if blob is not None:
+                    self.l1.set(data, blob, self.ttl)
+                else:
+                    self.l1.delete(data)
+        with self._stats_lock:
+            if blob is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if blob is None:
+            return default
+        try:
+            return _loads(blob)
+        except Exception:
+            return default
+
+    def delete(self, data: Any) -> None:
+        if not is_handle(data):
+            return
+        self.l1.delete(data)
+        if self.l2 is not None:
+            try:
+                self.l2.delete(data)
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            out = {'hits': self.hits, 'misses': self.misses}
+        out['l1'] = self.l1.stats()
+        if self.l2 is not None:
+            out['l2'] = self.l2.stats()
+        return out
+
+
+_STORE: Optional[SessionStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = SessionStore()
+    return _STORE
+
+
+def is_handle(data: Any) -> bool:
+    return isinstance(data, str) and data.startswith(HANDLE_PREFIX)
+
+
+def store_put(value: Any, handle: Optional[str] = None, ns: str = 'data') -> Any:
+    """Grava valor no servidor e devolve o handle (reutiliza `handle` se informado)."""
+    return get_session_store().put(value, handle=handle, ns=ns)
+
+
+def store_get(data: Any, default: Any = None, fresh: bool = False) -> Any:
+    """Resolve handle → valor (valor inline legado é devolvido como está)."""
+    return get_session_store().get(data, default, fresh=fresh)
+
+
+def store_delete(data: Any) -> None:
+    get_session_store().delete(data)
+
+
+def store_derive(handle: Any, suffix: str) -> Optional[str]:
+    """Handle derivado e estável (ex.: versão ordenada de um conjunto de resultados)."""
+    if not is_handle(handle):
+        return None
+    return f"{handle}~{suffix}"
+
+
+def store_stats() -> Dict[str, Any]:
+    return get_session_store().stats()
+
+
+__all__ = [
+    'SessionStore', 'get_session_store', 'is_handle',
+    'store_put', 'store_get', 'store_delete', 'store_derive', 'store_stats',
+]
@@ -0,0 +1,370 @@
+"""
+gvg_summarize.py
+Resumo map-reduce de documentos longos (editais, termos de referência, anexos).
+
+Objetivo:
+  Evitar uma única chamada lenta ao Assistant com o Markdown truncado em 100k
+  caracteres (perdendo o final do edital). O documento é dividido em trechos
+  por seção, cada trecho é condensado em paralelo (map) e o texto condensado
+  segue para o Assistant de resumo com o mesmo contrato de prompt (reduce).
+
+Fluxo:
+  • split_markdown_sections: corta em títulos (#), marcadores de página e '---',
+    agrupando seções até GVG_SUMMARY_CHUNK_CHARS.
+  • condense_markdown: map concorrente e limitado (GVG_SUMMARY_MAP_WORKERS) via
+    gvg_ai_utils.ai_chat_complete; resultado em ordem original.
+  • Cache de resumos parciais por SHA-256 do trecho + variante (memória LRU e
+    public.doc_chunk_summary); trechos repetidos entre documentos/usuários não
+    voltam ao modelo.
+
+Variáveis:
+  GVG_SUMMARY_MAPREDUCE (padrão on), GVG_SUMMARY_MAPREDUCE_MIN_CHARS (60000),
+  GVG_SUMMARY_CHUNK_CHARS (24000), GVG_SUMMARY_MAP_WORKERS (4),
+  GVG_SUMMARY_CHUNK_MODEL (padrão GVG_CHAT_MODEL), GVG_SUMMARY_CHUNK_MAX_TOKENS (700),
+  GVG_SUMMARY_CHUNK_CACHE (padrão on)
+"""
+from __future__ import annotations
+
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from gvg_ai_utils import ai_chat_complete
+from gvg_database import db_fetch_all, db_execute
+
+try:
+    from gvg_debug import debug_log as dbg  # type: ignore
+except Exception:  # pragma: no cover
+    def dbg(*_a, **_k):
+        pass
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+MAPREDUCE_ENABLED = (os.getenv('GVG_SUMMARY_MAPREDUCE', 'true') or '').strip().lower() in ('1', 'true', 'yes', 'on')
+MAPREDUCE_MIN_CHARS = max(10_000, _env_int('GVG_SUMMARY_MAPREDUCE_MIN_CHARS', 60_000))
+CHUNK_CHARS = max(4_000, _env_int('GVG_SUMMARY_CHUNK_CHARS', 24_000))
+MAP_WORKERS = max(1, _env_int('GVG_SUMMARY_MAP_WORKERS', 4))
+CHUNK_MAX_TOKENS = max(100, _env_int('GVG_SUMMARY_CHUNK_MAX_TOKENS', 700))
+CHUNK_MODEL = os.getenv('GVG_SUMMARY_CHUNK_MODEL') or os.getenv('GVG_CHAT_MODEL', 'gpt-4o')
+CHUNK_CACHE_ENABLED = (os.getenv('GVG_SUMMARY_CHUNK_CACHE', 'true') or '').strip().lower() in ('1', 'true', 'yes', 'on')
+# Limite do texto condensado entregue ao reduce (mesmo teto do caminho direto)
+REDUCE_MAX_CHARS = 100_000
+# Incrementar quando o prompt do map mudar (invalida resumos parciais antigos)
+CHUNK_PROMPT_VERSION = 'v1'
+# Excerto usado quando o map de um trecho falha (o reduce não perde a seção inteira)
+_FALLBACK_EXCERPT_CHARS = 2_000
+
+_MEMO_MAX = 4096
+_MEMO: "OrderedDict[str, str]" = OrderedDict()
+_MEMO_LOCK = threading.Lock()
+
+_MAP_SYSTEM_PROMPT = (
+    "Você condensa TRECHOS de documentos de licitação pública (editais, termos de referência, anexos).\n"
+    "Extraia somente fatos presentes no trecho: objeto, itens/lotes e quantidades, valores, datas e prazos, "
+    "local e forma de entrega, exigências de habilitação e qualificação técnica, garantias, critérios de "
+    "julgamento, penalidades e condições de pagamento.\n"
+    "Preserve números, unidades e datas exatamente como aparecem. Não invente, não comente e não inclua "
+    "citações ou referências. Responda em tópicos Markdown curtos. Se o trecho não tiver conteúdo relevante, "
+    "responda apenas: (sem conteúdo relevante)."
+)
+
+
+# =====================
+# Divisão por seções
+# =====================
+_HEADING_RE = re.compile(r'^\s{0,3}#{1,6}\s+\S')
+_PAGE_RE = re.compile(r'^\s*<!--\s*p[áa]gina\s+\d+\s*-->\s*$', re.IGNORECASE)
+_RULE_RE = re.compile(r'^\s*-{3,}\s*$')
+
+
+def _sha(text: str) -> str:
+    return hashlib.sha256((text or '').encode('utf-8', errors='replace')).hexdigest()
+
+
+def _sections(markdown: str) -> List[Dict[str, str]]:
+    """Quebra o Markdown em seções (título + corpo) nas fronteiras naturais."""
+    sections: List[Dict[str, str]] = []
+    title = ''
+    buf: List[str] = []
+
+    def _flush():
+        body = '\n'.join(buf).strip()
+        if body:
+            sections.append({'title': title, 'text': body})
+
+    for line in (markdown or '').replace('\r\n', '\n').split('\n'):
+        if _HEADING_RE.match(line):
+            _flush()
+            buf = [line]
+            title = line.strip().lstrip('#').strip()[:120]
+        elif _PAGE_RE.match(line) or _RULE_RE.match(line):
+            # Quebra de página: nova seção, mantendo o último título como contexto
+            _flush()
+            buf = []
+        else:
+            buf.append(line)
+    _flush()
+    return sections
+
+
+def _split_oversized(text: str, limit: int) -> List[str]:
+    """Seção maior que o limite: corta por parágrafo (tabelas inteiras) e, em último caso, por tamanho."""
+    parts: List[str] = []
+    cur = ''
+    for para in re.split(r'\n\s*\n', text):
+        para = para.strip()
+        if not para:
+            continue
+        while len(para) > limit:
+            if cur:
+                parts.append(cur)
+                cur = ''
+            cut = para.rfind('\n', 0, limit)
+            cut = cut if cut > limit // 2 else limit
+            parts.append(para[:cut].strip())
+            para = para[cut:].strip()
+        if cur and len(cur) + len(para) + 2 > limit:
+            parts.append(cur)
+            cur = ''
+        cur = f"{cur}\n\n{para}" if cur else para
+    if cur:
+        parts.append(cur)
+    return parts
+
+
+def split_markdown_sections(markdown: str, target_chars: int = CHUNK_CHARS) -> List[Dict[str, Any]]:
+    """Divide o Markdown em trechos de até target_chars respeitando seções.
+
+    Retorna [{'index', 'title', 'text', 'sha'}] na ordem do documento.
+    """
+    limit = max(1_000, int(target_chars or CHUNK_CHARS))
+    chunks: List[Dict[str, Any]] = []
+    cur_text = ''
+    cur_title = ''
+
+    def _emit(text: str, title: str):
+        text = text.strip()
+        if text:
+            chunks.append({'index': len(chunks), 'title': title, 'text': text, 'sha': _sha(text)})
+
+    for sec in _sections(markdown):
+        text, title = sec['text'], sec['title']
+        if len(text) > limit:
+            _emit(cur_text, cur_title)
+            cur_text, cur_title = '', ''
+            for piece in _split_oversized(text, limit):
+                _emit(piece, title)
+            continue
+        if cur_text and len(cur_text) + len(text) + 2 > limit:
+            _emit(cur_text, cur_title)
+            cur_text, cur_title = '', ''
+        if not cur_text:
+            cur_title = title
+        cur_text = f"{cur_text}\n\n{text}" if cur_text else text
+    _emit(cur_text, cur_title)
+    return chunks
+
+
+def should_map_reduce(markdown: Optional[str]) -> bool:
+    return MAPREDUCE_ENABLED and isinstance(markdown, str) and len(markdown) >= MAPREDUCE_MIN_CHARS
+
+
+# =====================
+# Cache de resumos parciais
+# =====================
+def chunk_variant() -> str:
+    return f"{CHUNK_MODEL}|{CHUNK_PROMPT_VERSION}|{CHUNK_MAX_TOKENS}"
+
+
+def _memo_get(key: str) -> Optional[str]:
+    with _MEMO_LOCK:
+        val = _MEMO.get(key)
+        if val is not None:
+            _MEMO.move_to_end(key)
+        return val
+
+
+def _memo_put(key: str, val: str) -> None:
+    with _MEMO_LOCK:
+        _MEMO[key] = val
+        _MEMO.move_to_end(key)
+        while len(_MEMO) > _MEMO_MAX:
+            _MEMO.popitem(last=False)
+
+
+def _cache_get_many(shas: List[str], variant: str) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    if not CHUNK_CACHE_ENABLED or not shas:
+        return out
+    missing = []
+    for sha in shas:
+        val = _memo_get(f"{variant}|{sha}")
+        if val is not None:
+            out[sha] = val
+        else:
+            missing.append(sha)
+    if not missing:
+        return out
+    try:
+        rows = db_fetch_all(
+            "SELECT chunk_sha, summary_md FROM public.doc_chunk_summary WHERE variant = %s AND chunk_sha = ANY(%s)",
+            (variant, missing), as_dict=False, ctx="SUM.chunk_get",
+        ) or []
+        for sha, summary in rows:
+            if summary:
+                out[sha] = summary
+                _memo_put(f"{variant}|{sha}", summary)
+    except Exception as e:
+        dbg('DOCS', f"chunk cache leitura erro: {e}")
+    return out
+
+
+def _cache_put(sha: str, variant: str, summary: str) -> None:
+    if not CHUNK_CACHE_ENABLED or not sha or not summary:
+        return
+    _memo_put(f"{variant}|{sha}", summary)
+    try:
+        db_execute(
+            """
+            INSERT INTO public.doc_chunk_summary (chunk_sha, variant, summary_md)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (chunk_sha, variant) DO UPDATE SET summary_md = EXCLUDED.summary_md, created_at = now()
+            """,
+            (sha, variant, summary), ctx="SUM.chunk_put",
+        )
+    except Exception as e:
+        dbg('DOCS', f"chunk cache gravação erro: {e}")
+
+
+# =====================
+# Map
+# =====================
+def _default_map_fn(chunk: Dict[str, Any], total: int) -> str:
+    title = f" — seção: {chunk['title']}" if chunk.get('title') else ''
+    messages = [
+        {'role': 'system', 'content': _MAP_SYSTEM_PROMPT},
+        {'role': 'user', 'content': f"Trecho {chunk['index'] + 1}/{total}{title}\n\n{chunk['text']}"},
+    ]
+    return ai_chat_complete(CHUNK_MODEL, messages, max_tokens=CHUNK_MAX_TOKENS, temperature=0.1, feature='doc_summary_map')
+
+
+def _with_aggregator(aggr: Any, fn: Callable[[], str]) -> Tuple[str, Any]:
+    """Executa fn com um agregador de uso próprio da seção (thread-local).
+
+    Retorna (texto, agregador parcial ou None): o agregador do chamador não é tocado
+    pelas threads do pool; os parciais são somados depois, na thread do chamador.
+    """
+    if aggr is None:
+        return fn(), None
+    try:
+        import gvg_usage
+        part = gvg_usage.UsageAggregator(aggr.user_id, aggr.event_type, aggr.ref_type, aggr.ref_id)
+        prev = getattr(gvg_usage._TL, 'usage_aggr', None)
+        gvg_usage._TL.usage_aggr = part
+    except Exception:
+        return fn(), None
+    try:
+        return fn(), part
+    finally:
+        # Com 1 worker roda na própria thread do chamador: restaura o agregador dele
+        gvg_usage._TL.usage_aggr = prev
+
+
+def condense_markdown(
+    markdown: str,
+    map_fn: Optional[Callable[[Dict[str, Any], int], str]] = None,
+    workers: Optional[int] = None,
+    target_chars: Optional[int] = None,
+    stats: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Map: resume cada trecho em paralelo e devolve o documento condensado (ordem original).
+
+    map_fn(chunk, total) -> texto; padrão ai_chat_complete. Trechos com falha entram
+    como excerto bruto e não são cacheados.
+    """
+    t0 = time.time()
+    chunks = split_markdown_sections(markdown, target_chars or CHUNK_CHARS)
+    total = len(chunks)
+    if not chunks:
+        return ''
+    variant = chunk_variant()
+    cached = _cache_get_many([c['sha'] for c in chunks], variant)
+    # Trechos repetidos no mesmo documento (anexos duplicados, cabeçalhos) vão ao modelo uma vez
+    todo = list({c['sha']: c for c in chunks if c['sha'] not in cached}.values())
+    fn = map_fn or _default_map_fn
+    try:
+        from gvg_usage import _get_current_aggregator
+        aggr = _get_current_aggregator()
+    except Exception:
+        aggr = None
+
+    def _run(chunk: Dict[str, Any]) -> Tuple[str, Any]:
+        try:
+            out, part = _with_aggregator(aggr, lambda: fn(chunk, total))
+            return (out or '').strip(), part
+        except Exception as e:
+            dbg('DOCS', f"resumo map erro trecho={chunk['index'] + 1}/{total}: {e}")
+            return '', None
+
+    results: Dict[str, str] = dict(cached)
+    n_workers = max(1, min(len(todo), int(workers or MAP_WORKERS))) if todo else 0
+    if n_workers == 1:
+        outs = [_run(c) for c in todo]
+    elif n_workers > 1:
+        with ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix='gvg-summary') as pool:
+            outs = list(pool.map(_run, todo))
+    else:
+        outs = []
+    # Uso (tokens) de cada seção somado aqui, na thread do chamador
+    for _out, part in outs:
+        if aggr is not None and part is not None:
+            aggr.merge(part)
+    failed = 0
+    for chunk, (out, _part) in zip(todo, outs):
+        if out:
+            results[chunk['sha']] = out
+            _cache_put(chunk['sha'], variant, out)
+        else:
+            failed += 1
+            results[chunk['sha']] = "(trecho sem resumo; excerto)\n\n" + chunk['text'][:_FALLBACK_EXCERPT_CHARS]
+
+    parts = []
+    for c in chunks:
+        head = f"## Parte {c['index'] + 1}/{total}" + (f" — {c['title']}" if c.get('title') else '')
+        parts.append(f"{head}\n\n{results[c['sha']]}")
+    condensed = "\n\n".join(parts)
+    elapsed_ms = int((time.time() - t0) * 1000)
+    if stats is not None:
+        stats.update({
+            'chunks': total, 'cache_hits': len(cached), 'mapped': len(todo), 'failed': failed,
+            'in_chars': len(markdown), 'out_chars': len(condensed), 'map_ms': elapsed_ms,
+        })
+    dbg('DOCS', f"resumo map-reduce trechos={total} cache={len(cached)} falhas={failed} in_chars={len(markdown)} out_chars={len(condensed)} time_ms={elapsed_ms}")
+    return condensed
+
+
+def condense_for_reduce(markdown: str, map_fn: Optional[Callable[[Dict[str, Any], int], str]] = None,
+                        stats: Optional[Dict[str, Any]] = None) -> str:
+    """Condensa até caber no reduce (um segundo nível de map só para documentos muito longos)."""
+    condensed = condense_markdown(markdown, map_fn=map_fn, stats=stats)
+    if len(condensed) > REDUCE_MAX_CHARS:
+        condensed = condense_markdown(condensed, map_fn=map_fn)
+    return condensed
+
+
+__all__ = [
+    'MAPREDUCE_ENABLED', 'MAPREDUCE_MIN_CHARS', 'REDUCE_MAX_CHARS',
+    'split_markdown_sections', 'should_map_reduce', 'chunk_variant',
+    'condense_markdown', 'condense_for_reduce',
+]
@@ -15,7 +15,11 @@ from __future__ import annotations
 from typing import Optional, Dict, Any, List, Tuple
 import threading, time, json
 import os
-from gvg_database import db_execute, db_execute_many
+import queue
+import atexit
+from datetime import datetime, timezone
+import psycopg2
+from gvg_database import create_connection
 from gvg_debug import debug_log as dbg
 
 # Métrica agora usa o próprio nome do event_type (dicionário antigo removido)
@@ -76,6 +80,15 @@ class UsageAggregator:
         try:
             if b: self.file_bytes_out += int(b)
         except Exception: pass
+    def merge(self, other: 'UsageAggregator') -> None:
+        """Soma os contadores de um agregador parcial (ex.: de uma thread de pool) neste."""
+        self.tokens_in += other.tokens_in
+        self.tokens_out += other.tokens_out
+        self.tokens_total += other.tokens_total
+        self.db_rows_read += other.db_rows_read
+        self.db_rows_written += other.db_rows_written
+        self.file_bytes_in += other.file_bytes_in
+        self.file_bytes_out += other.file_bytes_out
     # ---- finalize ----
     def as_meta(self) -> Dict[str, Any]:
         elapsed_ms = int((time.perf_counter() - self.start_ts) * 1000)
@@ -166,52 +179,245 @@ def record_usage(user_id: str, event_type: str, ref_type: Optional[str]=None, re
             pass
         return
     dbg('USAGE', f"→ event '{event_type}' user={user_id} ref={ref_type}:{ref_id} meta_keys={list((meta or {}).keys())}")
+    row = (user_id, event_type, ref_type, ref_id, None if meta is None else json.dumps(meta), datetime.now(timezone.utc))
+    _note_limits(user_id, event_type)
+    # Write-behind: enfileira para o flusher; fila cheia ou modo síncrono → grava na hora
+    if _USAGE_ASYNC and _SINK.offer(row):
+        return
+    _write_usage_rows([row])
+
+def _note_limits(user_id: str, event_type: str) -> None:
+    """Mantém a visão de cotas deste processo em dia antes do flush chegar ao banco."""
     try:
-        db_execute(
-            "INSERT INTO public.user_usage_events (user_id,event_type,ref_type,ref_id,meta) VALUES (%s,%s,%s,%s,%s::jsonb)",
-            (user_id, event_type, ref_type, ref_id, None if meta is None else json.dumps(meta)),
-            ctx="USAGE.record_usage:event"
-        )
-    except Exception as e:
-        try: dbg('USAGE', 'ERROR inserting event {event_type}: {e}')
-        except Exception: pass
-    metric = event_type  # usar o próprio nome
-    try:
-        db_execute(
-            "INSERT INTO public.user_usage_counters (user_id,metric_key,metric_value) VALUES (%s,%s,1) ON CONFLICT (user_id,metric_key) DO UPDATE SET metric_value = public.user_usage_counters.metric_value + 1, updated_at = now()",
-            (user_id, metric),
-            ctx="USAGE.record_usage:counter"
-        )
-        dbg('USAGE', f"✓ counter '{metric}' incremented for user={user_id}")
-    except Exception as e:
-        dbg('USAGE', f"ERROR upsert counter {metric}: {e}")
+        from gvg_limits import note_usage  # import tardio para evitar ciclos
+        note_usage(user_id, event_type)
+    except Exception:
+        pass
 
         
 def record_usage_bulk(user_id: str, events: List[Tuple[str,str,str,Dict[str,Any]]]) -> None:
-    if not _usage_enabled():
+    """Grava vários eventos do mesmo usuário em lote (INSERT multi-linha + contadores pré-agregados)."""
+    if not user_id or not _usage_enabled():
         return
-    rows_evt=[]; rows_cnt=[]
-    import json
     dbg('USAGE', f"→ bulk events count={len(events)} user={user_id}")
-    for ev_type, ref_type, ref_id, meta in events:
-        rows_evt.append((user_id, ev_type, ref_type, ref_id, json.dumps(meta or {}) ))
-        rows_cnt.append((user_id, ev_type))
-    if rows_evt:
+    now = datetime.now(timezone.utc)
+    rows = []
+    for ev in events:
+        ev_type, ref_type, ref_id, meta = ev[0], ev[1], ev[2], ev[3]
+        ts = ev[4] if len(ev) > 4 and ev[4] else now
+        rows.append((user_id, ev_type, ref_type, ref_id, json.dumps(meta or {}), ts))
+        _note_limits(user_id, ev_type)
+    _write_usage_rows(rows)
+
+# =============================
+# Gravação em lote (primitiva comum do flusher e de record_usage_bulk)
+# =============================
+
+_EVENT_COLS = "(user_id,event_type,ref_type,ref_id,meta,created_at)"
+_COUNTER_UPSERT = " ON CONFLICT (user_id,metric_key) DO UPDATE SET metric_value = public.user_usage_counters.metric_value + EXCLUDED.metric_value, updated_at = now()"
+_DAILY_UPSERT = " ON CONFLICT (user_id,usage_date,metric_key) DO UPDATE SET metric_value = public.user_usage_daily.metric_value + EXCLUDED.metric_value, updated_at = now()"
+
+# Erros de uma linha do lote (CHECK/FK/tipo): só estes justificam regravar linha a linha
+_ROW_ERRORS = (psycopg2.IntegrityError, psycopg2.DataError)
+
+def _execute_strict(sql: str, params: List[Any]) -> None:
+    """Como db_execute, mas propaga o erro (para distinguir linha inválida de banco indisponível)."""
+    conn = create_connection()
+    if not conn:
+        raise ConnectionError('sem conexão com o banco')
+    cur = None
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        conn.commit()
+    except Exception:
         try:
-            db_execute_many("INSERT INTO public.user_usage_events (user_id,event_type,ref_type,ref_id,meta) VALUES (%s,%s,%s,%s,%s::jsonb)", rows_evt, ctx="USAGE.record_usage_bulk:events")
-        except Exception as e:
-            try: dbg('USAGE', f"warn bulk events: {e}")
-            except Exception: pass
-    for (uid, metric) in rows_cnt:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
         try:
-            db_execute(
-                "INSERT INTO public.user_usage_counters (user_id,metric_key,metric_value) VALUES (%s,%s,1) ON CONFLICT (user_id,metric_key) DO UPDATE SET metric_value = public.user_usage_counters.metric_value + 1, updated_at = now()",
-                (uid, metric),
-                ctx="USAGE.record_usage_bulk:counter"
-            )
-            dbg('USAGE', f"✓ bulk counter '{metric}' incremented user={uid}")
+            if cur:
+                cur.close()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+def _insert_rows(head: str, tmpl: str, tail: str, rows: List[Tuple[Any, ...]], ctx: str) -> List[Tuple[Any, ...]]:
+    """INSERT multi-linha; devolve as linhas efetivamente gravadas.
+
+    Se o lote for recusado por erro de dado (CHECK/FK/tipo de uma linha), regrava linha a
+    linha e devolve só as aceitas. Sem conexão ou erro operacional: nada é gravado e não há
+    regravação (repetir linha a linha só multiplicaria a falha).
+    """
+    if not rows:
+        return []
+    params: List[Any] = [v for r in rows for v in r]
+    try:
+        _execute_strict(head + ",".join([tmpl] * len(rows)) + tail, params)
+        return list(rows)
+    except _ROW_ERRORS as e:
+        if len(rows) == 1:
+            dbg('USAGE', f"warn linha recusada ({ctx}): {e}")
+            return []
+        dbg('USAGE', f"warn lote recusado ({ctx}): {e}; regravando {len(rows)} linhas individualmente")
+    except Exception as e:
+        dbg('USAGE', f"ERROR lote ({ctx}): {e}")
+        return []
+    ok: List[Tuple[Any, ...]] = []
+    for r in rows:
+        try:
+            _execute_strict(head + tmpl + tail, list(r))
+            ok.append(r)
+        except _ROW_ERRORS as e:
+            dbg('USAGE', f"warn linha recusada ({ctx}): {e}")
         except Exception as e:
-            dbg('USAGE', f"warn bulk counter {metric}: {e}")
+            dbg('USAGE', f"ERROR linha ({ctx}): {e}")
+            break
+    return ok
+
+def _write_usage_rows(rows: List[Tuple[Any, ...]]) -> int:
+    """rows: (user_id, event_type, ref_type, ref_id, meta_json, created_at). Retorna nº de eventos gravados.
+
+    Um INSERT multi-linha para os eventos e um upsert por tabela de contadores, com
+    incrementos já somados por (usuário, métrica) e (usuário, dia, métrica) a partir
+    só dos eventos gravados.
+    """
+    if not rows:
+        return 0
+    inserted: List[Tuple[Any, ...]] = []
+    for start in range(0, len(rows), _USAGE_BATCH):
+        inserted += _insert_rows(
+            "INSERT INTO public.user_usage_events " + _EVENT_COLS + " VALUES ",
+            "(%s,%s,%s,%s,%s::jsonb,%s)", "", rows[start:start + _USAGE_BATCH], "USAGE.flush:events",
+        )
+    written = len(inserted)
+    if not inserted:
+        dbg('USAGE', f"flush events=0/{len(rows)}")
+        return 0
+    totals: Dict[Tuple[str, str], int] = {}
+    daily: Dict[Tuple[str, Any, str], int] = {}
+    for (uid, ev_type, _rt, _ri, _meta, ts) in inserted:
+        totals[(uid, ev_type)] = totals.get((uid, ev_type), 0) + 1
+        day = ts.date() if hasattr(ts, 'date') else ts
+        daily[(uid, day, ev_type)] = daily.get((uid, day, ev_type), 0) + 1
+    _insert_rows(
+        "INSERT INTO public.user_usage_counters (user_id,metric_key,metric_value) VALUES ",
+        "(%s,%s,%s)", _COUNTER_UPSERT, [(u, m, n) for (u, m), n in totals.items()], "USAGE.flush:counters",
+    )
+    _insert_rows(
+        "INSERT INTO public.user_usage_daily (user_id,usage_date,metric_key,metric_value) VALUES ",
+        "(%s,%s,%s,%s)", _DAILY_UPSERT, [(u, d, m, n) for (u, d, m), n in daily.items()], "USAGE.flush:daily",
+    )
+    dbg('USAGE', f"✓ flush events={written}/{len(rows)} counters={len(totals)} daily={len(daily)}")
+    return written
+
+class _UsageSink:
+    """Fila em memória + thread de flush (write-behind).
+
+    Limite de memória: no máximo GVG_USAGE_QUEUE_MAX eventos pendentes; acima disso
+    offer() devolve False e quem chamou grava de forma síncrona (sem perda).
+    """
+    def __init__(self, max_pending: int, flush_interval: float, batch: int):
+        self._q: "queue.Queue[Tuple[Any, ...]]" = queue.Queue(maxsize=max_pending)
+        self._interval = flush_interval
+        self._batch = batch
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stats = {'queued': 0, 'flushed': 0, 'flushes': 0, 'overflow': 0}
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='gvg-usage-flush', daemon=True)
+                self._thread.start()
+
+    def offer(self, row: Tuple[Any, ...]) -> bool:
+        self._ensure_thread()
+        try:
+            self._q.put_nowait(row)
+            self.stats['queued'] += 1
+            return True
+        except queue.Full:
+            self.stats['overflow'] += 1
+            return False
+
+    def _drain(self, limit: int) -> List[Tuple[Any, ...]]:
+        out: List[Tuple[Any, ...]] = []
+        while len(out) < limit:
+            try:
+                out.append(self._q.get_nowait())
+            except queue.Empty:
+                break
+        return out
+
+    def flush(self) -> int:
+        """Grava tudo o que está pendente (também usado no encerramento)."""
+        total = 0
+        with self._flush_lock:
+            while True:
+                rows = self._drain(self._batch)
+                if not rows:
+                    break
+                try:
+                    _write_usage_rows(rows)
+                except Exception as e:
+                    dbg('USAGE', f"ERROR flush: {e}")
+                total += len(rows)
+                self.stats['flushed'] += len(rows)
+                self.stats['flushes'] += 1
+        return total
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                # Acorda no intervalo ou antes, quando o lote enche
+                deadline = time.monotonic() + self._interval
+                while self._q.qsize() < self._batch and time.monotonic() < deadline and not self._stop.is_set():
+                    time.sleep(0.05)
+                self.flush()
+            except Exception as e:
+                try: dbg('USAGE', f"ERROR flusher: {e}")
+                except Exception: pass
+
+    def shutdown(self) -> int:
+        self._stop.set()
+        return self.flush()
+
+    def pending(self) -> int:
+        return self._q.qsize()
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+_USAGE_ASYNC = (os.getenv('GVG_USAGE_ASYNC', 'true') or '').strip().lower() in ('1','true','yes','on')
+_USAGE_BATCH = max(1, _env_int('GVG_USAGE_BATCH', 200))
+_SINK = _UsageSink(
+    max_pending=max(100, _env_int('GVG_USAGE_QUEUE_MAX', 10000)),
+    flush_interval=max(0.1, _env_int('GVG_USAGE_FLUSH_MS', 1000) / 1000.0),
+    batch=_USAGE_BATCH,
+)
+
+def flush_usage() -> int:
+    """Força a gravação dos eventos pendentes (retorna quantos foram gravados)."""
+    return _SINK.flush()
+
+def usage_sink_stats() -> Dict[str, int]:
+    return dict(_SINK.stats, pending=_SINK.pending())
+
+# Encerramento do processo (gunicorn worker, scripts): não perder eventos enfileirados
+atexit.register(_SINK.shutdown)
 
 def usage_event_set_ref(ref_type: Optional[str], ref_id: Optional[str]):
     """Atualiza ref_type/ref_id do evento ativo (usar após obter ID persistido)."""
@@ -236,7 +442,7 @@ def record_success_event(user_id: str, base_meta: Optional[Dict[str, Any]], succ
         meta = {}
     record_usage(user_id, success_type, ref_type, ref_id, meta)
 
-__all__ = ['record_usage','record_usage_bulk','usage_event_start','usage_event_finish','usage_event_set_ref','_get_current_aggregator','record_success_event']
+__all__ = ['record_usage','record_usage_bulk','flush_usage','usage_sink_stats','usage_event_start','usage_event_finish','usage_event_set_ref','_get_current_aggregator','record_success_event']
 def usage_event_discard():
     """Descarta (cancela) o evento corrente sem gravar nada (usar em falha)."""
     aggr = getattr(_TL, 'usage_aggr', None)
@@ -10,13 +10,13 @@ import os
 import json
 from typing import List, Optional, Dict, Any, Union
 import datetime as _dt
-import time
 from gvg_database import (
     create_connection,  # compat quando precisar
     db_fetch_all, db_fetch_one, db_execute, db_execute_many,
     db_execute_returning_one,
 )  # type: ignore
 from gvg_debug import debug_log as dbg  # type: ignore
+from gvg_cache import cache_get, cache_set, cache_invalidate  # type: ignore
 from gvg_schema import get_contratacao_core_columns, PRIMARY_KEY  # type: ignore
 from gvg_search_core import _augment_aliases  # type: ignore
 
@@ -36,19 +36,15 @@ _CURRENT_USER = {
 # Permite injetar token (por camada Flask) em tempo de execução
 _ACCESS_TOKEN: Optional[str] = None
 
-# --- Caches leves ---
-_SCHEMA_TYPES_CACHE: Dict[str, Dict[str, Any]] = {}
-_DATA_CACHE: Dict[str, Any] = {}
-
+# --- Caches leves (gvg_cache: namespaces 'user' e 'schema', backend compartilhado opcional) ---
 _TTL_SCHEMA_SECONDS = 3600  # 60 minutos
 _TTL_USER_DATA_SECONDS = 300  # 5 minutos
 
 
 def _schema_types_cached(table: str) -> Dict[str, str]:
-    now = time.time()
-    ent = _SCHEMA_TYPES_CACHE.get(table)
-    if ent and ent.get('expires', 0) > now:
-        return ent.get('types', {})
+    types = cache_get('schema', table)
+    if types is not None:
+        return types
     rows = db_fetch_all(
         (
             """
@@ -61,7 +57,8 @@ def _schema_types_cached(table: str) -> Dict[str, str]:
         ctx=f"USER.schema:describe:{table}"
     ) or []
     types = {r[0]: r[1] for r in rows}
-    _SCHEMA_TYPES_CACHE[table] = {'types': types, 'expires': now + _TTL_SCHEMA_SECONDS}
+    if types:
+        cache_set('schema', table, types, _TTL_SCHEMA_SECONDS)
     return types
 
 
@@ -70,23 +67,15 @@ def _schema_columns_cached(table: str) -> List[str]:
 
 
 def _cache_get(key: str):
-    ent = _DATA_CACHE.get(key)
-    if not ent:
-        return None
-    if ent.get('expires', 0) > time.time():
-        return ent.get('value')
-    _DATA_CACHE.pop(key, None)
-    return None
+    return cache_get('user', key)
 
 
 def _cache_set(key: str, value: Any, ttl: int = _TTL_USER_DATA_SECONDS):
-    _DATA_CACHE[key] = {'value': value, 'expires': time.time() + ttl}
+    cache_set('user', key, value, ttl)
 
 
 def _cache_invalidate_prefix(prefix: str):
-    for k in list(_DATA_CACHE.keys()):
-        if str(k).startswith(prefix):
-            _DATA_CACHE.pop(k, None)
+    cache_invalidate('user', prefix)
 
 
 def set_access_token(token: Optional[str]):
@@ -209,13 +198,16 @@ def add_prompt(
     embedding: Optional[List[float]] = None,
     filters: Optional[Dict[str, Any]] = None,
     preproc_output: Optional[Dict[str, Any]] = None,
+    uid: Optional[str] = None,
 ) -> Optional[int]:
     """Adiciona um prompt ao histórico do usuário, com configuração (e embedding, se disponível).
 
     - Dedup por (user_id, text)
+    - uid explícito (jobs em background); se ausente usa o usuário corrente
     - Retorna o id do prompt inserido (prompt_id) em caso de sucesso; None em erro.
     """
-    user = get_current_user(); uid = user['uid']
+    if not uid:
+        user = get_current_user(); uid = user['uid']
     try:
         # Dedup por texto do mesmo usuário: obter ids
         ids_rows = db_fetch_all(
@@ -439,14 +431,16 @@ def delete_prompt(text: str) -> bool:
         return False
 
 
-def save_user_results(prompt_id: int, results: List[Dict[str, Any]]) -> bool:
+def save_user_results(prompt_id: int, results: List[Dict[str, Any]], uid: Optional[str] = None) -> bool:
     """Grava os resultados retornados para um prompt na tabela public.user_results.
 
     Campos: user_id, prompt_id, numero_controle_pncp, rank, similarity, valor, data_encerramento_proposta
+    uid explícito (jobs em background); se ausente usa o usuário corrente.
     """
     if not prompt_id or not results:
         return False
-    user = get_current_user(); uid = user['uid']
+    if not uid:
+        user = get_current_user(); uid = user['uid']
     try:
         rows_to_insert = []
         for r in results:
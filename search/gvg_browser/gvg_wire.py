@@ -0,0 +1,389 @@
+"""
+gvg_wire.py
+Formato compacto (colunar) de resultados para dcc.Store e exportadores.
+
+Objetivo:
+  Reduzir o tamanho dos payloads que trafegam entre browser e servidor a cada
+  callback que lê `store-results`, `store-results-sorted` e `store-result-sessions`.
+
+Formato (v=1):
+  {
+    'v': 1, 'n': <qtd>,
+    'top':   {campo: [valores...]},        # chaves de nível superior (similarity, rank, ...)
+    'cols':  {campo: [valores...]},        # details canônicos (snake_case, sem aliases)
+    'dicts': {campo: [valores distintos]}, # campos codificados por dicionário (cols guarda índices)
+    'lazy':  {campo: [linhas truncadas]},  # textos longos truncados (buscados sob demanda)
+  }
+
+Observações:
+  • Apenas o conjunto canônico de campos é serializado; aliases gerados por
+    `_augment_aliases` são descartados no encode e recriados no decode.
+  • UF, modalidade, modo de disputa e órgão são codificados por dicionário.
+  • `objeto_compra` acima de GVG_WIRE_TEXT_PREVIEW caracteres vira prévia; o texto
+    integral é buscado no BD apenas quando `decode_results(..., full_text=True)`.
+  • `decode_results` aceita também a lista legada (list[dict]) para compatibilidade.
+  • Lista vazia continua lista vazia (preserva checagens `if not results`).
+"""
+from __future__ import annotations
+
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from gvg_schema import PRIMARY_KEY, CONTRATACAO_TABLE
+
+try:
+    from gvg_debug import debug_log as dbg  # type: ignore
+except Exception:  # pragma: no cover
+    def dbg(*_a, **_k):
+        pass
+
+
+WIRE_VERSION = 1
+
+# Campos com alta repetição entre resultados → dicionário
+DICT_FIELDS = (
+    'unidade_orgao_uf_sigla',
+    'unidade_orgao_municipio_nome',
+    'unidade_orgao_nome_unidade',
+    'orgao_entidade_razao_social',
+    'orgao_entidade_poder_id',
+    'orgao_entidade_esfera_id',
+    'modalidade_id',
+    'modalidade_nome',
+    'modo_disputa_id',
+    'modo_disputa_nome',
+    'usuario_nome',
+    'ano_compra',
+)
+
+# Textos longos → prévia no wire, texto integral sob demanda
+LAZY_TEXT_FIELDS = ('objeto_compra',)
+
+try:
+    WIRE_TEXT_PREVIEW = int(os.getenv('GVG_WIRE_TEXT_PREVIEW', '280'))
+except Exception:
+    WIRE_TEXT_PREVIEW = 280
+
+# Chaves de nível superior derivadas da PK quando iguais a ela
+_PK_MIRRORS = ('id', 'numero_controle')
+
+# Cache em processo de textos integrais (evita ir ao BD a cada render)
+_FULL_TEXT_CACHE: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_FULL_TEXT_CACHE_MAX = 5000
+_FULL_TEXT_LOCK = threading.Lock()
+
+
+# =====================
+# Aliases
+# =====================
+def _alias_map() -> Dict[str, List[str]]:
+    try:
+        from gvg_search_core import _ALIAS_SPECIAL  # type: ignore
+        return _ALIAS_SPECIAL
+    except Exception:
+        return {}
+
+
+def _augment(details: dict) -> dict:
+    try:
+        from gvg_search_core import _augment_aliases  # type: ignore
+        return _augment_aliases(details)
+    except Exception:
+        return details
+
+
+def canonical_details(details: dict, alias_map: Optional[Dict[str, List[str]]] = None) -> dict:
+    """Remove aliases (flat/camelCase) de um details, mantendo apenas chaves canônicas.
+
+    Um alias só é descartado quando seu valor é idêntico ao da chave canônica.
+    """
+    if not isinstance(details, dict):
+        return {}
+    amap = alias_map if alias_map is not None else _alias_map()
+    drop = set()
+    for k, v in details.items():
+        if '_' not in k or v in (None, ''):
+            continue
+        flat = k.replace('_', '')
+        if flat != k and details.get(flat) == v:
+            drop.add(flat)
+        for alt in amap.get(k, ()):
+            if alt != k and details.get(alt) == v:
+                drop.add(alt)
+    return {k: v for k, v in details.items() if k not in drop}
+
+
+# =====================
+# Encode / Decode
+# =====================
+def is_wire(payload: Any) -> bool:
+    return isinstance(payload, dict) and payload.get('v') == WIRE_VERSION and 'cols' in payload
+
+
+def encode_results(results: Any, text_preview: Optional[int] = None) -> Any:
+    """Codifica list[dict] de resultados no formato colunar.
+
+    Idempotente: payload já codificado é devolvido como está. Lista vazia → [].
+    """
+    if is_wire(results):
+        return results
+    if not results:
+        return []
+    preview = WIRE_TEXT_PREVIEW if text_preview is None else int(text_preview)
+    amap = _alias_map()
+    rows = []
+    for r in results:
+        if not isinstance(r, dict):
+            continue
+        rows.append((r, canonical_details(r.get('details') or {}, amap)))
+    n = len(rows)
+    # Ordem estável de colunas: primeira aparição
+    det_fields: List[str] = []
+    top_fields: List[str] = []
+    seen_det, seen_top = set(), set()
+    for r, d in rows:
+        for k in d.keys():
+            if k not in seen_det:
+                seen_det.add(k); det_fields.append(k)
+        for k in r.keys():
+            if k != 'details' and k not in seen_top:
+                seen_top.add(k); top_fields.append(k)
+
+    cols: Dict[str, list] = {f: [d.get(f) for _, d in rows] for f in det_fields}
+    top: Dict[str, list] = {f: [r.get(f) for r, _ in rows] for f in top_fields}
+
+    # id/numero_controle idênticos à PK são reconstruídos no decode
+    pk_col = cols.get(PRIMARY_KEY)
+    if pk_col is not None:
+        mirrors = []
+        for f in _PK_MIRRORS:
+            col = top.get(f)
+            if col is not None and all((a == b) for a, b in zip(col, pk_col)):
+                top.pop(f, None)
+                mirrors.append(f)
+        if mirrors:
+            top['_pk'] = mirrors
+
+    dicts: Dict[str, list] = {}
+    for f in DICT_FIELDS:
+        col = cols.get(f)
+        if col is None:
+            continue
+        index: Dict[Any, int] = {}
+        values: list = []
+        codes = []
+        for v in col:
+            if v is None:
+                codes.append(None)
+                continue
+            try:
+                i = index[v]
+            except (KeyError, TypeError):
+                i = len(values)
+                values.append(v)
+                try:
+                    index[v] = i
+                except TypeError:
+                    pass
+            codes.append(i)
+        # Só compensa quando há repetição
+        if len(values) < n:
+            dicts[f] = values
+            cols[f] = codes
+
+    lazy: Dict[str, list] = {}
+    if preview > 0:
+        for f in LAZY_TEXT_FIELDS:
+            col = cols.get(f)
+            if col is None:
+                continue
+            cut = []
+            for i, v in enumerate(col):
+                if isinstance(v, str) and len(v) > preview:
+                    col[i] = v[:preview]
+                    cut.append(i)
+            if cut:
+                lazy[f] = cut
+
+    out = {'v': WIRE_VERSION, 'n': n, 'top': top, 'cols': cols}
+    if dicts:
+        out['dicts'] = dicts
+    if lazy:
+        out['lazy'] = lazy
+    return out
+
+
+def wire_ids(payload: Any) -> List[str]:
+    """Retorna os ids PNCP na ordem do payload sem decodificar details."""
+    if is_wire(payload):
+        col = (payload.get('cols') or {}).get(PRIMARY_KEY)
+        if col is None:
+            col = (payload.get('top') or {}).get('id') or []
+        return [str(x) if x is not None else 'N/A' for x in col]
+    out = []
+    for r in (payload or []):
+        d = (r or {}).get('details', {}) or {}
+        pid = d.get('numerocontrolepncp') or d.get('numeroControlePNCP') or d.get(PRIMARY_KEY) or (r or {}).get('id') or (r or {}).get('numero_controle')
+        out.append(str(pid) if pid is not None else 'N/A')
+    return out
+
+
+def wire_len(payload: Any) -> int:
+    if is_wire(payload):
+        return int(payload.get('n') or 0)
+    return len(payload or [])
+
+
+def decode_results(payload: Any, full_text: bool = False, aliases: bool = True,
+                   rows: Optional[Iterable[int]] = None) -> List[dict]:
+    """Decodifica payload colunar para list[dict] no formato legado.
+
+    - full_text: busca no BD o texto integral dos campos truncados (LAZY_TEXT_FIELDS).
+    - aliases: recria aliases via `_augment_aliases` (compatível com o restante da UI).
+    - rows: decodifica apenas os índices informados (ex.: [0] para a primeira linha).
+    Lista legada é devolvida como está: já traz o texto integral (não há campos truncados), então
+    full_text não se aplica a ela.
+    """
+    if not is_wire(payload):
+        results = list(payload or []) if isinstance(payload, list) else []
+        return results
+    n = int(payload.get('n') or 0)
+    top = payload.get('top') or {}
+    cols = payload.get('cols') or {}
+    dicts = payload.get('dicts') or {}
+    lazy = payload.get('lazy') or {}
+    pk_mirrors = top.get('_pk') or []
+    idxs = list(range(n)) if rows is None else [i for i in rows if 0 <= i < n]
+
+    full_map: Dict[str, Dict[str, Any]] = {}
+    if full_text and lazy:
+        need = set()
+        for f, cut in lazy.items():
+            for i in cut:
+                if rows is None or i in idxs:
+                    need.add(i)
+        pk_col = cols.get(PRIMARY_KEY) or []
+        ids = [pk_col[i] for i in sorted(need) if i < len(pk_col) and pk_col[i]]
+        if ids:
+            full_map = fetch_full_text(ids, list(lazy.keys()))
+
+    out: List[dict] = []
+    lazy_sets = {f: set(v) for f, v in lazy.items()}
+    for i in idxs:
+        d: Dict[str, Any] = {}
+        for f, col in cols.items():
+            v = col[i] if i < len(col) else None
+            if f in dicts and v is not None:
+                try:
+                    v = dicts[f][v]
+                except Exception:
+                    v = None
+            d[f] = v
+        if full_map:
+            pid = d.get(PRIMARY_KEY)
+            rec = full_map.get(str(pid)) if pid is not None else None
+            if rec:
+                for f, s in lazy_sets.items():
+                    if i in s and rec.get(f):
+                        d[f] = rec.get(f)
+        r: Dict[str, Any] = {}
+        for f, col in top.items():
+            if f == '_pk':
+                continue
+            r[f] = col[i] if i < len(col) else None
+        for f in pk_mirrors:
+            r[f] = d.get(PRIMARY_KEY)
+        if aliases:
+            _augment(d)
+        r['details'] = d
+        out.append(r)
+    return out
+
+
+def first_result(payload: Any) -> dict:
+    """Primeiro resultado decodificado (ou {})."""
+    if is_wire(payload):
+        got = decode_results(payload, rows=[0])
+        return got[0] if got else {}
+    try:
+        return (payload or [None])[0] or {}
+    except Exception:
+        return {}
+
+
+# =====================
+# Texto integral sob demanda
+# =====================
+def fetch_full_text(ids: List[str], fields: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Busca campos de texto longo por PK em uma única query (com cache LRU em processo)."""
+    fields = [f for f in fields if f in LAZY_TEXT_FIELDS]
+    if not ids or not fields:
+        return {}
+    out: Dict[str, Dict[str, Any]] = {}
+    missing: List[str] = []
+    with _FULL_TEXT_LOCK:
+        for pid in ids:
+            rec = _FULL_TEXT_CACHE.get(str(pid))
+            if rec is not None and all(f in rec for f in fields):
+                _FULL_TEXT_CACHE.move_to_end(str(pid))
+                out[str(pid)] = rec
+            else:
+                missing.append(str(pid))
+    if missing:
+        try:
+            from gvg_database import db_fetch_all  # type: ignore
+            sql = (
+                f"SELECT {PRIMARY_KEY}, " + ", ".join(fields) +
+                f" FROM {CONTRATACAO_TABLE} WHERE {PRIMARY_KEY} = ANY(%s::text[])"
+            )
+            rows = db_fetch_all(sql, (missing,), as_dict=True, ctx="WIRE.fetch_full_text") or []
+        except Exception as e:
+            dbg('BROWSER', f"wire full_text erro: {e}")
+            rows = []
+        with _FULL_TEXT_LOCK:
+            for row in rows:
+                pid = str(row.get(PRIMARY_KEY))
+                rec = {f: row.get(f) for f in fields}
+                out[pid] = rec
+                _FULL_TEXT_CACHE[pid] = rec
+                _FULL_TEXT_CACHE.move_to_end(pid)
+            while len(_FULL_TEXT_CACHE) > _FULL_TEXT_CACHE_MAX:
+                _FULL_TEXT_CACHE.popitem(last=False)
+    return out
+
+
+# =====================
+# Medição
+# =====================
+def _json_size(obj: Any) -> int:
+    try:
+        return len(json.dumps(obj, ensure_ascii=False, default=str, separators=(',', ':')).encode('utf-8'))
+    except Exception:
+        return 0
+
+
+def measure_wire_bytes(results: Any) -> Dict[str, Any]:
+    """Compara bytes (JSON UTF-8, como o Dash serializa) do formato legado vs colunar."""
+    legacy = decode_results(results) if is_wire(results) else list(results or [])
+    wire = encode_results(legacy)
+    n = len(legacy)
+    legacy_b = _json_size(legacy)
+    wire_b = _json_size(wire)
+    return {
+        'n': n,
+        'legacy_bytes': legacy_b,
+        'wire_bytes': wire_b,
+        'legacy_per_result': round(legacy_b / n, 1) if n else 0.0,
+        'wire_per_result': round(wire_b / n, 1) if n else 0.0,
+        'ratio': round(wire_b / legacy_b, 3) if legacy_b else 0.0,
+    }
+
+
+__all__ = [
+    'WIRE_VERSION', 'DICT_FIELDS', 'LAZY_TEXT_FIELDS', 'WIRE_TEXT_PREVIEW',
+    'canonical_details', 'is_wire', 'encode_results', 'decode_results',
+    'wire_ids', 'wire_len', 'first_result', 'fetch_full_text', 'measure_wire_bytes',
+]
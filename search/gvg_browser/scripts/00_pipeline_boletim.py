@@ -4,6 +4,7 @@ Pipeline Boletim — executa 01 -> 02 em sequência na mesma sessão.
 - Define PIPELINE_TIMESTAMP único para sessão
 - Compartilha arquivo de log logs/log_<PIPELINE_TIMESTAMP>.log
 - Retorna código !=0 se qualquer etapa falhar
+- Alternativa residente (sem cron, agenda em memória): boletim_scheduler_daemon.py
 """
 from __future__ import annotations
 
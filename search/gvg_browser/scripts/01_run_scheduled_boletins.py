@@ -7,6 +7,23 @@ Uso local (PowerShell):
 Notas:
 - Não agenda nada por si só; é para ser chamado por um scheduler externo.
 - Hoje só lista e executa DIARIO/SEMANAL conforme dia da semana.
+- Boletins rodam em pool (GVG_BOLETIM_WORKERS / --workers) com timeout por boletim
+  (GVG_BOLETIM_TIMEOUT_S) e falhas isoladas. Chamadas OpenAI e DB respeitam os
+  orçamentos globais de gvg_budget (--openai-concurrency/--openai-rps, --db-concurrency/--db-qps).
+- Planejamento: boletins com a mesma consulta normalizada, tipo/abordagem/relevância,
+  filtros e limites formam um plano; cada plano roda uma vez (pré-processamento,
+  embedding e busca) e os resultados são gravados para todos os assinantes
+  (GVG_BOLETIM_DEDUP, padrão on).
+- Modo delta (GVG_BOLETIM_DELTA, padrão on): a busca considera só contratações
+  embedadas após o last_run_at do boletim (contratacao_emb.created_at) e mantém
+  apenas resultados com similaridade >= delta_cutoff (menor similaridade do top-N
+  da última execução completa). Execução completa (reconciliação) quando não há
+  estado delta, a cada GVG_BOLETIM_FULL_EVERY_DAYS dias ou com --full.
+- Percolação (GVG_BOLETIM_PERCOLATE, padrão off): boletins em modo delta com busca semântica
+  direta sem filtro de relevância são casados em lote contra as contratações novas
+  (gvg_percolator) antes dos planos; os demais e eventuais falhas seguem o fluxo normal.
+- Checkpoint em logs/boletins_checkpoint.jsonl: um run interrompido é retomado no
+  próximo disparo (mesmo run_at, pulando os boletins já concluídos).
 """
 
 from __future__ import annotations
@@ -14,6 +31,10 @@ from __future__ import annotations
 import uuid
 import os
 import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 
 # Garante que o pacote 'search' (raiz do repo) esteja no sys.path quando rodado via cron
@@ -24,7 +45,7 @@ try:
 except Exception:
     pass
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple
 import json
 
 try:
@@ -34,7 +55,12 @@ try:
         record_boletim_results,
         touch_last_run,
         update_schedule_preproc_output,
+        fetch_delta_state,
+        set_delta_state,
+        build_boletim_rows,
     )
+    from search.gvg_browser.gvg_percolator import percolate
+    from search.gvg_browser.gvg_scheduler import SCHEDULER_TZ
     from search.gvg_browser.gvg_debug import debug_log as dbg
     from search.gvg_browser.gvg_preprocessing import SearchQueryProcessor, ENABLE_SEARCH_V2
     from search.gvg_browser.gvg_search_core import (
@@ -51,7 +77,12 @@ except Exception:
         record_boletim_results,
         touch_last_run,
         update_schedule_preproc_output,
+        fetch_delta_state,
+        set_delta_state,
+        build_boletim_rows,
     )
+    from gvg_percolator import percolate
+    from gvg_scheduler import SCHEDULER_TZ
     sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
     from gvg_debug import debug_log as dbg
     from gvg_preprocessing import SearchQueryProcessor, ENABLE_SEARCH_V2
@@ -62,6 +93,12 @@ except Exception:
     )
 
 
+# Orçamentos globais: sempre o módulo "gvg_budget" (nome simples), o mesmo usado
+# por gvg_ai_utils/gvg_database, para que a configuração do CLI valha para eles.
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from gvg_budget import configure_budget, budget_stats
+
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 LOGS_DIR = os.path.join(SCRIPT_DIR, "logs")
 os.makedirs(LOGS_DIR, exist_ok=True)
@@ -70,67 +107,18 @@ os.makedirs(LOGS_DIR, exist_ok=True)
 PIPELINE_TIMESTAMP = os.getenv("PIPELINE_TIMESTAMP") or datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
 LOG_FILE = os.path.join(LOGS_DIR, f"log_{PIPELINE_TIMESTAMP}.log")
 
+_LOG_LOCK = threading.Lock()
+
 def log_line(msg: str) -> None:
     try:
-        print(msg, flush=True)
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(msg + "\n")
+        with _LOG_LOCK:
+            print(msg, flush=True)
+            with open(LOG_FILE, "a", encoding="utf-8") as f:
+                f.write(msg + "\n")
     except Exception:
         pass
 
 
-def _build_rows_from_search(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    rows: List[Dict[str, Any]] = []
-    def _first(det: Dict[str, Any], keys: List[str]) -> Any:
-        for k in keys:
-            if k in det and det.get(k) not in (None, ""):
-                return det.get(k)
-        return None
-    def _compact_payload(det: Dict[str, Any]) -> Dict[str, Any]:
-        return {
-            # identificação básica
-            'objeto': _first(det, ['objeto_compra', 'objetoCompra', 'objeto_contrato', 'objetoContrato']),
-            # órgão/unidade/localização
-            'orgao': _first(det, ['orgao_entidade_razao_social', 'orgaoEntidadeRazaoSocial', 'orgao_entidade_razaosocial']),
-            'unidade': _first(det, ['unidade_orgao_nome_unidade', 'unidadeorgao_nomeunidade']),
-            'municipio': _first(det, ['unidade_orgao_municipio_nome', 'unidadeorgao_municipionome']),
-            'uf': _first(det, ['unidade_orgao_uf_sigla', 'unidadeorgao_ufsigla']),
-            # valores/modalidade
-            'valor': _first(det, ['valor_total_estimado', 'valorTotalEstimado', 'valor_total_homologado', 'valorGlobal', 'valor_final', 'valorFinal']),
-            'modalidade': _first(det, ['modalidade_nome', 'modalidadeNome']),
-            'modo_disputa': _first(det, ['modo_disputa_nome', 'modoDisputaNome']),
-            # datas principais
-            'data_publicacao_pncp': _first(det, ['dataPublicacao', 'data_publicacao_pncp']),
-            'data_encerramento_proposta': _first(det, ['dataEncerramentoProposta', 'data_encerramento_proposta']),
-            # links úteis
-            'links': {
-                'origem': _first(det, ['link_sistema_origem', 'linkSistemaOrigem']),
-                'processo': _first(det, ['link_processo_eletronico', 'linkProcessoEletronico'])
-            }
-        }
-    for r in results or []:
-        det = r.get('details') or {}
-        pid = (
-            det.get('numerocontrolepncp')
-            or det.get('numeroControlePNCP')
-            or det.get('numero_controle_pncp')
-            or r.get('id')
-            or r.get('numero_controle')
-        )
-        if not pid:
-            continue
-        compact = _compact_payload(det)
-        rows.append({
-            'numero_controle_pncp': str(pid),
-            'similarity': r.get('similarity'),
-            'data_publicacao_pncp': compact.get('data_publicacao_pncp'),
-            'data_encerramento_proposta': compact.get('data_encerramento_proposta'),
-            'payload': compact,
-        })
-    return rows
-
-
-# Conversão de filtros (dict) para lista de condições SQL (igual ao Browser)
 def _filters_to_sql_conditions(f: Dict[str, Any] | None) -> List[str]:
     if not f or not isinstance(f, dict):
         return []
@@ -281,334 +269,741 @@ def _sort_results(results: List[Dict[str, Any]], order_mode: int) -> List[Dict[s
     return results
 
 
-def run_once(now: Optional[datetime] = None) -> None:
-    now = now or datetime.now(timezone.utc)
-    # Cabeçalho
-    log_line("================================================================================")
-    log_line(f"[1/2] EXECUÇÃO DE BOLETINS — Sessão: {PIPELINE_TIMESTAMP}")
-    log_line(f"Data: {now.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-    log_line("================================================================================")
 
-    schedules = list_active_schedules_all(now)
-    log_line(f"Boletins ativos hoje (após filtro de dias): {len(schedules)}")
-    # Preview: quais boletins serão executados hoje e o motivo
+
+# =====================
+# Execução concorrente (pool + orçamentos + checkpoint)
+# =====================
+def _env_int(name: str, default: int) -> int:
     try:
-        dow_map = {0: 'seg', 1: 'ter', 2: 'qua', 3: 'qui', 4: 'sex', 5: 'sab', 6: 'dom'}
-        dow = dow_map.get(now.weekday())
-        log_line(f"Prévia: {len(schedules)} boletim(ns) hoje {now.strftime('%Y-%m-%d')} (dow={dow})")
+        return int(os.getenv(name, str(default)))
     except Exception:
-        pass
+        return default
 
-    # Barra de progresso por boletim
-    total = len(schedules)
-    done = 0
-    last_pct = -1
 
-    executed = 0
-    skipped = 0
+BOLETIM_WORKERS = max(1, _env_int('GVG_BOLETIM_WORKERS', 4))
+SCHEDULE_TIMEOUT_S = max(10, _env_int('GVG_BOLETIM_TIMEOUT_S', 300))
+CHECKPOINT_ENABLED = (os.getenv('GVG_BOLETIM_CHECKPOINT', 'true') or '').strip().lower() in ('1', 'true', 'yes', 'on')
+CHECKPOINT_MAX_AGE_H = max(1, _env_int('GVG_BOLETIM_RESUME_HOURS', 12))
+CHECKPOINT_PATH = os.getenv('GVG_BOLETIM_CHECKPOINT_PATH') or os.path.join(LOGS_DIR, 'boletins_checkpoint.jsonl')
+BOLETIM_DEDUP = (os.getenv('GVG_BOLETIM_DEDUP', 'true') or '').strip().lower() in ('1', 'true', 'yes', 'on')
+DELTA_ENABLED = (os.getenv('GVG_BOLETIM_DELTA', 'true') or '').strip().lower() in ('1', 'true', 'yes', 'on')
+FULL_EVERY_DAYS = max(1, _env_int('GVG_BOLETIM_FULL_EVERY_DAYS', 7))
+PERCOLATE_ENABLED = (os.getenv('GVG_BOLETIM_PERCOLATE', 'false') or '').strip().lower() in ('1', 'true', 'yes', 'on')
 
-    for s in schedules:
-        sid = s['id']
-        uid = s['user_id']
-        query = s['query_text']
-        # Checagem de frequência por tipo de agenda antes de executar
-        stype = (s.get('schedule_type') or '').upper()
-        sdetail = s.get('schedule_detail') or {}
-        if isinstance(sdetail, str):
-            try:
-                sdetail = json.loads(sdetail)
-            except Exception:
-                sdetail = {}
-        last_run = s.get('last_run_at')
 
-        def _to_dt(x: Any) -> Optional[datetime]:
-            if not x:
-                return None
-            if isinstance(x, datetime):
-                return x if x.tzinfo else x.replace(tzinfo=timezone.utc)
-            if isinstance(x, str):
+class ScheduleAborted(Exception):
+    """Boletim abandonado por timeout: o worker não grava resultados nem last_run.
+
+    Toda gravação do plano acontece sob plan['lock'] com o abort re-checado dentro
+    dele; o timeout em _run_group marca o abort sob o mesmo lock.
+    """
+
+
+class _Checkpoint:
+    """Arquivo JSONL: 1ª linha = cabeçalho do run (run_at), depois um sid concluído por linha.
+
+    Removido ao final de um run completo. Se o processo cair, o próximo run_once
+    (dentro de GVG_BOLETIM_RESUME_HOURS) reaproveita o mesmo run_at e pula os sids concluídos.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def load(self) -> Tuple[Optional[datetime], Set[Any]]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = [ln for ln in f.read().splitlines() if ln.strip()]
+            if not lines:
+                return None, set()
+            head = json.loads(lines[0])
+            run_at = datetime.fromisoformat(head['run_at'])
+            if datetime.now(timezone.utc) - run_at > timedelta(hours=CHECKPOINT_MAX_AGE_H):
+                return None, set()
+            done: Set[Any] = set()
+            for ln in lines[1:]:
                 try:
-                    return datetime.fromisoformat(x.replace('Z', '+00:00'))
+                    done.add(json.loads(ln)['sid'])
                 except Exception:
-                    try:
-                        return datetime.strptime(x[:10], '%Y-%m-%d').replace(tzinfo=timezone.utc)
-                    except Exception:
-                        return None
-            return None
+                    continue  # última linha truncada na queda
+            return run_at, done
+        except FileNotFoundError:
+            return None, set()
+        except Exception as e:
+            log_line(f"Checkpoint ilegível ({e}); iniciando run novo")
+            return None, set()
+
+    def start(self, run_at: datetime) -> None:
+        with self._lock, open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'run_at': run_at.isoformat(), 'session': PIPELINE_TIMESTAMP}) + "\n")
+
+    def mark(self, sid: Any) -> None:
+        with self._lock:
+            if self._closed:
+                return  # run encerrado: não recria o arquivo sem cabeçalho
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'sid': sid}) + "\n")
+
+    def finish(self) -> None:
+        with self._lock:
+            self._closed = True
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
 
-        lr_dt = _to_dt(last_run)
-        now_date = now.astimezone(timezone.utc).date()
-        ran_today = (lr_dt.astimezone(timezone.utc).date() == now_date) if lr_dt else False
 
-        # MULTIDIARIO: respeita min_interval_minutes se definido em schedule_detail
-        min_int = None
+def _to_dt(x: Any) -> Optional[datetime]:
+    if not x:
+        return None
+    if isinstance(x, datetime):
+        return x if x.tzinfo else x.replace(tzinfo=timezone.utc)
+    if isinstance(x, str):
         try:
-            v = (sdetail or {}).get('min_interval_minutes')
-            if isinstance(v, (int, float)):
-                min_int = int(v)
+            return datetime.fromisoformat(x.replace('Z', '+00:00'))
         except Exception:
-            min_int = None
-
-        if stype in ('DIARIO', 'SEMANAL') and ran_today:
-            done += 1
-            skipped += 1
-            # Progresso também em skips
-            pct = int((done * 100) / max(1, total))
-            if pct == 100 or pct - last_pct >= 5:
-                fill = int(round(pct * 20 / 100))
-                bar = "█" * fill + "░" * (20 - fill)
-                log_line(f"Execução: {pct}% [{bar}] ({done}/{total})")
-                last_pct = pct
-            continue
-        if stype == 'MULTIDIARIO' and min_int and lr_dt and (now - lr_dt < timedelta(minutes=min_int)):
-            done += 1
-            skipped += 1
-            pct = int((done * 100) / max(1, total))
-            if pct == 100 or pct - last_pct >= 5:
-                fill = int(round(pct * 20 / 100))
-                bar = "█" * fill + "░" * (20 - fill)
-                log_line(f"Execução: {pct}% [{bar}] ({done}/{total})")
-                last_pct = pct
-            continue
-
-        log_line(f"Executando boletim {sid} :: '{query}'")
-
-        # Extrai configurações do snapshot do boletim
-        cfg = s.get('config_snapshot') or {}
-        if isinstance(cfg, str):
             try:
-                cfg = json.loads(cfg)
+                return datetime.strptime(x[:10], '%Y-%m-%d').replace(tzinfo=timezone.utc)
             except Exception:
-                cfg = {}
+                return None
+    return None
 
-        # Detalhes de agenda e canais (apenas logging por enquanto)
-        sched_detail = s.get('schedule_detail') or {}
-        if isinstance(sched_detail, str):
-            try:
-                sched_detail = json.loads(sched_detail)
-            except Exception:
-                sched_detail = {}
-        channels = s.get('channels') or []
-        if isinstance(channels, str):
-            try:
-                channels = json.loads(channels)
-            except Exception:
-                channels = [channels]
-
-        # Defaults seguros
-        search_type = int(cfg.get('search_type', 3))
-        search_approach = int(cfg.get('search_approach', 3))
-        relevance_level = int(cfg.get('relevance_level', 2))
-        sort_mode = int(cfg.get('sort_mode', 1))
-        max_results = int(cfg.get('max_results', 50))
-        top_categories_count = int(cfg.get('top_categories_count', 10))
-        # Forçar paridade com GSB: negation sempre ativo e filtro de encerrados sempre ligado no Boletim
-        use_v2 = bool(cfg.get('use_search_v2', ENABLE_SEARCH_V2))
-        filter_expired = True
-        negation_emb = True
-
-        # Log de configuração efetiva (snapshot x runtime)
+
+def _parse_date_any(d: Any) -> Optional[str]:
+    if not d:
+        return None
+    if isinstance(d, str):
+        s = d.strip()
         try:
-            dbg('BOLETIM', f"sid={sid} use_v2={use_v2} negation={negation_emb} filter_expired={filter_expired} days={(sched_detail or {}).get('days')}")
+            if len(s) >= 10 and s[4] == '-' and s[7] == '-':
+                return s[:10]
         except Exception:
             pass
+        try:
+            if '/' in s and len(s) >= 10:
+                dd, mm, yy = s[:10].split('/')
+                return f"{yy}-{mm}-{dd}"
+        except Exception:
+            return None
+        return None
+    return None
 
-        # Log dos parâmetros que serão enviados para a busca
-        # (Parâmetros omitidos do log para reduzir ruído)
 
-        # Executa busca respeitando snapshot, sem IA por padrão (usa cache de pré-processamento, se houver)
+def _load_json_field(value: Any, default: Any) -> Any:
+    if isinstance(value, str):
         try:
-            filters_dict = s.get('filters') if isinstance(s.get('filters'), dict) else {}
-            filters_sql = _filters_to_sql_conditions(filters_dict)
-
-            # Ler EXACTO preproc_output do BD, se existir
-            preproc = s.get('preproc_output') if isinstance(s.get('preproc_output'), dict) else None
-            info = None
-            if preproc and isinstance(preproc, dict):
-                info = preproc
-                where_sql = info.get('sql_conditions') or []
-                base_terms = (info.get('search_terms') or query or '').strip()
-                try:
-                    dbg('PRE', f"[BOLETIM] cache HIT user_schedule.preproc_output sid={sid} terms='{base_terms[:60]}' sql_conds={len(where_sql)}")
-                except Exception:
-                    pass
-            else:
-                # Sempre processar se não houver cache (alinha ao GSB)
-                try:
-                    dbg('PRE', f"[BOLETIM] cache MISS sid={sid} (gerando preproc_output)")
-                except Exception:
-                    pass
-                processor = SearchQueryProcessor()
-                try:
-                    info = processor.process_query_v2(query or '', filters_sql) if use_v2 else processor.process_query(query or '')
-                except Exception:
-                    info = {'search_terms': query or '', 'negative_terms': '', 'sql_conditions': filters_sql, 'embeddings': bool((query or '').strip())}
-                if not isinstance(info, dict):
-                    info = {'search_terms': query or '', 'negative_terms': '', 'sql_conditions': filters_sql, 'embeddings': bool((query or '').strip())}
-                # Salvar EXACTAMENTE output
-                try:
-                    update_schedule_preproc_output(sid, info)
-                    try:
-                        dbg('PRE', f"[BOLETIM] assistant OUTPUT+SAVE sid={sid} terms='{(info.get('search_terms') or '')[:60]}' sql_conds={len(info.get('sql_conditions') or [])}")
-                    except Exception:
-                        pass
-                except Exception:
-                    pass
-                where_sql = info.get('sql_conditions') or filters_sql
-                base_terms = (info.get('search_terms') or query or '').strip()
+            return json.loads(value)
+        except Exception:
+            return default
+    return value or default
 
-            # Aplicar filtro de encerrados de forma explícita no where_sql e nas sql_conditions do preproc
-            if filter_expired:
-                _enc_filter = "to_date(NULLIF(c.data_encerramento_proposta,''),'YYYY-MM-DD') >= CURRENT_DATE"
-                try:
-                    # Injetar no where_sql (usado por approaches com where_sql)
-                    where_sql = list(where_sql or [])
-                    if _enc_filter not in where_sql:
-                        where_sql.append(_enc_filter)
-                    # Injetar também nas sql_conditions do preproc (usado por query_obj nas buscas diretas)
-                    if isinstance(info, dict):
-                        sc = list((info.get('sql_conditions') or []))
-                        if _enc_filter not in sc:
-                            sc.append(_enc_filter)
-                            info['sql_conditions'] = sc
-                    try:
-                        dbg('BOLETIM', "Filtro de encerrados aplicado (filter_expired=True)")
-                    except Exception:
-                        pass
-                except Exception:
-                    pass
 
-            # Negative terms (usados para eventual embedding / futura extensão) - manter referência
-            negative_terms = ''
-            try:
-                negative_terms = (info.get('negative_terms') or '') if isinstance(info, dict) else ''
-            except Exception:
-                negative_terms = ''
+def _should_skip(s: Dict[str, Any], now: datetime, tz=None) -> bool:
+    """Checagem de frequência por tipo de agenda antes de executar.
 
-            # Alinhar relevância
-            try:
-                set_relevance_filter_level(relevance_level)
-            except Exception:
-                pass
+    "Já rodou hoje" usa o dia local em tz (padrão SCHEDULER_TZ), a mesma fronteira
+    de gvg_scheduler.next_due: um run que cruza a meia-noite UTC não pula o próximo slot.
+    """
+    tz = tz or SCHEDULER_TZ
+    stype = (s.get('schedule_type') or '').upper()
+    sdetail = _load_json_field(s.get('schedule_detail'), {})
+    lr_dt = _to_dt(s.get('last_run_at'))
+    now_date = now.astimezone(tz).date()
+    ran_today = (lr_dt.astimezone(tz).date() == now_date) if lr_dt else False
+
+    # MULTIDIARIO: respeita min_interval_minutes se definido em schedule_detail
+    min_int = None
+    try:
+        v = (sdetail or {}).get('min_interval_minutes')
+        if isinstance(v, (int, float)):
+            min_int = int(v)
+    except Exception:
+        min_int = None
 
-            results: List[Dict[str, Any]] = []
-            # Monta objeto unificado de query para o core (evita reprocessamento interno)
-            query_obj = {
-                'original_query': query,
-                'search_terms': (info.get('search_terms') if isinstance(info, dict) else query) or query,
-                'negative_terms': (info.get('negative_terms') if isinstance(info, dict) else '') or '',
-                'sql_conditions': (info.get('sql_conditions') if isinstance(info, dict) else where_sql) or [],
-                'embeddings': (info.get('embeddings') if isinstance(info, dict) and info.get('embeddings') is not None else True),
-                'explanation': (info.get('explanation') if isinstance(info, dict) else 'Pré-processado boletim') or 'Pré-processado boletim'
-            }
+    if stype in ('DIARIO', 'SEMANAL') and ran_today:
+        return True
+    if stype == 'MULTIDIARIO' and min_int and lr_dt and (now - lr_dt < timedelta(minutes=min_int)):
+        return True
+    return False
+
+
+def _plan_config(s: Dict[str, Any]) -> Dict[str, Any]:
+    """Parâmetros efetivos de busca do snapshot do boletim (defaults seguros)."""
+    cfg = _load_json_field(s.get('config_snapshot'), {})
+    return {
+        'search_type': int(cfg.get('search_type', 3)),
+        'search_approach': int(cfg.get('search_approach', 3)),
+        'relevance_level': int(cfg.get('relevance_level', 2)),
+        'sort_mode': int(cfg.get('sort_mode', 1)),
+        'max_results': int(cfg.get('max_results', 50)),
+        'top_categories_count': int(cfg.get('top_categories_count', 10)),
+        'use_v2': bool(cfg.get('use_search_v2', ENABLE_SEARCH_V2)),
+    }
+
+
+def _canon(v: Any) -> Any:
+    """Forma canônica de filtros: vazios removidos, strings aparadas, listas de escalares ordenadas."""
+    if isinstance(v, dict):
+        out = {}
+        for k in sorted(v):
+            c = _canon(v[k])
+            if c not in (None, '', [], {}):
+                out[str(k)] = c
+        return out
+    if isinstance(v, (list, tuple)):
+        items = [c for c in (_canon(x) for x in v) if c not in (None, '', [], {})]
+        if all(isinstance(x, (str, int, float)) for x in items):
+            return sorted(items, key=str)
+        return items
+    if isinstance(v, str):
+        return v.strip()
+    return v
+
+
+def _delta_params(s: Dict[str, Any], state: Optional[Dict[str, Any]], now: datetime, force_full: bool = False) -> Dict[str, Any]:
+    """Modo da execução do boletim: 'delta' (marca d'água = last_run_at) ou 'full' (reconciliação)."""
+    full = {'mode': 'full', 'watermark': None, 'cutoff': None}
+    if force_full or not DELTA_ENABLED or not state:
+        return full
+    watermark = _to_dt(s.get('last_run_at'))
+    last_full = _to_dt(state.get('last_full_run_at'))
+    cutoff = state.get('delta_cutoff')
+    if watermark is None or last_full is None or cutoff is None:
+        return full
+    if now - last_full >= timedelta(days=FULL_EVERY_DAYS):
+        return full
+    return {'mode': 'delta', 'watermark': watermark.astimezone(timezone.utc).isoformat(), 'cutoff': float(cutoff)}
+
+
+def _delta_condition(watermark_iso: str) -> str:
+    # Só referencia o alias c (válido em todas as buscas do core); o IN usa idx_contratacao_emb_created_at
+    return (
+        "c.numero_controle_pncp IN (SELECT ce_d.numero_controle_pncp FROM public.contratacao_emb ce_d "
+        f"WHERE ce_d.created_at >= '{watermark_iso}'::timestamptz)"
+    )
 
-            if search_approach == 1:
-                if search_type == 1:
-                    results, _ = semantic_search(query_obj, limit=max_results, filter_expired=filter_expired, use_negation=negation_emb)
-                elif search_type == 2:
-                    results, _ = keyword_search(query_obj, limit=max_results, filter_expired=filter_expired)
-                else:
-                    results, _ = hybrid_search(query_obj, limit=max_results, filter_expired=filter_expired, use_negation=negation_emb)
-            elif search_approach == 2:
-                cats = get_top_categories_for_query(query_text=base_terms or query, top_n=top_categories_count, use_negation=False, search_type=search_type, console=None)
-                if cats:
-                    # correspondence_search ainda recebe string; where_sql já aplicado via preproc -> passamos condições também
-                    results, _, _ = correspondence_search(query_text=query, top_categories=cats, limit=max_results, filter_expired=filter_expired, console=None, where_sql=where_sql)
-            else:
-                cats = get_top_categories_for_query(query_text=base_terms or query, top_n=top_categories_count, use_negation=False, search_type=search_type, console=None)
-                if cats:
-                    # category_filtered_search aceita string; passa where_sql com filtros
-                    results, _, _ = category_filtered_search(query_text=query, search_type=search_type, top_categories=cats, limit=max_results, filter_expired=filter_expired, use_negation=negation_emb, console=None, where_sql=where_sql)
-
-            # Ordenação e rank
-            results = _sort_results(results or [], sort_mode or 1)
-            for idx, r in enumerate(results, 1):
-                r['rank'] = idx
+
+def _plan_key(s: Dict[str, Any], cfg: Dict[str, Any]) -> str:
+    """(consulta normalizada, tipo, abordagem, relevância, filtros, limites, modo delta) → chave do plano."""
+    if not BOLETIM_DEDUP:
+        return f"sid:{s['id']}"
+    query = ' '.join((s.get('query_text') or '').split()).casefold()
+    filters = s.get('filters') if isinstance(s.get('filters'), dict) else {}
+    return json.dumps([query, cfg, _canon(filters), s.get('_delta')], sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _has_preproc(s: Dict[str, Any]) -> bool:
+    return isinstance(s.get('preproc_output'), dict) and bool(s.get('preproc_output'))
+
+
+def _build_plans(schedules: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Tuple[Dict[str, Any], Exception]]]:
+    """Agrupa boletins com plano idêntico; cada plano roda uma vez e distribui aos assinantes."""
+    plans: Dict[str, Dict[str, Any]] = {}
+    invalid: List[Tuple[Dict[str, Any], Exception]] = []
+    for s in schedules:
+        try:
+            cfg = _plan_config(s)
         except Exception as e:
-            log_line(f"ERRO busca sid={sid}: {e}")
-            done += 1
-            skipped += 1
-            pct = int((done * 100) / max(1, total))
-            if pct == 100 or pct - last_pct >= 5:
-                fill = int(round(pct * 20 / 100))
-                bar = "█" * fill + "░" * (20 - fill)
-                log_line(f"Execução: {pct}% [{bar}] ({done}/{total})")
-                last_pct = pct
+            invalid.append((s, e))
             continue
+        key = _plan_key(s, cfg)
+        plan = plans.get(key)
+        if plan is None:
+            plan = plans[key] = {
+                'key': key, 'cfg': cfg, 'schedules': [], 'delivered': 0, 'preproc_ran': False,
+                'lock': threading.Lock(),
+                'delta': s.get('_delta') or {'mode': 'full', 'watermark': None, 'cutoff': None}, 'cutoff': None,
+            }
+        plan['schedules'].append(s)
+    return list(plans.values()), invalid
+
+
+def _check_abort(abort: Optional[threading.Event], sid: Any) -> None:
+    if abort is not None and abort.is_set():
+        raise ScheduleAborted(f"sid={sid} abandonado por timeout")
+
+
+def _execute_plan(plan: Dict[str, Any], abort: Optional[threading.Event] = None) -> List[Dict[str, Any]]:
+    """Pré-processamento → busca → ordenação de um plano. Retorna as linhas (antes do delta por assinante).
 
-        # Log dos parâmetros efetivos reconhecidos pela função
-        # (Parâmetros efetivos omitidos do log)
-        rows_all = _build_rows_from_search(results or [])
+    O nível de relevância é global em gvg_search_core: run_once agrupa os planos por
+    nível e o define antes de cada grupo (não aqui).
+    """
+    subs = plan['schedules']
+    rep = subs[0]
+    sid = rep['id']
+    query = rep['query_text']
+    cfg = plan['cfg']
+    log_line(f"Executando boletim {sid} :: '{query}'" + (f" (+{len(subs) - 1} assinante(s) com o mesmo plano)" if len(subs) > 1 else ""))
+
+    sched_detail = _load_json_field(rep.get('schedule_detail'), {})
+    search_type = cfg['search_type']
+    search_approach = cfg['search_approach']
+    sort_mode = cfg['sort_mode']
+    max_results = cfg['max_results']
+    top_categories_count = cfg['top_categories_count']
+    # Forçar paridade com GSB: negation sempre ativo e filtro de encerrados sempre ligado no Boletim
+    use_v2 = cfg['use_v2']
+    filter_expired = True
+    negation_emb = True
+
+    # Log de configuração efetiva (snapshot x runtime)
+    try:
+        dbg('BOLETIM', f"sid={sid} use_v2={use_v2} negation={negation_emb} filter_expired={filter_expired} days={(sched_detail or {}).get('days')}")
+    except Exception:
+        pass
 
-        # Delta: manter apenas itens com data_publicacao_pncp >= baseline (last_run_at)
-        last_run = s.get('last_run_at')
-        baseline_iso = None
-        if last_run:
+    # Executa busca respeitando snapshot, sem IA por padrão (usa cache de pré-processamento, se houver)
+    filters_dict = rep.get('filters') if isinstance(rep.get('filters'), dict) else {}
+    filters_sql = _filters_to_sql_conditions(filters_dict)
+
+    # Ler EXACTO preproc_output do BD de qualquer assinante do plano, se existir
+    preproc = next((s['preproc_output'] for s in subs if _has_preproc(s)), None)
+    info = None
+    if preproc:
+        info = preproc
+        where_sql = info.get('sql_conditions') or []
+        base_terms = (info.get('search_terms') or query or '').strip()
+        try:
+            dbg('PRE', f"[BOLETIM] cache HIT user_schedule.preproc_output sid={sid} terms='{base_terms[:60]}' sql_conds={len(where_sql)}")
+        except Exception:
+            pass
+    else:
+        # Sempre processar se não houver cache (alinha ao GSB)
+        try:
+            dbg('PRE', f"[BOLETIM] cache MISS sid={sid} (gerando preproc_output)")
+        except Exception:
+            pass
+        processor = SearchQueryProcessor()
+        try:
+            info = processor.process_query_v2(query or '', filters_sql) if use_v2 else processor.process_query(query or '')
+        except Exception:
+            info = {'search_terms': query or '', 'negative_terms': '', 'sql_conditions': filters_sql, 'embeddings': bool((query or '').strip())}
+        if not isinstance(info, dict):
+            info = {'search_terms': query or '', 'negative_terms': '', 'sql_conditions': filters_sql, 'embeddings': bool((query or '').strip())}
+        plan['preproc_ran'] = True
+        where_sql = info.get('sql_conditions') or filters_sql
+        base_terms = (info.get('search_terms') or query or '').strip()
+    # Salvar EXACTAMENTE output nos assinantes ainda sem cache (próximos runs não chamam o assistant)
+    for s in subs:
+        if _has_preproc(s):
+            continue
+        try:
+            with plan['lock']:
+                _check_abort(abort, s['id'])
+                update_schedule_preproc_output(s['id'], info)
             try:
-                if isinstance(last_run, str):
-                    baseline_iso = last_run[:10]
-                else:
-                    baseline_iso = last_run.strftime('%Y-%m-%d')
+                dbg('PRE', f"[BOLETIM] assistant OUTPUT+SAVE sid={s['id']} terms='{(info.get('search_terms') or '')[:60]}' sql_conds={len(info.get('sql_conditions') or [])}")
             except Exception:
-                baseline_iso = None
-
-        def _parse_date_any(d: Any) -> Optional[str]:
-            if not d:
-                return None
-            if isinstance(d, str):
-                s = d.strip()
-                try:
-                    if len(s) >= 10 and s[4] == '-' and s[7] == '-':
-                        return s[:10]
-                except Exception:
-                    pass
-                try:
-                    if '/' in s and len(s) >= 10:
-                        dd, mm, yy = s[:10].split('/')
-                        return f"{yy}-{mm}-{dd}"
-                except Exception:
-                    return None
-                return None
-            return None
+                pass
+        except ScheduleAborted:
+            raise
+        except Exception:
+            pass
 
-        if baseline_iso:
-            before = len(rows_all)
-            rows = [r for r in rows_all if (_parse_date_any(r.get('data_publicacao_pncp')) or '') >= baseline_iso]
-            kept = len(rows)
-            # só loga delta se houve filtragem
-            if kept != before:
-                log_line(f"Delta baseline={baseline_iso}: {before}->{kept}")
-        else:
-            rows = rows_all
+    # Aplicar filtro de encerrados de forma explícita no where_sql e nas sql_conditions do preproc
+    if filter_expired:
+        _enc_filter = "to_date(NULLIF(c.data_encerramento_proposta,''),'YYYY-MM-DD') >= CURRENT_DATE"
+        try:
+            # Injetar no where_sql (usado por approaches com where_sql)
+            where_sql = list(where_sql or [])
+            if _enc_filter not in where_sql:
+                where_sql.append(_enc_filter)
+            # Injetar também nas sql_conditions do preproc (usado por query_obj nas buscas diretas).
+            # Cópia: o dict de preproc_output pertence à linha listada do boletim.
+            if isinstance(info, dict):
+                sc = list((info.get('sql_conditions') or []))
+                if _enc_filter not in sc:
+                    sc.append(_enc_filter)
+                    info = dict(info, sql_conditions=sc)
+            try:
+                dbg('BOLETIM', "Filtro de encerrados aplicado (filter_expired=True)")
+            except Exception:
+                pass
+        except Exception:
+            pass
 
-        run_token = uuid.uuid4().hex
-        record_boletim_results(sid, uid, run_token, now, rows)
-        log_line(f"Boletim {sid}: resultados gravados = {len(rows)}")
-        # Evento de uso boletim_run
+    # Modo delta: candidatos restritos às contratações embedadas após a marca d'água
+    delta = plan['delta']
+    if delta['mode'] == 'delta':
+        _delta_filter = _delta_condition(delta['watermark'])
+        where_sql = list(where_sql or []) + [_delta_filter]
+        if isinstance(info, dict):
+            info = dict(info, sql_conditions=list(info.get('sql_conditions') or []) + [_delta_filter])
         try:
-            from gvg_usage import usage_event_start, usage_event_finish  # type: ignore
-            usage_event_start(str(uid), 'boletim_run', ref_type='boletim', ref_id=str(sid))
-            usage_event_finish({'results': len(rows)})
+            dbg('BOLETIM', f"sid={sid} modo delta desde {delta['watermark']} corte={delta['cutoff']:.4f}")
         except Exception:
             pass
 
-        # marcar last_run
-        touch_last_run(sid, now)
-        executed += 1
+    results: List[Dict[str, Any]] = []
+    # Monta objeto unificado de query para o core (evita reprocessamento interno)
+    query_obj = {
+        'original_query': query,
+        'search_terms': (info.get('search_terms') if isinstance(info, dict) else query) or query,
+        'negative_terms': (info.get('negative_terms') if isinstance(info, dict) else '') or '',
+        'sql_conditions': (info.get('sql_conditions') if isinstance(info, dict) else where_sql) or [],
+        'embeddings': (info.get('embeddings') if isinstance(info, dict) and info.get('embeddings') is not None else True),
+        'explanation': (info.get('explanation') if isinstance(info, dict) else 'Pré-processado boletim') or 'Pré-processado boletim'
+    }
+
+    if search_approach == 1:
+        if search_type == 1:
+            results, _ = semantic_search(query_obj, limit=max_results, filter_expired=filter_expired, use_negation=negation_emb)
+        elif search_type == 2:
+            results, _ = keyword_search(query_obj, limit=max_results, filter_expired=filter_expired)
+        else:
+            results, _ = hybrid_search(query_obj, limit=max_results, filter_expired=filter_expired, use_negation=negation_emb)
+    elif search_approach == 2:
+        cats = get_top_categories_for_query(query_text=base_terms or query, top_n=top_categories_count, use_negation=False, search_type=search_type, console=None)
+        if cats:
+            # correspondence_search ainda recebe string; where_sql já aplicado via preproc -> passamos condições também
+            results, _, _ = correspondence_search(query_text=query, top_categories=cats, limit=max_results, filter_expired=filter_expired, console=None, where_sql=where_sql)
+    else:
+        cats = get_top_categories_for_query(query_text=base_terms or query, top_n=top_categories_count, use_negation=False, search_type=search_type, console=None)
+        if cats:
+            # category_filtered_search aceita string; passa where_sql com filtros
+            results, _, _ = category_filtered_search(query_text=query, search_type=search_type, top_categories=cats, limit=max_results, filter_expired=filter_expired, use_negation=negation_emb, console=None, where_sql=where_sql)
+
+    # Delta: mantém só o que entraria no top-N da busca completa (corte da última reconciliação)
+    if delta['mode'] == 'delta':
+        results = [r for r in (results or []) if float(r.get('similarity') or 0.0) >= delta['cutoff']]
+    else:
+        sims = [float(r.get('similarity') or 0.0) for r in (results or [])]
+        # Menos que max_results → qualquer contratação nova compatível entraria no top-N
+        plan['cutoff'] = min(sims) if (sims and len(sims) >= max_results) else -1.0
+
+    # Ordenação e rank
+    results = _sort_results(results or [], sort_mode or 1)
+    for idx, r in enumerate(results, 1):
+        r['rank'] = idx
+    return build_boletim_rows(results or [])
+
+
+def _deliver(s: Dict[str, Any], rows_all: List[Dict[str, Any]], now: datetime, delta_mode: bool = False) -> int:
+    """Grava os resultados do plano para um assinante (delta pelo last_run_at dele) e marca last_run."""
+    sid = s['id']
+    uid = s['user_id']
+    # Delta: manter apenas itens com data_publicacao_pncp >= baseline (last_run_at).
+    # No modo delta a marca d'água de ingestão já restringiu os candidatos (inclui publicações antigas
+    # ingeridas com atraso), então o filtro por data de publicação não se aplica.
+    last_run = s.get('last_run_at')
+    baseline_iso = None
+    if last_run and not delta_mode:
+        try:
+            if isinstance(last_run, str):
+                baseline_iso = last_run[:10]
+            else:
+                baseline_iso = last_run.strftime('%Y-%m-%d')
+        except Exception:
+            baseline_iso = None
+
+    if baseline_iso:
+        before = len(rows_all)
+        rows = [r for r in rows_all if (_parse_date_any(r.get('data_publicacao_pncp')) or '') >= baseline_iso]
+        kept = len(rows)
+        # só loga delta se houve filtragem
+        if kept != before:
+            log_line(f"Delta baseline={baseline_iso} sid={sid}: {before}->{kept}")
+    else:
+        rows = rows_all
+
+    run_token = uuid.uuid4().hex
+    record_boletim_results(sid, uid, run_token, now, rows)
+    log_line(f"Boletim {sid}: resultados gravados = {len(rows)}")
+    # Evento de uso boletim_run
+    try:
+        from gvg_usage import usage_event_start, usage_event_finish  # type: ignore
+        usage_event_start(str(uid), 'boletim_run', ref_type='boletim', ref_id=str(sid))
+        usage_event_finish({'results': len(rows)})
+    except Exception:
+        pass
+
+    # marcar last_run
+    touch_last_run(sid, now)
+    return len(rows)
+
+
+def _run_plan(plan: Dict[str, Any], now: datetime, abort: Optional[threading.Event] = None,
+              ckpt: Optional[_Checkpoint] = None) -> None:
+    """Executa o plano uma vez e distribui; falha de gravação de um assinante não afeta os demais."""
+    rows_all = _execute_plan(plan, abort)
+    delta_mode = plan['delta']['mode'] == 'delta'
+    delivered: List[Any] = []
+    for s in plan['schedules']:
+        # Abort re-checado sob o lock do plano: timeout marcado antes → nada é gravado;
+        # depois → a entrega já terminou e entra na contagem do _settle
+        with plan['lock']:
+            _check_abort(abort, s['id'])
+            try:
+                _deliver(s, rows_all, now, delta_mode)
+            except Exception as e:
+                log_line(f"ERRO gravação boletim sid={s['id']}: {e}")
+                continue
+            plan['delivered'] += 1
+            delivered.append(s['id'])
+            if ckpt is not None:
+                ckpt.mark(s['id'])
+    # Execução completa: registra o corte para os próximos deltas destes assinantes
+    if DELTA_ENABLED and not delta_mode and delivered:
+        try:
+            set_delta_state(delivered, plan['cutoff'], now)
+        except Exception as e:
+            log_line(f"WARN estado delta sid={delivered[0]}: {e}")
 
-        # Atualiza progresso
-        done += 1
-        pct = int((done * 100) / max(1, total))
-        if pct == 100 or pct - last_pct >= 5:
+
+class _Progress:
+    """Barra de progresso por boletim (thread principal)."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.last_pct = -1
+
+    def step(self, n: int = 1) -> None:
+        self.done += n
+        pct = int((self.done * 100) / max(1, self.total))
+        if pct == 100 or pct - self.last_pct >= 5:
             fill = int(round(pct * 20 / 100))
             bar = "█" * fill + "░" * (20 - fill)
-            log_line(f"Execução: {pct}% [{bar}] ({done}/{total})")
-            last_pct = pct
+            log_line(f"Execução: {pct}% [{bar}] ({self.done}/{self.total})")
+            self.last_pct = pct
+
+
+def _run_group(plans: List[Dict[str, Any]], now: datetime, workers: int, timeout_s: int,
+               ckpt: Optional[_Checkpoint], progress: _Progress, counts: Dict[str, int]) -> None:
+    """Executa um grupo de planos no pool; falhas e timeouts ficam isolados por plano."""
+    started: Dict[int, float] = {}
+    aborts: Dict[int, threading.Event] = {}
+
+    def _work(i: int, plan: Dict[str, Any]) -> None:
+        started[i] = time.monotonic()
+        _run_plan(plan, now, aborts[i], ckpt)
+
+    def _settle(plan: Dict[str, Any], bucket: str) -> None:
+        n = len(plan['schedules'])
+        counts['executed'] += plan['delivered']
+        counts[bucket] += n - plan['delivered']
+        progress.step(n)
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gvg-boletim')
+    try:
+        futures: Dict[Any, int] = {}
+        for i, plan in enumerate(plans):
+            aborts[i] = threading.Event()
+            futures[pool.submit(_work, i, plan)] = i
+        pending = set(futures)
+        while pending:
+            finished, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                i = futures[fut]
+                plan = plans[i]
+                if aborts[i].is_set():
+                    continue  # já contabilizado como timeout
+                try:
+                    fut.result()
+                except Exception as e:
+                    log_line(f"ERRO boletim sid={plan['schedules'][0]['id']} (plano com {len(plan['schedules'])}): {e}")
+                _settle(plan, 'failed')
+            # Timeouts: marca abort sob o lock do plano (o worker não grava nada depois disso)
+            # e segue sem esperar; gravação em andamento → tenta de novo no próximo ciclo
+            now_m = time.monotonic()
+            for fut in list(pending):
+                i = futures[fut]
+                t0 = started.get(i)
+                if t0 is not None and now_m - t0 > timeout_s:
+                    lock = plans[i]['lock']
+                    if not lock.acquire(blocking=False):
+                        continue
+                    try:
+                        aborts[i].set()
+                        pending.discard(fut)
+                        log_line(f"TIMEOUT boletim sid={plans[i]['schedules'][0]['id']} após {timeout_s}s (abandonado)")
+                        _settle(plans[i], 'timeout')
+                    finally:
+                        lock.release()
+    finally:
+        # Não espera workers presos em chamadas lentas (já marcados como abortados)
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _percolatable(s: Dict[str, Any]) -> bool:
+    """Busca reproduzível pela percolação: delta + semântica direta + sem filtro de relevância + preproc salvo."""
+    if (s.get('_delta') or {}).get('mode') != 'delta' or not _has_preproc(s):
+        return False
+    try:
+        cfg = _plan_config(s)
+    except Exception:
+        return False
+    return cfg['search_type'] == 1 and cfg['search_approach'] == 1 and cfg['relevance_level'] == 1
+
+
+def _run_percolation(todo: List[Dict[str, Any]], now: datetime, ckpt: Optional[_Checkpoint],
+                     progress: '_Progress', counts: Dict[str, int]) -> List[Dict[str, Any]]:
+    """Percola os boletins elegíveis; retorna os que ainda precisam do fluxo por planos."""
+    elig = [s for s in todo if _percolatable(s)]
+    if not elig:
+        return todo
+    entries = [
+        {
+            'id': s['id'], 'user_id': s['user_id'], 'query_text': s.get('query_text') or '',
+            'preproc_output': s.get('preproc_output'), 'since': _to_dt(s.get('last_run_at')),
+            'cutoff': s['_delta']['cutoff'], 'max_results': _plan_config(s)['max_results'],
+        }
+        for s in elig
+    ]
+    try:
+        res = percolate(entries, now)
+    except Exception as e:
+        log_line(f"WARN percolação indisponível ({e}); {len(elig)} boletim(ns) seguem nos planos")
+        return todo
+    delivered = set(res.get('delivered') or [])
+    for sid in delivered:
+        if ckpt is not None:
+            ckpt.mark(sid)
+        progress.step()
+    counts['executed'] += len(delivered)
+    counts['percolated'] = len(delivered)
+    t = res.get('timings') or {}
+    log_line(
+        f"Percolação: boletins={len(delivered)}/{len(elig)}, contratações novas={res.get('contracts', 0)}, "
+        f"acertos={res.get('hits', 0)}, vetores recalculados={res.get('embedded', 0)}, "
+        f"devolvidos={len(res.get('fallback') or [])} | "
+        + " ".join(f"{k}={v:.2f}" for k, v in t.items())
+    )
+    return [s for s in todo if s['id'] not in delivered]
+
+
+def run_once(now: Optional[datetime] = None, workers: Optional[int] = None, timeout_s: Optional[int] = None,
+             resume: bool = True, full: bool = False,
+             schedules: Optional[List[Dict[str, Any]]] = None) -> Dict[str, int]:
+    """Executa os boletins do dia. schedules: lista já carregada (daemon) em vez de list_active_schedules_all."""
+    workers = max(1, int(workers or BOLETIM_WORKERS))
+    timeout_s = int(timeout_s or SCHEDULE_TIMEOUT_S)
+    ckpt = _Checkpoint(CHECKPOINT_PATH) if CHECKPOINT_ENABLED else None
+    resumed_at, done_sids = (ckpt.load() if (ckpt is not None and resume) else (None, set()))
+    if resumed_at is not None:
+        # Retomada: mesmo run_at do run interrompido (resultados e last_run coerentes)
+        now = resumed_at
+    now = now or datetime.now(timezone.utc)
+    # Cabeçalho
+    log_line("================================================================================")
+    log_line(f"[1/2] EXECUÇÃO DE BOLETINS — Sessão: {PIPELINE_TIMESTAMP}")
+    log_line(f"Data: {now.strftime('%Y-%m-%d %H:%M:%S %Z')}")
+    log_line(f"Workers: {workers} | timeout por boletim: {timeout_s}s | dedup de planos: {'on' if BOLETIM_DEDUP else 'off'}"
+             f" | delta: {'off' if not DELTA_ENABLED else ('forçado completo' if full else 'on')}")
+    log_line("================================================================================")
 
+    if schedules is None:
+        schedules = list_active_schedules_all(now)
+    log_line(f"Boletins ativos hoje (após filtro de dias): {len(schedules)}")
+    # Preview: quais boletins serão executados hoje e o motivo
+    try:
+        dow_map = {0: 'seg', 1: 'ter', 2: 'qua', 3: 'qui', 4: 'sex', 5: 'sab', 6: 'dom'}
+        dow = dow_map.get(now.weekday())
+        log_line(f"Prévia: {len(schedules)} boletim(ns) hoje {now.strftime('%Y-%m-%d')} (dow={dow})")
+    except Exception:
+        pass
+
+    total = len(schedules)
+    progress = _Progress(total)
+    counts = {'executed': 0, 'skipped': 0, 'failed': 0, 'timeout': 0, 'resumed': 0, 'plans': 0, 'searches_saved': 0, 'preproc_saved': 0,
+              'delta_plans': 0, 'full_plans': 0, 'percolated': 0}
+
+    todo: List[Dict[str, Any]] = []
+    for s in schedules:
+        if s['id'] in done_sids:
+            counts['resumed'] += 1
+            progress.step()
+        elif _should_skip(s, now):
+            counts['skipped'] += 1
+            progress.step()
+        else:
+            todo.append(s)
+    if resumed_at is not None:
+        log_line(f"Retomando run de {resumed_at.isoformat()}: {counts['resumed']} boletim(ns) já concluído(s)")
+    elif ckpt is not None:
+        ckpt.start(now)
+
+    # Modo delta x completo por boletim (entra na chave do plano)
+    states: Dict[Any, Dict[str, Any]] = {}
+    if DELTA_ENABLED and not full and todo:
+        try:
+            states = fetch_delta_state([s['id'] for s in todo])
+        except Exception as e:
+            log_line(f"WARN estado delta indisponível ({e}); execução completa")
+    for s in todo:
+        s['_delta'] = _delta_params(s, states.get(s['id']), now, force_full=full)
+
+    t0 = time.monotonic()
+    if PERCOLATE_ENABLED and todo:
+        todo = _run_percolation(todo, now, ckpt, progress, counts)
+
+    # Planejamento: boletins com plano idêntico (consulta/config/filtros/modo) rodam uma vez
+    plans, invalid = _build_plans(todo)
+    for s, e in invalid:
+        log_line(f"ERRO config boletim sid={s['id']}: {e}")
+        counts['failed'] += 1
+        progress.step()
+    counts['plans'] = len(plans)
+    counts['delta_plans'] = sum(1 for p in plans if p['delta']['mode'] == 'delta')
+    counts['full_plans'] = len(plans) - counts['delta_plans']
+    counts['searches_saved'] = len(todo) - len(invalid) - len(plans)
+    log_line(f"Planos únicos: {len(plans)} para {len(todo) - len(invalid)} boletim(ns) (buscas evitadas: {counts['searches_saved']})")
+
+    # Nível de relevância é global no core: um grupo (pool) por nível
+    groups: Dict[int, List[Dict[str, Any]]] = {}
+    for plan in plans:
+        groups.setdefault(plan['cfg']['relevance_level'], []).append(plan)
+    for level in sorted(groups):
+        try:
+            set_relevance_filter_level(level)
+        except Exception:
+            pass
+        _run_group(groups[level], now, workers, timeout_s, ckpt, progress, counts)
+    elapsed = time.monotonic() - t0
+    if ckpt is not None:
+        ckpt.finish()
+
+    # Pré-processamentos evitados: assinantes sem cache atendidos por um único assistant/plano
+    lacking = sum(1 for p in plans for s in p['schedules'] if not _has_preproc(s))
+    counts['preproc_saved'] = lacking - sum(1 for p in plans if p['preproc_ran'])
+    rate = (counts['executed'] / elapsed * 60.0) if elapsed > 0 else 0.0
     # envio por email será tratado em script separado (last_sent_at)
-    log_line(f"Resumo: executados={executed}, pulados={skipped}, total={total}")
+    log_line(
+        f"Resumo: executados={counts['executed']}, pulados={counts['skipped']}, falhas={counts['failed']}, "
+        f"timeouts={counts['timeout']}, retomados={counts['resumed']}, total={total}, "
+        f"tempo={elapsed:.1f}s ({rate:.1f} boletins/min)"
+    )
+    log_line(
+        f"Dedup: planos={counts['plans']}, buscas evitadas={counts['searches_saved']}, "
+        f"pré-processamentos evitados={counts['preproc_saved']} | planos delta={counts['delta_plans']}, completos={counts['full_plans']}, "
+        f"percolados={counts['percolated']}"
+    )
+    try:
+        log_line(f"Orçamentos: {json.dumps(budget_stats(), ensure_ascii=False)}")
+    except Exception:
+        pass
     log_line("Concluído: execução de boletins finalizada")
+    return counts
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Executa os boletins agendados do dia (pool de workers).')
+    parser.add_argument('--workers', type=int, default=BOLETIM_WORKERS)
+    parser.add_argument('--timeout', type=int, default=SCHEDULE_TIMEOUT_S, help='Timeout por boletim (s)')
+    parser.add_argument('--openai-concurrency', type=int, default=None, help='Chamadas OpenAI simultâneas (0 = ilimitado)')
+    parser.add_argument('--openai-rps', type=float, default=None, help='Chamadas OpenAI por segundo (0 = ilimitado)')
+    parser.add_argument('--db-concurrency', type=int, default=None, help='Consultas DB simultâneas (0 = ilimitado)')
+    parser.add_argument('--db-qps', type=float, default=None, help='Consultas DB por segundo (0 = ilimitado)')
+    parser.add_argument('--no-resume', action='store_true', help='Ignora checkpoint de run interrompido')
+    parser.add_argument('--full', action='store_true', help='Execução completa (reconciliação) para todos os boletins')
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
-    run_once()
+    args = _parse_args()
+    configure_budget('openai', args.openai_concurrency, args.openai_rps)
+    configure_budget('db', args.db_concurrency, args.db_qps)
+    run_once(workers=args.workers, timeout_s=args.timeout, resume=not args.no_resume, full=args.full)
@@ -3,7 +3,12 @@ Envia boletins por email para usuários, usando o último run de cada boletim
 (caso last_run_at > last_sent_at). HTML reaproveita estilos do site (inline).
 
 Uso:
-  python -m search.gvg_browser.scripts.send_boletins_email
+  python -m search.gvg_browser.scripts.send_boletins_email [--workers N] [--rate R]
+
+Entrega (gvg_mailer): e-mails, linhas do último run e documentos são pré-carregados
+em poucas consultas em lote; o envio usa sessões SMTP reutilizadas (pool), senders
+concorrentes (SMTP_SEND_WORKERS / --workers) sob o orçamento 'smtp' (--rate msgs/s),
+retentativas e dead-letter (public.email_dead_letter). Ao final, estatísticas de vazão.
 
 Requisitos: SMTP_* no .env; DB configurado.
 """
@@ -12,6 +17,8 @@ from __future__ import annotations
 import os
 import json
 import sys
+import argparse
+import threading
 from pathlib import Path
 
 # Garante que o pacote 'search' (raiz do repo) esteja no sys.path quando rodado via cron
@@ -21,22 +28,25 @@ try:
         sys.path.insert(0, repo_root)
 except Exception:
     pass
+# gvg_mailer usa o orçamento global pelo nome simples "gvg_budget"
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional
 
 try:
-    from search.gvg_browser.gvg_boletim import set_last_sent, get_user_email
-    from search.gvg_browser.gvg_database import create_connection, fetch_documentos
-    from search.gvg_browser.gvg_email import send_html_email
+    from search.gvg_browser.gvg_boletim import get_user_emails, set_last_sent_many
+    from search.gvg_browser.gvg_database import create_connection, db_fetch_all, fetch_documentos_for_many
+    from search.gvg_browser.gvg_mailer import EmailJob, Mailer, SMTP_SEND_WORKERS
+    from search.gvg_browser.gvg_scheduler import SCHEDULER_TZ
     from search.gvg_browser.gvg_styles import styles
 except Exception:
     # Execução direta
-    import sys, os
-    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-    from gvg_boletim import set_last_sent, get_user_email
-    from gvg_database import create_connection, fetch_documentos
-    from gvg_email import send_html_email
+    from gvg_boletim import get_user_emails, set_last_sent_many
+    from gvg_database import create_connection, db_fetch_all, fetch_documentos_for_many
+    from gvg_mailer import EmailJob, Mailer, SMTP_SEND_WORKERS
+    from gvg_scheduler import SCHEDULER_TZ
     from gvg_styles import styles
+from gvg_budget import configure_budget
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 LOGS_DIR = os.path.join(SCRIPT_DIR, "logs")
 os.makedirs(LOGS_DIR, exist_ok=True)
@@ -44,6 +54,15 @@ os.makedirs(LOGS_DIR, exist_ok=True)
 PIPELINE_TIMESTAMP = os.getenv("PIPELINE_TIMESTAMP") or datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
 LOG_FILE = os.path.join(LOGS_DIR, f"log_{PIPELINE_TIMESTAMP}.log")
 
+_LOG_LOCK = threading.Lock()
+
+# last_sent_at é gravado em lotes pequenos durante a entrega: uma queda no meio
+# reenvia no máximo este número de boletins já entregues
+try:
+    SENT_FLUSH_CHUNK = max(1, int(os.getenv("BOLETIM_SENT_FLUSH_CHUNK", "10")))
+except Exception:
+    SENT_FLUSH_CHUNK = 10
+
 def log_line(msg: str) -> None:
     try:
         print(msg, flush=True)
@@ -57,8 +76,8 @@ def _style_inline(d: Dict[str, Any]) -> str:
     return "; ".join(f"{k}:{v}" for k, v in (d or {}).items())
 
 
-def _fetch_boletins_to_send() -> List[Dict[str, Any]]:
-    """Retorna boletins candidatos (last_run_at > last_sent_at) com metadados."""
+def _fetch_boletins_to_send(ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """Retorna boletins candidatos (last_run_at > last_sent_at) com metadados (opcionalmente só os ids dados)."""
     conn=None; cur=None
     out: List[Dict[str, Any]] = []
     try:
@@ -76,7 +95,9 @@ def _fetch_boletins_to_send() -> List[Dict[str, Any]]:
                  WHERE active = true
                    AND last_run_at IS NOT NULL
                    AND (last_sent_at IS NULL OR last_sent_at < last_run_at)
-                """
+                   AND (%s::bigint[] IS NULL OR id = ANY(%s::bigint[]))
+                """,
+                (ids, ids)
             )
             cols = [d[0] for d in cur.description]
             out = [dict(zip(cols, r)) for r in cur.fetchall() or []]
@@ -102,52 +123,47 @@ def _fetch_boletins_to_send() -> List[Dict[str, Any]]:
             if conn: conn.close()
 
 
-def _fetch_latest_run_rows(boletim_id: int) -> Tuple[List[Dict[str, Any]], Optional[datetime]]:
-    """Retorna as linhas do último run (por maior run_at) e o run_at."""
-    conn=None; cur=None
-    try:
-        conn = create_connection()
-        if not conn:
-            return [], None
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT MAX(run_at) FROM public.user_boletim WHERE boletim_id = %s
-            """,
-            (boletim_id,)
-        )
-        row = cur.fetchone()
-        last_run = row[0] if row else None
-        if not last_run:
-            return [], None
-        # Buscar linhas do último run
-        cur.execute(
+_RUN_ROWS_CHUNK = 500
+
+
+def _fetch_latest_run_rows_many(boletim_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """Linhas do último run (maior run_at) de vários boletins: {boletim_id: [linhas]}.
+
+    Uma consulta por bloco de _RUN_ROWS_CHUNK boletins (em vez de duas por boletim).
+    """
+    out: Dict[int, List[Dict[str, Any]]] = {}
+    ids = list(dict.fromkeys(boletim_ids or []))
+    for i in range(0, len(ids), _RUN_ROWS_CHUNK):
+        rows = db_fetch_all(
             """
-            SELECT id, numero_controle_pncp, similarity, data_publicacao_pncp, data_encerramento_proposta, payload
-              FROM public.user_boletim
-             WHERE boletim_id = %s AND run_at = %s
-             ORDER BY similarity DESC NULLS LAST, id ASC
+            WITH last AS (
+                SELECT boletim_id, MAX(run_at) AS run_at
+                  FROM public.user_boletim
+                 WHERE boletim_id = ANY(%s)
+                 GROUP BY boletim_id
+            )
+            SELECT ub.boletim_id, ub.id, ub.numero_controle_pncp, ub.similarity,
+                   ub.data_publicacao_pncp, ub.data_encerramento_proposta, ub.payload
+              FROM public.user_boletim ub
+              JOIN last l ON l.boletim_id = ub.boletim_id AND l.run_at = ub.run_at
+             ORDER BY ub.boletim_id, ub.similarity DESC NULLS LAST, ub.id ASC
             """,
-            (boletim_id, last_run)
-        )
-        cols = [d[0] for d in cur.description]
-        rows = [dict(zip(cols, r)) for r in cur.fetchall() or []]
-        return rows, last_run
-    except Exception as e:
-        # erro silencioso: retorna vazio
-        return [], None
-    finally:
-        try:
-            if cur: cur.close()
-        finally:
-            if conn: conn.close()
+            (ids[i:i + _RUN_ROWS_CHUNK],), as_dict=True, ctx="BOLETIM.fetch_latest_run_rows_many",
+        ) or []
+        for r in rows:
+            out.setdefault(r.pop('boletim_id'), []).append(r)
+    return out
 
 
 def _render_html_boletim(query_text: str, items: List[Dict[str, Any]],
                          cfg_snapshot: Optional[Dict[str, Any]] = None,
                          schedule_type: Optional[str] = None,
-                         schedule_detail: Optional[Dict[str, Any]] = None) -> str:
-    """Render de e-mail com cabeçalho (logo + título), cabeçalho de busca e cards no estilo do GSB."""
+                         schedule_detail: Optional[Dict[str, Any]] = None,
+                         docs_map: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> str:
+    """Render de e-mail com cabeçalho (logo + título), cabeçalho de busca e cards no estilo do GSB.
+
+    docs_map: documentos já carregados ({pncp: [docs]}); ausente → busca em lote aqui.
+    """
     # --- Styles inline a partir de gvg_styles ---
     card_style = _style_inline(styles.get('result_card', {}))
     title_style = _style_inline(styles.get('card_title', {}))
@@ -414,6 +430,13 @@ def _render_html_boletim(query_text: str, items: List[Dict[str, Any]],
     except Exception:
         pass
 
+    # Documentos de todos os PNCPs em lote (uma query + API concorrente para ausentes)
+    if docs_map is None:
+        try:
+            docs_map = fetch_documentos_for_many([it.get('numero_controle_pncp') for it in sorted_items if it.get('numero_controle_pncp')])
+        except Exception:
+            docs_map = {}
+
     for i, it in enumerate(sorted_items, start=1):
         payload = it.get('payload') or {}
         orgao = payload.get('orgao') or ''
@@ -439,12 +462,9 @@ def _render_html_boletim(query_text: str, items: List[Dict[str, Any]],
         # Tag de status de data (aplica backgroundColor dinâmico)
         link_html = f"<a href='{link}' target='_blank'>{link_text}</a>" if link else 'N/A'
 
-        # Documentos (lista completa) — busca via BD/API
+        # Documentos (lista completa) — pré-carregados via BD/API
         docs_html = ''
-        try:
-            docs = fetch_documentos(pncp_id) if pncp_id else []
-        except Exception:
-            docs = []
+        docs = docs_map.get(str(pncp_id), []) if pncp_id else []
         try:
             if docs:
                 items_html = []
@@ -491,7 +511,117 @@ def _render_html_boletim(query_text: str, items: List[Dict[str, Any]],
     return "\n".join(parts)
 
 
-def run_once(now: Optional[datetime] = None) -> None:
+def _to_dt(x: Any) -> Optional[datetime]:
+    if not x:
+        return None
+    if isinstance(x, datetime):
+        return x if x.tzinfo else x.replace(tzinfo=timezone.utc)
+    if isinstance(x, str):
+        try:
+            return datetime.fromisoformat(x.replace('Z', '+00:00'))
+        except Exception:
+            try:
+                return datetime.strptime(x[:10], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+            except Exception:
+                return None
+    return None
+
+
+def _is_due(b: Dict[str, Any], now: datetime, tz=None) -> bool:
+    """Dia da semana configurado e frequência (DIARIO/SEMANAL: 1x por dia; MULTIDIARIO: intervalo mínimo).
+
+    Dia e dia da semana no fuso local tz (padrão SCHEDULER_TZ), a mesma fronteira do runner e do daemon.
+    """
+    tz = tz or SCHEDULER_TZ
+    stype = (b.get('schedule_type') or '').upper()
+    sdetail = b.get('schedule_detail') or {}
+    ls_dt = _to_dt(b.get('last_sent_at'))
+    now_local = now.astimezone(tz)
+    now_date = now_local.date()
+    sent_today = (ls_dt.astimezone(tz).date() == now_date) if ls_dt else False
+
+    # Dias configurados
+    dow_map = {0: 'seg', 1: 'ter', 2: 'qua', 3: 'qui', 4: 'sex', 5: 'sab', 6: 'dom'}
+    cur_dow = dow_map.get(now_local.weekday())
+    cfg_days = (sdetail or {}).get('days') if isinstance(sdetail, dict) else None
+    days = []
+    if stype in ('DIARIO', 'MULTIDIARIO'):
+        days = list(cfg_days) if cfg_days else ['seg', 'ter', 'qua', 'qui', 'sex']
+    elif stype == 'SEMANAL':
+        days = list(cfg_days) if cfg_days else []
+    if cur_dow not in days:
+        return False
+
+    # Frequência
+    if stype in ('DIARIO', 'SEMANAL'):
+        return not sent_today
+    if stype == 'MULTIDIARIO':
+        min_int = None
+        try:
+            v = (sdetail or {}).get('min_interval_minutes')
+            if isinstance(v, (int, float)):
+                min_int = int(v)
+        except Exception:
+            min_int = None
+        if min_int and ls_dt and (now - ls_dt).total_seconds() < min_int * 60:
+            return False
+    return True
+
+
+def _sort_rows(rows: List[Dict[str, Any]], cfg_snapshot: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Ordenação igual ao GSB (sort_mode do snapshot)."""
+    try:
+        sm = int((cfg_snapshot or {}).get('sort_mode', 1))
+    except Exception:
+        sm = 1
+    def _to_date_any(v):
+        from datetime import datetime as _dt
+        if not v:
+            return None
+        s = str(v)
+        for fmt in ('%Y-%m-%d','%d/%m/%Y'):
+            try:
+                return _dt.strptime(s[:10], fmt).date()
+            except Exception:
+                continue
+        return None
+    def _val(v):
+        try:
+            if v is None:
+                return None
+            if isinstance(v,(int,float)):
+                return float(v)
+            import re as _re
+            s=str(v).strip()
+            if not s: return None
+            s=_re.sub(r"[^0-9,\.-]","",s)
+            if s.count(',')==1 and s.count('.')>=1:
+                s=s.replace('.','').replace(',','.')
+            elif s.count(',')==1 and s.count('.')==0:
+                s=s.replace(',','.')
+            elif s.count(',')>1 and s.count('.')==0:
+                s=s.replace(',','')
+            return float(s)
+        except Exception:
+            return None
+    if sm == 1:
+        return sorted(rows or [], key=lambda r: (r.get('similarity') or 0), reverse=True)
+    if sm == 2:
+        def _dk(r):
+            raw = r.get('data_encerramento_proposta') or (r.get('payload') or {}).get('data_encerramento_proposta')
+            return _to_date_any(raw) or _to_date_any('9999-12-31')
+        return sorted(rows or [], key=_dk)
+    if sm == 3:
+        def _vk(r):
+            vv = (r.get('payload') or {}).get('valor')
+            v = _val(vv)
+            return -(v if v is not None else -1.0)
+        return sorted(rows or [], key=_vk)
+    return list(rows or [])
+
+
+def run_once(now: Optional[datetime] = None, workers: Optional[int] = None, mailer: Optional[Mailer] = None,
+             ids: Optional[List[int]] = None) -> Dict[str, Any]:
     now = now or datetime.now(timezone.utc)
     # Cabeçalho
     log_line("================================================================================")
@@ -499,186 +629,113 @@ def run_once(now: Optional[datetime] = None) -> None:
     log_line(f"Data: {now.strftime('%Y-%m-%d %H:%M:%S %Z')}")
     log_line("================================================================================")
 
-    boletins = _fetch_boletins_to_send()
+    boletins = _fetch_boletins_to_send(ids)
     log_line(f"Boletins candidatos a envio: {len(boletins)}")
     total = len(boletins)
-    done = 0
-    last_pct = -1
-
-    sent = 0
-    skipped = 0
 
+    # 1) Filtro de dia/frequência (em memória)
+    due: List[Dict[str, Any]] = []
     for b in boletins:
-        sid = b['id']
-        uid = b['user_id']
-        query = b.get('query_text') or ''
-        stype = (b.get('schedule_type') or '').upper()
         sdetail = b.get('schedule_detail') or {}
-        channels = b.get('channels') or []
-        cfg_snapshot = b.get('config_snapshot') or {}
         if isinstance(sdetail, str):
             try:
                 sdetail = json.loads(sdetail)
             except Exception:
                 sdetail = {}
-        last_sent = b.get('last_sent_at')
-
-        def _to_dt(x: Any) -> Optional[datetime]:
-            if not x:
-                return None
-            if isinstance(x, datetime):
-                return x if x.tzinfo else x.replace(tzinfo=timezone.utc)
-            if isinstance(x, str):
-                try:
-                    return datetime.fromisoformat(x.replace('Z', '+00:00'))
-                except Exception:
-                    try:
-                        return datetime.strptime(x[:10], '%Y-%m-%d').replace(tzinfo=timezone.utc)
-                    except Exception:
-                        return None
-            return None
+        b['schedule_detail'] = sdetail
+        if _is_due(b, now):
+            due.append(b)
+    skipped = total - len(due)
+
+    # 2) Pré-carga em lote: e-mails, linhas do último run e documentos
+    emails = get_user_emails([b['user_id'] for b in due]) if due else {}
+    sendable = [b for b in due if emails.get(str(b['user_id']))]
+    skipped += len(due) - len(sendable)
+    runs = _fetch_latest_run_rows_many([b['id'] for b in sendable]) if sendable else {}
+    pncps = list(dict.fromkeys(
+        r.get('numero_controle_pncp') for rows in runs.values() for r in rows if r.get('numero_controle_pncp')
+    ))
+    try:
+        docs_map = fetch_documentos_for_many(pncps) if pncps else {}
+    except Exception:
+        docs_map = {}
+    log_line(f"Pré-carga: boletins={len(sendable)} e-mails={len(emails)} itens={sum(len(v) for v in runs.values())} documentos={len(docs_map)}")
 
-        ls_dt = _to_dt(last_sent)
-        now_date = now.astimezone(timezone.utc).date()
-        sent_today = (ls_dt.astimezone(timezone.utc).date() == now_date) if ls_dt else False
-
-        # Dias configurados
-        dow_map = {0: 'seg', 1: 'ter', 2: 'qua', 3: 'qui', 4: 'sex', 5: 'sab', 6: 'dom'}
-        cur_dow = dow_map.get(now.weekday())
-        cfg_days = (sdetail or {}).get('days') if isinstance(sdetail, dict) else None
-        days = []
-        if stype in ('DIARIO', 'MULTIDIARIO'):
-            days = list(cfg_days) if cfg_days else ['seg', 'ter', 'qua', 'qui', 'sex']
-        elif stype == 'SEMANAL':
-            days = list(cfg_days) if cfg_days else []
-        if cur_dow not in days:
-            done += 1
-            skipped += 1
-            # progresso ao pular
-            pct = int((done * 100) / max(1, total))
-            if pct == 100 or pct - last_pct >= 5:
+    # 3) Render e fila de envio
+    jobs: List[EmailJob] = []
+    for b in sendable:
+        sid = b['id']
+        query = b.get('query_text') or ''
+        cfg_snapshot = b.get('config_snapshot') or {}
+        rows = _sort_rows(runs.get(sid) or [], cfg_snapshot)
+        html = _render_html_boletim(query, rows, cfg_snapshot, (b.get('schedule_type') or '').upper(), b['schedule_detail'], docs_map=docs_map)
+        jobs.append(EmailJob(
+            to=emails[str(b['user_id'])], subject=f"Boletim GovGo — {query}", html=html,
+            kind='boletim', ref_id=str(sid), user_id=str(b['user_id']), meta={'items': len(rows)},
+        ))
+
+    # 4) Entrega concorrente (pool SMTP, retentativas, dead-letter)
+    progress = {'done': skipped, 'last_pct': -1}
+    pending_sent: List[int] = []
+
+    def _flush_sent(ids_: List[int]) -> None:
+        if not ids_:
+            return
+        try:
+            set_last_sent_many(ids_, now)
+        except Exception as e:
+            log_line(f"Falha ao gravar last_sent_at ({len(ids_)} boletins): {e}")
+
+    def _on_result(r) -> None:
+        batch: List[int] = []
+        with _LOG_LOCK:
+            if r.ok:
+                log_line(f"Enviado: boletim id={r.job.ref_id} para {r.job.to} (itens={r.job.meta.get('items', 0)})")
+                pending_sent.append(int(r.job.ref_id))
+                if len(pending_sent) >= SENT_FLUSH_CHUNK:
+                    batch = pending_sent[:]
+                    del pending_sent[:]
+            else:
+                log_line(f"Falha envio: boletim id={r.job.ref_id} para {r.job.to} ({r.error})")
+            progress['done'] += 1
+            pct = int((progress['done'] * 100) / max(1, total))
+            if pct == 100 or pct - progress['last_pct'] >= 5:
                 fill = int(round(pct * 20 / 100))
                 bar = "█" * fill + "░" * (20 - fill)
-                log_line(f"Envio: {pct}% [{bar}] ({done}/{total})")
-                last_pct = pct
-            continue
-
-        # Frequência
-        if stype in ('DIARIO', 'SEMANAL'):
-            if sent_today:
-                done += 1
-                skipped += 1
-                # progresso ao pular
-                pct = int((done * 100) / max(1, total))
-                if pct == 100 or pct - last_pct >= 5:
-                    fill = int(round(pct * 20 / 100))
-                    bar = "█" * fill + "░" * (20 - fill)
-                    log_line(f"Envio: {pct}% [{bar}] ({done}/{total})")
-                    last_pct = pct
-                continue
-        elif stype == 'MULTIDIARIO':
-            min_int = None
-            try:
-                v = (sdetail or {}).get('min_interval_minutes')
-                if isinstance(v, (int, float)):
-                    min_int = int(v)
-            except Exception:
-                min_int = None
-            if min_int and ls_dt and (now - ls_dt).total_seconds() < min_int * 60:
-                done += 1
-                skipped += 1
-                # progresso ao pular
-                pct = int((done * 100) / max(1, total))
-                if pct == 100 or pct - last_pct >= 5:
-                    fill = int(round(pct * 20 / 100))
-                    bar = "█" * fill + "░" * (20 - fill)
-                    log_line(f"Envio: {pct}% [{bar}] ({done}/{total})")
-                    last_pct = pct
-                continue
+                log_line(f"Envio: {pct}% [{bar}] ({progress['done']}/{total})")
+                progress['last_pct'] = pct
+        # Marca fora do lock de log para não segurar os demais senders
+        _flush_sent(batch)
 
-        email = get_user_email(uid)
-        if not email:
-            skipped += 1
-            done += 1
-            # atualiza progresso mesmo ao pular
-            pct = int((done * 100) / max(1, total))
-            if pct == 100 or pct - last_pct >= 5:
-                fill = int(round(pct * 20 / 100))
-                bar = "█" * fill + "░" * (20 - fill)
-                log_line(f"Envio: {pct}% [{bar}] ({done}/{total})")
-                last_pct = pct
-            continue
+    own_mailer = mailer is None
+    mailer = mailer or Mailer(workers=workers or SMTP_SEND_WORKERS)
+    try:
+        report = mailer.deliver(jobs, on_result=_on_result)
+    finally:
+        if own_mailer:
+            mailer.close()
+        # Resto do último lote (também quando a entrega aborta no meio)
+        with _LOG_LOCK:
+            batch = pending_sent[:]
+            del pending_sent[:]
+        _flush_sent(batch)
 
-        rows, last_run = _fetch_latest_run_rows(sid)
-        # Ordenação igual ao GSB
-        try:
-            sm = int((cfg_snapshot or {}).get('sort_mode', 1))
-        except Exception:
-            sm = 1
-        def _to_date_any(v):
-            from datetime import datetime as _dt
-            if not v:
-                return None
-            s = str(v)
-            for fmt in ('%Y-%m-%d','%d/%m/%Y'):
-                try:
-                    return _dt.strptime(s[:10], fmt).date()
-                except Exception:
-                    continue
-            return None
-        def _val(v):
-            try:
-                if v is None:
-                    return None
-                if isinstance(v,(int,float)):
-                    return float(v)
-                import re as _re
-                s=str(v).strip()
-                if not s: return None
-                s=_re.sub(r"[^0-9,\.-]","",s)
-                if s.count(',')==1 and s.count('.')>=1:
-                    s=s.replace('.','').replace(',','.')
-                elif s.count(',')==1 and s.count('.')==0:
-                    s=s.replace(',','.')
-                elif s.count(',')>1 and s.count('.')==0:
-                    s=s.replace(',','')
-                return float(s)
-            except Exception:
-                return None
-        if sm == 1:
-            rows = sorted(rows or [], key=lambda r: (r.get('similarity') or 0), reverse=True)
-        elif sm == 2:
-            def _dk(r):
-                raw = r.get('data_encerramento_proposta') or (r.get('payload') or {}).get('data_encerramento_proposta')
-                return _to_date_any(raw) or _to_date_any('9999-12-31')
-            rows = sorted(rows or [], key=_dk)
-        elif sm == 3:
-            def _vk(r):
-                vv = (r.get('payload') or {}).get('valor')
-                v = _val(vv)
-                return -(v if v is not None else -1.0)
-            rows = sorted(rows or [], key=_vk)
-        html = _render_html_boletim(query, rows, cfg_snapshot, stype, sdetail)
-        subject = f"Boletim GovGo — {query}"
-        ok = send_html_email(email, subject, html)
-        if ok:
-            set_last_sent(sid, now)
-            log_line(f"Enviado: boletim id={sid} para {email} (itens={len(rows)})")
-            sent += 1
-        else:
-            log_line(f"Falha envio: boletim id={sid} para {email}")
-
-        # Progresso
-        done += 1
-        pct = int((done * 100) / max(1, total))
-        if pct == 100 or pct - last_pct >= 5:
-            fill = int(round(pct * 20 / 100))
-            bar = "█" * fill + "░" * (20 - fill)
-            log_line(f"Envio: {pct}% [{bar}] ({done}/{total})")
-            last_pct = pct
-
-    log_line(f"Resumo envio: enviados={sent}, pulados={skipped}, candidatos={total}")
+    st = report.stats
+    log_line(f"Resumo envio: enviados={st['sent']}, falhas={st['failed']}, pulados={skipped}, candidatos={total}")
+    log_line(f"Vazão: {st['msgs_per_s']} msgs/s em {st['elapsed_s']}s | workers={st['workers']} conexões={st['connections']} "
+             f"msgs/conexão={st['msgs_per_conn']} retentativas={st['retries']} dead-letter={st['dead_letter']}")
+    return dict(st, skipped=skipped, candidates=total)
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Envia os boletins executados por e-mail (pool SMTP).')
+    parser.add_argument('--workers', type=int, default=SMTP_SEND_WORKERS, help='Senders SMTP concorrentes')
+    parser.add_argument('--rate', type=float, default=None, help='Mensagens por segundo (0 = ilimitado)')
+    parser.add_argument('--smtp-concurrency', type=int, default=None, help='Envios SMTP simultâneos (0 = ilimitado)')
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
-    run_once()
+    args = _parse_args()
+    configure_budget('smtp', args.smtp_concurrency, args.rate)
+    run_once(workers=args.workers)
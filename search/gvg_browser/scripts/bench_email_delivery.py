@@ -0,0 +1,153 @@
+"""
+Benchmark da entrega de e-mails (gvg_mailer) contra um sink SMTP local (aiosmtpd).
+
+Sobe um servidor SMTP em 127.0.0.1 que descarta as mensagens, com latências simuladas:
+  --connect-ms  custo de abrir sessão (TLS + login no provedor real), pago no EHLO;
+  --data-ms     custo por mensagem (DATA).
+e falhas injetadas no RCPT: --transient-rate (451, repetível) e --permanent-rate (550).
+Compara:
+  • send_html_email em laço (uma conexão por mensagem, como o envio antigo);
+  • Mailer com pool de sessões para cada tamanho de --workers.
+Verifica que toda mensagem foi entregue exatamente uma vez ou terminou em falha/dead-letter
+(dead-letter desligado aqui: sem DB).
+
+Requer: pip install aiosmtpd
+
+Uso:
+  python search/gvg_browser/scripts/bench_email_delivery.py --messages 500 --workers 1,4,8
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BROWSER_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+if BROWSER_DIR not in sys.path:
+    sys.path.insert(0, BROWSER_DIR)
+
+try:
+    from aiosmtpd.controller import Controller
+except Exception:  # pragma: no cover
+    Controller = None
+
+
+class SinkHandler:
+    """Handler aiosmtpd: conta entregas por destinatário e injeta latência/falhas."""
+
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.delivered = {}
+        self.sessions = 0
+        self.rng = random.Random(3)
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        with self.lock:
+            self.sessions += 1
+        await asyncio.sleep(self.args.connect_ms / 1000.0)
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        with self.lock:
+            r = self.rng.random()
+        if address.startswith('bounce') or r < self.args.permanent_rate:
+            return '550 5.1.1 mailbox unavailable'
+        if r < self.args.permanent_rate + self.args.transient_rate:
+            return '451 4.3.0 try again later'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.args.data_ms / 1000.0)
+        with self.lock:
+            for rcpt in envelope.rcpt_tos:
+                self.delivered[rcpt] = self.delivered.get(rcpt, 0) + 1
+        return '250 Message accepted'
+
+    def reset(self):
+        with self.lock:
+            self.delivered = {}
+            self.sessions = 0
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mede msgs/s do envio de e-mails (pool SMTP) contra um sink aiosmtpd.')
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--workers', default='1,4,8', help='Lista de tamanhos de pool/senders')
+    parser.add_argument('--connect-ms', type=float, default=120.0, help='Latência de abertura de sessão (TLS+login simulados)')
+    parser.add_argument('--data-ms', type=float, default=15.0, help='Latência por mensagem')
+    parser.add_argument('--transient-rate', type=float, default=0.02, help='Fração de RCPT com 451')
+    parser.add_argument('--permanent-rate', type=float, default=0.005, help='Fração de RCPT com 550')
+    parser.add_argument('--max-per-conn', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=0.0, help='Orçamento smtp em msgs/s (0 = ilimitado)')
+    parser.add_argument('--html-kb', type=int, default=40, help='Tamanho do HTML por mensagem')
+    parser.add_argument('--skip-baseline', action='store_true', help='Não mede o envio uma-conexão-por-mensagem')
+    args = parser.parse_args()
+
+    if Controller is None:
+        print('aiosmtpd não instalado (pip install aiosmtpd)')
+        sys.exit(1)
+
+    handler = SinkHandler(args)
+    port = _free_port()
+    controller = Controller(handler, hostname='127.0.0.1', port=port, ready_timeout=10)
+    controller.start()
+    os.environ.update({'SMTP_HOST': '127.0.0.1', 'SMTP_PORT': str(port), 'SMTP_FROM': 'boletim@govgo.local',
+                       'SMTP_TLS': 'false', 'SMTP_USE_SSL': 'false', 'SMTP_USER': '', 'SMTP_PASS': ''})
+
+    from gvg_email import send_html_email
+    from gvg_mailer import EmailJob, Mailer, SmtpPool
+    from gvg_budget import configure_budget
+
+    configure_budget('smtp', 0, args.rate)
+    html = '<div>' + ('x' * 1024 + '\n') * args.html_kb + '</div>'
+    jobs = [EmailJob(to=f"user{i}@govgo.local", subject=f"Boletim {i}", html=html, kind='bench', ref_id=str(i))
+            for i in range(args.messages)]
+    print(f"mensagens={args.messages} connect={args.connect_ms}ms data={args.data_ms}ms "
+          f"451={args.transient_rate:.1%} 550={args.permanent_rate:.1%} html={args.html_kb}KB sink=127.0.0.1:{port}")
+
+    try:
+        if not args.skip_baseline:
+            handler.reset()
+            t0 = time.time()
+            ok = sum(1 for j in jobs if send_html_email(j.to, j.subject, j.html))
+            elapsed = time.time() - t0
+            print(f"send_html_email (1 conexão/msg): {elapsed:7.1f}s  msgs/s={ok / elapsed:7.1f}  "
+                  f"enviados={ok} sessões={handler.sessions}")
+
+        for w in [int(x) for x in args.workers.split(',') if x.strip()]:
+            handler.reset()
+            mailer = Mailer(pool=SmtpPool(size=w, max_msgs_per_conn=args.max_per_conn), workers=w,
+                            backoff_s=0.05, dead_letter=False)
+            report = mailer.deliver(jobs)
+            mailer.close()
+            st = report.stats
+            dup = sum(1 for n in handler.delivered.values() if n > 1)
+            missing = [r for r in report.sent if r.job.to not in handler.delivered]
+            perm = sum(1 for r in report.failed if r.permanent)
+            print(f"Mailer workers={w:<3} {st['elapsed_s']:7.1f}s  msgs/s={st['msgs_per_s']:7.1f}  enviados={st['sent']} "
+                  f"falhas={st['failed']} (permanentes={perm}) retentativas={st['retries']} conexões={st['connections']} "
+                  f"sessões_sink={handler.sessions} msgs/conexão={st['msgs_per_conn']}")
+            assert not dup, f"{dup} destinatários receberam mais de uma vez"
+            assert not missing, f"{len(missing)} marcados como enviados sem chegar ao sink"
+            assert len(handler.delivered) == st['sent'], 'contagem do sink difere do relatório'
+    finally:
+        controller.stop()
+
+
+if __name__ == '__main__':
+    main()
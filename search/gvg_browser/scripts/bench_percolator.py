@@ -0,0 +1,109 @@
+"""
+Benchmark da percolação de boletins (gvg_percolator.match).
+
+Gera N consultas salvas e M contratações novas sintéticas (dim 3072, agrupadas em tópicos
+para similaridades realistas), grupos de filtros com seletividade configurável, cortes e
+marcas d'água por boletim, e mede:
+  • parse dos vetores halfvec em texto (como chegam do Postgres) para o lote de contratações;
+  • montagem do índice (normalização);
+  • casamento em lote (produto matricial + máscaras + top-N por boletim) e montagem das linhas.
+Sem DB/OpenAI: só a parte em memória do motor.
+
+Uso:
+  python search/gvg_browser/scripts/bench_percolator.py --queries 10000 --contracts 5000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BROWSER_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+if BROWSER_DIR not in sys.path:
+    sys.path.insert(0, BROWSER_DIR)
+
+from gvg_percolator import QueryIndex, ContractBatch, match, parse_vector
+
+
+def _clustered(rng: np.random.Generator, centers: np.ndarray, n: int, noise: float) -> np.ndarray:
+    topic = rng.integers(0, len(centers), size=n)
+    out = centers[topic] + noise * rng.standard_normal((n, centers.shape[1]), dtype=np.float32)
+    return out.astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mede a vazão da percolação (consultas x contratações novas).')
+    parser.add_argument('--queries', type=int, default=10000)
+    parser.add_argument('--contracts', type=int, default=5000)
+    parser.add_argument('--dim', type=int, default=3072)
+    parser.add_argument('--topics', type=int, default=300, help='Tópicos (centros) compartilhados por consultas e contratações')
+    parser.add_argument('--noise', type=float, default=0.012, help='Ruído por coordenada em torno do tópico')
+    parser.add_argument('--groups', type=int, default=500, help='Conjuntos distintos de filtros (sql_conditions)')
+    parser.add_argument('--no-filter-share', type=float, default=0.3, help='Fração de boletins sem filtros')
+    parser.add_argument('--selectivity', type=float, default=0.2, help='Fração do lote aprovada por grupo de filtros')
+    parser.add_argument('--max-results', type=int, default=50)
+    parser.add_argument('--chunk', type=int, default=512, help='Consultas por bloco de produto matricial')
+    parser.add_argument('--parse-sample', type=int, default=5000, help='Vetores halfvec em texto para medir o parse')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    centers = rng.standard_normal((args.topics, args.dim), dtype=np.float32) / np.sqrt(args.dim)
+    now = time.time()
+
+    # Parse: texto '[...]' como em embeddings_hv::text
+    sample = _clustered(rng, centers, min(args.parse_sample, args.contracts), args.noise)
+    texts = ['[' + ','.join(f"{x:.5g}" for x in row) + ']' for row in sample]
+    t0 = time.perf_counter()
+    parsed = [parse_vector(t) for t in texts]
+    parse_s = time.perf_counter() - t0
+    assert parsed and parsed[0].shape == (args.dim,)
+
+    # Lote de contratações novas (último dia e meio) + linha de user_boletim pré-montada
+    cvecs = _clustered(rng, centers, args.contracts, args.noise)
+    cnorm = cvecs / np.linalg.norm(cvecs, axis=1, keepdims=True)
+    created = now - rng.uniform(0, 36 * 3600, size=args.contracts)
+    pks = [f"{10**13 + i}-1-{i:06d}/2026" for i in range(args.contracts)]
+    rows = [{'numero_controle_pncp': pk, 'similarity': None, 'payload': {'objeto': 'objeto'}} for pk in pks]
+    batch = ContractBatch(pks=pks, matrix=cnorm.astype(np.float32), created=created, rows=rows)
+
+    # Máscaras dos grupos de filtros (grupo 0 = sem filtros)
+    masks = rng.random((args.groups + 1, args.contracts)) < args.selectivity
+    masks[0, :] = True
+    groups = np.where(rng.random(args.queries) < args.no_filter_share, 0, rng.integers(1, args.groups + 1, size=args.queries))
+
+    qvecs = _clustered(rng, centers, args.queries, args.noise)
+    t0 = time.perf_counter()
+    index = QueryIndex.build(
+        list(range(args.queries)), list(qvecs),
+        cutoffs=rng.uniform(0.35, 0.75, size=args.queries),
+        limits=np.full(args.queries, args.max_results),
+        since=now - rng.uniform(20 * 3600, 30 * 3600, size=args.queries),
+        groups=groups,
+    )
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    matches = match(index, batch, masks, chunk=args.chunk)
+    match_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    hits = [dict(batch.rows[ci], similarity=sim) for per in matches for ci, sim in per]
+    rows_s = time.perf_counter() - t0
+
+    with_hits = sum(1 for per in matches if per)
+    pairs = args.queries * args.contracts
+    print(f"consultas={args.queries} contratações={args.contracts} dim={args.dim} grupos={args.groups} "
+          f"seletividade={args.selectivity:.0%} sem_filtro={args.no_filter_share:.0%}")
+    print(f"parse halfvec texto: {len(texts)} vetores em {parse_s:.2f}s ({len(texts) / parse_s:,.0f} vetores/s)")
+    print(f"índice: {build_s:.2f}s | casamento: {match_s:.2f}s ({pairs / match_s / 1e6:,.1f} M pares/s, "
+          f"{args.queries / match_s:,.0f} boletins/s) | linhas: {rows_s:.2f}s")
+    print(f"boletins com acertos={with_hits} acertos={len(hits)} (média {len(hits) / max(1, args.queries):.1f}/boletim)")
+    print(f"total em memória (índice+casamento+linhas): {build_s + match_s + rows_s:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+Benchmark do executor de boletins agendados (01_run_scheduled_boletins.run_once).
+
+Gera milhares de boletins sintéticos e mede boletins/minuto para vários tamanhos
+de pool, com embedder simulado (latência fixa, sob o orçamento 'openai') e DB:
+  --pg   → Postgres local real (SUPABASE_* apontando para ele): tabelas bench_* criadas
+           e removidas pelo script; a busca vetorial é emulada com pg_sleep.
+  (sem)  → DB simulado (sleep sob o orçamento 'db').
+Com --distinct < --schedules, vários boletins compartilham o mesmo plano (dedup).
+Ao final, simula uma queda no meio do run e mede a retomada pelo checkpoint.
+
+Uso:
+  python search/gvg_browser/scripts/bench_scheduled_boletins.py --schedules 3000 --workers 1,4,8,16
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BROWSER_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+if BROWSER_DIR not in sys.path:
+    sys.path.insert(0, BROWSER_DIR)
+
+from gvg_budget import configure_budget, budget_stats, limit
+
+
+def _load_runner():
+    spec = importlib.util.spec_from_file_location('run_scheduled_boletins', os.path.join(SCRIPT_DIR, '01_run_scheduled_boletins.py'))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)  # type: ignore[union-attr]
+    return mod
+
+
+class _Crash(BaseException):
+    """Simula a queda do processo (não é capturada como falha isolada de boletim)."""
+
+
+class MockBackend:
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.recorded = 0
+        self.crash_after = None
+        self.delta_state = {}
+        self.pg = None
+        if args.pg:
+            import gvg_database
+            self.pg = gvg_database
+
+    # ---- DB ----
+    def _db(self, ms: float, sql: str = None, params=None, write: bool = False):
+        if self.pg is None:
+            with limit('db'):
+                time.sleep(ms / 1000.0)
+            return
+        if write:
+            self.pg.db_execute(sql, params, ctx='BENCH.write')
+        else:
+            self.pg.db_fetch_all("SELECT pg_sleep(%s)", (ms / 1000.0,), ctx='BENCH.search')
+
+    def setup(self, n: int):
+        if self.pg is None:
+            return
+        self.pg.db_execute("DROP TABLE IF EXISTS bench_boletim_result, bench_schedule", ctx='BENCH.setup')
+        self.pg.db_execute("CREATE UNLOGGED TABLE bench_schedule (id INTEGER PRIMARY KEY, last_run_at TIMESTAMPTZ, preproc_output JSONB)", ctx='BENCH.setup')
+        self.pg.db_execute(
+            "CREATE UNLOGGED TABLE bench_boletim_result (boletim_id INTEGER, run_token TEXT, run_at TIMESTAMPTZ, numero_controle_pncp TEXT, similarity REAL)",
+            ctx='BENCH.setup',
+        )
+        self.pg.db_execute("INSERT INTO bench_schedule (id) SELECT generate_series(1, %s)", (n,), ctx='BENCH.setup')
+
+    def teardown(self):
+        if self.pg is not None:
+            self.pg.db_execute("DROP TABLE IF EXISTS bench_boletim_result, bench_schedule", ctx='BENCH.teardown')
+
+    # ---- OpenAI ----
+    def embed(self, text: str):
+        with limit('openai'):
+            time.sleep(self.args.embed_ms / 1000.0)
+        return [0.0] * 8
+
+    # ---- Funções substituídas no runner ----
+    def semantic_search(self, query_obj, limit=50, filter_expired=True, use_negation=True):
+        if random.random() < self.args.fail_rate:
+            raise RuntimeError('falha simulada na busca')
+        if random.random() < self.args.hang_rate:
+            time.sleep(self.args.timeout + 2)
+        self.embed(query_obj.get('search_terms') or '')
+        self._db(self.args.db_ms)
+        results = []
+        for i in range(min(limit, self.args.results)):
+            pid = f"{random.randint(10**13, 10**14 - 1)}-1-{i:06d}/2025"
+            results.append({'id': pid, 'similarity': 0.9 - i * 0.01, 'details': {
+                'numero_controle_pncp': pid, 'objeto_compra': 'objeto', 'data_publicacao_pncp': '2099-01-01',
+            }})
+        return results, 0.0
+
+    def process_query(self, query: str):
+        with limit('openai'):
+            time.sleep(self.args.preproc_ms / 1000.0)
+        return {'search_terms': query, 'negative_terms': '', 'sql_conditions': [], 'embeddings': True}
+
+    def update_schedule_preproc_output(self, sid, info):
+        self._db(self.args.db_write_ms, "UPDATE bench_schedule SET preproc_output = %s::jsonb WHERE id = %s", ('{}', sid), write=True)
+        return True
+
+    def record_boletim_results(self, sid, uid, run_token, run_at, rows):
+        with self.lock:
+            self.recorded += 1
+            if self.crash_after is not None and self.recorded > self.crash_after:
+                raise _Crash()
+        if self.pg is not None and rows:
+            self.pg.db_execute_many(
+                "INSERT INTO bench_boletim_result VALUES (%s,%s,%s,%s,%s)",
+                [(sid, run_token, run_at, r['numero_controle_pncp'], r.get('similarity')) for r in rows],
+                ctx='BENCH.record',
+            )
+        else:
+            self._db(self.args.db_write_ms)
+        return len(rows)
+
+    def fetch_delta_state(self, ids):
+        with self.lock:
+            return {i: self.delta_state[i] for i in ids if i in self.delta_state}
+
+    def set_delta_state(self, ids, cutoff, full_run_at):
+        with self.lock:
+            for i in ids:
+                self.delta_state[i] = {'delta_cutoff': cutoff, 'last_full_run_at': full_run_at}
+        return len(ids)
+
+    def touch_last_run(self, sid, dt):
+        self._db(self.args.db_write_ms, "UPDATE bench_schedule SET last_run_at = %s WHERE id = %s", (dt, sid), write=True)
+        return True
+
+
+def _schedules(n: int, miss_rate: float, distinct: int):
+    """Boletins sintéticos; consultas/UF sorteadas de um conjunto de `distinct` planos (variações de caixa/espaço)."""
+    ufs = ['SP', 'RJ', 'MG', 'PR', 'BA']
+    out = []
+    for i in range(1, n + 1):
+        k = random.randrange(max(1, distinct))
+        q = f"consulta sintética {k // len(ufs)}"
+        out.append({
+            'id': i, 'user_id': f"user-{i % 500}", 'query_text': (q.upper() if i % 3 == 0 else q) + ('  ' if i % 2 else ''),
+            'schedule_type': 'DIARIO', 'schedule_detail': {}, 'channels': ['email'],
+            'config_snapshot': {'search_type': 1, 'search_approach': 1, 'relevance_level': 1, 'max_results': 50},
+            'filters': {'uf': [ufs[k % len(ufs)]], 'orgao': ''}, 'last_run_at': None,
+            'preproc_output': None if random.random() < miss_rate else {'search_terms': q, 'sql_conditions': []},
+        })
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mede boletins/minuto do executor concorrente (embedder simulado).')
+    parser.add_argument('--schedules', type=int, default=3000)
+    parser.add_argument('--distinct', type=int, default=0, help='Planos distintos (0 = todos distintos)')
+    parser.add_argument('--workers', default='1,4,8,16', help='Lista de tamanhos de pool')
+    parser.add_argument('--embed-ms', type=float, default=150.0, help='Latência do embedding simulado')
+    parser.add_argument('--preproc-ms', type=float, default=1500.0, help='Latência do pré-processamento (assistant) simulado')
+    parser.add_argument('--preproc-miss', type=float, default=0.05, help='Fração sem preproc_output em cache')
+    parser.add_argument('--db-ms', type=float, default=60.0, help='Latência da busca no DB')
+    parser.add_argument('--db-write-ms', type=float, default=10.0, help='Latência das escritas (modo DB simulado)')
+    parser.add_argument('--results', type=int, default=20, help='Resultados por boletim')
+    parser.add_argument('--fail-rate', type=float, default=0.005)
+    parser.add_argument('--hang-rate', type=float, default=0.0, help='Fração de boletins que travam além do timeout')
+    parser.add_argument('--timeout', type=int, default=30)
+    parser.add_argument('--openai-concurrency', type=int, default=8)
+    parser.add_argument('--openai-rps', type=float, default=50.0)
+    parser.add_argument('--db-concurrency', type=int, default=10)
+    parser.add_argument('--db-qps', type=float, default=0.0)
+    parser.add_argument('--pg', action='store_true', help='Usa Postgres local real (variáveis SUPABASE_*)')
+    args = parser.parse_args()
+
+    random.seed(11)
+    runner = _load_runner()
+    backend = MockBackend(args)
+    quiet = ('Resumo', 'Dedup', 'Retomando', 'TIMEOUT', 'Orçamentos')
+    runner.log_line = lambda msg: print('   ', msg, flush=True) if msg.startswith(quiet) else None
+    runner.dbg = lambda *_a, **_k: None
+    runner.semantic_search = backend.semantic_search
+    runner.SearchQueryProcessor = lambda: backend
+    runner.update_schedule_preproc_output = backend.update_schedule_preproc_output
+    runner.record_boletim_results = backend.record_boletim_results
+    runner.touch_last_run = backend.touch_last_run
+    runner.fetch_delta_state = backend.fetch_delta_state
+    runner.set_delta_state = backend.set_delta_state
+    runner.set_relevance_filter_level = lambda _lvl: None
+    runner.ENABLE_SEARCH_V2 = False
+    runner.CHECKPOINT_PATH = os.path.join(tempfile.mkdtemp(prefix='gvg_bench_boletim_'), 'checkpoint.jsonl')
+    configure_budget('openai', args.openai_concurrency, args.openai_rps)
+    configure_budget('db', args.db_concurrency, args.db_qps)
+
+    schedules = _schedules(args.schedules, args.preproc_miss, args.distinct or args.schedules)
+    runner.list_active_schedules_all = lambda _now: [dict(s) for s in schedules]
+    backend.setup(args.schedules)
+    print(f"Boletins={args.schedules} embed={args.embed_ms}ms preproc={args.preproc_ms}ms (miss={args.preproc_miss:.0%}) "
+          f"db={'postgres' if args.pg else 'simulado'} openai={args.openai_concurrency}/{args.openai_rps}rps db={args.db_concurrency}")
+    try:
+        for w in [int(x) for x in args.workers.split(',') if x.strip()]:
+            t0 = time.time()
+            counts = runner.run_once(now=datetime.now(timezone.utc), workers=w, timeout_s=args.timeout, resume=False)
+            elapsed = time.time() - t0
+            print(f"workers={w:<3} tempo={elapsed:7.1f}s  boletins/min={counts['executed'] / elapsed * 60:8.1f}  "
+                  f"planos={counts['plans']} buscas_evitadas={counts['searches_saved']} "
+                  f"falhas={counts['failed']} timeouts={counts['timeout']}")
+
+        # Queda no meio do run + retomada pelo checkpoint
+        w = max(int(x) for x in args.workers.split(',') if x.strip())
+        backend.recorded = 0
+        backend.crash_after = args.schedules // 2
+        try:
+            runner.run_once(now=datetime.now(timezone.utc), workers=w, timeout_s=args.timeout)
+        except _Crash:
+            print(f"queda simulada após ~{backend.crash_after} boletins gravados")
+        backend.crash_after = None
+        counts = runner.run_once(workers=w, timeout_s=args.timeout)
+        print(f"retomada: já concluídos={counts['resumed']} executados agora={counts['executed']}")
+        print(f"orçamentos: {budget_stats()}")
+    finally:
+        backend.teardown()
+
+
+if __name__ == '__main__':
+    main()
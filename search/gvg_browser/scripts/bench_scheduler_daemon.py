@@ -0,0 +1,212 @@
+"""
+Benchmark do daemon de boletins (boletim_scheduler_daemon) x disparo em lote (cron + processo novo).
+
+Daemon (medido de fato, DB e executor simulados):
+  N boletins com vencimentos espalhados em --window s; o daemon acorda pela fila de
+  prioridade, roda os lotes vencidos e recarrega a agenda pela marca d'água, enquanto
+  --edits-per-s edições de usuários chegam. Mede atraso (início - vencimento), lotes e
+  linhas relidas do DB (incremental) x varredura completa a cada disparo.
+Lote:
+  • partida a frio: processo novo importando a pilha do executor/envio (medido, subprocess);
+  • atraso: com cron a cada --cron-min min, cada boletim espera o próximo disparo (calculado
+    para os mesmos vencimentos);
+  • varredura: todas as N linhas de user_schedule lidas a cada disparo.
+
+Uso:
+  python search/gvg_browser/scripts/bench_scheduler_daemon.py --schedules 2000 --window 60
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BROWSER_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+if BROWSER_DIR not in sys.path:
+    sys.path.insert(0, BROWSER_DIR)
+
+from gvg_scheduler import next_due
+
+_COLD_IMPORT = (
+    "import time; t = time.perf_counter(); "
+    "import gvg_boletim, gvg_search_core, gvg_preprocessing, gvg_percolator, gvg_mailer, gvg_email; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def _load_daemon():
+    spec = importlib.util.spec_from_file_location('boletim_scheduler_daemon', os.path.join(SCRIPT_DIR, 'boletim_scheduler_daemon.py'))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)  # type: ignore[union-attr]
+    return mod
+
+
+class FakeDB:
+    """user_schedule em memória com updated_at (relógio do 'DB') e latência por consulta/linha."""
+
+    def __init__(self, n: int, window: float, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.rows = {}
+        self.due = {}
+        self.read_rows = 0
+        self.queries = 0
+        now = datetime.now(timezone.utc)
+        for sid in range(1, n + 1):
+            offset = random.uniform(1.0, window)
+            # MULTIDIARIO diário em todos os dias: vence em now + offset
+            last = now - timedelta(minutes=1440) + timedelta(seconds=offset)
+            self.rows[sid] = {
+                'id': sid, 'user_id': f"user-{sid % 500}", 'query_text': f"consulta {sid}",
+                'schedule_type': 'MULTIDIARIO',
+                'schedule_detail': {'days': ['seg', 'ter', 'qua', 'qui', 'sex', 'sab', 'dom'], 'time': '00:00', 'min_interval_minutes': 1440},
+                'channels': ['email'], 'config_snapshot': {}, 'filters': {}, 'preproc_output': None,
+                'last_run_at': last, 'active': True, 'updated_at': now - timedelta(days=1),
+            }
+            self.due[sid] = (last + timedelta(minutes=1440)).timestamp()
+
+    def load(self, since):
+        with self.lock:
+            out = [dict(r, _detail=r['schedule_detail']) for r in self.rows.values() if since is None or r['updated_at'] > since]
+            wm = max((r['updated_at'] for r in self.rows.values()), default=since)
+            self.read_rows += len(out)
+            self.queries += 1
+        time.sleep((self.args.db_ms + len(out) * self.args.row_us / 1000.0) / 1000.0)
+        return out, wm
+
+    def mark_run(self, ids, now):
+        with self.lock:
+            for sid in ids:
+                self.rows[sid]['last_run_at'] = now
+                self.rows[sid]['updated_at'] = datetime.now(timezone.utc)
+
+    def edit_random(self):
+        """Usuário altera um boletim (ex.: filtros) sem mudar o vencimento."""
+        with self.lock:
+            sid = random.choice(list(self.rows))
+            self.rows[sid]['filters'] = {'uf': [random.choice(['SP', 'RJ', 'MG'])]}
+            self.rows[sid]['updated_at'] = datetime.now(timezone.utc)
+
+
+class FakeRunner:
+    LOG_FILE = os.devnull
+
+    def __init__(self, db: FakeDB, args):
+        self.db = db
+        self.args = args
+        self.starts = {}
+
+    def log_line(self, msg: str) -> None:
+        if self.args.verbose:
+            print('   ', msg, flush=True)
+
+    def run_once(self, now=None, workers=None, timeout_s=None, resume=True, full=False, schedules=None):
+        t = time.time()
+        for s in schedules or []:
+            self.starts.setdefault(s['id'], t)
+        time.sleep((self.args.batch_ms + len(schedules or []) * self.args.item_ms) / 1000.0)
+        self.db.mark_run([s['id'] for s in schedules or []], now)
+        return {}
+
+
+def _pct(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara o daemon residente de boletins com o disparo em lote.')
+    parser.add_argument('--schedules', type=int, default=2000)
+    parser.add_argument('--window', type=float, default=60.0, help='Janela (s) em que os vencimentos caem')
+    parser.add_argument('--poll', type=float, default=5.0, help="Recarga incremental (s)")
+    parser.add_argument('--coalesce', type=float, default=1.0)
+    parser.add_argument('--edits-per-s', type=float, default=5.0, help='Edições de boletins por segundo durante o teste')
+    parser.add_argument('--db-ms', type=float, default=20.0, help='Latência por consulta da agenda')
+    parser.add_argument('--row-us', type=float, default=30.0, help='Custo por linha lida (µs)')
+    parser.add_argument('--batch-ms', type=float, default=50.0, help='Custo fixo por lote executado')
+    parser.add_argument('--item-ms', type=float, default=2.0, help='Custo por boletim no lote')
+    parser.add_argument('--cron-min', type=float, default=15.0, help='Intervalo do cron no modo lote (min)')
+    parser.add_argument('--connect-ms', type=float, default=150.0, help='Abertura de conexões (DB/SMTP) por processo no modo lote')
+    parser.add_argument('--cold-runs', type=int, default=3)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+    random.seed(5)
+
+    # ---- Lote: partida a frio (processo novo) ----
+    cold = []
+    for _ in range(args.cold_runs):
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-c', _COLD_IMPORT], cwd=BROWSER_DIR, capture_output=True, text=True)
+        wall = time.perf_counter() - t0
+        if proc.returncode != 0:
+            print(f"partida a frio: importação falhou ({(proc.stderr.strip().splitlines() or ['?'])[-1]})")
+            break
+        cold.append((wall, float(proc.stdout.strip().splitlines()[-1])))
+
+    # ---- Custo de agenda em memória ----
+    db = FakeDB(args.schedules, args.window, args)
+    now = datetime.now(timezone.utc)
+    items = [dict(r, _detail=r['schedule_detail']) for r in db.rows.values()]
+    t0 = time.perf_counter()
+    for it in items:
+        next_due(it, now)
+    nd_us = (time.perf_counter() - t0) / max(1, len(items)) * 1e6
+
+    # ---- Daemon ----
+    mod = _load_daemon()
+    runner = FakeRunner(db, args)
+    daemon = mod.SchedulerDaemon(runner, None, poll_s=args.poll, full_reload_s=3600, coalesce_s=args.coalesce,
+                                 retry_s=600, load_fn=db.load)
+    th = threading.Thread(target=daemon.serve, daemon=True)
+    t_start = time.time()
+    th.start()
+    stop_edits = threading.Event()
+
+    def _edits():
+        while not stop_edits.wait(1.0 / args.edits_per_s if args.edits_per_s > 0 else 3600):
+            db.edit_random()
+    te = threading.Thread(target=_edits, daemon=True)
+    te.start()
+    time.sleep(args.window + 3.0)
+    stop_edits.set()
+    daemon.stop()
+    th.join(timeout=30)
+
+    lags = [max(0.0, runner.starts[sid] - db.due[sid]) for sid in runner.starts]
+    missing = args.schedules - len(runner.starts)
+    print(f"boletins={args.schedules} janela={args.window:.0f}s poll={args.poll:.0f}s edições={args.edits_per_s}/s "
+          f"db={args.db_ms}ms+{args.row_us}µs/linha")
+    print(f"next_due: {nd_us:.1f} µs/boletim ({args.schedules} em {nd_us * args.schedules / 1000:.1f} ms)")
+    print(f"daemon: executados={len(runner.starts)} faltando={missing} lotes={daemon.stats['batches']} "
+          f"atraso médio={statistics.mean(lags) if lags else 0:.3f}s p95={_pct(lags, 95):.3f}s máx={max(lags) if lags else 0:.3f}s")
+    print(f"daemon: consultas da agenda={db.queries} linhas lidas={db.read_rows} "
+          f"(varredura completa por consulta seria {db.queries * args.schedules})")
+
+    # ---- Lote: mesmo conjunto de vencimentos com cron ----
+    period = args.cron_min * 60.0
+    cron_lags = []
+    for _ in range(50):  # fase do cron sorteada: média sobre disparos em qualquer ponto do ciclo
+        phase = random.uniform(0, period)
+        cron_lags.extend(period - ((d - t_start - phase) % period) for d in db.due.values())
+    per_trigger = args.connect_ms / 1000.0 + args.db_ms / 1000.0 + args.schedules * args.row_us / 1e6
+    if cold:
+        wall = statistics.mean(w for w, _ in cold)
+        imp = statistics.mean(i for _, i in cold)
+        print(f"lote: partida a frio={wall:.2f}s por processo (importação da pilha={imp:.2f}s) x2 etapas (01, 02)")
+        per_trigger += 2 * wall
+    print(f"lote (cron {args.cron_min:.0f} min): atraso médio={statistics.mean(cron_lags):.1f}s p95={_pct(cron_lags, 95):.1f}s "
+          f"máx={max(cron_lags):.1f}s | sobrecarga por disparo≈{per_trigger:.2f}s | linhas lidas por disparo={args.schedules}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+Daemon residente de boletins: agenda em memória + execução (01) e envio (02) no mesmo processo.
+
+Alternativa ao disparo em lote (00_pipeline_boletim / cron), que sobe processos novos a cada
+execução, reimporta a pilha do browser, reabre conexões e varre todos os boletins. Aqui:
+- Pilha importada uma vez; conexões DB reaproveitadas (pool, --db-pool / GVG_DB_POOL_SIZE),
+  sessões SMTP reaproveitadas (gvg_mailer) e caches (gvg_cache) quentes entre execuções.
+- Próximo vencimento por boletim (gvg_scheduler.next_due) numa fila de prioridade; o processo
+  dorme até o próximo vencimento exato.
+- Recarga incremental: só boletins com user_schedule.updated_at acima da marca d'água
+  (a cada --poll s e logo após cada execução); recarga completa a cada --full-reload s
+  (captura exclusões físicas).
+- Boletins que vencem dentro de --coalesce s rodam juntos (planos idênticos deduplicados pelo 01).
+- Falha de execução (last_run_at não avança): nova tentativa após --retry s.
+
+Uso:
+  python -m search.gvg_browser.scripts.boletim_scheduler_daemon [--workers 8] [--no-email]
+  (SIGTERM/SIGINT: termina a execução em curso e sai)
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Garante que o pacote 'search' (raiz do repo) esteja no sys.path quando rodado via serviço
+try:
+    repo_root = str(Path(__file__).resolve().parents[3])
+    if repo_root not in sys.path:
+        sys.path.insert(0, repo_root)
+except Exception:
+    pass
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SCRIPT_DIR, '..')))
+
+try:
+    from search.gvg_browser.gvg_boletim import fetch_schedules_changed_since
+    from search.gvg_browser.gvg_scheduler import DueQueue, next_due, SCHEDULER_TZ
+    from search.gvg_browser.gvg_database import enable_connection_pool, connection_pool_stats
+    from search.gvg_browser.gvg_mailer import Mailer, SMTP_SEND_WORKERS
+except Exception:
+    from gvg_boletim import fetch_schedules_changed_since
+    from gvg_scheduler import DueQueue, next_due, SCHEDULER_TZ
+    from gvg_database import enable_connection_pool, connection_pool_stats
+    from gvg_mailer import Mailer, SMTP_SEND_WORKERS
+from gvg_budget import configure_budget
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+POLL_S = max(1, _env_int('GVG_SCHEDULER_POLL_S', 60))
+FULL_RELOAD_S = max(60, _env_int('GVG_SCHEDULER_FULL_RELOAD_S', 3600))
+COALESCE_S = max(0, _env_int('GVG_SCHEDULER_COALESCE_S', 5))
+RETRY_S = max(30, _env_int('GVG_SCHEDULER_RETRY_S', 900))
+# updated_at = início da transação: relê uma janela antes da marca para não perder commits tardios
+WATERMARK_OVERLAP_S = max(0, _env_int('GVG_SCHEDULER_WATERMARK_OVERLAP_S', 30))
+DB_POOL_SIZE = max(0, _env_int('GVG_DB_POOL_SIZE', 4))
+SEND_EMAIL = (os.getenv('GVG_SCHEDULER_SEND_EMAIL', 'true') or '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+LOGS_DIR = os.path.join(SCRIPT_DIR, "logs")
+os.makedirs(LOGS_DIR, exist_ok=True)
+
+
+def _load_script(name: str, filename: str):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SCRIPT_DIR, filename))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)  # type: ignore[union-attr]
+    return mod
+
+
+def _runner_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Cópia no formato de list_active_schedules_all (sem campos internos do daemon)."""
+    return {k: v for k, v in item.items() if not k.startswith('_') and k not in ('active', 'updated_at')}
+
+
+class SchedulerDaemon:
+    def __init__(self, runner, sender=None, mailer: Optional[Mailer] = None, workers: Optional[int] = None,
+                 timeout_s: Optional[int] = None, poll_s: float = POLL_S, full_reload_s: float = FULL_RELOAD_S,
+                 coalesce_s: float = COALESCE_S, retry_s: float = RETRY_S,
+                 load_fn=None, clock=None):
+        self.runner = runner
+        self.sender = sender
+        self.mailer = mailer
+        self.workers = workers
+        self.timeout_s = timeout_s
+        self.poll_s = float(poll_s)
+        self.full_reload_s = float(full_reload_s)
+        self.coalesce_s = float(coalesce_s)
+        self.retry_s = float(retry_s)
+        self.load_fn = load_fn or fetch_schedules_changed_since
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+        self.queue = DueQueue()
+        self.items: Dict[Any, Dict[str, Any]] = {}
+        self.attempted: Dict[Any, datetime] = {}
+        self.watermark: Optional[datetime] = None
+        self.next_reload = 0.0
+        self.next_full_reload = 0.0
+        self.stop_event = threading.Event()
+        self.stats = {'batches': 0, 'executed': 0, 'reloads': 0, 'reloaded_rows': 0, 'full_reloads': 0,
+                      'lag_s_max': 0.0, 'lag_s_sum': 0.0, 'run_s_sum': 0.0}
+
+    def log(self, msg: str) -> None:
+        self.runner.log_line(f"[daemon] {msg}")
+
+    # ---- Carga da agenda ----
+    def _reschedule(self, sid: Any, now: datetime) -> None:
+        item = self.items.get(sid)
+        due = next_due(item, now) if item else None
+        tried = self.attempted.get(sid)
+        if due is not None and tried is not None:
+            last = item.get('last_run_at')
+            last = last if isinstance(last, datetime) else None
+            if last is not None and (last if last.tzinfo else last.replace(tzinfo=timezone.utc)) >= tried:
+                self.attempted.pop(sid, None)  # execução registrada no DB
+            elif due <= tried + timedelta(seconds=self.retry_s):
+                due = tried + timedelta(seconds=self.retry_s)  # falhou: aguarda antes de tentar de novo
+        self.queue.schedule(sid, due)
+
+    def reload(self, full: bool = False) -> int:
+        now = self.clock()
+        t0 = time.monotonic()
+        if full:
+            rows, wm = self.load_fn(None)
+            seen = {r['id'] for r in rows}
+            # Lista vazia com agenda carregada = provável erro de DB (db_fetch_all devolve []): não apaga a agenda
+            for sid in ([s for s in self.items if s not in seen] if rows else []):
+                self.items.pop(sid, None)
+                self.queue.remove(sid)
+            self.stats['full_reloads'] += 1
+            self.next_full_reload = time.time() + self.full_reload_s
+        else:
+            since = (self.watermark - timedelta(seconds=WATERMARK_OVERLAP_S)) if self.watermark is not None else None
+            rows, wm = self.load_fn(since)
+        if wm is not None and (self.watermark is None or wm > self.watermark):
+            self.watermark = wm
+        for item in rows:
+            sid = item['id']
+            if not item.get('active', True):
+                self.items.pop(sid, None)
+                self.attempted.pop(sid, None)
+                self.queue.remove(sid)
+                continue
+            self.items[sid] = item
+            self._reschedule(sid, now)
+        self.stats['reloads'] += 1
+        self.stats['reloaded_rows'] += len(rows)
+        self.next_reload = time.time() + self.poll_s
+        if full or rows:
+            self.log(f"agenda {'completa' if full else 'incremental'}: {len(rows)} linha(s) em {(time.monotonic() - t0) * 1000:.0f}ms "
+                     f"| agendados={len(self.queue)} | marca d'água={self.watermark}")
+        return len(rows)
+
+    # ---- Execução ----
+    def run_due(self) -> int:
+        now = self.clock()
+        due = self.queue.pop_due(now.timestamp(), self.coalesce_s)
+        if not due:
+            return 0
+        ids = [sid for sid, _ in due if sid in self.items]
+        lags = [max(0.0, now.timestamp() - ts) for _, ts in due]
+        log_file = os.path.join(LOGS_DIR, f"log_daemon_{now.astimezone(SCHEDULER_TZ).strftime('%Y%m%d')}.log")
+        self.runner.LOG_FILE = log_file
+        if self.sender is not None:
+            self.sender.LOG_FILE = log_file
+        t0 = time.monotonic()
+        try:
+            self.runner.run_once(now=now, workers=self.workers, timeout_s=self.timeout_s, resume=False,
+                                 schedules=[_runner_item(self.items[sid]) for sid in ids])
+            if self.sender is not None:
+                self.sender.run_once(now=now, mailer=self.mailer, ids=ids)
+        except Exception as e:
+            self.log(f"ERRO execução de {len(ids)} boletim(ns): {e}")
+        run_s = time.monotonic() - t0
+        for sid in ids:
+            self.attempted[sid] = now
+        self.stats['batches'] += 1
+        self.stats['executed'] += len(ids)
+        self.stats['lag_s_max'] = max(self.stats['lag_s_max'], max(lags))
+        self.stats['lag_s_sum'] += sum(lags)
+        self.stats['run_s_sum'] += run_s
+        self.log(f"lote: {len(ids)} boletim(ns) | atraso máx={max(lags):.2f}s | execução={run_s:.1f}s")
+        # Últimas execuções (last_run_at) voltam pela marca d'água; quem não avançou entra em nova tentativa
+        self.reload()
+        for sid in ids:
+            if sid in self.items and self.queue.due_of(sid) is None:
+                self._reschedule(sid, self.clock())
+        return len(ids)
+
+    def step(self) -> None:
+        """Uma iteração do laço: recargas vencidas, lote vencido, espera até o próximo evento."""
+        if time.time() >= self.next_full_reload:
+            self.reload(full=True)
+        elif time.time() >= self.next_reload:
+            self.reload()
+        self.run_due()
+        if not self.stop_event.is_set():
+            self.queue.wait(min(self.next_reload, self.next_full_reload))
+
+    def serve(self) -> None:
+        self.log(f"iniciado: poll={self.poll_s:.0f}s recarga completa={self.full_reload_s:.0f}s coalesce={self.coalesce_s:.0f}s fuso={SCHEDULER_TZ}")
+        while not self.stop_event.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                self.log(f"ERRO laço: {e}")
+                self.stop_event.wait(min(self.poll_s, 30.0))
+        self.log(f"encerrado: {self.stats} | pool DB: {connection_pool_stats()}")
+
+    def stop(self, *_a) -> None:
+        self.stop_event.set()
+        self.queue.wake()
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Daemon residente de boletins (agenda em memória, execução e envio).')
+    parser.add_argument('--workers', type=int, default=None, help='Workers do executor (padrão GVG_BOLETIM_WORKERS)')
+    parser.add_argument('--timeout', type=int, default=None, help='Timeout por boletim (s)')
+    parser.add_argument('--poll', type=int, default=POLL_S, help="Intervalo da recarga incremental por marca d'água (s)")
+    parser.add_argument('--full-reload', type=int, default=FULL_RELOAD_S, help='Intervalo da recarga completa (s)')
+    parser.add_argument('--coalesce', type=int, default=COALESCE_S, help='Janela para agrupar vencimentos próximos (s)')
+    parser.add_argument('--retry', type=int, default=RETRY_S, help='Espera antes de repetir boletim que falhou (s)')
+    parser.add_argument('--db-pool', type=int, default=DB_POOL_SIZE, help='Conexões DB reaproveitadas (0 = desliga)')
+    parser.add_argument('--mail-workers', type=int, default=SMTP_SEND_WORKERS, help='Senders SMTP concorrentes')
+    parser.add_argument('--no-email', action='store_true', help='Só executa (sem a etapa de envio)')
+    parser.add_argument('--openai-concurrency', type=int, default=None)
+    parser.add_argument('--openai-rps', type=float, default=None)
+    parser.add_argument('--db-concurrency', type=int, default=None)
+    parser.add_argument('--db-qps', type=float, default=None)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = _parse_args()
+    configure_budget('openai', args.openai_concurrency, args.openai_rps)
+    configure_budget('db', args.db_concurrency, args.db_qps)
+    enable_connection_pool(args.db_pool)
+    runner = _load_script('run_scheduled_boletins', '01_run_scheduled_boletins.py')
+    send = SEND_EMAIL and not args.no_email
+    sender = _load_script('send_boletins_email', '02_send_boletins_email.py') if send else None
+    daemon = SchedulerDaemon(
+        runner, sender, mailer=Mailer(workers=args.mail_workers) if send else None,
+        workers=args.workers, timeout_s=args.timeout, poll_s=args.poll, full_reload_s=args.full_reload,
+        coalesce_s=args.coalesce, retry_s=args.retry,
+    )
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.serve()
+    if daemon.mailer is not None:
+        daemon.mailer.close()
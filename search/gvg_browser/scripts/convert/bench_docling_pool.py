@@ -0,0 +1,68 @@
+import argparse
+import glob
+import os
+import sys
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+# Permite execução direta a partir do repo sem instalar pacote
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, '..', '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from gvg_docling_pool import DoclingPool
+
+
+_SUBPROC_CODE = (
+    "import sys; sys.path.insert(0, sys.argv[2]);\n"
+    "from gvg_docling_pool import build_docling_converter\n"
+    "res=build_docling_converter().convert(sys.argv[1]); res.document.export_to_markdown()"
+)
+
+
+def _run_subprocess(path: str) -> bool:
+    proc = subprocess.run([sys.executable, '-c', _SUBPROC_CODE, path, REPO_ROOT], capture_output=True, text=True, timeout=600)
+    return proc.returncode == 0
+
+
+def _report(label: str, n_ok: int, n_total: int, elapsed: float) -> None:
+    per_min = (n_ok / elapsed * 60.0) if elapsed > 0 else 0.0
+    print(f"{label:<12} docs={n_total} ok={n_ok} tempo={elapsed:.1f}s docs/min={per_min:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Docling: subprocesso por arquivo vs pool pré-aquecido (docs/min).')
+    parser.add_argument('corpus', help='Diretório com PDFs (fixture)')
+    parser.add_argument('--workers', type=int, default=2, help='Workers do pool (padrão 2)')
+    parser.add_argument('--skip-subprocess', action='store_true', help='Mede apenas o pool')
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.corpus, '**', '*.pdf'), recursive=True))
+    if not files:
+        print(f"Nenhum PDF em: {args.corpus}")
+        sys.exit(1)
+
+    if not args.skip_subprocess:
+        t0 = time.time()
+        n_ok = sum(1 for f in files if _run_subprocess(f))
+        _report('subprocesso', n_ok, len(files), time.time() - t0)
+
+    pool = DoclingPool(workers=args.workers)
+    t0 = time.time()
+    pool.start()
+    # Aquecimento contado à parte (custo pago uma vez por worker)
+    for w in list(pool._idle.queue):
+        w.wait_ready(300)
+    warm = time.time() - t0
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=args.workers) as ex:
+        oks = list(ex.map(lambda f: pool.convert(f)[0], files))
+    _report('pool', sum(1 for ok in oks if ok), len(files), time.time() - t0)
+    print(f"aquecimento={warm:.1f}s stats={pool.stats}")
+    pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Permite execução direta a partir do repo sem instalar pacote
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, '..', '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import requests
+
+import gvg_http
+from gvg_http import download_to_file, http_stats
+
+
+class _State:
+    files = {}
+    drop_rate = 0.0
+    error_rate = 0.0
+    latency = 0.0
+    lock = threading.Lock()
+    requests = 0
+
+
+class MockPNCPHandler(BaseHTTPRequestHandler):
+    """Servidor de arquivos simulado: ETag, Range/If-Range, 304, quedas no meio do corpo e 503."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with _State.lock:
+            _State.requests += 1
+        if _State.latency:
+            time.sleep(_State.latency)
+        body = _State.files.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if random.random() < _State.error_rate:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        start = 0
+        rng = self.headers.get('Range')
+        if rng and self.headers.get('If-Range', etag) == etag:
+            start = int(rng.split('=')[1].split('-')[0])
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+        part = body[start:]
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(len(part)))
+        self.send_header('ETag', etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if not rng and random.random() < _State.drop_rate:
+            # Queda da conexão no meio do corpo
+            self.wfile.write(part[: len(part) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(part)
+
+
+def _run(label, fn, urls, workers):
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(fn, urls))
+    elapsed = time.time() - t0
+    ok = [r for r in results if r]
+    total_mb = sum(ok) / (1024 * 1024)
+    print(f"{label:<24} arquivos={len(ok)}/{len(urls)} tempo={elapsed:.2f}s throughput={total_mb / elapsed if elapsed else 0:.1f} MB/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mede o cliente de download compartilhado contra um servidor HTTP local simulado.')
+    parser.add_argument('--files', type=int, default=40)
+    parser.add_argument('--size-kb', type=int, default=512)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.01, help='Latência simulada por requisição (s)')
+    parser.add_argument('--drop-rate', type=float, default=0.2, help='Fração de respostas cortadas no meio (fase com falhas)')
+    parser.add_argument('--error-rate', type=float, default=0.1, help='Fração de respostas 503 (fase com falhas)')
+    args = parser.parse_args()
+
+    random.seed(7)
+    _State.files = {f"/arquivos/{i}": os.urandom(args.size_kb * 1024) for i in range(args.files)}
+    _State.latency = args.latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockPNCPHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [base + p for p in _State.files]
+    work = tempfile.mkdtemp(prefix='gvg_bench_dl_')
+    gvg_http.DOWNLOAD_CACHE_PATH = os.path.join(work, 'cache')
+    gvg_http.DOWNLOAD_CACHE_FRESH_S = 0  # força revalidação (304) na segunda passada
+    gvg_http.HTTP_BACKOFF = 0.05
+
+    def naive(url):
+        r = requests.get(url, timeout=30)
+        return len(r.content) if r.status_code == 200 else 0
+
+    def client(url, use_cache=False):
+        res = download_to_file(url, work, use_cache=use_cache)
+        size = res['size']
+        os.remove(res['path'])
+        return size
+
+    def client_checked(url):
+        res = download_to_file(url, work, use_cache=False)
+        with open(res['path'], 'rb') as f:
+            same = f.read() == _State.files[url[len(base):]]
+        os.remove(res['path'])
+        return res['size'] if same else 0
+
+    try:
+        _run('requests.get por arquivo', naive, urls, args.workers)
+        _run('cliente (sem cache)', client, urls, args.workers)
+        _run('cliente (cache frio)', lambda u: client(u, True), urls, args.workers)
+        _run('cliente (revalida 304)', lambda u: client(u, True), urls, args.workers)
+        st = http_stats()
+        print(f"  cache_hits={st['cache_hits']} revalidados={st['revalidated']}")
+        _State.drop_rate = args.drop_rate
+        _State.error_rate = args.error_rate
+        _run('cliente (com falhas)', client_checked, urls, args.workers)
+        st = http_stats()
+        print(f"  retomadas={st['resumed']} abortados={st['aborted']} requisições_servidor={_State.requests}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+# Permite execução direta a partir do repo sem instalar pacote
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, '..', '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from gvg_documents import convert_document_to_markdown
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mede a economia da camada rápida (pypdfium2) vs Docling em um corpus de PDFs.')
+    parser.add_argument('corpus', help='Diretório com PDFs (fixture)')
+    parser.add_argument('--skip-docling-only', action='store_true', help='Não roda a linha de base somente-Docling')
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.corpus, '**', '*.pdf'), recursive=True))
+    if not files:
+        print(f"Nenhum PDF em: {args.corpus}")
+        sys.exit(1)
+
+    # Camadas: fast path + escalonamento para Docling (registro por documento via conv_info)
+    t0 = time.time()
+    recs = []
+    for f in files:
+        info = {}
+        convert_document_to_markdown(f, os.path.basename(f), fast_tier=True, conv_info=info)
+        recs.append((os.path.basename(f), info))
+    tiered = time.time() - t0
+    for name, info in recs:
+        print(f"  {info.get('tier', '?'):7s} {info.get('ms', 0):7d} ms  escalado={info.get('escalated', False)!s:5s} {name}")
+    fast = [i for _, i in recs if i.get('tier') == 'fast']
+    docl = [i for _, i in recs if i.get('tier') == 'docling']
+    print(f"camadas     docs={len(files)} tempo={tiered:.1f}s fast={len(fast)} docling={len(docl)} "
+          f"(escalados={sum(1 for i in docl if i.get('escalated'))}) fast_ms={sum(i.get('ms', 0) for i in fast)} "
+          f"docling_ms={sum(i.get('ms', 0) for i in docl)}")
+
+    if not args.skip_docling_only:
+        t0 = time.time()
+        for f in files:
+            convert_document_to_markdown(f, os.path.basename(f), fast_tier=False)
+        base = time.time() - t0
+        saved = base - tiered
+        print(f"só Docling  docs={len(files)} tempo={base:.1f}s")
+        print(f"economia    {saved:.1f}s ({(saved / base * 100.0) if base > 0 else 0.0:.0f}%)")
+
+if __name__ == '__main__':
+    main()
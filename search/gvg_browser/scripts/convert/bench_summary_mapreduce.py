@@ -0,0 +1,101 @@
+import argparse
+import glob
+import os
+import sys
+import time
+import threading
+
+# Permite execução direta a partir do repo sem instalar pacote
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, '..', '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import gvg_summarize
+from gvg_summarize import condense_for_reduce, REDUCE_MAX_CHARS
+
+
+class MockLLM:
+    """LLM simulado: latência = base + tokens_in/prefill + tokens_out/decode (tokens ≈ chars/4)."""
+
+    def __init__(self, base_s, prefill_tps, decode_tps, out_tokens, scale):
+        self.base_s = base_s
+        self.prefill_tps = prefill_tps
+        self.decode_tps = decode_tps
+        self.out_tokens = out_tokens
+        self.scale = scale
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def _call(self, text, out_tokens):
+        tin = max(1, len(text) // 4)
+        with self.lock:
+            self.calls += 1
+            self.tokens_in += tin
+            self.tokens_out += out_tokens
+        time.sleep((self.base_s + tin / self.prefill_tps + out_tokens / self.decode_tps) * self.scale)
+        return ('- fato relevante do trecho ' * (out_tokens // 6)).strip()
+
+    def map_fn(self, chunk, total):
+        return self._call(chunk['text'], self.out_tokens)
+
+    def reduce(self, text):
+        return self._call(text, self.out_tokens * 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara latência e tokens do resumo direto vs map-reduce (LLM simulado).')
+    parser.add_argument('corpus', help='Diretório com arquivos .md (Markdown convertido)')
+    parser.add_argument('--workers', type=int, default=gvg_summarize.MAP_WORKERS)
+    parser.add_argument('--chunk-chars', type=int, default=gvg_summarize.CHUNK_CHARS)
+    parser.add_argument('--base', type=float, default=1.5, help='Latência fixa por chamada (s)')
+    parser.add_argument('--prefill', type=float, default=4000.0, help='Tokens de entrada por segundo')
+    parser.add_argument('--decode', type=float, default=60.0, help='Tokens de saída por segundo')
+    parser.add_argument('--out-tokens', type=int, default=500, help='Tokens de saída por trecho (reduce = 2x)')
+    parser.add_argument('--scale', type=float, default=0.01, help='Fator aplicado ao sleep (1.0 = tempo real simulado)')
+    parser.add_argument('--cache', action='store_true', help='Usa o cache de trechos (roda 2x para medir acertos)')
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.corpus, '**', '*.md'), recursive=True))
+    if not files:
+        print(f"Nenhum .md em: {args.corpus}")
+        sys.exit(1)
+    gvg_summarize.CHUNK_CHARS = args.chunk_chars
+    gvg_summarize.MAP_WORKERS = args.workers
+    gvg_summarize.CHUNK_CACHE_ENABLED = bool(args.cache)
+    llm = MockLLM(args.base, args.prefill, args.decode, args.out_tokens, args.scale)
+
+    for f in files:
+        with open(f, 'r', encoding='utf-8', errors='replace') as fh:
+            md = fh.read()
+        name = os.path.basename(f)
+
+        # Linha de base: uma chamada com o Markdown truncado
+        llm.reset()
+        t0 = time.time()
+        llm.reduce(md[:REDUCE_MAX_CHARS])
+        single_s = (time.time() - t0) / args.scale
+        single = (llm.calls, llm.tokens_in, llm.tokens_out)
+        coverage = min(1.0, REDUCE_MAX_CHARS / max(1, len(md)))
+
+        runs = 2 if args.cache else 1
+        for run in range(runs):
+            llm.reset()
+            st = {}
+            t0 = time.time()
+            condensed = condense_for_reduce(md, map_fn=llm.map_fn, stats=st)
+            llm.reduce(condensed)
+            mr_s = (time.time() - t0) / args.scale
+            label = 'map-reduce' if run == 0 else 'map-reduce (cache)'
+            print(f"{name}: chars={len(md)} trechos={st.get('chunks')} cache={st.get('cache_hits')}")
+            print(f"  direto      tempo={single_s:.1f}s chamadas={single[0]} tok_in={single[1]} tok_out={single[2]} cobertura={coverage:.0%}")
+            print(f"  {label:<11} tempo={mr_s:.1f}s chamadas={llm.calls} tok_in={llm.tokens_in} tok_out={llm.tokens_out} cobertura=100%")
+
+
+if __name__ == '__main__':
+    main()